@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+In-process ANN Index for Terminology Lookups
+============================================
+
+Optional search backend for the LOINC, RxNorm and SNOMED CT vector stores.
+
+An index directory is exported from a pgvector table with ``export_vector_index``.
+The configured path is a symlink to the newest versioned export (``<path>.<timestamp>``):
+
+    manifest.json   table, collection, row count, dimensions, dtype, model, index type
+    vectors.npy     float16/float32 row-normalized embedding matrix (memory-mapped)
+    rows.jsonl      {"document": ..., "metadata": ...} per row, read lazily via mmap
+    offsets.npy     byte offset of each row in rows.jsonl (plus end offset)
+    index.faiss     HNSW or IVF graph over the vectors (only when faiss is installed)
+
+``VectorIndex`` answers cosine-distance queries (same scale as pgvector's ``<=>``)
+for a batch of query vectors at once, using the faiss index when available and an
+exact chunked scan of the memory-mapped matrix otherwise.
+
+``QueryEmbeddingCache`` keeps query embeddings in an LRU keyed by whitespace-
+normalized text, so repeated lookups skip the model entirely.
+
+Usage:
+    python ann_index.py --table loinc_pg_embedding --collection-table loinc_pg_collection \\
+        --collection loinc_terminology --model <embedding model> --out /data/ann/loinc --index-type hnsw
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import shutil
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # exact numpy scan is used instead
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+ROWS_FILE = "rows.jsonl"
+OFFSETS_FILE = "offsets.npy"
+FAISS_FILE = "index.faiss"
+
+SCAN_CHUNK_ROWS = 65536  # Rows converted to float32 per step of the exact scan
+
+# (document, metadata, cosine distance)
+SearchHit = Tuple[str, Dict[str, Any], float]
+
+
+def normalize_query(text: str) -> str:
+    """Cache key for a query: surrounding/repeated whitespace does not change the embedding"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class QueryEmbeddingCache:
+    """LRU of query embeddings keyed by normalized query text"""
+
+    def __init__(self, embeddings, max_entries: int = 2048):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, queries: Sequence[str]) -> np.ndarray:
+        """(len(queries), dim) float32 matrix; all misses are embedded in one model call"""
+        keys = [normalize_query(q) for q in queries]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            vectors = np.asarray(self.embeddings.embed_documents(missing), dtype=np.float32)
+            for key, vector in zip(missing, vectors):
+                found[key] = vector
+            if self.max_entries > 0:
+                with self._lock:
+                    for key in missing:
+                        self._memory[key] = found[key]
+                        self._memory.move_to_end(key)
+                    while len(self._memory) > self.max_entries:
+                        self._memory.popitem(last=False)
+        return np.stack([found[key] for key in keys])
+
+    def get(self, query: str) -> np.ndarray:
+        return self.get_many([query])[0]
+
+
+class VectorIndex:
+    """Memory-mapped embedding matrix with optional faiss HNSW/IVF index"""
+
+    def __init__(self, path: str, expected_model: Optional[str] = None, ef_search: int = 128, nprobe: int = 16):
+        # Resolve the symlink once so every file comes from the same export
+        path = os.path.realpath(path)
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        if expected_model and self.manifest.get("model") != expected_model:
+            built_with = self.manifest.get("model") or "an unrecorded model"
+            raise ValueError(f"ANN index at {path} was built with {built_with}, expected {expected_model}")
+
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        self._rows_file = open(os.path.join(path, ROWS_FILE), "rb")
+        self._rows = mmap.mmap(self._rows_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+
+        self.faiss_index = None
+        faiss_path = os.path.join(path, FAISS_FILE)
+        if faiss is not None and os.path.exists(faiss_path):
+            self.faiss_index = faiss.read_index(faiss_path)
+        elif os.path.exists(faiss_path):
+            logger.warning("⚠️  faiss not installed; using exact scan for ANN index at %s", path)
+        # faiss search parameters are per-index state, so serialize searches on it
+        self._search_lock = threading.Lock()
+
+        logger.info(f"✅ Loaded ANN index {path}: {len(self)} rows, "
+                    f"{'faiss ' + self.manifest.get('index_type', '') if self.faiss_index is not None else 'exact scan'}")
+
+    def __len__(self) -> int:
+        return int(self.vectors.shape[0])
+
+    def row(self, i: int) -> Tuple[str, Dict[str, Any]]:
+        record = json.loads(self._rows[int(self.offsets[i]):int(self.offsets[i + 1])])
+        return record["document"], record["metadata"]
+
+    def search(self, queries: np.ndarray, k: int) -> List[List[SearchHit]]:
+        """Top-k rows per query, nearest first, with cosine distance (1 - dot product)"""
+        queries = np.ascontiguousarray(np.atleast_2d(queries), dtype=np.float32)
+        k = min(k, len(self))
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+        if self.faiss_index is not None:
+            scores, ids = self._search_faiss(queries, k)
+        else:
+            scores, ids = self._search_exact(queries, k)
+        return [
+            [(*self.row(i), float(1.0 - s)) for s, i in zip(row_scores, row_ids) if i >= 0]
+            for row_scores, row_ids in zip(scores, ids)
+        ]
+
+    def _search_faiss(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        with self._search_lock:
+            if hasattr(self.faiss_index, "hnsw"):
+                self.faiss_index.hnsw.efSearch = max(self.ef_search, k)
+            if hasattr(self.faiss_index, "nprobe"):
+                self.faiss_index.nprobe = self.nprobe
+            return self.faiss_index.search(queries, k)
+
+    def _search_exact(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Chunked inner-product scan keeping a running top-k per query"""
+        n_queries = len(queries)
+        best_scores = np.empty((n_queries, 0), dtype=np.float32)
+        best_ids = np.empty((n_queries, 0), dtype=np.int64)
+        for start in range(0, len(self), SCAN_CHUNK_ROWS):
+            block = np.asarray(self.vectors[start:start + SCAN_CHUNK_ROWS], dtype=np.float32)
+            scores = queries @ block.T
+            take = min(k, scores.shape[1])
+            part = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, part, axis=1)], axis=1)
+            best_ids = np.concatenate([best_ids, part + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_ids = np.take_along_axis(best_ids, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_ids, order, axis=1)
+
+
+_open_indexes: Dict[str, VectorIndex] = {}
+_open_lock = threading.Lock()
+
+
+def open_vector_index(path: str, expected_model: Optional[str] = None, **kwargs) -> VectorIndex:
+    """Process-wide VectorIndex per directory (mappers are constructed repeatedly)"""
+    path = os.path.abspath(path)
+    with _open_lock:
+        index = _open_indexes.get(path)
+        if index is None:
+            index = VectorIndex(path, expected_model=expected_model, **kwargs)
+            _open_indexes[path] = index
+        return index
+
+
+_query_caches: Dict[str, QueryEmbeddingCache] = {}
+
+
+def shared_query_cache(name: str, embeddings, max_entries: int) -> QueryEmbeddingCache:
+    """Process-wide query cache per model name, so it outlives individual vector stores"""
+    with _open_lock:
+        cache = _query_caches.get(name)
+        if cache is None:
+            cache = QueryEmbeddingCache(embeddings, max_entries)
+            _query_caches[name] = cache
+        return cache
+
+
+def export_vector_index(
+    database_url: str,
+    embedding_table: str,
+    collection_table: str,
+    collection_name: str,
+    out_dir: str,
+    dtype: str = "float16",
+    index_type: str = "hnsw",
+    model: Optional[str] = None,
+    hnsw_m: int = 32,
+    ivf_lists: Optional[int] = None,
+) -> int:
+    """Export one collection from pgvector into an index directory; returns rows written.
+
+    The export is built in a new versioned directory next to ``out_dir``, then
+    ``out_dir`` (a symlink) is switched to it with a single rename, so a process
+    opening the index sees either the previous export or the new one.
+    ``model`` is required: it is recorded in the manifest and checked on load.
+    """
+    import psycopg2
+
+    if index_type not in ("hnsw", "ivf", "flat"):
+        raise ValueError(f"Unsupported index type: {index_type}")
+    if not model:
+        raise ValueError("model is required so the index can be checked against the query embedding model")
+    out_dir = os.path.abspath(out_dir)
+    version_dir = f"{out_dir}.{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    building = f"{version_dir}.building"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+
+    conn = psycopg2.connect(database_url)
+    try:
+        # One snapshot for the count and the rows, even if a reload swaps the table meanwhile
+        conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        where = f"""
+            WHERE collection_id = (SELECT uuid FROM {collection_table} WHERE name = %s)
+        """
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT count(*), max(vector_dims(embedding)) FROM {embedding_table} {where}",
+                        (collection_name,))
+            n_rows, dim = cur.fetchone()
+        if not n_rows:
+            raise ValueError(f"No rows to export from {embedding_table} for collection '{collection_name}'")
+
+        vectors = np.lib.format.open_memmap(
+            os.path.join(building, VECTORS_FILE), mode="w+", dtype=np.dtype(dtype), shape=(n_rows, dim)
+        )
+        offsets = np.zeros(n_rows + 1, dtype=np.int64)
+        with conn.cursor(name="ann_export") as cur, open(os.path.join(building, ROWS_FILE), "wb") as rows_out:
+            cur.itersize = 5000
+            cur.execute(f"SELECT embedding::real[], document, cmetadata FROM {embedding_table} {where}",
+                        (collection_name,))
+            for i, (embedding, document, cmetadata) in enumerate(cur):
+                vector = np.asarray(embedding, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                vectors[i] = vector / norm if norm else vector
+                if isinstance(cmetadata, (str, bytes)):
+                    cmetadata = json.loads(cmetadata)
+                rows_out.write(json.dumps({"document": document, "metadata": cmetadata or {}}).encode("utf-8"))
+                rows_out.write(b"\n")
+                offsets[i + 1] = rows_out.tell()
+        vectors.flush()
+        np.save(os.path.join(building, OFFSETS_FILE), offsets)
+    finally:
+        conn.close()
+
+    built_type = "flat"
+    if index_type != "flat":
+        if faiss is None:
+            logger.warning("⚠️  faiss not installed; exported matrix only (queries use exact scan)")
+        else:
+            built_type = index_type
+            _build_faiss_index(np.load(os.path.join(building, VECTORS_FILE), mmap_mode="r"),
+                               os.path.join(building, FAISS_FILE), index_type, hnsw_m, ivf_lists)
+
+    with open(os.path.join(building, MANIFEST_FILE), "w") as f:
+        json.dump({
+            "table": embedding_table,
+            "collection": collection_name,
+            "rows": int(n_rows),
+            "dimensions": int(dim),
+            "dtype": dtype,
+            "model": model,
+            "index_type": built_type,
+            "exported_at": datetime.utcnow().isoformat(),
+        }, f, indent=2)
+
+    os.rename(building, version_dir)
+    _swap_in(out_dir, version_dir)
+    logger.info(f"✅ Exported {n_rows:,} rows from {embedding_table} to {out_dir} ({built_type}, {dtype})")
+    return int(n_rows)
+
+
+def _swap_in(out_dir: str, version_dir: str) -> None:
+    """Point the ``out_dir`` symlink at ``version_dir`` and remove the export it replaced"""
+    previous = os.path.realpath(out_dir) if os.path.islink(out_dir) else None
+    if os.path.isdir(out_dir) and not os.path.islink(out_dir):
+        # Plain directory from an older export: a symlink cannot be renamed over it,
+        # so this one switch leaves out_dir briefly missing
+        logger.warning(f"⚠️  Converting {out_dir} to a symlink; the index is unavailable for a moment")
+        previous = f"{out_dir}.old"
+        shutil.rmtree(previous, ignore_errors=True)
+        os.rename(out_dir, previous)
+    link = f"{out_dir}.link"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(version_dir), link)
+    os.replace(link, out_dir)
+    # Processes that already mapped the old files keep reading them after removal
+    if previous and previous != os.path.realpath(version_dir):
+        shutil.rmtree(previous, ignore_errors=True)
+
+
+def _build_faiss_index(vectors: np.ndarray, path: str, index_type: str, hnsw_m: int, ivf_lists: Optional[int]) -> None:
+    n_rows, dim = vectors.shape
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+    else:
+        lists = ivf_lists or max(1, int(np.sqrt(n_rows)))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, lists, faiss.METRIC_INNER_PRODUCT)
+        sample = np.asarray(vectors[np.linspace(0, n_rows - 1, min(n_rows, lists * 64)).astype(np.int64)],
+                            dtype=np.float32)
+        index.train(sample)
+    for start in range(0, n_rows, SCAN_CHUNK_ROWS):
+        index.add(np.asarray(vectors[start:start + SCAN_CHUNK_ROWS], dtype=np.float32))
+    faiss.write_index(index, path)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Export a pgvector terminology table to an in-process ANN index")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="PostgreSQL URL")
+    parser.add_argument("--table", required=True, help="Embedding table (e.g. loinc_pg_embedding)")
+    parser.add_argument("--collection-table", required=True, help="Collection table (e.g. loinc_pg_collection)")
+    parser.add_argument("--collection", required=True, help="Collection name")
+    parser.add_argument("--out", required=True, help="Index directory")
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+    parser.add_argument("--index-type", choices=["hnsw", "ivf", "flat"], default="hnsw")
+    parser.add_argument("--model", required=True, help="Embedding model recorded in the manifest and checked on load")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+    export_vector_index(args.database_url, args.table, args.collection_table, args.collection, args.out,
+                        dtype=args.dtype, index_type=args.index_type, model=args.model)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Bulk Vector Loader
+==================
+
+Shared loader used by the LOINC, RxNorm and SNOMED CT embedders to (re)build a
+terminology embedding table.
+
+- Records are streamed from the caller's iterator, never materialized in full
+- Texts are embedded in large chunks; each worker process loads the model once
+- Rows are written with binary COPY into ``{table}_staging`` (no indexes yet)
+- Progress is checkpointed in ``vector_load_checkpoints`` in the same
+  transaction as each COPY, so a crashed run resumes after the last chunk
+- The HNSW / IVFFlat index is built after the load, then the staging table
+  replaces the live table in a single transaction
+
+Each embedding table holds one collection, so the swap replaces the whole table.
+
+Usage (from an embedder):
+    loader = BulkVectorLoader(
+        database_url=DATABASE_URL,
+        embedding_table=LOINC_EMBEDDING_TABLE,
+        collection_table=LOINC_COLLECTION_TABLE,
+        collection_name=COLLECTION_NAME,
+        model_name=EMBEDDING_MODEL,
+    )
+    loader.load(((r.get_embedding_text(), r.get_metadata()) for r in records),
+                run_key=source_fingerprint(LOINC_CSV_PATH, EMBEDDING_MODEL))
+"""
+
+import io
+import json
+import math
+import os
+import struct
+import time
+import uuid
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_TABLE = "vector_load_checkpoints"
+EMBEDDING_COLUMNS = "(uuid, collection_id, embedding, document, cmetadata)"
+
+# Binary COPY framing: signature, flags, header extension length / end-of-data marker
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_COPY_TRAILER = struct.pack("!h", -1)
+
+# (embedding text, metadata) pairs produced by the embedders
+VectorRecord = Tuple[str, Dict[str, Any]]
+
+
+def source_fingerprint(path, model_name: str, limit: Optional[int] = None) -> str:
+    """Run key for a source file: a changed file, model or limit starts a fresh load"""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{int(stat.st_mtime)}:{model_name}:{limit or 'all'}"
+
+
+def resolve_device(device: str = "auto") -> str:
+    """'auto' picks CUDA, then Apple MPS, then CPU"""
+    if device != "auto":
+        return device
+    import torch
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def build_embeddings(model_name: str, device: str = "auto", encode_batch_size: int = 64):
+    """HuggingFace embedding model configured the way all terminology tables were built"""
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={'device': resolve_device(device)},
+        encode_kwargs={'normalize_embeddings': True, 'batch_size': encode_batch_size}
+    )
+
+
+def encode_copy_rows(
+    collection_id: str,
+    texts: Sequence[str],
+    metadatas: Sequence[Dict[str, Any]],
+    vectors: Sequence[Sequence[float]],
+) -> Tuple[io.BytesIO, List[str]]:
+    """Encode rows for ``COPY ... EMBEDDING_COLUMNS FROM STDIN (FORMAT binary)``.
+
+    uuid is 16 raw bytes, vector is pgvector's recv format (int16 dim, int16
+    unused, float4 values) and json/text are UTF-8 bytes.
+    """
+    buf = io.BytesIO()
+    buf.write(_COPY_HEADER)
+    collection_bytes = uuid.UUID(str(collection_id)).bytes
+    ids = []
+    for text, metadata, vector in zip(texts, metadatas, vectors):
+        row_id = uuid.uuid4()
+        ids.append(str(row_id))
+        document = text.encode("utf-8")
+        cmetadata = json.dumps(metadata).encode("utf-8")
+        dim = len(vector)
+        buf.write(struct.pack("!hi16si16s", 5, 16, row_id.bytes, 16, collection_bytes))
+        buf.write(struct.pack(f"!ihh{dim}f", 4 + 4 * dim, dim, 0, *vector))
+        buf.write(struct.pack("!i", len(document)))
+        buf.write(document)
+        buf.write(struct.pack("!i", len(cmetadata)))
+        buf.write(cmetadata)
+    buf.write(_COPY_TRAILER)
+    buf.seek(0)
+    return buf, ids
+
+
+def copy_embeddings(cursor, table: str, collection_id: str, texts, metadatas, vectors) -> List[str]:
+    """Write embedded rows to ``table`` with one binary COPY; returns the new row ids"""
+    buf, ids = encode_copy_rows(collection_id, texts, metadatas, vectors)
+    cursor.copy_expert(f"COPY {table} {EMBEDDING_COLUMNS} FROM STDIN WITH (FORMAT binary)", buf)
+    return ids
+
+
+def _chunks(records: Iterable[VectorRecord], size: int) -> Iterator[List[VectorRecord]]:
+    iterator = iter(records)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Per-process model, loaded once by the pool initializer
+_worker_embeddings = None
+
+
+def _init_worker(model_name: str, device: str, encode_batch_size: int) -> None:
+    global _worker_embeddings
+    _worker_embeddings = build_embeddings(model_name, device, encode_batch_size)
+
+
+def _embed_in_worker(texts: List[str]) -> List[List[float]]:
+    return _worker_embeddings.embed_documents(texts)
+
+
+class BulkVectorLoader:
+    """Resumable COPY-based (re)build of one terminology embedding table"""
+
+    def __init__(
+        self,
+        database_url: str,
+        embedding_table: str,
+        collection_table: str,
+        collection_name: str,
+        model_name: str,
+        collection_metadata: Optional[Dict[str, Any]] = None,
+        dimensions: int = 768,
+        device: str = "auto",
+        encode_batch_size: int = 64,
+        chunk_size: int = 5000,
+        workers: int = 1,
+        index_method: str = "hnsw",
+        maintenance_work_mem: str = "1GB",
+        embeddings=None,
+    ):
+        if index_method not in ("hnsw", "ivfflat"):
+            raise ValueError(f"Unsupported index method: {index_method}")
+        self.database_url = database_url
+        self.embedding_table = embedding_table
+        self.staging_table = f"{embedding_table}_staging"
+        self.collection_table = collection_table
+        self.collection_name = collection_name
+        self.collection_metadata = collection_metadata or {"embedding_model": model_name}
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.device = device
+        self.encode_batch_size = encode_batch_size
+        self.chunk_size = chunk_size
+        self.workers = max(1, workers)
+        self.index_method = index_method
+        self.maintenance_work_mem = maintenance_work_mem
+        # Optional already-loaded model for single-process runs
+        self.embeddings = embeddings
+
+    # ------------------------------------------------------------------ load
+
+    def load(self, records: Iterable[VectorRecord], run_key: str) -> int:
+        """Embed and load ``records``, then swap them in; returns rows in the new table"""
+        start_time = time.time()
+        conn = psycopg2.connect(self.database_url)
+        try:
+            collection_id = self._prepare(conn)
+            position, rows_loaded = self._start_or_resume(conn, run_key)
+            if position:
+                logger.info(f"🔁 Resuming {self.embedding_table} load after {position:,} records")
+
+            for chunk, vectors in self._embedded_chunks(islice(records, position, None)):
+                texts = [text for text, _ in chunk]
+                metadatas = [metadata for _, metadata in chunk]
+                with conn.cursor() as cur:
+                    copy_embeddings(cur, self.staging_table, collection_id, texts, metadatas, vectors)
+                    position += len(chunk)
+                    rows_loaded += len(chunk)
+                    cur.execute(f"""
+                        UPDATE {CHECKPOINT_TABLE}
+                        SET position = %s, rows_loaded = %s, updated_at = now()
+                        WHERE target_table = %s
+                    """, (position, rows_loaded, self.embedding_table))
+                conn.commit()
+                elapsed = time.time() - start_time
+                logger.info(f"✅ Loaded {rows_loaded:,} rows into {self.staging_table} "
+                            f"({rows_loaded / elapsed if elapsed > 0 else 0:.1f} rows/sec)")
+
+            self._build_indexes(conn, rows_loaded)
+            self._swap(conn)
+        finally:
+            conn.close()
+
+        logger.info(f"🎉 {self.embedding_table} rebuilt with {rows_loaded:,} rows "
+                    f"in {time.time() - start_time:.1f} seconds")
+        return rows_loaded
+
+    def _embedded_chunks(self, records: Iterable[VectorRecord]) -> Iterator[Tuple[List[VectorRecord], List[List[float]]]]:
+        """Yield (chunk, vectors) in input order so checkpoints stay a contiguous prefix"""
+        if self.workers == 1:
+            embeddings = self.embeddings or build_embeddings(self.model_name, self.device, self.encode_batch_size)
+            for chunk in _chunks(records, self.chunk_size):
+                yield chunk, embeddings.embed_documents([text for text, _ in chunk])
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.model_name, self.device, self.encode_batch_size),
+        ) as executor:
+            # Keep every worker busy while bounding how many chunks sit in memory
+            in_flight = deque()
+            for chunk in _chunks(records, self.chunk_size):
+                in_flight.append((chunk, executor.submit(_embed_in_worker, [text for text, _ in chunk])))
+                if len(in_flight) >= self.workers * 2:
+                    done_chunk, future = in_flight.popleft()
+                    yield done_chunk, future.result()
+            while in_flight:
+                done_chunk, future = in_flight.popleft()
+                yield done_chunk, future.result()
+
+    # ---------------------------------------------------------------- tables
+
+    def _prepare(self, conn) -> str:
+        """Extension, collection/checkpoint tables and the collection id"""
+        with conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.collection_table} (
+                    uuid UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    name VARCHAR(255) NOT NULL,
+                    cmetadata JSON,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+                    target_table TEXT PRIMARY KEY,
+                    run_key TEXT NOT NULL,
+                    position BIGINT NOT NULL DEFAULT 0,
+                    rows_loaded BIGINT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP NOT NULL DEFAULT now()
+                )
+            """)
+            cur.execute(f"SELECT uuid FROM {self.collection_table} WHERE name = %s", (self.collection_name,))
+            row = cur.fetchone()
+            if row:
+                collection_id = str(row[0])
+            else:
+                cur.execute(f"""
+                    INSERT INTO {self.collection_table} (name, cmetadata)
+                    VALUES (%s, %s)
+                    RETURNING uuid
+                """, (self.collection_name, json.dumps(self.collection_metadata)))
+                collection_id = str(cur.fetchone()[0])
+                logger.info(f"✅ Created collection '{self.collection_name}' with ID: {collection_id}")
+        conn.commit()
+        return collection_id
+
+    def _start_or_resume(self, conn, run_key: str) -> Tuple[int, int]:
+        """Checkpointed (position, rows_loaded) for this run, or a fresh empty staging table"""
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT run_key, position, rows_loaded FROM {CHECKPOINT_TABLE} WHERE target_table = %s",
+                        (self.embedding_table,))
+            checkpoint = cur.fetchone()
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (self.staging_table,))
+            staging_exists = cur.fetchone()[0]
+            if checkpoint and checkpoint[0] == run_key and staging_exists:
+                return int(checkpoint[1]), int(checkpoint[2])
+
+            if checkpoint:
+                logger.info(f"⚠️  Discarding checkpoint for a different run of {self.embedding_table}")
+            cur.execute(f"DROP TABLE IF EXISTS {self.staging_table}")
+            cur.execute(f"""
+                CREATE TABLE {self.staging_table} (
+                    uuid UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    collection_id UUID REFERENCES {self.collection_table}(uuid),
+                    embedding VECTOR({self.dimensions}),
+                    document TEXT,
+                    cmetadata JSON,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cur.execute(f"""
+                INSERT INTO {CHECKPOINT_TABLE} (target_table, run_key, position, rows_loaded)
+                VALUES (%s, %s, 0, 0)
+                ON CONFLICT (target_table) DO UPDATE
+                SET run_key = EXCLUDED.run_key, position = 0, rows_loaded = 0, updated_at = now()
+            """, (self.embedding_table, run_key))
+        conn.commit()
+        return 0, 0
+
+    def _build_indexes(self, conn, rows_loaded: int) -> None:
+        """Build indexes on the loaded staging table (far cheaper than maintaining them per row)"""
+        logger.info(f"🏗️  Building {self.index_method} index on {self.staging_table} ({rows_loaded:,} rows)")
+        start_time = time.time()
+        with conn.cursor() as cur:
+            cur.execute(f"SET maintenance_work_mem = '{self.maintenance_work_mem}'")
+            cur.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_{self.staging_table}_collection
+                ON {self.staging_table}(collection_id)
+            """)
+            if self.index_method == "hnsw":
+                cur.execute(f"""
+                    CREATE INDEX IF NOT EXISTS idx_{self.staging_table}_embedding
+                    ON {self.staging_table} USING hnsw (embedding vector_cosine_ops)
+                """)
+            else:
+                # pgvector guidance: rows/1000 lists up to 1M rows, sqrt(rows) beyond
+                lists = max(1, rows_loaded // 1000) if rows_loaded <= 1_000_000 else int(math.sqrt(rows_loaded))
+                cur.execute(f"""
+                    CREATE INDEX IF NOT EXISTS idx_{self.staging_table}_embedding
+                    ON {self.staging_table} USING ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})
+                """)
+            cur.execute(f"ANALYZE {self.staging_table}")
+        conn.commit()
+        logger.info(f"✅ Index built in {time.time() - start_time:.1f} seconds")
+
+    def _swap(self, conn) -> None:
+        """Replace the live table with the staging table in one transaction"""
+        live, staging, old = self.embedding_table, self.staging_table, f"{self.embedding_table}_old"
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {old}")
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (live,))
+            if cur.fetchone()[0]:
+                cur.execute(f"ALTER TABLE {live} RENAME TO {old}")
+            cur.execute(f"ALTER TABLE {staging} RENAME TO {live}")
+            # Dropping the old table frees the index/constraint names the new table takes over
+            cur.execute(f"DROP TABLE IF EXISTS {old}")
+            cur.execute(f"ALTER TABLE {live} RENAME CONSTRAINT {staging}_pkey TO {live}_pkey")
+            cur.execute(f"ALTER TABLE {live} RENAME CONSTRAINT {staging}_collection_id_fkey TO {live}_collection_id_fkey")
+            cur.execute(f"ALTER INDEX idx_{staging}_collection RENAME TO idx_{live}_collection")
+            cur.execute(f"ALTER INDEX idx_{staging}_embedding RENAME TO idx_{live}_embedding")
+            cur.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE target_table = %s", (live,))
+        conn.commit()
+        logger.info(f"🔄 Swapped {staging} into {live}")
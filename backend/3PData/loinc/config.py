@@ -77,6 +77,10 @@ CHECKPOINT_INTERVAL = 5000  # Save progress every N records
 DEFAULT_SEARCH_RESULTS = 10
 MIN_SIMILARITY_SCORE = 0.0
 MAX_SIMILARITY_SCORE = 1.0
+ANN_INDEX_DIR = os.getenv('LOINC_ANN_INDEX_DIR')  # In-process index exported by ../ann_index.py (unset: query pgvector)
+ANN_EF_SEARCH = int(os.getenv('ANN_EF_SEARCH', '128'))  # HNSW search breadth (raised to k when k is larger)
+ANN_NPROBE = int(os.getenv('ANN_NPROBE', '16'))  # IVF lists probed per query
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '4096'))  # Query embeddings kept in the LRU (0 disables)
 
 # Validation Settings
 REQUIRED_LOINC_FIELDS = ['LOINC_NUM', 'LONG_COMMON_NAME']
@@ -268,27 +268,32 @@ class LabTestLOINCMapper:
     
     def search_similar_loinc_codes(self, test: LabTest, k: int =300) -> List[Dict]:
         """Search for similar LOINC codes using embeddings"""
+        return self.search_similar_loinc_codes_batch([test], k=k)[0]
+    
+    def search_similar_loinc_codes_batch(self, tests: List[LabTest], k: int = 300) -> List[List[Dict]]:
+        """Similar LOINC codes for several tests with one batched embedding + search call"""
         try:
-            search_text = test.get_search_text()
-            results = self.loinc_pipeline.search_loinc_codes(search_text, k=k)
-            
-            similar_codes = []
-            for doc, score in results:
-                metadata = doc.metadata
-                similar_codes.append({
-                    'loinc_num': metadata.get('loinc_num', ''),
-                    'long_common_name': metadata.get('long_common_name', ''),
-                    'component': metadata.get('component', ''),
-                    'property': metadata.get('property', ''),
-                    'system': metadata.get('system', ''),
-                    'score': score
-                })
-            
-            return similar_codes
-            
+            search_texts = [test.get_search_text() for test in tests]
+            results = self.loinc_pipeline.search_loinc_codes_batch(search_texts, k=k)
         except Exception as e:
-            logger.error(f"❌ Error searching LOINC codes for {test.test_name}: {e}")
-            return []
+            label = tests[0].test_name if len(tests) == 1 else f"{len(tests)} tests"
+            logger.error(f"❌ Error searching LOINC codes for {label}: {e}")
+            return [[] for _ in tests]
+        
+        return [
+            [
+                {
+                    'loinc_num': doc.metadata.get('loinc_num', ''),
+                    'long_common_name': doc.metadata.get('long_common_name', ''),
+                    'component': doc.metadata.get('component', ''),
+                    'property': doc.metadata.get('property', ''),
+                    'system': doc.metadata.get('system', ''),
+                    'score': score
+                }
+                for doc, score in hits
+            ]
+            for hits in results
+        ]
     
     def get_chatgpt_loinc_code(self, test: LabTest, similar_codes: List[Dict]) -> Tuple[Optional[str], Optional[str]]:
         """Query ChatGPT to determine the exact LOINC code"""
@@ -470,6 +475,10 @@ class LabTestLOINCMapper:
         for i in tqdm(range(0, len(tests), LAB_MAPPER_BATCH_SIZE), desc="Processing batches"):
             batch = tests[i:i + LAB_MAPPER_BATCH_SIZE]
             
+            # One batched search for the tests that still need a LOINC code
+            pending = [test for test in batch if not test.loinc_code]
+            similar_by_test = dict(zip(map(id, pending), self.search_similar_loinc_codes_batch(pending))) if pending else {}
+            
             for test in batch:
                 try:
                     # Skip if already has LOINC code
@@ -480,7 +489,7 @@ class LabTestLOINCMapper:
                     logger.info(f"🔍 Processing: {test.test_name}")
                     
                     # Search for similar LOINC codes
-                    similar_codes = self.search_similar_loinc_codes(test)
+                    similar_codes = similar_by_test.get(id(test), [])
                     
                     if not similar_codes:
                         logger.warning(f"⚠️  No similar LOINC codes found for {test.test_name}")
@@ -25,6 +25,7 @@ import csv
 import json
 import time
 import uuid
+from itertools import islice
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Tuple, Generator
 import logging
@@ -40,7 +41,8 @@ from tqdm import tqdm
 from config import (
     EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, MAX_RETRIES, LOINC_CSV_FILE, COLLECTION_NAME, 
     LOINC_COLLECTION_TABLE, LOINC_EMBEDDING_TABLE, DATABASE_URL, LOINC_CSV_PATH,
-    LOINC_EMBEDDER_BATCH_SIZE, EMBEDDING_BATCH_SIZE, LOINC_EMBEDDER_RATE_LIMIT_DELAY
+    LOINC_EMBEDDER_BATCH_SIZE, EMBEDDING_BATCH_SIZE, ANN_INDEX_DIR, ANN_EF_SEARCH, ANN_NPROBE,
+    QUERY_EMBEDDING_CACHE_SIZE
 )
 
 # LangChain imports
@@ -49,6 +51,9 @@ from langchain_community.vectorstores.pgvector import PGVector
 from langchain.docstore.document import Document
 from sqlalchemy import create_engine, text
 
+# Shared 3PData/ modules (the app image ships ann_index but not bulk_vector_loader, which is imported lazily)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -138,6 +143,18 @@ class CustomLOINCPGVector(PGVector):
         
         # Cache collection ID to avoid repeated queries
         self._collection_id = None
+        
+        # Query embedding LRU and optional in-process ANN index (../ann_index.py)
+        from ann_index import shared_query_cache, open_vector_index
+        self._query_cache = shared_query_cache(EMBEDDING_MODEL, embedding_function, QUERY_EMBEDDING_CACHE_SIZE)
+        self._ann_index = None
+        if ANN_INDEX_DIR:
+            try:
+                self._ann_index = open_vector_index(
+                    ANN_INDEX_DIR, expected_model=EMBEDDING_MODEL, ef_search=ANN_EF_SEARCH, nprobe=ANN_NPROBE
+                )
+            except Exception as e:
+                logger.warning(f"⚠️  LOINC ANN index unavailable, searching pgvector instead: {e}")
     
     def _create_tables_if_not_exists(self) -> None:
         """Create custom tables with LOINC-specific names (called once during initialization)"""
@@ -227,24 +244,14 @@ class CustomLOINCPGVector(PGVector):
         texts = [doc.page_content for doc in documents]
         embeddings = self.embeddings.embed_documents(texts)
         
-        # Insert into custom table
-        document_ids = []
+        # Insert into custom table with a single binary COPY
+        from bulk_vector_loader import copy_embeddings
         with self._make_session() as session:
-            for doc, embedding in zip(documents, embeddings):
-                doc_id = str(uuid.uuid4())
-                session.execute(text(f"""
-                    INSERT INTO {self.embedding_table_name} 
-                    (uuid, collection_id, embedding, document, cmetadata)
-                    VALUES (:uuid, :collection_id, :embedding, :document, :metadata)
-                """), {
-                    "uuid": doc_id,
-                    "collection_id": collection_id,
-                    "embedding": embedding,
-                    "document": doc.page_content,
-                    "metadata": json.dumps(doc.metadata)
-                })
-                document_ids.append(doc_id)
-            
+            cursor = session.connection().connection.cursor()
+            document_ids = copy_embeddings(
+                cursor, self.embedding_table_name, collection_id,
+                texts, [doc.metadata for doc in documents], embeddings
+            )
             session.commit()
         
         logger.info(f"✅ Added {len(documents)} documents to {self.embedding_table_name}")
@@ -252,22 +259,35 @@ class CustomLOINCPGVector(PGVector):
     
     def similarity_search_with_score(self, query: str, k: int = 10, **kwargs) -> List[Tuple[Document, float]]:
         """Search using custom embedding table"""
+        return self.batch_similarity_search_with_score([query], k=k)[0]
+    
+    def batch_similarity_search_with_score(self, queries: List[str], k: int = 10) -> List[List[Tuple[Document, float]]]:
+        """Search several queries at once; scores are cosine distances (lower is closer)"""
+        query_embeddings = self._query_cache.get_many(queries)
+        
+        if self._ann_index is not None:
+            return [
+                [(Document(page_content=document, metadata=metadata), distance) for document, metadata, distance in hits]
+                for hits in self._ann_index.search(query_embeddings, k)
+            ]
+        return [self._pgvector_search(embedding, k) for embedding in query_embeddings]
+    
+    def _pgvector_search(self, query_embedding, k: int) -> List[Tuple[Document, float]]:
         # Use cached collection ID for better performance
         collection_id = self._get_collection_id()
-        query_embedding = self.embeddings.embed_query(query)
         
         with self._make_session() as session:
-            # Convert embedding list to PostgreSQL vector format
-            embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
-            
+            # HNSW returns at most ef_search rows, so widen it for large k
+            session.execute(text(f"SET LOCAL hnsw.ef_search = {min(max(k, ANN_EF_SEARCH), 1000)}"))
             result = session.execute(text(f"""
-                SELECT document, cmetadata, embedding <=> '{embedding_str}'::vector as distance
+                SELECT document, cmetadata, embedding <=> (:embedding)::vector as distance
                 FROM {self.embedding_table_name}
                 WHERE collection_id = :collection_id
                 AND (cmetadata->>'status' IS NULL OR cmetadata->>'status' != 'DISCOURAGED')
-                ORDER BY embedding <=> '{embedding_str}'::vector
+                ORDER BY embedding <=> (:embedding)::vector
                 LIMIT :k
             """), {
+                "embedding": '[' + ','.join(map(str, query_embedding.tolist())) + ']',
                 "collection_id": collection_id,
                 "k": k
             }).fetchall()
@@ -422,52 +442,52 @@ class LOINCEmbeddingPipeline:
             logger.error(f"❌ Database setup failed: {e}")
             return False
     
-    def process_loinc_codes(self, max_codes: Optional[int] = None):
-        """Process LOINC codes and generate embeddings"""
+    def process_loinc_codes(self, max_codes: Optional[int] = None, workers: int = 1,
+                            index_method: str = "hnsw"):
+        """Rebuild the LOINC embedding table with the resumable bulk loader.
+
+        Records are embedded in LOINC_EMBEDDER_BATCH_SIZE chunks (one model per
+        worker process when workers > 1), COPY'd into a staging table and swapped
+        in once the vector index is built. Rerunning after a crash resumes from
+        the last committed chunk.
+        """
+        from bulk_vector_loader import BulkVectorLoader, source_fingerprint
         logger.info("🚀 Starting LOINC code processing...")
         
         self.start_time = time.time()
-        processed_batches = 0
         
-        try:
-            # Initialize CSV processor lazily to avoid errors when CSV is unavailable
-            if self.processor is None:
-                self.processor = LOINCCSVProcessor(LOINC_CSV_PATH)
-            for batch_records in self.processor.process_csv(batch_size=LOINC_EMBEDDER_BATCH_SIZE):
-                if max_codes and self.processed_count >= max_codes:
-                    logger.info(f"Reached maximum codes limit: {max_codes}")
-                    break
-                
-                # Convert to LangChain documents
-                documents = [record.to_langchain_document() for record in batch_records]
-                
-                # Add to vector store with rate limiting
-                try:
-                    start_batch_time = time.time()
-                    self.vector_store.add_documents(documents)
-                    batch_time = time.time() - start_batch_time
-                    
-                    # Update progress
-                    self.processed_count += len(documents)
-                    processed_batches += 1
-                    
-                    # No cost for local HuggingFace embeddings
-                    batch_cost = 0.0
-                    self.total_cost += batch_cost
-                    
-                    logger.info(f"✅ Batch {processed_batches}: {len(documents)} codes in {batch_time:.1f}s "
-                              f"(Total: {self.processed_count:,})")
-                    
-                    # Minimal rate limiting for local processing
-                    if LOINC_EMBEDDER_RATE_LIMIT_DELAY > 0:
-                        time.sleep(LOINC_EMBEDDER_RATE_LIMIT_DELAY)
-                
-                except Exception as e:
-                    logger.error(f"❌ Error processing batch {processed_batches}: {e}")
-                    continue
+        # Initialize CSV processor lazily to avoid errors when CSV is unavailable
+        if self.processor is None:
+            self.processor = LOINCCSVProcessor(LOINC_CSV_PATH)
         
+        records = (
+            (record.get_embedding_text(), record.get_metadata())
+            for batch in self.processor.process_csv(batch_size=LOINC_EMBEDDER_BATCH_SIZE)
+            for record in batch
+        )
+        if max_codes:
+            records = islice(records, max_codes)
+        
+        loader = BulkVectorLoader(
+            database_url=DATABASE_URL,
+            embedding_table=LOINC_EMBEDDING_TABLE,
+            collection_table=LOINC_COLLECTION_TABLE,
+            collection_name=COLLECTION_NAME,
+            model_name=EMBEDDING_MODEL,
+            dimensions=EMBEDDING_DIMENSIONS,
+            device="cpu",
+            encode_batch_size=EMBEDDING_BATCH_SIZE,
+            chunk_size=LOINC_EMBEDDER_BATCH_SIZE,
+            workers=workers,
+            index_method=index_method,
+            embeddings=self.embeddings,
+        )
+        try:
+            self.processed_count = loader.load(
+                records, run_key=source_fingerprint(LOINC_CSV_PATH, EMBEDDING_MODEL, max_codes)
+            )
         except Exception as e:
-            logger.error(f"❌ Error in LOINC processing: {e}")
+            logger.error(f"❌ Error in LOINC processing (rerun to resume): {e}")
             raise
         
         # Final summary
@@ -495,6 +515,12 @@ class LOINCEmbeddingPipeline:
         
         return results
     
+    def search_loinc_codes_batch(self, queries: List[str], k: int = 10) -> List[List[Tuple[Document, float]]]:
+        """Search several queries in one pass (one model call for uncached queries)"""
+        results = self.vector_store.batch_similarity_search_with_score(queries, k=k)
+        logger.info(f"🔍 Searched {len(queries)} LOINC queries (k={k})")
+        return results
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get database statistics"""
         try:
@@ -527,6 +553,9 @@ def main():
     parser.add_argument("--setup-db", action="store_true", help="Setup database")
     parser.add_argument("--process-loinc", action="store_true", help="Process LOINC codes")
     parser.add_argument("--max-codes", type=int, help="Maximum codes to process")
+    parser.add_argument("--workers", type=int, default=1, help="Embedding worker processes (one model each)")
+    parser.add_argument("--index-method", choices=["hnsw", "ivfflat"], default="hnsw",
+                        help="Vector index built after the load")
     parser.add_argument("--search", type=str, help="Search LOINC codes")
     parser.add_argument("--stats", action="store_true", help="Show database statistics")
     
@@ -544,7 +573,8 @@ def main():
             pipeline.setup_database()
         
         if args.process_loinc:
-            pipeline.process_loinc_codes(max_codes=args.max_codes)
+            pipeline.process_loinc_codes(max_codes=args.max_codes, workers=args.workers,
+                                        index_method=args.index_method)
         
         if args.search:
             pipeline.search_loinc_codes(args.search)
@@ -117,11 +117,15 @@ class LOINCSearchTool:
         """
         print(f"\n🔍 Performing batch search for {len(queries)} queries...")
         
+        try:
+            batch_results = self.pipeline.search_loinc_codes_batch(queries, k=k)
+        except Exception as e:
+            print(f"❌ Search error: {e}")
+            return {}
+        
         results = {}
-        for i, query in enumerate(queries, 1):
-            print(f"  📊 Processing query {i}/{len(queries)}: '{query}'")
-            query_results = self.search(query, k=k, verbose=False)
-            results[query] = [metadata for metadata, score in query_results]
+        for query, query_results in zip(queries, batch_results):
+            results[query] = [doc.metadata for doc, score in query_results]
         
         return results
     
@@ -25,7 +25,7 @@ import sys
 import csv
 import json
 import time
-import uuid
+from itertools import islice
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Tuple, Generator
 import logging
@@ -43,6 +43,11 @@ from langchain_community.vectorstores.pgvector import PGVector
 from langchain.docstore.document import Document
 from sqlalchemy import create_engine, text
 
+# Shared 3PData/ modules (bulk_vector_loader.py, ann_index.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from bulk_vector_loader import BulkVectorLoader, copy_embeddings, source_fingerprint
+from ann_index import open_vector_index, shared_query_cache
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -64,7 +69,11 @@ from config import (
     RXNORM_EMBEDDING_TABLE,
     BATCH_SIZE,
     EMBEDDING_BATCH_SIZE,
-    RATE_LIMIT_DELAY,
+    EMBEDDING_DIMENSIONS,
+    ANN_INDEX_DIR,
+    ANN_EF_SEARCH,
+    ANN_NPROBE,
+    QUERY_EMBEDDING_CACHE_SIZE,
     # ...any other needed config values...
 )
 
@@ -130,6 +139,17 @@ class CustomRxNormPGVector(PGVector):
         
         # Cache collection ID to avoid repeated queries
         self._collection_id = None
+        
+        # Query embedding LRU and optional in-process ANN index
+        self._query_cache = shared_query_cache(EMBEDDING_MODEL, embedding_function, QUERY_EMBEDDING_CACHE_SIZE)
+        self._ann_index = None
+        if ANN_INDEX_DIR:
+            try:
+                self._ann_index = open_vector_index(
+                    ANN_INDEX_DIR, expected_model=EMBEDDING_MODEL, ef_search=ANN_EF_SEARCH, nprobe=ANN_NPROBE
+                )
+            except Exception as e:
+                logger.warning(f"⚠️  RxNorm ANN index unavailable, searching pgvector instead: {e}")
     
     def _create_tables_if_not_exists(self) -> None:
         """Create custom tables with RxNorm-specific names (called once during initialization)"""
@@ -216,25 +236,13 @@ class CustomRxNormPGVector(PGVector):
         texts = [doc.page_content for doc in documents]
         embeddings = self.embedding_function.embed_documents(texts)
         
-        # Prepare data for insertion
-        ids = []
+        # Insert with a single binary COPY
         with self._make_session() as session:
-            for i, (doc, embedding) in enumerate(zip(documents, embeddings)):
-                doc_id = str(uuid.uuid4())
-                ids.append(doc_id)
-                
-                session.execute(text(f"""
-                    INSERT INTO {self.embedding_table_name} 
-                    (uuid, collection_id, embedding, document, cmetadata)
-                    VALUES (:uuid, :collection_id, :embedding, :document, :metadata)
-                """), {
-                    "uuid": doc_id,
-                    "collection_id": collection_id,
-                    "embedding": embedding,
-                    "document": doc.page_content,
-                    "metadata": json.dumps(doc.metadata)
-                })
-            
+            cursor = session.connection().connection.cursor()
+            ids = copy_embeddings(
+                cursor, self.embedding_table_name, collection_id,
+                texts, [doc.metadata for doc in documents], embeddings
+            )
             session.commit()
         
         logger.info(f"✅ Added {len(documents)} documents to RxNorm collection")
@@ -242,13 +250,26 @@ class CustomRxNormPGVector(PGVector):
     
     def similarity_search_with_score(self, query: str, k: int = 10, **kwargs) -> List[Tuple[Document, float]]:
         """Search for similar documents with custom table names"""
-        collection_id = self._get_collection_id()
+        return self.batch_similarity_search_with_score([query], k=k)[0]
+    
+    def batch_similarity_search_with_score(self, queries: List[str], k: int = 10) -> List[List[Tuple[Document, float]]]:
+        """Search several queries at once; scores are cosine similarities (higher is closer)"""
+        query_embeddings = self._query_cache.get_many(queries)
         
-        # Get query embedding
-        query_embedding = self.embedding_function.embed_query(query)
+        if self._ann_index is not None:
+            return [
+                [(Document(page_content=document, metadata=metadata), 1 - distance) for document, metadata, distance in hits]
+                for hits in self._ann_index.search(query_embeddings, k)
+            ]
+        return [self._pgvector_search(embedding, k) for embedding in query_embeddings]
+    
+    def _pgvector_search(self, query_embedding, k: int) -> List[Tuple[Document, float]]:
+        collection_id = self._get_collection_id()
         
         # Search in custom table
         with self._make_session() as session:
+            # HNSW returns at most ef_search rows, so widen it for large k
+            session.execute(text(f"SET LOCAL hnsw.ef_search = {min(max(k, ANN_EF_SEARCH), 1000)}"))
             result = session.execute(text(f"""
                     SELECT document, cmetadata,
                         1 - (embedding <=> (:embedding)::vector) as similarity
@@ -257,7 +278,7 @@ class CustomRxNormPGVector(PGVector):
                     ORDER BY embedding <=> (:embedding)::vector
                     LIMIT :k
                 """), {
-                "embedding": query_embedding,
+                "embedding": query_embedding.tolist(),
                 "collection_id": collection_id,
                 "k": k
             })
@@ -362,40 +383,46 @@ class RxNormEmbeddingPipeline:
         # Tables are created automatically during CustomRxNormPGVector initialization
         logger.info("✅ Database setup completed")
     
-    def process_rxnorm_codes(self, max_codes: Optional[int] = None):
-        """Process RxNorm codes and create embeddings"""
+    def process_rxnorm_codes(self, max_codes: Optional[int] = None, workers: int = 1,
+                             index_method: str = "hnsw"):
+        """Rebuild the RxNorm embedding table with the resumable bulk loader"""
         logger.info("Starting RxNorm embedding pipeline...")
         
-        total_processed = 0
         start_time = time.time()
         
-        try:
-            for batch in self.csv_processor.process_csv():
-                # Convert to LangChain documents
-                documents = [record.to_langchain_document() for record in batch]
-                
-                # Add to vector store
-                self.vector_store.add_documents(documents)
-                
-                total_processed += len(batch)
-                
-                # Check if we've reached the limit
-                if max_codes and total_processed >= max_codes:
-                    logger.info(f"Reached maximum codes limit: {max_codes}")
-                    break
-                
-                # Progress update
-                elapsed_time = time.time() - start_time
-                rate = total_processed / elapsed_time if elapsed_time > 0 else 0
-                logger.info(f"Processed {total_processed} RxNorm codes ({rate:.2f} codes/sec)")
-                
-                # Rate limiting
-                time.sleep(RATE_LIMIT_DELAY)
+        records = (
+            (record.get_embedding_text(), record.get_metadata())
+            for batch in self.csv_processor.process_csv()
+            for record in batch
+        )
+        if max_codes:
+            records = islice(records, max_codes)
+        
+        loader = BulkVectorLoader(
+            database_url=DATABASE_URL,
+            embedding_table=RXNORM_EMBEDDING_TABLE,
+            collection_table=RXNORM_COLLECTION_TABLE,
+            collection_name=COLLECTION_NAME,
+            collection_metadata={"description": "RxNorm terminology embeddings"},
+            model_name=EMBEDDING_MODEL,
+            dimensions=EMBEDDING_DIMENSIONS,
+            device="cpu",
+            encode_batch_size=EMBEDDING_BATCH_SIZE,
+            chunk_size=BATCH_SIZE,
+            workers=workers,
+            index_method=index_method,
+            embeddings=self.embeddings,
+        )
         
+        try:
+            total_processed = loader.load(
+                records, run_key=source_fingerprint(RXNORM_CSV_FILE, EMBEDDING_MODEL, max_codes)
+            )
         except KeyboardInterrupt:
-            logger.info("Processing interrupted by user")
+            logger.info("Processing interrupted by user (rerun to resume)")
+            return
         except Exception as e:
-            logger.error(f"Error during processing: {e}")
+            logger.error(f"Error during processing (rerun to resume): {e}")
             raise
         
         elapsed_time = time.time() - start_time
@@ -411,6 +438,11 @@ class RxNormEmbeddingPipeline:
         
         return results
     
+    def search_rxnorm_codes_batch(self, queries: List[str], k: int = 10) -> List[List[Tuple[Document, float]]]:
+        """Search several queries in one pass (one model call for uncached queries)"""
+        logger.info(f"Searching {len(queries)} queries")
+        return self.vector_store.batch_similarity_search_with_score(queries, k=k)
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get processing statistics"""
         with self.vector_store._make_session() as session:
@@ -436,6 +468,9 @@ def main():
     parser.add_argument("--process-rxnorm", action="store_true", help="Process RxNorm codes")
     parser.add_argument("--search", type=str, help="Search for RxNorm codes")
     parser.add_argument("--max-codes", type=int, help="Maximum number of codes to process")
+    parser.add_argument("--workers", type=int, default=1, help="Embedding worker processes (one model each)")
+    parser.add_argument("--index-method", choices=["hnsw", "ivfflat"], default="hnsw",
+                        help="Vector index built after the load")
     parser.add_argument("--stats", action="store_true", help="Show statistics")
     
     args = parser.parse_args()
@@ -446,7 +481,8 @@ def main():
         pipeline.setup_database()
     
     elif args.process_rxnorm:
-        pipeline.process_rxnorm_codes(max_codes=args.max_codes)
+        pipeline.process_rxnorm_codes(max_codes=args.max_codes, workers=args.workers,
+                                      index_method=args.index_method)
     
     elif args.search:
         pipeline.search_rxnorm_codes(args.search)
@@ -27,6 +27,11 @@ else:
 # Embedding Model Configuration
 EMBEDDING_MODEL = "pritamdeka/BioBERT-mnli-snli-scinli-scitail-mednli-stsb"
 EMBEDDING_DIMENSIONS = 768
+# Local copy of EMBEDDING_MODEL loaded by parallel_embedder.py workers
+EMBEDDING_MODEL_PATH = os.getenv(
+    'SNOMED_EMBEDDING_MODEL_PATH',
+    "/Users/rajanishsd/Documents/zivohealth-1/backend/model/BioBERT-mnli-snli-scinli-scitail-mednli-stsb"
+)
 
 # Custom Table Names
 SNOMED_COLLECTION_TABLE = "snomed_pg_collection"
@@ -53,6 +58,8 @@ BATCH_SIZE = 10000  # Number of SNOMED codes to process at once
 EMBEDDING_BATCH_SIZE = 1024  # Batch size for embeddings
 RATE_LIMIT_DELAY = 0.1  # Delay between batches (seconds)
 MAX_DB_CONNECTIONS = 8  # Limit concurrent DB writes to avoid overloading PostgreSQL
+EMBEDDING_WORKERS = int(os.getenv("SNOMED_EMBEDDING_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))  # Processes, one model each
+VECTOR_INDEX_METHOD = os.getenv("SNOMED_VECTOR_INDEX_METHOD", "hnsw")  # hnsw or ivfflat, built after the load
 
 # Progress Tracking
 PROGRESS_UPDATE_INTERVAL = 1000  # Update progress every N records
@@ -62,6 +69,10 @@ CHECKPOINT_INTERVAL = 5000  # Save progress every N records
 DEFAULT_SEARCH_RESULTS = 10
 MIN_SIMILARITY_SCORE = 0.0
 MAX_SIMILARITY_SCORE = 1.0
+ANN_INDEX_DIR = os.getenv('SNOMED_ANN_INDEX_DIR')  # In-process index exported by ../ann_index.py (unset: query pgvector)
+ANN_EF_SEARCH = int(os.getenv('ANN_EF_SEARCH', '128'))  # HNSW search breadth (raised to k when k is larger)
+ANN_NPROBE = int(os.getenv('ANN_NPROBE', '16'))  # IVF lists probed per query
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '4096'))  # Query embeddings kept in the LRU (0 disables)
 
 # Logging Configuration
 LOG_LEVEL = "INFO"
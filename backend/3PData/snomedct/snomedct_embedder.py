@@ -23,7 +23,6 @@ import os
 import sys
 import time
 import json
-import uuid
 import logging
 from pathlib import Path
 from typing import Dict, List, Any, Tuple, Optional
@@ -44,6 +43,11 @@ from langchain_community.vectorstores.pgvector import PGVector
 from langchain.docstore.document import Document
 from sqlalchemy import create_engine, text
 
+# Shared 3PData/ modules (bulk_vector_loader.py, ann_index.py)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from bulk_vector_loader import copy_embeddings
+from ann_index import open_vector_index, shared_query_cache
+
 # Import config
 from config import (
     DATABASE_URL,
@@ -61,6 +65,10 @@ from config import (
     SPARK_NUM_EXECUTORS,
     SPARK_EXECUTOR_MEMORY,
     SPARK_DRIVER_MEMORY,
+    ANN_INDEX_DIR,
+    ANN_EF_SEARCH,
+    ANN_NPROBE,
+    QUERY_EMBEDDING_CACHE_SIZE,
     LOG_FILE
 )
 
@@ -111,6 +119,16 @@ class CustomSNOMEDPGVector(PGVector):
         self.embedding_table_name = SNOMED_EMBEDDING_TABLE
         self._create_tables_if_not_exists()
         self._collection_id = None
+        # Query embedding LRU and optional in-process ANN index
+        self._query_cache = shared_query_cache(EMBEDDING_MODEL, embedding_function, QUERY_EMBEDDING_CACHE_SIZE)
+        self._ann_index = None
+        if ANN_INDEX_DIR:
+            try:
+                self._ann_index = open_vector_index(
+                    ANN_INDEX_DIR, expected_model=EMBEDDING_MODEL, ef_search=ANN_EF_SEARCH, nprobe=ANN_NPROBE
+                )
+            except Exception as e:
+                logger.warning(f"⚠️  SNOMED CT ANN index unavailable, searching pgvector instead: {e}")
     def _create_tables_if_not_exists(self) -> None:
         with self._make_session() as session:
             session.execute(text(f"""
@@ -171,29 +189,31 @@ class CustomSNOMEDPGVector(PGVector):
         collection_id = self._get_collection_id()
         texts = [doc.page_content for doc in documents]
         embeddings = self.embedding_function.embed_documents(texts)
-        ids = []
         with self._make_session() as session:
-            for i, (doc, embedding) in enumerate(zip(documents, embeddings)):
-                doc_id = str(uuid.uuid4())
-                ids.append(doc_id)
-                session.execute(text(f"""
-                    INSERT INTO {self.embedding_table_name} 
-                    (uuid, collection_id, embedding, document, cmetadata)
-                    VALUES (:uuid, :collection_id, :embedding, :document, :metadata)
-                """), {
-                    "uuid": doc_id,
-                    "collection_id": collection_id,
-                    "embedding": embedding,
-                    "document": doc.page_content,
-                    "metadata": json.dumps(doc.metadata)
-                })
+            cursor = session.connection().connection.cursor()
+            ids = copy_embeddings(
+                cursor, self.embedding_table_name, collection_id,
+                texts, [doc.metadata for doc in documents], embeddings
+            )
             session.commit()
         logger.info(f"✅ Added {len(documents)} documents to SNOMED CT collection")
         return ids
     def similarity_search_with_score(self, query: str, k: int = 10, **kwargs) -> List[Tuple[Document, float]]:
+        return self.batch_similarity_search_with_score([query], k=k)[0]
+    def batch_similarity_search_with_score(self, queries: List[str], k: int = 10) -> List[List[Tuple[Document, float]]]:
+        """Search several queries at once; scores are cosine similarities (higher is closer)"""
+        query_embeddings = self._query_cache.get_many(queries)
+        if self._ann_index is not None:
+            return [
+                [(Document(page_content=document, metadata=metadata), 1 - distance) for document, metadata, distance in hits]
+                for hits in self._ann_index.search(query_embeddings, k)
+            ]
+        return [self._pgvector_search(embedding, k) for embedding in query_embeddings]
+    def _pgvector_search(self, query_embedding, k: int) -> List[Tuple[Document, float]]:
         collection_id = self._get_collection_id()
-        query_embedding = self.embedding_function.embed_query(query)
         with self._make_session() as session:
+            # HNSW returns at most ef_search rows, so widen it for large k
+            session.execute(text(f"SET LOCAL hnsw.ef_search = {min(max(k, ANN_EF_SEARCH), 1000)}"))
             result = session.execute(text(f"""
                 SELECT document, cmetadata, 1 - (embedding <=> (:embedding)::vector) as similarity
                 FROM {self.embedding_table_name}
@@ -201,7 +221,7 @@ class CustomSNOMEDPGVector(PGVector):
                 ORDER BY embedding <=> (:embedding)::vector
                 LIMIT :k
             """), {
-                "embedding": query_embedding,
+                "embedding": query_embedding.tolist(),
                 "collection_id": collection_id,
                 "k": k
             })
@@ -299,6 +319,9 @@ class SNOMEDCTEmbeddingPipeline:
         for i, (doc, score) in enumerate(results):
             logger.info(f"{i+1}. Score: {score:.4f} - {doc.page_content[:100]}...")
         return results
+    def search_snomedct_batch(self, queries: List[str], k: int = 10) -> List[List[Tuple[Document, float]]]:
+        logger.info(f"Searching {len(queries)} queries")
+        return self.vector_store.batch_similarity_search_with_score(queries, k=k)
     def get_stats(self) -> Dict[str, Any]:
         with self.vector_store._make_session() as session:
             result = session.execute(text(f"""
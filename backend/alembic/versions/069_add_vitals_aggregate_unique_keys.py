@@ -0,0 +1,46 @@
+"""069 add unique rollup keys to vitals aggregate tables
+
+Revision ID: 069
+Revises: 068
+Create Date: 2025-10-24
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '069'
+down_revision = '068'
+branch_labels = None
+depends_on = None
+
+
+# (table, index name, key columns) used by the set-based rollup upserts
+ROLLUP_KEYS = [
+    ('vitals_hourly_aggregates', 'ux_vitals_hourly_rollup_key', ['user_id', 'metric_type', 'hour_start']),
+    ('vitals_daily_aggregates', 'ux_vitals_daily_rollup_key', ['user_id', 'metric_type', 'date']),
+    ('vitals_weekly_aggregates', 'ux_vitals_weekly_rollup_key', ['user_id', 'metric_type', 'week_start_date']),
+    ('vitals_monthly_aggregates', 'ux_vitals_monthly_rollup_key', ['user_id', 'metric_type', 'year', 'month']),
+]
+
+
+def upgrade() -> None:
+    for table, index_name, columns in ROLLUP_KEYS:
+        # 1) Remove duplicate buckets keeping the most recently written row
+        join_condition = " AND ".join(f"a.{col} = b.{col}" for col in columns)
+        op.execute(
+            f"""
+            DELETE FROM {table} a
+            USING {table} b
+            WHERE {join_condition}
+              AND a.id < b.id;
+            """
+        )
+
+        # 2) Unique key targeted by INSERT ... ON CONFLICT in VitalsRollupCRUD
+        op.create_index(index_name, table, columns, unique=True)
+
+
+def downgrade() -> None:
+    for table, index_name, _columns in reversed(ROLLUP_KEYS):
+        op.drop_index(index_name, table_name=table)
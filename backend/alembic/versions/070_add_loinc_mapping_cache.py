@@ -0,0 +1,47 @@
+"""070 add loinc_mapping_cache table
+
+Revision ID: 070
+Revises: 069
+Create Date: 2025-10-24
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '070'
+down_revision = '069'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'loinc_mapping_cache',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('cache_key', sa.String(length=64), nullable=False),
+        sa.Column('test_name_normalized', sa.String(length=255), nullable=False),
+        sa.Column('test_category_normalized', sa.String(length=100), nullable=False, server_default=''),
+        sa.Column('unit_normalized', sa.String(length=100), nullable=False, server_default=''),
+        sa.Column('loinc_code', sa.String(length=20), nullable=True),
+        sa.Column('loinc_source', sa.String(length=20), nullable=True),
+        sa.Column('confidence', sa.Float(), nullable=True),
+        sa.Column('is_negative', sa.Boolean(), nullable=False, server_default=sa.text('false')),
+        sa.Column('mapper_version', sa.String(length=64), nullable=False),
+        sa.Column('hit_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.UniqueConstraint('cache_key', name='uq_loinc_mapping_cache_key'),
+    )
+    op.create_index('ix_loinc_mapping_cache_id', 'loinc_mapping_cache', ['id'], unique=False)
+    op.create_index('idx_loinc_cache_name_category', 'loinc_mapping_cache', ['test_name_normalized', 'test_category_normalized'], unique=False)
+    op.create_index('idx_loinc_cache_loinc_code', 'loinc_mapping_cache', ['loinc_code'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_loinc_cache_loinc_code', table_name='loinc_mapping_cache')
+    op.drop_index('idx_loinc_cache_name_category', table_name='loinc_mapping_cache')
+    op.drop_index('ix_loinc_mapping_cache_id', table_name='loinc_mapping_cache')
+    op.drop_table('loinc_mapping_cache')
@@ -0,0 +1,55 @@
+"""071 add agent_checkpoints and agent_checkpoint_writes tables
+
+Revision ID: 071
+Revises: 070
+Create Date: 2025-10-25
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '071'
+down_revision = '070'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'agent_checkpoints',
+        sa.Column('thread_id', sa.String(length=255), nullable=False),
+        sa.Column('checkpoint_ns', sa.String(length=255), nullable=False, server_default=''),
+        sa.Column('checkpoint_id', sa.String(length=64), nullable=False),
+        sa.Column('parent_checkpoint_id', sa.String(length=64), nullable=True),
+        sa.Column('checkpoint_type', sa.String(length=32), nullable=False),
+        sa.Column('checkpoint', sa.LargeBinary(), nullable=False),
+        sa.Column('metadata_type', sa.String(length=32), nullable=False),
+        sa.Column('metadata', sa.LargeBinary(), nullable=False),
+        sa.Column('size_bytes', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.PrimaryKeyConstraint('thread_id', 'checkpoint_ns', 'checkpoint_id', name='pk_agent_checkpoints'),
+    )
+    op.create_index('idx_agent_checkpoints_expires_at', 'agent_checkpoints', ['expires_at'], unique=False)
+
+    op.create_table(
+        'agent_checkpoint_writes',
+        sa.Column('thread_id', sa.String(length=255), nullable=False),
+        sa.Column('checkpoint_ns', sa.String(length=255), nullable=False, server_default=''),
+        sa.Column('checkpoint_id', sa.String(length=64), nullable=False),
+        sa.Column('task_id', sa.String(length=64), nullable=False),
+        sa.Column('idx', sa.Integer(), nullable=False),
+        sa.Column('channel', sa.String(length=255), nullable=False),
+        sa.Column('value_type', sa.String(length=32), nullable=False),
+        sa.Column('value', sa.LargeBinary(), nullable=False),
+        sa.Column('task_path', sa.String(length=255), nullable=False, server_default=''),
+        sa.PrimaryKeyConstraint('thread_id', 'checkpoint_ns', 'checkpoint_id', 'task_id', 'idx', name='pk_agent_checkpoint_writes'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('agent_checkpoint_writes')
+    op.drop_index('idx_agent_checkpoints_expires_at', table_name='agent_checkpoints')
+    op.drop_table('agent_checkpoints')
@@ -0,0 +1,31 @@
+"""072 add partial index for draining pending vitals per user
+
+Revision ID: 072
+Revises: 071
+Create Date: 2025-10-26
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '072'
+down_revision = '071'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Serves the keyset-paginated claim (user_id, id > cursor) and the per-user sweep
+    op.create_index(
+        'idx_vitals_raw_data_pending_user_id',
+        'vitals_raw_data',
+        ['user_id', 'id'],
+        unique=False,
+        postgresql_where=sa.text("aggregation_status IN ('pending', 'queued', 'failed')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_vitals_raw_data_pending_user_id', table_name='vitals_raw_data')
@@ -0,0 +1,43 @@
+"""073 add content-addressed OCR result store
+
+Revision ID: 073
+Revises: 072
+Create Date: 2025-10-27
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '073'
+down_revision = '072'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ocr_documents',
+        sa.Column('content_sha256', sa.String(length=64), nullable=False),
+        sa.Column('page_count', sa.Integer(), nullable=False),
+        sa.Column('char_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('source', sa.String(length=32), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.Column('last_used_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.PrimaryKeyConstraint('content_sha256', name='pk_ocr_documents'),
+    )
+
+    op.create_table(
+        'ocr_document_pages',
+        sa.Column('content_sha256', sa.String(length=64), nullable=False),
+        sa.Column('page_number', sa.Integer(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(['content_sha256'], ['ocr_documents.content_sha256'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('content_sha256', 'page_number', name='pk_ocr_document_pages'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('ocr_document_pages')
+    op.drop_table('ocr_documents')
@@ -0,0 +1,45 @@
+"""074 add lab_category_summary table
+
+Revision ID: 074
+Revises: 073
+Create Date: 2025-10-28
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '074'
+down_revision = '073'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Populate with: python scripts/rebuild_lab_category_summary.py
+    op.create_table(
+        'lab_category_summary',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('category', sa.String(length=100), nullable=False),
+        sa.Column('total_tests', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('normal_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('abnormal_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('critical_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('latest_green_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('latest_amber_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('latest_red_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_test_date', sa.Date(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'category', name='lab_category_summary_user_category_unique'),
+    )
+    op.create_index(op.f('ix_lab_category_summary_id'), 'lab_category_summary', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_lab_category_summary_id'), table_name='lab_category_summary')
+    op.drop_table('lab_category_summary')
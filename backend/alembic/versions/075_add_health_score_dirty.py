@@ -0,0 +1,33 @@
+"""075 add health_score_dirty table
+
+Revision ID: 075
+Revises: 074
+Create Date: 2025-10-29
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '075'
+down_revision = '074'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'health_score_dirty',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('since_date', sa.Date(), nullable=False),
+        sa.Column('marked_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', name='pk_health_score_dirty'),
+    )
+    op.create_index('idx_health_score_dirty_marked_at', 'health_score_dirty', ['marked_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_health_score_dirty_marked_at', table_name='health_score_dirty')
+    op.drop_table('health_score_dirty')
@@ -0,0 +1,26 @@
+"""076 add rolling history summary to chat_sessions
+
+Revision ID: 076
+Revises: 075
+Create Date: 2025-10-31
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '076'
+down_revision = '075'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('chat_sessions', sa.Column('history_summary', sa.Text(), nullable=True))
+    op.add_column('chat_sessions', sa.Column('history_summary_message_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('chat_sessions', 'history_summary_message_id')
+    op.drop_column('chat_sessions', 'history_summary')
@@ -6,6 +6,7 @@ load_dotenv()
 
 import logging
 logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
 
 # Add the project root and backend to Python path
 project_root = Path(__file__).parent.parent.parent.parent
@@ -14,9 +15,7 @@ sys.path.insert(0, str(project_root))
 sys.path.insert(0, str(backend_path))
 
 from langgraph.graph import StateGraph, END, START
-from langgraph.checkpoint.memory import MemorySaver
 from typing import TypedDict, Dict, Any, List, Optional
-from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage
 from pydantic import BaseModel, Field
 from datetime import datetime
@@ -32,19 +31,25 @@ from app.core.config import settings
 
 # LangSmith tracing imports
 
-from langchain.callbacks.tracers import LangChainTracer
-from langchain.callbacks.manager import CallbackManager
 
 
 from langchain_core.tools import tool
 from langgraph.prebuilt import create_react_agent
 from langchain_core.messages import HumanMessage, SystemMessage
 from app.agentsv2.response_utils import format_agent_response, format_error_response
+from app.agentsv2.workflow_registry import get_agent, get_chat_model, get_compiled_workflow, get_tracer, register_workflow
+from app.agentsv2.postgres_checkpointer import get_checkpointer
+from app.agentsv2.stream_events import ChatStreamCallbackHandler
 from app.utils.timezone import now_local
 
 # Context variables for passing state to tools  
 current_session_id: ContextVar[Optional[int]] = ContextVar('current_session_id', default=None)
 current_user_id: ContextVar[Optional[str]] = ContextVar('current_user_id', default=None)
+# State of the customer workflow run being executed; read by the shared agents' tools
+_current_request_state: ContextVar[Optional[Dict[str, Any]]] = ContextVar('customer_request_state', default=None)
+
+# Graph nodes announced on a streaming request's chat stream
+CUSTOMER_WORKFLOW_NODES = ("assess_user_intent", "execute_user_request", "synthesize_response", "handle_error")
 
 # Global state for managing user responses
 user_response_events: Dict[str, asyncio.Event] = {}
@@ -234,6 +239,97 @@ def get_pending_response_keys() -> List[str]:
         return list(user_response_events.keys())
 
 
+def _request_context():
+    """Return (state, user_id, session_id) for the workflow run the current tool call belongs to"""
+    state = _current_request_state.get()
+    if state is None:
+        raise RuntimeError("Customer workflow tool called outside of a workflow run")
+    return state, state.get("user_id"), state.get("session_id")
+
+
+# Intent assessment tools: request data comes from the state bound by assess_user_intent
+@tool("ask_clarifying_question")
+async def assess_clarifying_question(question: str) -> str:
+    """Ask a clarifying question to the user and get their response.
+
+    Args:
+        question: The clarifying question to ask the user
+
+    Returns:
+        String containing the user's response
+    """
+    state, user_id, session_id = _request_context()
+    return await ask_user_question(question, session_id, user_id)
+
+# Helper to fetch most recent uploaded file for this session
+def _get_recent_session_file() -> Optional[Dict[str, Any]]:
+    state = _current_request_state.get() or {}
+    session_id = state.get("session_id")
+    if not session_id:
+        return None
+    try:
+        with SessionLocal() as db:
+            msgs = crud.chat_message.get_session_messages(db=db, session_id=session_id, skip=0, limit=100)
+        for m in reversed(msgs or []):
+            try:
+                file_path_val = getattr(m, "file_path", None)
+                file_type_val = getattr(m, "file_type", None)
+                if file_path_val and file_type_val:
+                    original_name_val = Path(file_path_val).name if file_path_val else None
+                    return {
+                        "file_path": file_path_val,
+                        "file_type": file_type_val,
+                        "original_name": original_name_val
+                    }
+            except Exception:
+                pass
+    except Exception:
+        return None
+    return None
+
+# Tool to retrieve the most recent uploaded file for the current session and update state
+@tool
+async def get_recent_session_file_tool() -> dict:
+    """Get the most recently uploaded file for the current chat session.
+    Use ONLY when ALL of the following conditions are met:
+    - state.uploaded_file is missing or empty
+    - AND the user explicitly asks to "use the previous file", "last file", "same file",
+      or mentions a network issue and asks to refer to the previous upload/context
+    - Do NOT call this tool in normal flows or to guess context.
+
+    Side effects:
+    - If a file is found, this will set state.uploaded_file to the recovered metadata.
+
+    Returns: {found: bool, uploaded_file?: dict, reason?: str}
+    """
+    state, user_id, session_id = _request_context()
+    try:
+        meta = _get_recent_session_file()
+        if meta:
+            state["uploaded_file"] = meta
+            return {"found": True, "uploaded_file": meta}
+        return {"found": False, "reason": "No prior uploaded file found for this session."}
+    except Exception as e:
+        return {"found": False, "reason": str(e)}
+
+
+def _format_conversation_context(conversation_history: List[Dict[str, Any]]) -> str:
+    """Prompt block for the conversation: the rolling summary in full, then the last 5 turns"""
+    if not conversation_history:
+        return ""
+    summaries = [msg for msg in conversation_history if msg.get('role') == 'system']
+    turns = [msg for msg in conversation_history if msg.get('role') != 'system']
+    context_info = "\n\nCONVERSATION CONTEXT:\n"
+    for msg in summaries:
+        context_info += f"{msg.get('content', '')}\n"
+    for msg in turns[-5:]:
+        role = msg.get('role', 'unknown')
+        content = msg.get('content', '')
+        context_info += f"- {role.upper()}: {content[:200]}{'...' if len(content) > 200 else ''}\n"
+    context_info += "\nUse this context to better understand the current request.\n"
+    return context_info
+
+
 async def assess_user_intent(state: CustomerState) -> CustomerState:
     """
     The objective is to understand the user's intent completeness and classify the intent.
@@ -243,88 +339,11 @@ async def assess_user_intent(state: CustomerState) -> CustomerState:
         original_input = state["user_input"]
         enhanced_input = original_input
         
-        # Create the ask_user_question tool with access to state
-        @tool
-        async def ask_clarifying_question(question: str) -> str:
-            """Ask a clarifying question to the user and get their response.
-            
-            Args:
-                question: The clarifying question to ask the user
-                
-            Returns:
-                String containing the user's response
-            """
-            session_id = state.get("session_id")
-            user_id = state.get("user_id")
-            return await ask_user_question(question, session_id, user_id)
-        
-        # Helper to fetch most recent uploaded file for this session
-        def _get_recent_session_file() -> Optional[Dict[str, Any]]:
-            session_id = state.get("session_id")
-            if not session_id:
-                return None
-            try:
-                with SessionLocal() as db:
-                    msgs = crud.chat_message.get_session_messages(db=db, session_id=session_id, skip=0, limit=100)
-                for m in reversed(msgs or []):
-                    try:
-                        file_path_val = getattr(m, "file_path", None)
-                        file_type_val = getattr(m, "file_type", None)
-                        if file_path_val and file_type_val:
-                            original_name_val = Path(file_path_val).name if file_path_val else None
-                            return {
-                                "file_path": file_path_val,
-                                "file_type": file_type_val,
-                                "original_name": original_name_val
-                            }
-                    except Exception:
-                        pass
-            except Exception:
-                return None
-            return None
-
-        # Tool to retrieve the most recent uploaded file for the current session and update state
-        @tool
-        async def get_recent_session_file_tool() -> dict:
-            """Get the most recently uploaded file for the current chat session.
-            Use ONLY when ALL of the following conditions are met:
-            - state.uploaded_file is missing or empty
-            - AND the user explicitly asks to "use the previous file", "last file", "same file",
-              or mentions a network issue and asks to refer to the previous upload/context
-            - Do NOT call this tool in normal flows or to guess context.
-
-            Side effects:
-            - If a file is found, this will set state.uploaded_file to the recovered metadata.
-
-            Returns: {found: bool, uploaded_file?: dict, reason?: str}
-            """
-            try:
-                meta = _get_recent_session_file()
-                if meta:
-                    state["uploaded_file"] = meta
-                    return {"found": True, "uploaded_file": meta}
-                return {"found": False, "reason": "No prior uploaded file found for this session."}
-            except Exception as e:
-                return {"found": False, "reason": str(e)}
-
         # Note: Do NOT proactively populate from history. Use get_recent_session_file_tool only under explicit user instruction.
 
-        # Create a ReAct agent with the tools
-        
-        llm = ChatOpenAI(model=settings.CUSTOMER_AGENT_MODEL, openai_api_key=settings.OPENAI_API_KEY)
-        
             # Get conversation history for context
         conversation_history = state.get("conversation_history", [])
-        context_info = ""
-        if conversation_history:
-            # Format recent conversation history (last 5 messages for context)
-            recent_history = conversation_history[-5:] if len(conversation_history) > 5 else conversation_history
-            context_info = "\n\nCONVERSATION CONTEXT:\n"
-            for msg in recent_history:
-                role = msg.get('role', 'unknown')
-                content = msg.get('content', '')
-                context_info += f"- {role.upper()}: {content[:200]}{'...' if len(content) > 200 else ''}\n"
-            context_info += "\nUse this context to better understand the current request.\n"
+        context_info = _format_conversation_context(conversation_history)
         
         # Get file information if available
         uploaded_file = state.get("uploaded_file")
@@ -531,11 +550,9 @@ async def assess_user_intent(state: CustomerState) -> CustomerState:
 
         """
                     
-        # Create agent for assessment
-        agent = create_react_agent(
-            model=llm,
-            tools=[ask_clarifying_question, get_recent_session_file_tool]
-        )
+        # Shared assessment agent; its tools read this request's state from the context
+        agent = get_compiled_workflow("customer_assess_agent")
+        _current_request_state.set(state)
         
         # Create messages with system prompt
         messages = [
@@ -650,6 +667,403 @@ def _get_recommended_agent_for_document_type(document_type: str) -> str:
         return "prescription_clinical_agent_tool"  # Default fallback
 
 
+# Helper to compose effective prompt by combining tool's prompt with assessed user input
+def _compose_effective_prompt(local_prompt: str) -> str:
+    state = _current_request_state.get() or {}
+    base = (local_prompt or "").strip()
+    # Strip any OCR-style artifacts like "Image analyzed: ..." to avoid misleading the agent
+    try:
+        base = re.sub(r"(?im)^\s*Image analyzed:.*$", "", base).strip()
+    except Exception:
+        pass
+    assessed = (state.get("user_input") or "").strip()
+    if assessed and base:
+        # Avoid duplication if assessed text is already included
+        if assessed.lower() in base.lower():
+            return base
+        return f"{base}\n\nUser input: {assessed}".strip()
+    return assessed or base
+
+# Executor tools: request data comes from the state bound by execute_user_request
+@tool
+async def ask_clarifying_question(question: str, reasoning: str) -> str:
+    """Ask a clarifying question to the user and get their response.
+
+    Args:
+        question: The clarifying question to ask the user
+        reasoning: Clear explanation of why this clarifying question is needed
+
+    Returns:
+        String containing the user's response
+    """
+    state, user_id, session_id = _request_context()
+    return await ask_user_question(question, session_id, user_id)
+
+@tool
+async def vitals_agent_tool(prompt_with_user_input: str) -> dict:
+    """Handle vitals data operations (heart rate, blood pressure, weight, temperature, oxygen saturation).
+
+    SUPPORTED OPERATIONS:
+    1. UPDATE: "update my vitals data: [user input]" - Add new vital measurements to health records
+    2. RETRIEVE: "retrieve my vitals: [user input]" - Get historical vitals data and current values
+    3. ANALYZE & RECOMMENDATIONS: "analyze my vitals: [user input]" - Analyze trends, patterns, and provide health recommendations
+
+    Use this tool when:
+    - User wants to update vital signs measurements (blood pressure, heart rate, weight, temperature, oxygen saturation)
+    - User wants to retrieve historical vitals data and view past measurements
+    - User wants analysis of vitals trends, patterns, and health recommendations
+    - User uploads images of medical devices (scale, BP monitor, thermometer, pulse oximeter)
+    - User mentions specific vital signs like "blood pressure", "weight", "heart rate", "temperature", "SpO2"
+    - User asks for health insights based on their vital signs
+
+    Examples:
+    - "update my vitals data: I just measured my blood pressure and it was 120/80"
+    - "retrieve my vitals: show me my weight trends from last month"
+    - "analyze my vitals: what does my blood pressure pattern suggest?"
+
+    Args:
+        prompt_with_user_input: Combined prompt that includes the operation type AND the user's actual words/input
+                               Must preserve the user's original words and context
+
+    Returns:
+        Dict containing vitals processing results
+    """
+    state, user_id, session_id = _request_context()
+    # Get all required values from state
+    final_extracted_text = state.get("extracted_text", "")
+    final_source_file_path = state.get("source_file_path", "")
+    final_image_base64 = state.get("image_base64", None)
+
+    # Get image path from uploaded file if available (prefer persisted S3 path; fallback to source_file_path)
+    final_image_path = None
+    if state.get("is_image"):
+        final_image_path = state.get("file_path") or state.get("source_file_path")
+
+    agent = get_agent("vitals")
+    # Combine tool-specified prompt with assessed user input, de-duplicating
+    effective_prompt = _compose_effective_prompt(prompt_with_user_input)
+    return await agent.run(effective_prompt, user_id, session_id, final_extracted_text, final_image_path, final_image_base64, final_source_file_path)
+
+@tool
+async def nutrition_agent_tool(prompt_with_user_input: str) -> dict:
+    """Handle nutrition data operations (food intake, calorie tracking, meal logging, dietary analysis).
+
+    SUPPORTED OPERATIONS:
+    1. UPDATE: "update my nutrition or meals or breakfast or snack data: [user input]" - Log meals, food intake, and nutrition information
+    2. RETRIEVE: "retrieve my nutrition data: [user input]" - Get historical nutrition data, meal logs, and calorie tracking
+    3. ANALYZE & RECOMMENDATIONS: "analyze my nutrition: [user input]" - Analyze dietary patterns, nutritional balance, and provide dietary recommendations. dont split the user request into multiple tool calls for analysis and recommendations
+
+    Use this tool when:
+    - User wants to log meals, food intake, or nutrition information
+    - User wants to track calories, macronutrients, or dietary habits
+    - User wants dietary analysis, nutritional insights, and personalized recommendations
+    - User uploads food images, nutrition labels, or meal photos
+    - User mentions food, meals, calories, nutrition, diet, eating habits, supplements
+    - User asks for dietary advice or nutritional guidance
+
+    Args:
+        prompt_with_user_input: Combined prompt that includes the operation type AND the user's actual words/input
+                               Must preserve the user's original words and context
+
+    Returns:
+        Dict containing nutrition processing results
+    """
+    state, user_id, session_id = _request_context()
+    # Get all required values from state
+    final_extracted_text = state.get("extracted_text", "")
+    final_source_file_path = state.get("source_file_path", "")
+    final_image_base64 = state.get("image_base64", None)
+
+    # Get image path from uploaded file if available (prefer persisted S3 path; fallback to source_file_path)
+    final_image_path = None
+    if state.get("is_image"):
+        final_image_path = state.get("file_path") or state.get("source_file_path")
+
+    agent = get_agent("nutrition")
+    # Combine tool-specified prompt with assessed user input, de-duplicating
+    effective_prompt = _compose_effective_prompt(prompt_with_user_input)
+    return await agent.run(effective_prompt, user_id, session_id, final_extracted_text, final_image_path, final_image_base64, final_source_file_path)
+
+@tool
+async def pharmacy_agent_tool(prompt_with_user_input: str) -> dict:
+    """Handle pharmacy and medication inventory operations.
+
+    SUPPORTED OPERATIONS:
+    1. UPDATE: "update my pharmacy bills along with medication data: [user input]" - Add pharmacy purchases, medications, and billing information
+    2. RETRIEVE: "retrieve my pharmacy bills along with medication data: [user input]" - Get medication history, pharmacy expenses, and inventory
+    3. ANALYZE & RECOMMENDATIONS: "analyze my pharmacy bills data: [user input]" - Analyze spending patterns, medication usage, and provide cost-saving recommendations. dont split the user request into multiple tool calls for analysis and recommendations
+
+    Use this tool when:
+    - User wants to track medication inventory and pharmacy purchases
+    - User wants drug information, interactions, and medication details
+    - User mentions pharmacy purchases, over-the-counter medications, or prescriptions
+    - User wants to track medication costs, pharmacy bills, and healthcare expenses
+    - User uploads pharmacy receipts, medication packaging, or pill bottles
+    - User asks for medication management advice or cost optimization
+
+    Examples:
+    - "update my pharmacy bills along with medication data: I bought Tylenol and vitamins from CVS for $25"
+    - "retrieve my pharmacy bills along with medication data: show me my medication expenses this month"
+    - "analyze my pharmacy bills data: how can I save money on my medications?"
+
+    Args:
+        prompt_with_user_input: Combined prompt that includes the operation type AND the user's actual words/input
+                               Must preserve the user's original words and context
+
+    Returns:
+        Dict containing pharmacy processing results
+    """
+    state, user_id, session_id = _request_context()
+    # Get all required values from state
+    final_extracted_text = state.get("extracted_text", "")
+    final_source_file_path = state.get("source_file_path", "")
+    final_image_base64 = state.get("image_base64", None)
+
+    # Get image path from uploaded file if available (prefer temp_path if present)
+    final_image_path = state.get("file_path", None) if state.get("is_image") else None
+
+    agent = get_agent("pharmacy")
+    # Combine tool-specified prompt with assessed user input, de-duplicating
+    effective_prompt = _compose_effective_prompt(prompt_with_user_input)
+    return await agent.run(effective_prompt, user_id, session_id, final_extracted_text, final_image_path, final_image_base64, final_source_file_path)
+
+@tool
+async def lab_agent_tool(prompt_with_user_input: str) -> dict:
+    """Handle biomarkers and lab results operations (blood tests, LFT, kidney function, cholesterol).
+
+    SUPPORTED OPERATIONS:
+    1. UPDATE: "update my lab or biomarker data: [user input]" - Add new lab results, blood test values, and biomarker measurements
+    2. RETRIEVE: "retrieve my lab or biomarker data: [user input]" - Get historical lab results, test values, and biomarker trends
+    3. ANALYZE & RECOMMENDATIONS: "analyze my lab or biomarker data: [user input]" - Analyze lab trends, identify patterns, and provide health recommendations.dont split the user request into multiple tool calls for analysis and recommendations
+
+    Use this tool when:
+    - User uploads lab reports, blood test results, or medical test documents
+    - User wants to track biomarkers, lab values, and test results over time
+    - User wants analysis of lab trends, patterns, and health insights
+    - User mentions specific lab tests (cholesterol, glucose, liver function, kidney function, CBC, metabolic panel)
+    - User wants to understand lab report findings and their health implications
+    - User asks for interpretation of blood work or biomarker results
+
+    Examples:
+    - "update my lab or biomarker data: My recent blood test showed cholesterol at 200 mg/dL"
+    - "retrieve my lab or biomarker data: show me my glucose levels from the past 6 months"
+    - "analyze my lab or biomarker data: what do my liver function tests indicate?"
+
+    Args:
+        prompt_with_user_input: Combined prompt that includes the operation type AND the user's actual words/input
+                               Must preserve the user's original words and context
+
+    Returns:
+        Dict containing lab processing results
+    """
+    state, user_id, session_id = _request_context()
+    # Get all required values from state
+    final_extracted_text = state.get("extracted_text", "")
+    final_source_file_path = state.get("source_file_path", "")
+    final_image_base64 = state.get("image_base64", None)
+
+    # Get image path from uploaded file if available (prefer temp_path if present)
+    final_image_path = state.get("file_path", None) if state.get("is_image") else None
+
+    agent = get_agent("lab")
+    # Combine tool-specified prompt with assessed user input, de-duplicating
+    effective_prompt = _compose_effective_prompt(prompt_with_user_input)
+    result = await agent.run(effective_prompt, user_id, session_id, final_extracted_text, final_image_path, final_image_base64, final_source_file_path)
+
+    # Debug: Log what the lab agent returns to the LangChain agent
+    print(f"🔍 [DEBUG] lab_agent_tool returning to LangChain agent:")
+    print(f"🔍 [DEBUG] - success: {result.get('success')}")
+    print(f"🔍 [DEBUG] - visualizations count: {len(result.get('visualizations', []))}")
+    if result.get('visualizations'):
+        for i, viz in enumerate(result['visualizations']):
+            print(f"🔍 [DEBUG] - viz {i}: {viz.get('title')} -> {viz.get('filename')}")
+
+    return result
+
+@tool
+async def prescription_clinical_agent_tool(prompt_with_user_input: str) -> dict:
+    """Handle prescription analysis and clinical notes operations.
+
+    SUPPORTED OPERATIONS:
+    1. UPDATE: "update my prescription or clinical data: [user input]" - Add new prescriptions, clinical notes, and medical observations
+    2. RETRIEVE: "retrieve my prescription or clinical data: [user input]" - Get prescription history, clinical notes, and medication records
+
+    IMPORTANT: Do NOT use this tool for lab reports, vitals, nutrition, or pharmacy data - use the respective specialized agents instead.
+
+    Use this tool when:
+    - User uploads prescription documents from doctors or healthcare providers
+    - User wants prescription analysis, medication tracking, and adherence monitoring
+    - User wants to manage clinical notes, medical observations, and doctor's recommendations
+    - User mentions prescribed medications from doctors (not over-the-counter purchases)
+    - User wants to track prescription history, dosages, and medication changes
+    - User needs help with prescription medication management and clinical documentation
+
+    Examples:
+    - "update my prescription or clinical data: My doctor prescribed Lisinopril 10mg daily for blood pressure"
+    - "retrieve my prescription or clinical data: show me all my current prescriptions"
+    - "update my prescription or clinical data: Doctor noted I should monitor blood sugar twice daily"
+
+    Args:
+        prompt_with_user_input: Combined prompt that includes the operation type AND the user's actual words/input
+                               Must preserve the user's original words and context
+
+    Returns:
+        Dict containing prescription/clinical processing results
+    """
+    state, user_id, session_id = _request_context()
+    # Get all required values from state
+    final_extracted_text = state.get("extracted_text", "")
+    final_source_file_path = state.get("source_file_path", "")
+    final_image_base64 = state.get("image_base64", None)
+
+    # Get image path from state if available (images only)
+    final_image_path = state.get("file_path", None) if state.get("is_image") else None
+
+    agent = get_agent("prescription_clinical")
+    # Combine tool-specified prompt with assessed user input, de-duplicating
+    effective_prompt = _compose_effective_prompt(prompt_with_user_input)
+    return await agent.process_request(effective_prompt, user_id, session_id, final_image_path, final_image_base64, final_extracted_text, final_source_file_path)
+
+@tool
+async def medical_doctor_agent_tool(patient_case: str, budget_limit: float = None) -> dict:
+    """Provide medical analysis, symptom evaluation, and health recommendations.
+
+    Use this tool when:
+    - User describes symptoms and wants medical analysis
+    - User wants diagnosis assistance or second opinion
+    - User wants health recommendations based on their data
+    - User asks medical questions about conditions or treatments
+    - User wants comprehensive health assessment
+    - NOT for simple data updates or retrieval - use specific agents for those
+
+    Args:
+        patient_case: The user's medical case description or symptoms
+        budget_limit: Optional budget limit for medical recommendations
+
+    Returns:
+        Dict containing medical analysis and recommendations
+    """
+    state, user_id, session_id = _request_context()
+    # Use the dedicated LangGraph medical doctor workflow
+    from app.agentsv2.medical_doctor_workflow import process_medical_request_async
+    try:
+        result = await process_medical_request_async(
+            user_id=user_id,
+            patient_case=patient_case,
+            session_id=session_id,
+            conversation_history=state.get("conversation_history", []),
+            budget_limit=budget_limit,
+        )
+        return result
+    except Exception as mdw_e:
+        print(f"⚠️ [medical_doctor_agent_tool] Workflow error: {mdw_e}")
+        # Minimal fallback using panel directly if workflow fails
+        from app.agentsv2.medical_doctor_panels import MedicalDoctorPanel
+        try:
+            panel = MedicalDoctorPanel(api_key=settings.OPENAI_API_KEY, budget_limit=budget_limit)
+            return await panel.process_patient_case_async(patient_case, budget_limit)
+        except Exception as inner_e:
+            return {"action": "error", "details": str(inner_e)}
+
+@tool
+async def document_workflow_tool(file_path: str, analysis_only: bool = False) -> dict:
+    """Process uploaded documents and optionally update health records.
+
+    Use this tool when:
+    - User uploads a document that needs processing (PDF, image of medical document)
+    - User wants to extract information from medical documents
+    - If analysis_only=True: Only analyze the document, don't update health records. 
+    - Use this tool to analyze the document and then use the agents to process the document.
+
+
+    IMPORTANT: 
+    - Always set analysis_only=True
+
+    Args:
+        file_path: Path to the uploaded document file
+        analysis_only: If True, only analyze without updating records
+
+    Returns:
+        Dict containing document processing results with clear guidance for next steps
+    """
+    state, user_id, session_id = _request_context()
+    from app.agentsv2.document_workflow import process_file_async
+   # Get all required values from state
+    final_source_file_path = state.get("source_file_path", "")
+    final_image_base64 = state.get("image_base64", None)
+
+    # Get image path from state if available (images only)
+    final_image_path = state.get("file_path", None) if state.get("is_image") else None
+
+    # Safely get file information from uploaded_file
+    uploaded_file = state.get("uploaded_file")
+    if uploaded_file is None:
+        return {
+            "action": "error",
+            "details": "No file uploaded. Please upload a document to process.",
+            "requires_user_input": True
+        }
+
+    file_name = uploaded_file.get("original_name")
+    file_type = uploaded_file.get("file_type")
+    user_prompt = state.get("user_input", "")
+    result = await process_file_async(user_id, file_name, file_type, final_image_path, final_image_base64, final_source_file_path, analysis_only, user_prompt)
+
+    # Extract key information from the result
+    analysis_result = result.get("analysis_result", {})
+    document_type = analysis_result.get("document_type", "Unknown") if isinstance(analysis_result, dict) else getattr(analysis_result, 'document_type', "Unknown")
+    extracted_text = result.get("ocr_result", "")
+    confidence = analysis_result.get("confidence", 0.0) if isinstance(analysis_result, dict) else getattr(analysis_result, 'confidence', 0.0)
+
+    # Store extracted text in state for other tools to use
+    state["extracted_text"] = extracted_text
+    state["document_type"] = document_type
+    # Persisted path should be the durable reference (S3 URI if enabled); prefer uploaded file_path from state
+    persisted_path = None
+    try:
+        if uploaded_file:
+            persisted_path = uploaded_file.get("file_path") or file_path
+    except Exception:
+        persisted_path = file_path
+    state["source_file_path"] = persisted_path
+    try:
+        ext = (Path(persisted_path).suffix or "").lower()
+        state["is_image"] = ext in [".jpg", ".jpeg", ".png"]
+    except Exception:
+        pass
+
+    # Create enhanced result with clear next steps guidance
+    enhanced_result = result.copy()
+    enhanced_result["next_steps_guidance"] = {
+        "document_type": document_type,
+        "confidence": confidence,
+        "extracted_text": extracted_text,
+        "source_file_path": persisted_path,
+        "recommended_agent": _get_recommended_agent_for_document_type(document_type),
+        "agent_prompt": f"Process this {document_type} document for user {user_id}. The extracted text and file information are provided."
+    }
+
+    # Store agent-specific results in the state for later synthesis
+    agent_results = {}
+    if result.get("lab_agent_result"):
+        agent_results["lab_agent"] = result.get("lab_agent_result")
+    if result.get("vitals_agent_result"):
+        agent_results["vitals_agent"] = result.get("vitals_agent_result")
+    if result.get("nutrition_agent_result"):
+        agent_results["nutrition_agent"] = result.get("nutrition_agent_result")
+    if result.get("pharmacy_agent_result"):
+        agent_results["pharmacy_agent"] = result.get("pharmacy_agent_result")
+    if result.get("clinical_agent_result"):
+        agent_results["clinical_agent"] = result.get("clinical_agent_result")
+
+    # Store agent results in state for synthesis
+    if agent_results:
+        state["agent_results"] = agent_results
+        print(f"🔍 [DEBUG] Stored agent results in state: {list(agent_results.keys())}")
+
+    return enhanced_result
+
+
 async def execute_user_request(state: CustomerState) -> CustomerState:
     """
     Execute the user request by coordinating with appropriate agents.
@@ -657,405 +1071,8 @@ async def execute_user_request(state: CustomerState) -> CustomerState:
     
     # Extract user input and context from state
     user_input = state["user_input"]
-    user_id = state["user_id"]
-    session_id = state.get("session_id")
     uploaded_file = state.get("uploaded_file")
     
-    # Helper to compose effective prompt by combining tool's prompt with assessed user input
-    def _compose_effective_prompt(local_prompt: str) -> str:
-        base = (local_prompt or "").strip()
-        # Strip any OCR-style artifacts like "Image analyzed: ..." to avoid misleading the agent
-        try:
-            base = re.sub(r"(?im)^\s*Image analyzed:.*$", "", base).strip()
-        except Exception:
-            pass
-        assessed = (state.get("user_input") or "").strip()
-        if assessed and base:
-            # Avoid duplication if assessed text is already included
-            if assessed.lower() in base.lower():
-                return base
-            return f"{base}\n\nUser input: {assessed}".strip()
-        return assessed or base
-
-    # Create agent tool functions
-    @tool
-    async def ask_clarifying_question(question: str, reasoning: str) -> str:
-        """Ask a clarifying question to the user and get their response.
-        
-        Args:
-            question: The clarifying question to ask the user
-            reasoning: Clear explanation of why this clarifying question is needed
-            
-        Returns:
-            String containing the user's response
-        """
-        return await ask_user_question(question, session_id, user_id)
-    
-    @tool
-    async def vitals_agent_tool(prompt_with_user_input: str) -> dict:
-        """Handle vitals data operations (heart rate, blood pressure, weight, temperature, oxygen saturation).
-        
-        SUPPORTED OPERATIONS:
-        1. UPDATE: "update my vitals data: [user input]" - Add new vital measurements to health records
-        2. RETRIEVE: "retrieve my vitals: [user input]" - Get historical vitals data and current values
-        3. ANALYZE & RECOMMENDATIONS: "analyze my vitals: [user input]" - Analyze trends, patterns, and provide health recommendations
-        
-        Use this tool when:
-        - User wants to update vital signs measurements (blood pressure, heart rate, weight, temperature, oxygen saturation)
-        - User wants to retrieve historical vitals data and view past measurements
-        - User wants analysis of vitals trends, patterns, and health recommendations
-        - User uploads images of medical devices (scale, BP monitor, thermometer, pulse oximeter)
-        - User mentions specific vital signs like "blood pressure", "weight", "heart rate", "temperature", "SpO2"
-        - User asks for health insights based on their vital signs
-        
-        Examples:
-        - "update my vitals data: I just measured my blood pressure and it was 120/80"
-        - "retrieve my vitals: show me my weight trends from last month"
-        - "analyze my vitals: what does my blood pressure pattern suggest?"
-        
-        Args:
-            prompt_with_user_input: Combined prompt that includes the operation type AND the user's actual words/input
-                                   Must preserve the user's original words and context
-            
-        Returns:
-            Dict containing vitals processing results
-        """
-        # Get all required values from state
-        final_extracted_text = state.get("extracted_text", "")
-        final_source_file_path = state.get("source_file_path", "")
-        final_image_base64 = state.get("image_base64", None)
-        
-        # Get image path from uploaded file if available (prefer persisted S3 path; fallback to source_file_path)
-        final_image_path = None
-        if state.get("is_image"):
-            final_image_path = state.get("file_path") or state.get("source_file_path")
-        
-        from app.agentsv2.vitals_agent import VitalsAgentLangGraph
-        agent = VitalsAgentLangGraph()
-        # Combine tool-specified prompt with assessed user input, de-duplicating
-        effective_prompt = _compose_effective_prompt(prompt_with_user_input)
-        return await agent.run(effective_prompt, user_id, session_id, final_extracted_text, final_image_path, final_image_base64, final_source_file_path)
-    
-    @tool
-    async def nutrition_agent_tool(prompt_with_user_input: str) -> dict:
-        """Handle nutrition data operations (food intake, calorie tracking, meal logging, dietary analysis).
-        
-        SUPPORTED OPERATIONS:
-        1. UPDATE: "update my nutrition or meals or breakfast or snack data: [user input]" - Log meals, food intake, and nutrition information
-        2. RETRIEVE: "retrieve my nutrition data: [user input]" - Get historical nutrition data, meal logs, and calorie tracking
-        3. ANALYZE & RECOMMENDATIONS: "analyze my nutrition: [user input]" - Analyze dietary patterns, nutritional balance, and provide dietary recommendations. dont split the user request into multiple tool calls for analysis and recommendations
-        
-        Use this tool when:
-        - User wants to log meals, food intake, or nutrition information
-        - User wants to track calories, macronutrients, or dietary habits
-        - User wants dietary analysis, nutritional insights, and personalized recommendations
-        - User uploads food images, nutrition labels, or meal photos
-        - User mentions food, meals, calories, nutrition, diet, eating habits, supplements
-        - User asks for dietary advice or nutritional guidance
-        
-        Args:
-            prompt_with_user_input: Combined prompt that includes the operation type AND the user's actual words/input
-                                   Must preserve the user's original words and context
-            
-        Returns:
-            Dict containing nutrition processing results
-        """
-        # Get all required values from state
-        final_extracted_text = state.get("extracted_text", "")
-        final_source_file_path = state.get("source_file_path", "")
-        final_image_base64 = state.get("image_base64", None)
-        
-        # Get image path from uploaded file if available (prefer persisted S3 path; fallback to source_file_path)
-        final_image_path = None
-        if state.get("is_image"):
-            final_image_path = state.get("file_path") or state.get("source_file_path")
-        
-        from app.agentsv2.nutrition_agent import NutritionAgentLangGraph
-        agent = NutritionAgentLangGraph()
-        # Combine tool-specified prompt with assessed user input, de-duplicating
-        effective_prompt = _compose_effective_prompt(prompt_with_user_input)
-        return await agent.run(effective_prompt, user_id, session_id, final_extracted_text, final_image_path, final_image_base64, final_source_file_path)
-    
-    @tool
-    async def pharmacy_agent_tool(prompt_with_user_input: str) -> dict:
-        """Handle pharmacy and medication inventory operations.
-        
-        SUPPORTED OPERATIONS:
-        1. UPDATE: "update my pharmacy bills along with medication data: [user input]" - Add pharmacy purchases, medications, and billing information
-        2. RETRIEVE: "retrieve my pharmacy bills along with medication data: [user input]" - Get medication history, pharmacy expenses, and inventory
-        3. ANALYZE & RECOMMENDATIONS: "analyze my pharmacy bills data: [user input]" - Analyze spending patterns, medication usage, and provide cost-saving recommendations. dont split the user request into multiple tool calls for analysis and recommendations
-        
-        Use this tool when:
-        - User wants to track medication inventory and pharmacy purchases
-        - User wants drug information, interactions, and medication details
-        - User mentions pharmacy purchases, over-the-counter medications, or prescriptions
-        - User wants to track medication costs, pharmacy bills, and healthcare expenses
-        - User uploads pharmacy receipts, medication packaging, or pill bottles
-        - User asks for medication management advice or cost optimization
-        
-        Examples:
-        - "update my pharmacy bills along with medication data: I bought Tylenol and vitamins from CVS for $25"
-        - "retrieve my pharmacy bills along with medication data: show me my medication expenses this month"
-        - "analyze my pharmacy bills data: how can I save money on my medications?"
-        
-        Args:
-            prompt_with_user_input: Combined prompt that includes the operation type AND the user's actual words/input
-                                   Must preserve the user's original words and context
-            
-        Returns:
-            Dict containing pharmacy processing results
-        """
-        # Get all required values from state
-        final_extracted_text = state.get("extracted_text", "")
-        final_source_file_path = state.get("source_file_path", "")
-        final_image_base64 = state.get("image_base64", None)
-        
-        # Get image path from uploaded file if available (prefer temp_path if present)
-        final_image_path = state.get("file_path", None) if state.get("is_image") else None
-        
-        from app.agentsv2.pharmacy_agent import PharmacyAgentLangGraph
-        agent = PharmacyAgentLangGraph()
-        # Combine tool-specified prompt with assessed user input, de-duplicating
-        effective_prompt = _compose_effective_prompt(prompt_with_user_input)
-        return await agent.run(effective_prompt, user_id, session_id, final_extracted_text, final_image_path, final_image_base64, final_source_file_path)
-    
-    @tool
-    async def lab_agent_tool(prompt_with_user_input: str) -> dict:
-        """Handle biomarkers and lab results operations (blood tests, LFT, kidney function, cholesterol).
-        
-        SUPPORTED OPERATIONS:
-        1. UPDATE: "update my lab or biomarker data: [user input]" - Add new lab results, blood test values, and biomarker measurements
-        2. RETRIEVE: "retrieve my lab or biomarker data: [user input]" - Get historical lab results, test values, and biomarker trends
-        3. ANALYZE & RECOMMENDATIONS: "analyze my lab or biomarker data: [user input]" - Analyze lab trends, identify patterns, and provide health recommendations.dont split the user request into multiple tool calls for analysis and recommendations
-        
-        Use this tool when:
-        - User uploads lab reports, blood test results, or medical test documents
-        - User wants to track biomarkers, lab values, and test results over time
-        - User wants analysis of lab trends, patterns, and health insights
-        - User mentions specific lab tests (cholesterol, glucose, liver function, kidney function, CBC, metabolic panel)
-        - User wants to understand lab report findings and their health implications
-        - User asks for interpretation of blood work or biomarker results
-        
-        Examples:
-        - "update my lab or biomarker data: My recent blood test showed cholesterol at 200 mg/dL"
-        - "retrieve my lab or biomarker data: show me my glucose levels from the past 6 months"
-        - "analyze my lab or biomarker data: what do my liver function tests indicate?"
-        
-        Args:
-            prompt_with_user_input: Combined prompt that includes the operation type AND the user's actual words/input
-                                   Must preserve the user's original words and context
-            
-        Returns:
-            Dict containing lab processing results
-        """
-        # Get all required values from state
-        final_extracted_text = state.get("extracted_text", "")
-        final_source_file_path = state.get("source_file_path", "")
-        final_image_base64 = state.get("image_base64", None)
-        
-        # Get image path from uploaded file if available (prefer temp_path if present)
-        final_image_path = state.get("file_path", None) if state.get("is_image") else None
-        
-        from app.agentsv2.lab_agent import LabAgentLangGraph
-        agent = LabAgentLangGraph()
-        # Combine tool-specified prompt with assessed user input, de-duplicating
-        effective_prompt = _compose_effective_prompt(prompt_with_user_input)
-        result = await agent.run(effective_prompt, user_id, session_id, final_extracted_text, final_image_path, final_image_base64, final_source_file_path)
-        
-        # Debug: Log what the lab agent returns to the LangChain agent
-        print(f"🔍 [DEBUG] lab_agent_tool returning to LangChain agent:")
-        print(f"🔍 [DEBUG] - success: {result.get('success')}")
-        print(f"🔍 [DEBUG] - visualizations count: {len(result.get('visualizations', []))}")
-        if result.get('visualizations'):
-            for i, viz in enumerate(result['visualizations']):
-                print(f"🔍 [DEBUG] - viz {i}: {viz.get('title')} -> {viz.get('filename')}")
-        
-        return result
-    
-    @tool
-    async def prescription_clinical_agent_tool(prompt_with_user_input: str) -> dict:
-        """Handle prescription analysis and clinical notes operations.
-        
-        SUPPORTED OPERATIONS:
-        1. UPDATE: "update my prescription or clinical data: [user input]" - Add new prescriptions, clinical notes, and medical observations
-        2. RETRIEVE: "retrieve my prescription or clinical data: [user input]" - Get prescription history, clinical notes, and medication records
-        
-        IMPORTANT: Do NOT use this tool for lab reports, vitals, nutrition, or pharmacy data - use the respective specialized agents instead.
-        
-        Use this tool when:
-        - User uploads prescription documents from doctors or healthcare providers
-        - User wants prescription analysis, medication tracking, and adherence monitoring
-        - User wants to manage clinical notes, medical observations, and doctor's recommendations
-        - User mentions prescribed medications from doctors (not over-the-counter purchases)
-        - User wants to track prescription history, dosages, and medication changes
-        - User needs help with prescription medication management and clinical documentation
-        
-        Examples:
-        - "update my prescription or clinical data: My doctor prescribed Lisinopril 10mg daily for blood pressure"
-        - "retrieve my prescription or clinical data: show me all my current prescriptions"
-        - "update my prescription or clinical data: Doctor noted I should monitor blood sugar twice daily"
-        
-        Args:
-            prompt_with_user_input: Combined prompt that includes the operation type AND the user's actual words/input
-                                   Must preserve the user's original words and context
-            
-        Returns:
-            Dict containing prescription/clinical processing results
-        """
-        # Get all required values from state
-        final_extracted_text = state.get("extracted_text", "")
-        final_source_file_path = state.get("source_file_path", "")
-        final_image_base64 = state.get("image_base64", None)
-        
-        # Get image path from state if available (images only)
-        final_image_path = state.get("file_path", None) if state.get("is_image") else None
-        
-        from app.agentsv2.prescription_clinical_agent import PrescriptionClinicalAgentLangGraph
-        agent = PrescriptionClinicalAgentLangGraph()
-        # Combine tool-specified prompt with assessed user input, de-duplicating
-        effective_prompt = _compose_effective_prompt(prompt_with_user_input)
-        return await agent.process_request(effective_prompt, user_id, session_id, final_image_path, final_image_base64, final_extracted_text, final_source_file_path)
-    
-    @tool
-    async def medical_doctor_agent_tool(patient_case: str, budget_limit: float = None) -> dict:
-        """Provide medical analysis, symptom evaluation, and health recommendations.
-        
-        Use this tool when:
-        - User describes symptoms and wants medical analysis
-        - User wants diagnosis assistance or second opinion
-        - User wants health recommendations based on their data
-        - User asks medical questions about conditions or treatments
-        - User wants comprehensive health assessment
-        - NOT for simple data updates or retrieval - use specific agents for those
-        
-        Args:
-            patient_case: The user's medical case description or symptoms
-            budget_limit: Optional budget limit for medical recommendations
-            
-        Returns:
-            Dict containing medical analysis and recommendations
-        """
-        # Use the dedicated LangGraph medical doctor workflow
-        from app.agentsv2.medical_doctor_workflow import process_medical_request_async
-        try:
-            result = await process_medical_request_async(
-                user_id=user_id,
-                patient_case=patient_case,
-                session_id=session_id,
-                conversation_history=state.get("conversation_history", []),
-                budget_limit=budget_limit,
-            )
-            return result
-        except Exception as mdw_e:
-            print(f"⚠️ [medical_doctor_agent_tool] Workflow error: {mdw_e}")
-            # Minimal fallback using panel directly if workflow fails
-            from app.agentsv2.medical_doctor_panels import MedicalDoctorPanel
-            try:
-                panel = MedicalDoctorPanel(api_key=settings.OPENAI_API_KEY, budget_limit=budget_limit)
-                return await panel.process_patient_case_async(patient_case, budget_limit)
-            except Exception as inner_e:
-                return {"action": "error", "details": str(inner_e)}
-    
-    @tool
-    async def document_workflow_tool(file_path: str, analysis_only: bool = False) -> dict:
-        """Process uploaded documents and optionally update health records.
-        
-        Use this tool when:
-        - User uploads a document that needs processing (PDF, image of medical document)
-        - User wants to extract information from medical documents
-        - If analysis_only=True: Only analyze the document, don't update health records. 
-        - Use this tool to analyze the document and then use the agents to process the document.
-    
-        
-        IMPORTANT: 
-        - Always set analysis_only=True
-        
-        Args:
-            file_path: Path to the uploaded document file
-            analysis_only: If True, only analyze without updating records
-            
-        Returns:
-            Dict containing document processing results with clear guidance for next steps
-        """
-        from app.agentsv2.document_workflow import process_file_async
-       # Get all required values from state
-        final_source_file_path = state.get("source_file_path", "")
-        final_image_base64 = state.get("image_base64", None)
-        
-        # Get image path from state if available (images only)
-        final_image_path = state.get("file_path", None) if state.get("is_image") else None
-        
-        # Safely get file information from uploaded_file
-        uploaded_file = state.get("uploaded_file")
-        if uploaded_file is None:
-            return {
-                "action": "error",
-                "details": "No file uploaded. Please upload a document to process.",
-                "requires_user_input": True
-            }
-        
-        file_name = uploaded_file.get("original_name")
-        file_type = uploaded_file.get("file_type")
-        user_prompt = state.get("user_input", "")
-        result = await process_file_async(user_id, file_name, file_type, final_image_path, final_image_base64, final_source_file_path, analysis_only, user_prompt)
-        
-        # Extract key information from the result
-        analysis_result = result.get("analysis_result", {})
-        document_type = analysis_result.get("document_type", "Unknown") if isinstance(analysis_result, dict) else getattr(analysis_result, 'document_type', "Unknown")
-        extracted_text = result.get("ocr_result", "")
-        confidence = analysis_result.get("confidence", 0.0) if isinstance(analysis_result, dict) else getattr(analysis_result, 'confidence', 0.0)
-        
-        # Store extracted text in state for other tools to use
-        state["extracted_text"] = extracted_text
-        state["document_type"] = document_type
-        # Persisted path should be the durable reference (S3 URI if enabled); prefer uploaded file_path from state
-        persisted_path = None
-        try:
-            if uploaded_file:
-                persisted_path = uploaded_file.get("file_path") or file_path
-        except Exception:
-            persisted_path = file_path
-        state["source_file_path"] = persisted_path
-        try:
-            ext = (Path(persisted_path).suffix or "").lower()
-            state["is_image"] = ext in [".jpg", ".jpeg", ".png"]
-        except Exception:
-            pass
-        
-        # Create enhanced result with clear next steps guidance
-        enhanced_result = result.copy()
-        enhanced_result["next_steps_guidance"] = {
-            "document_type": document_type,
-            "confidence": confidence,
-            "extracted_text": extracted_text,
-            "source_file_path": persisted_path,
-            "recommended_agent": _get_recommended_agent_for_document_type(document_type),
-            "agent_prompt": f"Process this {document_type} document for user {user_id}. The extracted text and file information are provided."
-        }
-        
-        # Store agent-specific results in the state for later synthesis
-        agent_results = {}
-        if result.get("lab_agent_result"):
-            agent_results["lab_agent"] = result.get("lab_agent_result")
-        if result.get("vitals_agent_result"):
-            agent_results["vitals_agent"] = result.get("vitals_agent_result")
-        if result.get("nutrition_agent_result"):
-            agent_results["nutrition_agent"] = result.get("nutrition_agent_result")
-        if result.get("pharmacy_agent_result"):
-            agent_results["pharmacy_agent"] = result.get("pharmacy_agent_result")
-        if result.get("clinical_agent_result"):
-            agent_results["clinical_agent"] = result.get("clinical_agent_result")
-        
-        # Store agent results in state for synthesis
-        if agent_results:
-            state["agent_results"] = agent_results
-            print(f"🔍 [DEBUG] Stored agent results in state: {list(agent_results.keys())}")
-        
-        return enhanced_result
-
-    # Create ReAct agent with all tools
-    llm = ChatOpenAI(model=settings.CUSTOMER_AGENT_MODEL, openai_api_key=settings.OPENAI_API_KEY)
-    
     # Get file information if available
     file_info = ""
     if uploaded_file:
@@ -1068,15 +1085,7 @@ async def execute_user_request(state: CustomerState) -> CustomerState:
 
     # Build conversation context like in assess_user_intent
     conversation_history = state.get("conversation_history", [])
-    context_info = ""
-    if conversation_history:
-        recent_history = conversation_history[-5:] if len(conversation_history) > 5 else conversation_history
-        context_info = "\n\nCONVERSATION CONTEXT:\n"
-        for msg in recent_history:
-            role = msg.get('role', 'unknown')
-            content = msg.get('content', '')
-            context_info += f"- {role.upper()}: {content[:200]}{'...' if len(content) > 200 else ''}\n"
-        context_info += "\nUse this context to better understand the current request.\n"
+    context_info = _format_conversation_context(conversation_history)
 
     system_prompt = f"""You are a healthcare app assistant that coordinates with specialized agents to fulfill user requests.
 
@@ -1200,23 +1209,9 @@ async def execute_user_request(state: CustomerState) -> CustomerState:
 
             Use the appropriate tools to fulfill the user request completely, then respond with the JSON format above. If you need clarification on any aspect, ask the user first."""
 
-    # Create agent with all tools
-    tools = [
-        ask_clarifying_question,
-        vitals_agent_tool,
-        nutrition_agent_tool,
-        pharmacy_agent_tool,
-        lab_agent_tool,
-        prescription_clinical_agent_tool,
-        medical_doctor_agent_tool,
-        document_workflow_tool
-    ]
-    
-
-    agent = create_react_agent(
-        model=llm,
-        tools=tools
-    )
+    # Shared executor agent; its tools read this request's state from the context
+    agent = get_compiled_workflow("customer_executor_agent")
+    _current_request_state.set(state)
     
     # Create messages with system prompt
     messages = [
@@ -1430,13 +1425,35 @@ def should_handle_error(state: CustomerState) -> str:
         return "synthesize_response"
 
 
+def _build_assess_agent():
+    """ReAct agent used by assess_user_intent (compiled once per process)"""
+    return create_react_agent(
+        model=get_chat_model(settings.CUSTOMER_AGENT_MODEL, openai_api_key=settings.OPENAI_API_KEY),
+        tools=[assess_clarifying_question, get_recent_session_file_tool]
+    )
+
+
+def _build_executor_agent():
+    """ReAct agent used by execute_user_request (compiled once per process)"""
+    # Streaming model: its answer tokens reach ChatStreamCallbackHandler as they are generated
+    return create_react_agent(
+        model=get_chat_model(settings.CUSTOMER_AGENT_MODEL, openai_api_key=settings.OPENAI_API_KEY, streaming=True),
+        tools=[
+            ask_clarifying_question,
+            vitals_agent_tool,
+            nutrition_agent_tool,
+            pharmacy_agent_tool,
+            lab_agent_tool,
+            prescription_clinical_agent_tool,
+            medical_doctor_agent_tool,
+            document_workflow_tool
+        ]
+    )
+
+
 # Create the workflow graph
-async def create_customer_workflow():
-    """Create and return the customer workflow graph."""
-     # Set up LangSmith tracing
-    tracer = LangChainTracer()
-    callback_manager = CallbackManager([tracer])
-    
+def _build_customer_workflow():
+    """Build and compile the customer workflow graph."""
     # Create the workflow
     workflow = StateGraph(CustomerState)
     
@@ -1465,14 +1482,21 @@ async def create_customer_workflow():
     workflow.add_edge("synthesize_response", END)
     workflow.add_edge("handle_error", END)
     
-    # Compile the workflow
-    memory = MemorySaver()
-    app = workflow.compile(checkpointer=memory)
-    
-    return app
+    # Thread state is persisted in Postgres so follow-ups resume on any worker
+    return workflow.compile(checkpointer=get_checkpointer())
+
+
+register_workflow("customer_assess_agent", _build_assess_agent)
+register_workflow("customer_executor_agent", _build_executor_agent)
+register_workflow("customer_workflow", _build_customer_workflow)
+
+
+async def create_customer_workflow():
+    """Return the shared compiled customer workflow graph."""
+    return get_compiled_workflow("customer_workflow")
 
 
-async def process_customer_request_async(user_id: str, user_input: str, conversation_history: List[Dict] = None, uploaded_file: Optional[Dict[str, Any]] = None, session_id: Optional[int] = None) -> dict:
+async def process_customer_request_async(user_id: str, user_input: str, conversation_history: List[Dict] = None, uploaded_file: Optional[Dict[str, Any]] = None, session_id: Optional[int] = None, request_id: Optional[str] = None) -> dict:
     """
     Process a customer request asynchronously.
     
@@ -1482,6 +1506,8 @@ async def process_customer_request_async(user_id: str, user_input: str, conversa
         conversation_history (List[Dict]): Previous conversation context
         uploaded_file (Optional[Dict[str, Any]]): File information if user uploaded a file
         session_id (Optional[int]): Chat session ID for storing messages
+        request_id (Optional[str]): Streaming request ID; node transitions and answer
+            tokens are published to its chat stream while the workflow runs
         
     Returns:
         dict: Processing results including final response
@@ -1507,6 +1533,12 @@ async def process_customer_request_async(user_id: str, user_input: str, conversa
         "requires_user_input": False,
         "is_diagnosis_request": False,
         "uploaded_file": uploaded_file,
+        # Per-run file context: reset so a checkpointed earlier upload never carries over
+        "extracted_text": "",
+        "document_type": None,
+        "source_file_path": None,
+        "image_path": None,
+        "image_base64": None,
         # Initialize standardized response fields
         "response_data": None,
         "task_types": [],
@@ -1517,16 +1549,31 @@ async def process_customer_request_async(user_id: str, user_input: str, conversa
     current_session_id.set(session_id)
     current_user_id.set(user_id)
     
-    # Create and run workflow
+    # Run the shared workflow; per-request data travels only in state and config
     app = await create_customer_workflow()
+    # One checkpoint thread per chat session; session-less calls get a throwaway thread
+    thread_id = f"customer-session-{session_id}" if session_id else f"customer-{user_id}-{uuid.uuid4().hex}"
+    config = {
+        "configurable": {"thread_id": thread_id},
+        "callbacks": [get_tracer()]
+    }
+    if request_id:
+        config["callbacks"].append(ChatStreamCallbackHandler(request_id, nodes=CUSTOMER_WORKFLOW_NODES))
     
-    result = await app.ainvoke(
-        initial_state,
-        config={
-            "configurable": {"thread_id": f"customer-{user_id}"},
-            "callbacks": [LangChainTracer()]
-        }
-    )
+    # Without caller-supplied history, resume the context persisted by this session's previous run
+    if session_id and not initial_state["conversation_history"]:
+        try:
+            previous = await app.aget_state(config)
+            if previous and previous.values:
+                previous_history = list(previous.values.get("conversation_history") or [])
+                if previous.values.get("user_input") and previous.values.get("final_response"):
+                    previous_history.append({"role": "user", "content": previous.values["user_input"]})
+                    previous_history.append({"role": "assistant", "content": previous.values["final_response"]})
+                initial_state["conversation_history"] = previous_history[-10:]
+        except Exception as e:
+            logger.warning(f"⚠️ [CustomerWorkflow] Could not load checkpointed state for session {session_id}: {e}")
+    
+    result = await app.ainvoke(initial_state, config=config)
     
     # Convert any Pydantic models to dicts for JSON serialization
     intent_result = result.get("intent_classification")
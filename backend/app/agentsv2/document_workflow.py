@@ -15,7 +15,6 @@ sys.path.insert(0, str(project_root))
 sys.path.insert(0, str(backend_path))
 
 from langgraph.graph import StateGraph, END, START
-from langgraph.checkpoint.memory import MemorySaver
 from typing import TypedDict, Union, Dict, Any, List, Optional
 from app.agentsv2.tools.ocr_tools import OCRToolkit
 from langchain_openai import ChatOpenAI
@@ -30,8 +29,7 @@ import json
 
 # LangSmith tracing imports
 from langsmith import Client
-from langchain.callbacks.tracers import LangChainTracer
-from langchain.callbacks.manager import CallbackManager
+from app.agentsv2.workflow_registry import get_agent, get_compiled_workflow, get_tracer, register_workflow
 
 # PydanticOutputParser import
 from langchain.output_parsers import PydanticOutputParser
@@ -189,7 +187,7 @@ async def handle_pdf(state: FileState) -> FileState:
         # ocr_text = ocr_toolkit._extract_text_from_pdf(Path(file_path), "first")  # Extract first page only
         # ocr_text = ocr_toolkit._extract_text_from_pdf(Path(file_path), "last")   # Extract last page only
         # ocr_text = ocr_toolkit._extract_text_from_pdf(Path(file_path), [1, 2, 3])  # Extract pages 1, 2, and 3
-        ocr_text = ocr_toolkit._extract_text_from_pdf_s3_uri(file_path)
+        ocr_text = await ocr_toolkit.aextract_text_from_pdf_s3_uri(file_path)
         analysis_result = analyze_document_type(ocr_text)
         analysis_result.extracted_text = ocr_text
         if analysis_result.document_type != "Other":
@@ -293,8 +291,7 @@ async def handle_result(state: FileState) -> FileState:
                 # Route to appropriate agent based on document type
                 if analysis_result.document_type == "Lab Report":
                     # Use LabAgentLangGraph for lab reports
-                    from app.agentsv2.lab_agent import LabAgentLangGraph
-                    lab_agent = LabAgentLangGraph()
+                    lab_agent = get_agent("lab")
 
                     #store the extracted text in a file
                     with open(f"extracted_text_{state['user_id']}.txt", "w") as f:
@@ -377,8 +374,7 @@ async def handle_result(state: FileState) -> FileState:
 
                 elif analysis_result.document_type in ["Clinical Notes", "Prescription"]:
                     # Use PrescriptionClinicalAgentLangGraph for clinical notes and prescriptions
-                    from app.agentsv2.prescription_clinical_agent import PrescriptionClinicalAgentLangGraph
-                    clinical_agent = PrescriptionClinicalAgentLangGraph()
+                    clinical_agent = get_agent("prescription_clinical")
                     
                     # Compose a prompt for the clinical agent
                     prompt = f"Extract and update {'clinical notes' if analysis_result.document_type == 'Clinical Notes' else 'prescription'} data for user id {state['user_id']}.\nExtracted text:\n{analysis_result.extracted_text}\n Confidence Score: {analysis_result.confidence}\n File Name: {state['file_name']}"
@@ -405,8 +401,7 @@ async def handle_result(state: FileState) -> FileState:
 
                 elif analysis_result.document_type == "Pharmacy Bill":
                     # Use PharmacyAgentLangGraph for pharmacy bills
-                    from app.agentsv2.pharmacy_agent import PharmacyAgentLangGraph
-                    pharmacy_agent = PharmacyAgentLangGraph()
+                    pharmacy_agent = get_agent("pharmacy")
                     
                     # Compose a prompt for the pharmacy agent
                     prompt = f"Extract and update pharmacy bill data for user id {state['user_id']}.\nExtracted text:\n{analysis_result.extracted_text}\n Confidence Score: {analysis_result.confidence}\n File Name: {state['file_name']}"
@@ -433,8 +428,7 @@ async def handle_result(state: FileState) -> FileState:
 
                 elif analysis_result.document_type == "Vitals Details":
                     # Use VitalsAgentLangGraph for vitals
-                    from app.agentsv2.vitals_agent import VitalsAgentLangGraph
-                    vitals_agent = VitalsAgentLangGraph()
+                    vitals_agent = get_agent("vitals")
                     
                     # Compose a prompt for the vitals agent
                     prompt = f"Extract and update vitals data for user id {state['user_id']}.\nExtracted text:\n{analysis_result.extracted_text}\n Confidence Score: {analysis_result.confidence}\n File Name: {state['file_name']}"
@@ -461,8 +455,7 @@ async def handle_result(state: FileState) -> FileState:
 
                 elif analysis_result.document_type == "Nutrition":
                     # Use NutritionAgentLangGraph for nutrition documents
-                    from app.agentsv2.nutrition_agent import NutritionAgentLangGraph
-                    nutrition_agent = NutritionAgentLangGraph()
+                    nutrition_agent = get_agent("nutrition")
                     
                     # Compose a prompt for the nutrition agent
                     prompt = f"Extract and update nutrition data for user id {state['user_id']}.\nExtracted text:\n{analysis_result.extracted_text}\n Confidence Score: {analysis_result.confidence}\n File Name: {state['file_name']}"
@@ -842,10 +835,6 @@ Analyze the following text and classify the document type:
 def create_file_type_workflow():
     """Create a LangGraph workflow for file type detection and processing."""
     
-    # Set up LangSmith tracing
-    tracer = LangChainTracer()
-    callback_manager = CallbackManager([tracer])
-    
     # Create the workflow
     workflow = StateGraph(FileState)
     
@@ -893,7 +882,11 @@ def create_file_type_workflow():
     workflow.add_edge("handle_result", END)
     workflow.add_edge("handle_unsupported", END)
     
-    return workflow.compile(checkpointer=MemorySaver())
+    # Each run starts from a fresh state, so the shared compiled graph needs no checkpointer
+    return workflow.compile()
+
+
+register_workflow("document_file_type", create_file_type_workflow)
 
 
 async def process_file_async(user_id: str, file_name: str = None, file_type: str = None, image_path: str = None, image_base64: str = None, source_file_path: str = None, analysis_only: bool = False, user_prompt: str = None) -> dict:
@@ -907,8 +900,8 @@ async def process_file_async(user_id: str, file_name: str = None, file_type: str
     Returns:
         dict: Dictionary containing file_type and error information
     """
-    # Create the workflow
-    workflow = create_file_type_workflow()
+    # Shared compiled workflow (built once per process)
+    workflow = get_compiled_workflow("document_file_type")
     
     # Initialize the state with all required fields
     initial_state = FileState(
@@ -943,7 +936,7 @@ async def process_file_async(user_id: str, file_name: str = None, file_type: str
         initial_state,
         config={
             "configurable": {"thread_id": "test-thread"},
-            "callbacks": [LangChainTracer()]
+            "callbacks": [get_tracer()]
         }
     )
     
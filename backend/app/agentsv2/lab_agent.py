@@ -17,7 +17,7 @@ sys.path.insert(0, str(project_root))
 sys.path.insert(0, str(backend_path))
 
 from langgraph.graph import  StateGraph, END, START
-from langchain_openai import ChatOpenAI
+from app.agentsv2.workflow_registry import get_chat_model, get_tracer
 from app.core.config import settings
 from app.core.database_utils import execute_query_safely_json, get_table_schema_safely, get_raw_db_connection
 from app.configurations.lab_config import LAB_TABLES, PRIMARY_LAB_TABLE, ALL_LAB_TABLES, AGGREGATION_TABLES
@@ -33,7 +33,6 @@ import re
 
 from app.agentsv2.lab_analyze_workflow import LabAnalyzeWorkflow
 from app.agentsv2.response_utils import format_agent_response, format_error_response
-from langchain.callbacks.tracers import LangChainTracer
 import os
 from app.utils.sqs_client import get_ml_worker_client
 
@@ -163,8 +162,8 @@ class LabAgentLangGraph:
                 os.environ["LANGCHAIN_API_KEY"] = settings.LANGCHAIN_API_KEY
             if hasattr(settings, 'LANGCHAIN_PROJECT') and settings.LANGCHAIN_PROJECT:
                 os.environ["LANGCHAIN_PROJECT"] = settings.LANGCHAIN_PROJECT
-        self.llm = ChatOpenAI(model=settings.LAB_AGENT, api_key=settings.OPENAI_API_KEY)
-        self.vision_llm = ChatOpenAI(
+        self.llm = get_chat_model(model=settings.LAB_AGENT, api_key=settings.OPENAI_API_KEY)
+        self.vision_llm = get_chat_model(
             model="gpt-4o",
             api_key=settings.OPENAI_API_KEY,
             max_tokens=4000
@@ -985,7 +984,7 @@ class LabAgentLangGraph:
             tracer = None
             callbacks = None
             if getattr(settings, "LANGCHAIN_TRACING_V2", False):
-                tracer = LangChainTracer()
+                tracer = get_tracer()
                 callbacks = [tracer]
 
             # Execute workflow with tracing if enabled
@@ -993,7 +992,7 @@ class LabAgentLangGraph:
             if callbacks:
                 config = {
                     "configurable": {"thread_id": f"lab-agent-{user_id}-{session_id}" if session_id is not None else f"lab-agent-{user_id}"},
-                    "callbacks": [LangChainTracer()]
+                    "callbacks": callbacks
                 }
             if config:
                 result = await self.workflow.ainvoke(initial_state, config=config)
@@ -1355,15 +1354,21 @@ class LabAgentLangGraph:
         except Exception as e:
             return f"Schema Query Error for table '{table_name}': {e}"
 
-    async def _use_advanced_retrieval(self, user_request: str) -> Dict[str, Any]:
-        """Use LangGraph ReAct agent for retrieval (same logic as original ReAct agent)"""
-        try:
-            # Create a ReAct agent using LangGraph (replaces initialize_agent)
-            agent = create_react_agent(
+    def _get_retrieval_agent(self):
+        """SQL retrieval ReAct agent, compiled once per (shared) agent instance"""
+        if getattr(self, "_retrieval_agent", None) is None:
+            self._retrieval_agent = create_react_agent(
                 model=self.llm,
                 tools=self.tools,
                 prompt=SQL_GENERATION_SYSTEM_PROMPT
             )
+        return self._retrieval_agent
+
+    async def _use_advanced_retrieval(self, user_request: str) -> Dict[str, Any]:
+        """Use LangGraph ReAct agent for retrieval (same logic as original ReAct agent)"""
+        try:
+            # Create a ReAct agent using LangGraph (replaces initialize_agent)
+            agent = self._get_retrieval_agent()
             
             # Run the agent (same as original ReAct agent logic) - use ainvoke for async tools
             result = await agent.ainvoke({"messages": [HumanMessage(content=user_request)]})
@@ -22,7 +22,6 @@ sys.path.insert(0, str(project_root))
 sys.path.insert(0, str(backend_path))
 
 from langgraph.graph import StateGraph, END, START
-from langchain_openai import ChatOpenAI
 from app.core.config import settings
 from app.utils.timezone import now_local, isoformat_now
 from app.configurations.lab_config import LAB_TABLES, PRIMARY_LAB_TABLE, ALL_LAB_TABLES, AGGREGATION_TABLES
@@ -41,6 +40,7 @@ from langchain.callbacks.manager import CallbackManager
 
 # Import create_react_agent for simplified tool handling
 from langgraph.prebuilt import create_react_agent
+from app.agentsv2.workflow_registry import RequestScopedAttributes, get_chat_model, get_tracer
 
 from app.agentsv2.response_utils import format_agent_response
 
@@ -84,13 +84,22 @@ class LabAnalyzeWorkflowState:
     # LangGraph message handling
     messages: Annotated[Sequence[BaseMessage], operator.add] = field(default_factory=list)
 
-class LabAnalyzeWorkflow:
+class LabAnalyzeWorkflow(RequestScopedAttributes):
     """
     LangGraph-based analyze workflow for lab data analysis.
     
     Thread-safe and designed for shared instance usage.
     All state is managed through LabAnalyzeWorkflowState objects passed to methods.
     """
+
+    REQUEST_SCOPED_ATTRIBUTES = {
+        "current_user_id": lambda: None,
+        "current_data": dict,
+        "current_results": dict,
+        "current_plots": list,
+        "downloaded_plot_files": list,
+        "retrieved_data_json": lambda: None,
+    }
     
     def __init__(self, lab_agent_instance=None):
         # Set up LangSmith tracing configuration
@@ -102,7 +111,7 @@ class LabAnalyzeWorkflow:
             if hasattr(settings, 'LANGCHAIN_PROJECT') and settings.LANGCHAIN_PROJECT:
                 os.environ["LANGCHAIN_PROJECT"] = settings.LANGCHAIN_PROJECT
         
-        self.llm = ChatOpenAI(model=settings.LAB_AGENT)
+        self.llm = get_chat_model(settings.LAB_AGENT)
         
         # Store reference to the parent lab agent for method reuse
         self.lab_agent = lab_agent_instance
@@ -426,6 +435,14 @@ class LabAnalyzeWorkflow:
 
 
     
+    def _get_react_agent(self):
+        """ReAct agent over this workflow's tools, compiled once per instance"""
+        agent = self.__dict__.get("_react_agent")
+        if agent is None:
+            agent = create_react_agent(model=self.llm, tools=self.get_tools())
+            self._react_agent = agent
+        return agent
+
     def get_tools(self):
         """Get the list of available tools."""
         return self.tools
@@ -724,10 +741,7 @@ class LabAnalyzeWorkflow:
             state.messages = messages
             
             # Create a ReAct agent that can execute tools automatically
-            react_agent = create_react_agent(
-                model=self.llm,
-                tools=self.get_tools()
-            )
+            react_agent = self._get_react_agent()
             
             # Use the ReAct agent to process the request with tool execution
             result = await react_agent.ainvoke({"messages": state.messages})
@@ -1004,6 +1018,7 @@ class LabAnalyzeWorkflow:
         Returns:
             Dict containing the analysis results
         """
+        self.begin_request_scope()
         try:
             # Initialize state without pre-retrieved data - agent will retrieve as needed
             initial_state = LabAnalyzeWorkflowState(
@@ -1019,7 +1034,7 @@ class LabAnalyzeWorkflow:
                 initial_state,
                 config={
                     "configurable": {"thread_id": f"lab-code-interpreter-{user_id}"},
-                    "callbacks": [LangChainTracer()]
+                    "callbacks": [get_tracer()]
                 }
             )
             
@@ -19,7 +19,7 @@ import asyncio
 from app.utils.timezone import now_local, isoformat_now
 
 from langgraph.graph import StateGraph, END, START
-from langgraph.checkpoint.memory import MemorySaver
+from app.agentsv2.workflow_registry import get_compiled_workflow, register_workflow
 
 from langchain_core.tools import tool
 
@@ -272,7 +272,7 @@ def handle_error(state: MedicalDoctorState) -> MedicalDoctorState:
     return state
 
 
-async def create_medical_doctor_workflow():
+def _build_medical_doctor_workflow():
     workflow = StateGraph(MedicalDoctorState)
 
     workflow.add_node("run_initial_panel", run_initial_panel)
@@ -317,9 +317,16 @@ async def create_medical_doctor_workflow():
     workflow.add_edge("synthesize_response", END)
     workflow.add_edge("handle_error", END)
 
-    memory = MemorySaver()
-    app = workflow.compile(checkpointer=memory)
-    return app
+    # Each run starts from a fresh state, so the shared compiled graph needs no checkpointer
+    return workflow.compile()
+
+
+register_workflow("medical_doctor", _build_medical_doctor_workflow)
+
+
+async def create_medical_doctor_workflow():
+    """Return the shared compiled medical doctor workflow"""
+    return get_compiled_workflow("medical_doctor")
 
 
 async def process_medical_request_async(
@@ -31,7 +31,7 @@ sys.path.insert(0, str(backend_path))
 
 from langgraph.graph import StateGraph, END, START
 from langgraph.prebuilt import ToolNode, tools_condition, create_react_agent
-from langchain_openai import ChatOpenAI
+from app.agentsv2.workflow_registry import get_chat_model, get_tracer
 from app.agentsv2.response_utils import format_agent_response, format_error_response
 from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, ToolMessage
 from langchain_core.tools import tool
@@ -46,7 +46,6 @@ from app.configurations.nutrition_config import NUTRITION_TABLES, PRIMARY_NUTRIT
 
 # LangSmith tracing imports
 from langsmith import Client
-from langchain.callbacks.tracers import LangChainTracer
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
@@ -183,14 +182,14 @@ class NutritionAgentLangGraph:
                 os.environ["LANGCHAIN_PROJECT"] = settings.LANGCHAIN_PROJECT
         # Initialize two LLMs for different purposes
         # Basic analysis LLM for intent analysis, classification, etc.
-        self.llm = ChatOpenAI(
+        self.llm = get_chat_model(
             model=settings.NUTRITION_AGENT_MODEL,
             api_key=settings.OPENAI_API_KEY
         )
         
         # Vision LLM for image analysis only  
         vision_model = settings.NUTRITION_VISION_MODEL or "gpt-4o"
-        self.vision_llm = ChatOpenAI(
+        self.vision_llm = get_chat_model(
             model=vision_model,
             api_key=settings.OPENAI_API_KEY,
             timeout=300
@@ -1200,7 +1199,7 @@ IMPORTANT:
             if hasattr(settings, 'LANGCHAIN_TRACING_V2') and settings.LANGCHAIN_TRACING_V2:
                 config = {
                     "configurable": {"thread_id": f"nutrition-agent-{user_id}"},
-                    "callbacks": [LangChainTracer()]
+                    "callbacks": [get_tracer()]
                 }
             if config:
                 result = await self.workflow.ainvoke(initial_state, config=config)
@@ -1392,6 +1391,16 @@ IMPORTANT:
         except Exception as e:
             return {"action": "error", "error": str(e)}
 
+    def _get_retrieval_agent(self):
+        """SQL retrieval ReAct agent, compiled once per (shared) agent instance"""
+        if getattr(self, "_retrieval_agent", None) is None:
+            self._retrieval_agent = create_react_agent(
+                model=self.llm,
+                tools=self.tools,
+                prompt=NUTRITION_SQL_GENERATION_SYSTEM_PROMPT
+            )
+        return self._retrieval_agent
+
     async def _use_advanced_retrieval(self, user_request: str) -> Dict[str, Any]:
         """Use LangGraph ReAct agent for retrieval but *bypass* the model's final
         message and return the raw JSON payload produced by the last
@@ -1399,11 +1408,7 @@ IMPORTANT:
         are never truncated by the language-model."""
         try:
             # 1. Build the ReAct agent (LangGraph helper)
-            agent = create_react_agent(
-                model=self.llm,
-                tools=self.tools,
-                prompt=NUTRITION_SQL_GENERATION_SYSTEM_PROMPT
-            )
+            agent = self._get_retrieval_agent()
 
             # 2. Execute the agent while requesting all intermediate tool steps.
             #    LangGraph and LCEL agents accept a second *config* dict where we
@@ -23,7 +23,6 @@ sys.path.insert(0, str(project_root))
 sys.path.insert(0, str(backend_path))
 
 from langgraph.graph import StateGraph, END, START
-from langchain_openai import ChatOpenAI
 from app.core.config import settings
 from app.configurations.nutrition_config import NUTRITION_TABLES, PRIMARY_NUTRITION_TABLE
 import psycopg2
@@ -41,6 +40,7 @@ from langchain.callbacks.manager import CallbackManager
 
 # Import create_react_agent for simplified tool handling
 from langgraph.prebuilt import create_react_agent
+from app.agentsv2.workflow_registry import RequestScopedAttributes, get_chat_model, get_tracer
 from app.agentsv2.tools.nutrition_tools import nutrition_recipe_search_tool, internet_search_tool
 
 @dataclass
@@ -83,13 +83,22 @@ class NutritionAnalyzeWorkflowState:
     # LangGraph message handling
     messages: Annotated[Sequence[BaseMessage], operator.add] = field(default_factory=list)
 
-class NutritionAnalyzeWorkflow:
+class NutritionAnalyzeWorkflow(RequestScopedAttributes):
     """
     LangGraph-based analyze workflow for nutrition data analysis.
     
     Thread-safe and designed for shared instance usage.
     All state is managed through NutritionAnalyzeWorkflowState objects passed to methods.
     """
+
+    REQUEST_SCOPED_ATTRIBUTES = {
+        "current_user_id": lambda: None,
+        "current_data": dict,
+        "current_results": dict,
+        "current_plots": list,
+        "downloaded_plot_files": list,
+        "intermediate_tool_outputs": dict,
+    }
     
     def __init__(self, nutrition_agent_instance=None):
         # Set up LangSmith tracing configuration
@@ -101,7 +110,7 @@ class NutritionAnalyzeWorkflow:
             if hasattr(settings, 'LANGCHAIN_PROJECT') and settings.LANGCHAIN_PROJECT:
                 os.environ["LANGCHAIN_PROJECT"] = settings.LANGCHAIN_PROJECT
         
-        self.llm = ChatOpenAI(model=settings.DEFAULT_AI_MODEL)
+        self.llm = get_chat_model(settings.DEFAULT_AI_MODEL)
         
         # Store reference to the parent nutrition agent for method reuse
         self.nutrition_agent = nutrition_agent_instance
@@ -372,6 +381,14 @@ class NutritionAnalyzeWorkflow:
         
         return [recipe_search_tool, retrieve_nutrition_data, execute_python_code, web_search_tool]
     
+    def _get_react_agent(self):
+        """ReAct agent over this workflow's tools, compiled once per instance"""
+        agent = self.__dict__.get("_react_agent")
+        if agent is None:
+            agent = create_react_agent(model=self.llm, tools=self.get_tools())
+            self._react_agent = agent
+        return agent
+
     def get_tools(self):
         """Get the list of available tools."""
         return self.tools
@@ -761,10 +778,7 @@ Start execution immediately following this workflow!
                 state.messages = messages
             
             # Create a ReAct agent that can execute tools automatically
-            react_agent = create_react_agent(
-                model=self.llm,
-                tools=self.get_tools()
-            )
+            react_agent = self._get_react_agent()
             
             # Use the ReAct agent to process the request with tool execution
             # Request intermediate steps to avoid truncation of tool outputs
@@ -1062,6 +1076,7 @@ Start execution immediately following this workflow!
         Returns:
             Dict containing the analysis results
         """
+        self.begin_request_scope()
         try:
             # Initialize state without pre-retrieved data - agent will retrieve as needed
             initial_state = NutritionAnalyzeWorkflowState(
@@ -1081,7 +1096,7 @@ Start execution immediately following this workflow!
                         "thread_id": f"nutrition-code-interpreter-{user_id}",
                         "recursion_limit": 35
                     },
-                    "callbacks": [LangChainTracer()]
+                    "callbacks": [get_tracer()]
                 }
             )
             
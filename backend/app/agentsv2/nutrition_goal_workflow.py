@@ -22,6 +22,7 @@ from langchain_core.tools import tool
 import json
 import re
 from app.agentsv2.nutrition_agent import NutritionAgentLangGraph
+from app.agentsv2.workflow_registry import get_agent
 from app.agentsv2.tools.nutrition_tools import internet_search_tool
 from app.agentsv2.tools.url_reader_tool import fetch_and_read_url
 from app.agentsv2.customer_workflow import ask_user_question
@@ -57,7 +58,7 @@ class NutritionalGoalWorkflow:
         self.memory = MemorySaver()
         self.workflow = self._build_workflow()
         # Prefer injected instance; otherwise create a local one
-        self.nutrition_agent = nutrition_agent_instance or NutritionAgentLangGraph()
+        self.nutrition_agent = nutrition_agent_instance or get_agent("nutrition")
 
     def _build_workflow(self):
         g = StateGraph(NutritionalGoalState)
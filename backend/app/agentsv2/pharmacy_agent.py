@@ -27,7 +27,7 @@ sys.path.insert(0, str(backend_path))
 
 from langgraph.graph import StateGraph, END, START
 from langgraph.prebuilt import ToolNode, tools_condition, create_react_agent
-from langchain_openai import ChatOpenAI
+from app.agentsv2.workflow_registry import get_chat_model, get_tracer
 from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, ToolMessage
 from langchain_core.tools import tool
 from app.core.config import settings
@@ -40,7 +40,6 @@ from app.configurations.pharmacy_config import PHARMACY_TABLES, PRIMARY_PHARMACY
 
 # LangSmith tracing imports
 from langsmith import Client
-from langchain.callbacks.tracers import LangChainTracer
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
@@ -164,14 +163,14 @@ class PharmacyAgentLangGraph:
                 os.environ["LANGCHAIN_PROJECT"] = settings.LANGCHAIN_PROJECT
         # Initialize two LLMs for different purposes
         # Basic analysis LLM for intent analysis, classification, etc.
-        self.llm = ChatOpenAI(
+        self.llm = get_chat_model(
             model=settings.PHARMACY_AGENT_MODEL,
             api_key=settings.OPENAI_API_KEY
         )
         
         # Vision LLM for image analysis only  
         vision_model = settings.PHARMACY_VISION_MODEL 
-        self.vision_llm = ChatOpenAI(
+        self.vision_llm = get_chat_model(
             model=vision_model,
             api_key=settings.OPENAI_API_KEY,
             timeout=300
@@ -1380,7 +1379,7 @@ class PharmacyAgentLangGraph:
             if hasattr(settings, 'LANGCHAIN_TRACING_V2') and settings.LANGCHAIN_TRACING_V2:
                 config = {
                     "configurable": {"thread_id": f"pharmacy-agent-{user_id}-{session_id}" if session_id is not None else f"pharmacy-agent-{user_id}"},
-                    "callbacks": [LangChainTracer()]
+                    "callbacks": [get_tracer()]
                 }
             if config:
                 result = await self.workflow.ainvoke(initial_state, config=config)
@@ -1527,12 +1526,32 @@ class PharmacyAgentLangGraph:
             
                     cursor.execute(insert_query, values)
                     bill_id = cursor.fetchone()[0]
-                    
-                    return {"success": True, "action": "inserted", "bill_id": bill_id}
+
+            self._mark_health_scores_stale(cleaned.get('user_id'), cleaned.get('bill_date'))
+            return {"success": True, "action": "inserted", "bill_id": bill_id}
             
         except Exception as e:
             return {"success": False, "action": "error", "error": str(e)}
 
+    @staticmethod
+    def _mark_health_scores_stale(user_id, bill_date) -> None:
+        """New bills change medication adherence; let the ML worker refresh stored health scores"""
+        from app.core.database_utils import get_db_session
+        from app.health_scoring.invalidation import mark_scores_stale
+        from app.utils.sqs_client import get_ml_worker_client
+        try:
+            since = datetime.strptime(str(bill_date)[:10], "%Y-%m-%d").date() if bill_date else None
+        except ValueError:
+            since = None
+        try:
+            with get_db_session() as db:
+                mark_scores_stale(db, user_id, since)
+            ml_worker_client = get_ml_worker_client()
+            if ml_worker_client.is_enabled():
+                ml_worker_client.send_health_score_recompute_trigger(user_id=user_id)
+        except Exception as e:
+            logger.warning(f"⚠️ [PharmacyAgent] Failed to mark health scores stale for user {user_id}: {e}")
+
     def _insert_pharmacy_medications(self, medications_data: list) -> dict:
         """Insert multiple medication records for a pharmacy bill"""
         try:
@@ -1598,15 +1617,21 @@ class PharmacyAgentLangGraph:
         except Exception as e:
             return {"success": False, "action": "error", "error": str(e)}
 
-    async def _use_advanced_retrieval(self, user_request: str) -> Dict[str, Any]:
-        """Use LangGraph ReAct agent for retrieval (same logic as original ReAct agent)"""
-        try:
-            # Create a ReAct agent using LangGraph (replaces initialize_agent)
-            agent = create_react_agent(
+    def _get_retrieval_agent(self):
+        """SQL retrieval ReAct agent, compiled once per (shared) agent instance"""
+        if getattr(self, "_retrieval_agent", None) is None:
+            self._retrieval_agent = create_react_agent(
                 model=self.llm,
                 tools=self.tools,
                 prompt=PHARMACY_SQL_GENERATION_SYSTEM_PROMPT
             )
+        return self._retrieval_agent
+
+    async def _use_advanced_retrieval(self, user_request: str) -> Dict[str, Any]:
+        """Use LangGraph ReAct agent for retrieval (same logic as original ReAct agent)"""
+        try:
+            # Create a ReAct agent using LangGraph (replaces initialize_agent)
+            agent = self._get_retrieval_agent()
             
             # Run the agent (same as original ReAct agent logic) - use ainvoke for async tools
             result = await agent.ainvoke({"messages": [HumanMessage(content=user_request)]})
@@ -22,7 +22,6 @@ sys.path.insert(0, str(project_root))
 sys.path.insert(0, str(backend_path))
 
 from langgraph.graph import StateGraph, END, START
-from langchain_openai import ChatOpenAI
 from app.core.config import settings
 from app.utils.timezone import now_local, isoformat_now
 from app.configurations.pharmacy_config import PHARMACY_TABLES, PRIMARY_PHARMACY_TABLE
@@ -41,6 +40,7 @@ from langchain.callbacks.manager import CallbackManager
 
 # Import create_react_agent for simplified tool handling
 from langgraph.prebuilt import create_react_agent
+from app.agentsv2.workflow_registry import RequestScopedAttributes, get_chat_model, get_tracer
 from app.agentsv2.tools.pharmacy_tools import pharmacy_medication_search_tool
 
 @dataclass
@@ -82,13 +82,22 @@ class PharmacyAnalyzeWorkflowState:
     # LangGraph message handling
     messages: Annotated[Sequence[BaseMessage], operator.add] = field(default_factory=list)
 
-class PharmacyAnalyzeWorkflow:
+class PharmacyAnalyzeWorkflow(RequestScopedAttributes):
     """
     LangGraph-based analyze workflow for pharmacy data analysis.
     
     Thread-safe and designed for shared instance usage.
     All state is managed through PharmacyAnalyzeWorkflowState objects passed to methods.
     """
+
+    REQUEST_SCOPED_ATTRIBUTES = {
+        "current_user_id": lambda: None,
+        "current_data": dict,
+        "current_results": dict,
+        "current_plots": list,
+        "downloaded_plot_files": list,
+        "retrieved_data_json": lambda: None,
+    }
     
     def __init__(self, pharmacy_agent_instance=None):
         # Set up LangSmith tracing configuration
@@ -100,7 +109,7 @@ class PharmacyAnalyzeWorkflow:
             if hasattr(settings, 'LANGCHAIN_PROJECT') and settings.LANGCHAIN_PROJECT:
                 os.environ["LANGCHAIN_PROJECT"] = settings.LANGCHAIN_PROJECT
         
-        self.llm = ChatOpenAI(model=settings.PHARMACY_VISION_MODEL)
+        self.llm = get_chat_model(settings.PHARMACY_VISION_MODEL)
         
         # Store reference to the parent pharmacy agent for method reuse
         self.pharmacy_agent = pharmacy_agent_instance
@@ -370,6 +379,14 @@ class PharmacyAnalyzeWorkflow:
         
         return [medication_search_tool, retrieve_pharmacy_data, execute_python_code]
     
+    def _get_react_agent(self):
+        """ReAct agent over this workflow's tools, compiled once per instance"""
+        agent = self.__dict__.get("_react_agent")
+        if agent is None:
+            agent = create_react_agent(model=self.llm, tools=self.get_tools())
+            self._react_agent = agent
+        return agent
+
     def get_tools(self):
         """Get the list of available tools."""
         return self.tools
@@ -765,10 +782,7 @@ class PharmacyAnalyzeWorkflow:
                 state.messages = messages
             
             # Create a ReAct agent that can execute tools automatically
-            react_agent = create_react_agent(
-                model=self.llm,
-                tools=self.get_tools()
-            )
+            react_agent = self._get_react_agent()
             
             # Use the ReAct agent to process the request with tool execution
             result = await react_agent.ainvoke({"messages": state.messages})
@@ -997,6 +1011,7 @@ class PharmacyAnalyzeWorkflow:
         Returns:
             Dict containing the analysis results
         """
+        self.begin_request_scope()
         try:
             # Initialize state without pre-retrieved data - agent will retrieve as needed
             initial_state = PharmacyAnalyzeWorkflowState(
@@ -1016,7 +1031,7 @@ class PharmacyAnalyzeWorkflow:
                         "thread_id": f"pharmacy-code-interpreter-{user_id}",
                         "recursion_limit": 35
                     },
-                    "callbacks": [LangChainTracer()]
+                    "callbacks": [get_tracer()]
                 }
             )
             
@@ -0,0 +1,470 @@
+"""
+Durable, bounded LangGraph checkpointer backed by Postgres.
+
+Checkpoints are serialized with the saver's serde (msgpack under the default
+JsonPlusSerializer), zlib-compressed when large and stored in agent_checkpoints,
+so a follow-up landing on another uvicorn worker or after a restart resumes from
+the same thread state. Memory stays bounded: each thread keeps only its newest
+checkpoints within a count and byte budget, rows expire after a TTL, and the
+in-process hot cache is a size-limited LRU validated against the newest
+checkpoint id before use.
+"""
+import asyncio
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    WRITES_IDX_MAP,
+    get_checkpoint_id,
+)
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database_utils import get_db_session
+
+try:
+    from langgraph.checkpoint.base import get_checkpoint_metadata
+except ImportError:  # older langgraph-checkpoint
+    get_checkpoint_metadata = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSED_PREFIX = "z:"
+COMPRESS_MIN_BYTES = 1024
+
+
+class PostgresCheckpointSaver(BaseCheckpointSaver):
+    """LangGraph checkpoint saver using agent_checkpoints / agent_checkpoint_writes"""
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[int] = None,
+        max_checkpoints_per_thread: Optional[int] = None,
+        max_bytes_per_thread: Optional[int] = None,
+        cache_size: Optional[int] = None,
+    ):
+        super().__init__()
+        self.ttl_seconds = ttl_seconds or settings.AGENT_CHECKPOINT_TTL_SECONDS
+        self.max_checkpoints_per_thread = max_checkpoints_per_thread or settings.AGENT_CHECKPOINT_MAX_PER_THREAD
+        self.max_bytes_per_thread = max_bytes_per_thread or settings.AGENT_CHECKPOINT_MAX_BYTES_PER_THREAD
+        self.cache_size = cache_size if cache_size is not None else settings.AGENT_CHECKPOINT_CACHE_SIZE
+        self._cache: "OrderedDict[Tuple[str, str], CheckpointTuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._last_purge = 0.0
+
+    # ----- serialization -----
+
+    def _dump(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        if len(data) >= COMPRESS_MIN_BYTES:
+            return COMPRESSED_PREFIX + type_, zlib.compress(data)
+        return type_, data
+
+    def _load(self, type_: str, data: Any) -> Any:
+        data = bytes(data)
+        if type_.startswith(COMPRESSED_PREFIX):
+            type_, data = type_[len(COMPRESSED_PREFIX):], zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    # ----- hot cache -----
+
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[CheckpointTuple]:
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+
+    def _cache_put(self, key: Tuple[str, str], value: CheckpointTuple):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_drop(self, thread_id: str):
+        with self._cache_lock:
+            for key in [k for k in self._cache if k[0] == thread_id]:
+                del self._cache[key]
+
+    # ----- reads -----
+
+    @staticmethod
+    def _config_parts(config: RunnableConfig) -> Tuple[str, str]:
+        configurable = config["configurable"]
+        return str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")
+
+    def _row_to_tuple(self, db, row) -> CheckpointTuple:
+        writes = db.execute(text("""
+            SELECT task_id, channel, value_type, value
+            FROM agent_checkpoint_writes
+            WHERE thread_id = :thread_id AND checkpoint_ns = :checkpoint_ns AND checkpoint_id = :checkpoint_id
+            ORDER BY task_id, idx
+        """), {
+            "thread_id": row.thread_id,
+            "checkpoint_ns": row.checkpoint_ns,
+            "checkpoint_id": row.checkpoint_id,
+        }).fetchall()
+
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": row.thread_id,
+                    "checkpoint_ns": row.checkpoint_ns,
+                    "checkpoint_id": row.checkpoint_id,
+                }
+            },
+            checkpoint=self._load(row.checkpoint_type, row.checkpoint),
+            metadata=self._load(row.metadata_type, row.metadata),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": row.thread_id,
+                        "checkpoint_ns": row.checkpoint_ns,
+                        "checkpoint_id": row.parent_checkpoint_id,
+                    }
+                }
+                if row.parent_checkpoint_id else None
+            ),
+            pending_writes=[(w.task_id, w.channel, self._load(w.value_type, w.value)) for w in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id, checkpoint_ns = self._config_parts(config)
+        checkpoint_id = get_checkpoint_id(config)
+        key = (thread_id, checkpoint_ns)
+
+        with get_db_session() as db:
+            if not checkpoint_id:
+                # Cheap head lookup decides whether the cached tuple is still the newest
+                latest_id = db.execute(text("""
+                    SELECT checkpoint_id FROM agent_checkpoints
+                    WHERE thread_id = :thread_id AND checkpoint_ns = :checkpoint_ns AND expires_at > :now
+                    ORDER BY checkpoint_id DESC
+                    LIMIT 1
+                """), {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "now": datetime.utcnow()}).scalar()
+                if latest_id is None:
+                    return None
+                cached = self._cache_get(key)
+                if cached is not None and cached.config["configurable"]["checkpoint_id"] == latest_id:
+                    return cached
+                checkpoint_id = latest_id
+
+            row = db.execute(text("""
+                SELECT * FROM agent_checkpoints
+                WHERE thread_id = :thread_id AND checkpoint_ns = :checkpoint_ns
+                  AND checkpoint_id = :checkpoint_id AND expires_at > :now
+            """), {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+                "now": datetime.utcnow(),
+            }).fetchone()
+            if row is None:
+                return None
+            result = self._row_to_tuple(db, row)
+
+        if not get_checkpoint_id(config):
+            self._cache_put(key, result)
+        return result
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        clauses = ["expires_at > :now"]
+        params: Dict[str, Any] = {"now": datetime.utcnow()}
+        if config:
+            thread_id, checkpoint_ns = self._config_parts(config)
+            clauses.append("thread_id = :thread_id")
+            params["thread_id"] = thread_id
+            if "checkpoint_ns" in config["configurable"]:
+                clauses.append("checkpoint_ns = :checkpoint_ns")
+                params["checkpoint_ns"] = checkpoint_ns
+            if get_checkpoint_id(config):
+                clauses.append("checkpoint_id = :checkpoint_id")
+                params["checkpoint_id"] = get_checkpoint_id(config)
+        if before and get_checkpoint_id(before):
+            clauses.append("checkpoint_id < :before_id")
+            params["before_id"] = get_checkpoint_id(before)
+
+        # Metadata filters are applied after decoding, so the SQL limit only applies without them
+        sql = f"SELECT * FROM agent_checkpoints WHERE {' AND '.join(clauses)} ORDER BY checkpoint_id DESC"
+        if limit and not filter:
+            sql += " LIMIT :limit"
+            params["limit"] = limit
+
+        with get_db_session() as db:
+            rows = db.execute(text(sql), params).fetchall()
+            results = []
+            for row in rows:
+                item = self._row_to_tuple(db, row)
+                if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                results.append(item)
+                if limit and len(results) >= limit:
+                    break
+
+        yield from results
+
+    # ----- writes -----
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id, checkpoint_ns = self._config_parts(config)
+        parent_checkpoint_id = config["configurable"].get("checkpoint_id")
+        if get_checkpoint_metadata is not None:
+            metadata = get_checkpoint_metadata(config, metadata)
+
+        checkpoint_type, checkpoint_data = self._dump(checkpoint)
+        metadata_type, metadata_data = self._dump(metadata)
+        size_bytes = len(checkpoint_data) + len(metadata_data)
+        if size_bytes > self.max_bytes_per_thread:
+            logger.warning(
+                f"⚠️ [Checkpointer] Checkpoint for thread '{thread_id}' is {size_bytes} bytes, "
+                f"over the {self.max_bytes_per_thread} byte thread budget; keeping only this checkpoint"
+            )
+
+        with get_db_session() as db:
+            db.execute(text("""
+                INSERT INTO agent_checkpoints (
+                    thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                    checkpoint_type, checkpoint, metadata_type, metadata, size_bytes, expires_at
+                ) VALUES (
+                    :thread_id, :checkpoint_ns, :checkpoint_id, :parent_checkpoint_id,
+                    :checkpoint_type, :checkpoint, :metadata_type, :metadata, :size_bytes, :expires_at
+                )
+                ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id) DO UPDATE SET
+                    checkpoint_type = EXCLUDED.checkpoint_type,
+                    checkpoint = EXCLUDED.checkpoint,
+                    metadata_type = EXCLUDED.metadata_type,
+                    metadata = EXCLUDED.metadata,
+                    size_bytes = EXCLUDED.size_bytes,
+                    expires_at = EXCLUDED.expires_at
+            """), {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+                "parent_checkpoint_id": parent_checkpoint_id,
+                "checkpoint_type": checkpoint_type,
+                "checkpoint": checkpoint_data,
+                "metadata_type": metadata_type,
+                "metadata": metadata_data,
+                "size_bytes": size_bytes,
+                "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl_seconds),
+            })
+            self._evict_thread(db, thread_id, checkpoint_ns)
+
+        self._maybe_purge_expired()
+
+        new_config = {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+        self._cache_put((thread_id, checkpoint_ns), CheckpointTuple(
+            config=new_config,
+            checkpoint=checkpoint,
+            metadata=metadata,
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id}}
+                if parent_checkpoint_id else None
+            ),
+            pending_writes=[],
+        ))
+        return new_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id, checkpoint_ns = self._config_parts(config)
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_data = self._dump(value)
+            rows.append({
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+                "task_id": task_id,
+                "idx": WRITES_IDX_MAP.get(channel, idx),
+                "channel": channel,
+                "value_type": value_type,
+                "value": value_data,
+                "task_path": task_path,
+            })
+        if not rows:
+            return
+
+        # Special channels (errors, interrupts) overwrite; regular writes keep the first value
+        conflict = (
+            "DO UPDATE SET channel = EXCLUDED.channel, value_type = EXCLUDED.value_type, value = EXCLUDED.value"
+            if all(w[0] in WRITES_IDX_MAP for w in writes) else "DO NOTHING"
+        )
+        with get_db_session() as db:
+            db.execute(text(f"""
+                INSERT INTO agent_checkpoint_writes (
+                    thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, value_type, value, task_path
+                ) VALUES (
+                    :thread_id, :checkpoint_ns, :checkpoint_id, :task_id, :idx, :channel, :value_type, :value, :task_path
+                )
+                ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id, task_id, idx) {conflict}
+            """), rows)
+
+        cached = self._cache_get((thread_id, checkpoint_ns))
+        if cached is not None and cached.config["configurable"]["checkpoint_id"] == checkpoint_id:
+            cached.pending_writes.extend((task_id, channel, value) for channel, value in writes)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with get_db_session() as db:
+            db.execute(text("DELETE FROM agent_checkpoint_writes WHERE thread_id = :thread_id"), {"thread_id": str(thread_id)})
+            db.execute(text("DELETE FROM agent_checkpoints WHERE thread_id = :thread_id"), {"thread_id": str(thread_id)})
+        self._cache_drop(str(thread_id))
+
+    # ----- eviction -----
+
+    def _evict_thread(self, db, thread_id: str, checkpoint_ns: str):
+        """Keep only the newest checkpoints of a thread within the count and byte budgets"""
+        evicted = db.execute(text("""
+            DELETE FROM agent_checkpoints
+            WHERE thread_id = :thread_id AND checkpoint_ns = :checkpoint_ns
+              AND checkpoint_id IN (
+                SELECT checkpoint_id FROM (
+                    SELECT checkpoint_id,
+                           row_number() OVER (ORDER BY checkpoint_id DESC) AS rn,
+                           sum(size_bytes) OVER (ORDER BY checkpoint_id DESC) AS running_bytes
+                    FROM agent_checkpoints
+                    WHERE thread_id = :thread_id AND checkpoint_ns = :checkpoint_ns
+                ) ranked
+                WHERE rn > 1 AND (rn > :max_count OR running_bytes > :max_bytes)
+              )
+            RETURNING checkpoint_id
+        """), {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "max_count": self.max_checkpoints_per_thread,
+            "max_bytes": self.max_bytes_per_thread,
+        }).fetchall()
+        if evicted:
+            db.execute(text("""
+                DELETE FROM agent_checkpoint_writes
+                WHERE thread_id = :thread_id AND checkpoint_ns = :checkpoint_ns
+                  AND checkpoint_id = ANY(:checkpoint_ids)
+            """), {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_ids": [row.checkpoint_id for row in evicted],
+            })
+
+    def purge_expired(self) -> int:
+        """Delete expired checkpoints and their writes; returns the number of checkpoints removed"""
+        with get_db_session() as db:
+            deleted = db.execute(text("""
+                DELETE FROM agent_checkpoints WHERE expires_at <= :now
+                RETURNING thread_id, checkpoint_ns, checkpoint_id
+            """), {"now": datetime.utcnow()}).fetchall()
+            if deleted:
+                db.execute(text("""
+                    DELETE FROM agent_checkpoint_writes w
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM agent_checkpoints c
+                        WHERE c.thread_id = w.thread_id
+                          AND c.checkpoint_ns = w.checkpoint_ns
+                          AND c.checkpoint_id = w.checkpoint_id
+                    )
+                """))
+        if deleted:
+            logger.info(f"🧹 [Checkpointer] Purged {len(deleted)} expired checkpoints")
+        return len(deleted)
+
+    def _maybe_purge_expired(self):
+        now = time.monotonic()
+        if now - self._last_purge < settings.AGENT_CHECKPOINT_PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+        try:
+            self.purge_expired()
+        except Exception as e:
+            logger.warning(f"⚠️ [Checkpointer] Failed to purge expired checkpoints: {e}")
+
+    # ----- async API (DB work runs in the default executor) -----
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items: List[CheckpointTuple] = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+_checkpointer: Optional[PostgresCheckpointSaver] = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer() -> PostgresCheckpointSaver:
+    """Process-wide checkpointer shared by compiled workflows"""
+    global _checkpointer
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                _checkpointer = PostgresCheckpointSaver()
+    return _checkpointer
@@ -3,8 +3,10 @@ import sys
 from typing import List, Optional, Dict, Any, Literal
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+import asyncio
 import json
 import base64
+import time
 import uuid
 from app.utils.timezone import now_local, isoformat_now
 
@@ -18,7 +20,7 @@ sys.path.insert(0, str(project_root))
 sys.path.insert(0, str(backend_path))
 
 from langgraph.graph import StateGraph, END, START
-from langchain_openai import ChatOpenAI
+from app.agentsv2.workflow_registry import get_agent, get_chat_model, get_llm_semaphore
 from app.core.config import settings
 from app.core.database_utils import execute_query_safely_json, get_table_schema_safely, get_raw_db_connection, get_db_session
 import psycopg2
@@ -37,10 +39,6 @@ from app.models.chat_session import Prescription
 from app.models.clinical_notes import ClinicalNotes
 from app.db.session import SessionLocal
 
-# Import vitals and lab agents
-from app.agentsv2.vitals_agent import VitalsAgentLangGraph
-from app.agentsv2.lab_agent import LabAgentLangGraph
-
 load_dotenv()
 
 SQL_GENERATION_SYSTEM_PROMPT = """
@@ -159,19 +157,19 @@ class PrescriptionClinicalAgentLangGraph:
                 os.environ["LANGCHAIN_PROJECT"] = settings.LANGCHAIN_PROJECT
 
         # Use global configs with fallbacks
-        self.llm = ChatOpenAI(
+        self.llm = get_chat_model(
             model=settings.PRESCRIPTION_CLINICAL_AGENT_MODEL or settings.DEFAULT_AI_MODEL,
             api_key=settings.OPENAI_API_KEY
         )
-        self.vision_llm = ChatOpenAI(
+        self.vision_llm = get_chat_model(
             model=settings.PRESCRIPTION_CLINICAL_VISION_MODEL or "gpt-4o",
             api_key=settings.OPENAI_API_KEY,
             max_tokens=settings.PRESCRIPTION_CLINICAL_VISION_MAX_TOKENS or 4000
         )
         
-        # Initialize vitals and lab agents for processing respective data
-        self.vitals_agent = VitalsAgentLangGraph()
-        self.lab_agent = LabAgentLangGraph()
+        # Reuse the shared vitals and lab agents for processing respective data
+        self.vitals_agent = get_agent("vitals")
+        self.lab_agent = get_agent("lab")
         
         # Create tools and workflow
         self.tools = self._create_tools()
@@ -550,38 +548,38 @@ class PrescriptionClinicalAgentLangGraph:
         return "process_components"
 
     async def process_components(self, state: PrescriptionClinicalAgentState) -> PrescriptionClinicalAgentState:
-        """Process document based on detected components and route to appropriate agents"""
+        """Process document based on detected components and route to appropriate agents
+
+        Each detected component is an independent extraction over the same
+        document, so the branches run concurrently under the process-wide LLM
+        semaphore. A branch that fails or times out leaves its result empty
+        without affecting the others.
+        """
         try:
             self.log_execution_step(state, "process_components", "started", {
                 "detected_components": state.task_types
             })
             
-            # Process vitals if detected
-            if "vitals" in state.task_types:
-                self.log_execution_step(state, "process_components", "processing_vitals")
-                vitals_data = await self._extract_vitals_data(state)
-                state.extracted_vitals_data = vitals_data
-            
-            # Process biomarkers if detected
-            if "biomarkers" in state.task_types:
-                self.log_execution_step(state, "process_components", "processing_biomarkers")
-                biomarkers_data = await self._extract_biomarkers_data(state)
-                state.extracted_lab_data = biomarkers_data
-            
-            # Process prescriptions if detected
-            if "prescriptions" in state.task_types:
-                self.log_execution_step(state, "process_components", "processing_prescriptions")
-                prescription_data = await self._extract_prescription_data_internal(state)
-                state.extracted_prescription_data = prescription_data
-            
-            # Process clinical notes if detected
-            if "clinical_notes" in state.task_types:
-                self.log_execution_step(state, "process_components", "processing_clinical_notes")
-                clinical_data = await self._extract_clinical_data_internal(state)
-                state.extracted_clinical_data = clinical_data
+            # component -> (extractor, state attribute receiving the result)
+            branches = {
+                "vitals": (self._extract_vitals_data, "extracted_vitals_data"),
+                "biomarkers": (self._extract_biomarkers_data, "extracted_lab_data"),
+                "prescriptions": (self._extract_prescription_data_internal, "extracted_prescription_data"),
+                "clinical_notes": (self._extract_clinical_data_internal, "extracted_clinical_data"),
+            }
+            selected = [component for component in branches if component in state.task_types]
+            
+            started = time.perf_counter()
+            results = await asyncio.gather(*[
+                self._run_component(state, component, branches[component][0]) for component in selected
+            ])
+            for component, result in zip(selected, results):
+                setattr(state, branches[component][1], result)
             
             self.log_execution_step(state, "process_components", "completed", {
-                "processed_components": len(state.task_types)
+                "processed_components": len(state.task_types),
+                "extracted_components": [c for c, r in zip(selected, results) if r],
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1)
             })
             
         except Exception as e:
@@ -596,6 +594,28 @@ class PrescriptionClinicalAgentLangGraph:
         
         return state
 
+    async def _run_component(self, state: PrescriptionClinicalAgentState, component: str, extractor) -> Optional[Dict]:
+        """Run one extraction branch with a timeout, logging its timing; returns None on failure"""
+        timeout = settings.PRESCRIPTION_CLINICAL_COMPONENT_TIMEOUT_SECONDS
+        async with get_llm_semaphore():
+            self.log_execution_step(state, "process_components", f"processing_{component}")
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(extractor(state), timeout=timeout)
+                status = "completed" if result else "empty"
+                details = {}
+            except asyncio.TimeoutError:
+                result = None
+                status = "timeout"
+                details = {"timeout_seconds": timeout}
+            except Exception as e:
+                result = None
+                status = "failed"
+                details = {"error": str(e)}
+            details["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self.log_execution_step(state, "process_components", f"{component}_{status}", details)
+            return result
+
     async def extract_prescription_data(self, state: PrescriptionClinicalAgentState) -> PrescriptionClinicalAgentState:
         """Extract prescription data from image or text"""
         self.log_execution_step(state, "extract_prescription_data", "started")
@@ -862,18 +882,21 @@ class PrescriptionClinicalAgentLangGraph:
             self.log_execution_step(state, "retrieve_data", "failed", {"error": str(e)})
         return state
 
+    def _get_retrieval_agent(self):
+        """SQL retrieval ReAct agent, compiled once per (shared) agent instance"""
+        if getattr(self, "_retrieval_agent", None) is None:
+            self._retrieval_agent = create_react_agent(
+                model=self.llm,
+                tools=self.tools,
+                prompt=SQL_GENERATION_SYSTEM_PROMPT
+            )
+        return self._retrieval_agent
+
     async def _use_advanced_retrieval(self, user_request: str) -> Dict[str, Any]:
         """Use LangGraph ReAct agent for retrieval (same approach as lab agent)"""
         try:
-            # Use the comprehensive SQL generation system prompt
-            retrieval_system_prompt = SQL_GENERATION_SYSTEM_PROMPT
-            
             # Create a ReAct agent using LangGraph (same as lab agent approach)
-            agent = create_react_agent(
-                model=self.llm,
-                tools=self.tools,
-                prompt=retrieval_system_prompt
-            )
+            agent = self._get_retrieval_agent()
             
             # Run the agent - use ainvoke for async tools
             result = await agent.ainvoke({"messages": [HumanMessage(content=user_request)]})
@@ -1440,8 +1463,8 @@ class PrescriptionClinicalAgentLangGraph:
 
 # Convenience functions for external usage
 def get_prescription_clinical_agent() -> PrescriptionClinicalAgentLangGraph:
-    """Get a prescription clinical agent instance"""
-    return PrescriptionClinicalAgentLangGraph()
+    """Get the shared prescription clinical agent instance"""
+    return get_agent("prescription_clinical")
 
 async def extract_prescription_and_clinical_data(prompt: str, user_id: int, session_id: int = 1, image_path: str = None, image_base64: str = None, extracted_text: str = None) -> Dict:
     """Extract prescription and/or clinical data from document"""
@@ -1454,7 +1477,6 @@ async def retrieve_prescription_and_clinical_data(prompt: str, user_id: int, ses
     return await agent.process_request(prompt, user_id, session_id) 
 
 if __name__ == "__main__":
-    import asyncio
     agent = get_prescription_clinical_agent()
     image_path = "/Users/rajanishsd/Documents/zivohealth-1/backend/data/uploads/chat/5eb324be-354a-4f12-9355-2f9c1ef4b954_1_20250715_185147.jpg"
     
@@ -0,0 +1,139 @@
+"""
+LangChain callback handler that feeds a chat request's event stream (app/core/chat_stream.py).
+
+Attached to the customer workflow's invocation config, it publishes a ``node``
+event when one of the workflow's nodes starts and ``token`` events for every
+streamed LLM delta. Only the executor model is created with streaming enabled,
+so specialist agents running inside its tools do not emit tokens.
+
+The executor answers with a JSON object ({"title", "reasoning", "content", ...});
+AnswerFieldExtractor forwards only the characters of its "content" string as
+they arrive, and plain-text answers pass through unchanged.
+"""
+import json
+import re
+from typing import Any, Dict, Iterable, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from app.core.chat_stream import publish_chat_event
+
+_FIELD_START = r'(?<!\\)"{field}"\s*:\s*"'
+
+
+class AnswerFieldExtractor:
+    """Incrementally decode one string field of a streamed JSON object"""
+
+    def __init__(self, field: str = "content"):
+        self._pattern = re.compile(_FIELD_START.format(field=re.escape(field)))
+        self._buffer = ""
+        self._pos = 0
+        self._mode: Optional[str] = None  # None (undecided), "seek", "emit", "raw", "done"
+
+    def feed(self, token: str) -> str:
+        """Add a streamed token; returns the newly decoded answer text (may be empty)"""
+        if self._mode == "raw":
+            return token
+        if self._mode == "done":
+            return ""
+        self._buffer += token
+
+        if self._mode is None:
+            head = self._buffer.lstrip()
+            if not head:
+                return ""
+            if head[0] not in "{`":
+                self._mode = "raw"
+                return self._buffer
+            self._mode = "seek"
+
+        if self._mode == "seek":
+            match = self._pattern.search(self._buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+            self._mode = "emit"
+        return self._emit()
+
+    def _emit(self) -> str:
+        out = []
+        buf, pos = self._buffer, self._pos
+        while pos < len(buf):
+            char = buf[pos]
+            if char == '"':
+                self._mode = "done"
+                pos += 1
+                break
+            if char != "\\":
+                out.append(char)
+                pos += 1
+                continue
+            # Escape sequence: wait until it is complete
+            if pos + 1 >= len(buf):
+                break
+            length = 6 if buf[pos + 1] == "u" else 2
+            if length == 6 and pos + 6 <= len(buf) and buf[pos + 2:pos + 4].lower() in ("d8", "d9", "da", "db"):
+                length = 12  # high surrogate, decode together with its pair
+            if pos + length > len(buf):
+                break
+            try:
+                out.append(json.loads(f'"{buf[pos:pos + length]}"'))
+            except ValueError:
+                out.append(buf[pos + 1:pos + length])
+            pos += length
+        self._pos = pos
+        return "".join(out)
+
+
+class ChatStreamCallbackHandler(AsyncCallbackHandler):
+    """Publishes node transitions and answer token deltas for one chat request"""
+
+    def __init__(self, request_id: str, nodes: Optional[Iterable[str]] = None, field: str = "content"):
+        self.request_id = request_id
+        self.nodes = set(nodes) if nodes is not None else None
+        self.field = field
+        self.current_node: Optional[str] = None
+        self._extractors: Dict[UUID, AnswerFieldExtractor] = {}
+
+    async def on_chain_start(
+        self,
+        serialized: Optional[Dict[str, Any]],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        tags: Optional[list] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        if not node or node != kwargs.get("name"):
+            return
+        if self.nodes is not None and node not in self.nodes:
+            return
+        self.current_node = node
+        await publish_chat_event(self.request_id, "node", node=node)
+
+    async def on_llm_new_token(
+        self,
+        token: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        if not token:
+            return
+        extractor = self._extractors.get(run_id)
+        if extractor is None:
+            extractor = self._extractors[run_id] = AnswerFieldExtractor(self.field)
+        delta = extractor.feed(token)
+        if delta:
+            await publish_chat_event(self.request_id, "token", content=delta, node=self.current_node)
+
+    async def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._extractors.pop(run_id, None)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._extractors.pop(run_id, None)
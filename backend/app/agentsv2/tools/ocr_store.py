@@ -0,0 +1,175 @@
+"""
+Content-addressed store for OCR results.
+
+Documents are keyed by the SHA-256 of their bytes, so re-uploading the same lab
+PDF (under any file name or S3 key) reuses the Textract output instead of
+starting another job. Text is persisted per page in Postgres (ocr_documents /
+ocr_document_pages) and fronted by a size-limited in-process LRU; pages are
+loaded lazily, so asking for the first page of a long report reads one row.
+
+The store is best-effort: database errors are logged and treated as a miss so
+OCR keeps working without it.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import bindparam, text
+
+from app.core.config import settings
+from app.core.database_utils import get_db_session
+
+logger = logging.getLogger(__name__)
+
+
+class OCRStore:
+    """Per-page OCR text keyed by document SHA-256"""
+
+    def __init__(self, memory_entries: Optional[int] = None):
+        self.memory_entries = settings.OCR_STORE_MEMORY_ENTRIES if memory_entries is None else memory_entries
+        # sha256 -> {"page_count": int, "pages": {page_number: text}}
+        self._memory: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    # ----- memory tier -----
+
+    def _remember(self, sha256: str, page_count: int, pages: Dict[int, str]) -> None:
+        if self.memory_entries <= 0:
+            return
+        with self._lock:
+            entry = self._memory.get(sha256)
+            if entry is None:
+                entry = {"page_count": page_count, "pages": {}}
+                self._memory[sha256] = entry
+            entry["pages"].update(pages)
+            self._memory.move_to_end(sha256)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _recall(self, sha256: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._memory.get(sha256)
+            if entry is not None:
+                self._memory.move_to_end(sha256)
+            return entry
+
+    # ----- public API -----
+
+    def get_page_count(self, sha256: str) -> Optional[int]:
+        """Number of pages stored for a document, or None if it has not been OCR'd"""
+        entry = self._recall(sha256)
+        if entry is not None:
+            return entry["page_count"]
+
+        try:
+            with get_db_session() as db:
+                row = db.execute(
+                    text(
+                        """
+                        UPDATE ocr_documents SET last_used_at = CURRENT_TIMESTAMP
+                        WHERE content_sha256 = :sha256
+                        RETURNING page_count
+                        """
+                    ),
+                    {"sha256": sha256},
+                ).fetchone()
+        except Exception as e:
+            logger.warning(f"⚠️ [OCRStore] Lookup failed for {sha256[:12]}: {e}")
+            return None
+
+        if row is None:
+            return None
+        self._remember(sha256, row[0], {})
+        return row[0]
+
+    def get_pages(self, sha256: str, page_numbers: Iterable[int]) -> Optional[Dict[int, str]]:
+        """Text of the requested pages, loading only those not already in memory"""
+        wanted = sorted(set(page_numbers))
+        entry = self._recall(sha256)
+        cached = dict(entry["pages"]) if entry is not None else {}
+        missing = [n for n in wanted if n not in cached]
+
+        if missing:
+            try:
+                with get_db_session() as db:
+                    rows = db.execute(
+                        text(
+                            """
+                            SELECT page_number, text FROM ocr_document_pages
+                            WHERE content_sha256 = :sha256 AND page_number IN :page_numbers
+                            """
+                        ).bindparams(bindparam("page_numbers", expanding=True)),
+                        {"sha256": sha256, "page_numbers": missing},
+                    ).fetchall()
+            except Exception as e:
+                logger.warning(f"⚠️ [OCRStore] Page load failed for {sha256[:12]}: {e}")
+                return None
+
+            loaded = {row[0]: row[1] for row in rows}
+            if len(loaded) < len(missing):
+                return None
+            cached.update(loaded)
+            if entry is not None:
+                self._remember(sha256, entry["page_count"], loaded)
+
+        return {n: cached[n] for n in wanted}
+
+    def put(self, sha256: str, pages: Dict[int, str], page_count: int, source: str) -> None:
+        """Persist every page of a document; pages without text are stored as empty strings"""
+        pages = {n: pages.get(n, "") for n in range(1, page_count + 1)}
+        self._remember(sha256, page_count, pages)
+
+        try:
+            with get_db_session() as db:
+                inserted = db.execute(
+                    text(
+                        """
+                        INSERT INTO ocr_documents (content_sha256, page_count, char_count, source)
+                        VALUES (:sha256, :page_count, :char_count, :source)
+                        ON CONFLICT (content_sha256) DO NOTHING
+                        RETURNING content_sha256
+                        """
+                    ),
+                    {
+                        "sha256": sha256,
+                        "page_count": page_count,
+                        "char_count": sum(len(t) for t in pages.values()),
+                        "source": source,
+                    },
+                ).fetchone()
+                if inserted is None:
+                    # Another worker stored the same document first
+                    return
+                if pages:
+                    db.execute(
+                        text(
+                            """
+                            INSERT INTO ocr_document_pages (content_sha256, page_number, text)
+                            VALUES (:sha256, :page_number, :text)
+                            """
+                        ),
+                        [{"sha256": sha256, "page_number": n, "text": t} for n, t in pages.items()],
+                    )
+            logger.info(f"💾 [OCRStore] Stored {page_count} page(s) for {sha256[:12]} ({source})")
+        except Exception as e:
+            logger.warning(f"⚠️ [OCRStore] Failed to persist {sha256[:12]}: {e}")
+
+
+_store: Optional[OCRStore] = None
+_store_lock = threading.Lock()
+
+
+def get_ocr_store() -> OCRStore:
+    """Process-wide OCRStore"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = OCRStore()
+    return _store
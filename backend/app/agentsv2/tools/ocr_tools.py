@@ -6,13 +6,18 @@ More reliable and doesn't require local OCR dependencies.
 """
 
 import os
+import asyncio
 import logging
 import base64
 import hashlib
-from typing import List, Dict, Union, Optional
+import time
+import uuid
+from typing import List, Dict, Union, Optional, Tuple
+from urllib.parse import urlparse
 from langchain.tools import Tool
 from pathlib import Path
 from app.utils.timezone import now_local, isoformat_now
+from app.agentsv2.tools.ocr_store import OCRStore, get_ocr_store
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -28,11 +33,15 @@ except ImportError:
     logging.warning("AWS boto3 not available. Install boto3 for Textract OCR")
 
 
+class _TextractJobError(Exception):
+    """Textract job failure; the message is what the extraction methods return"""
+
+
 class OCRToolkit:
     """Toolkit for extracting text from images and PDFs using AWS Textract"""
     
-    # Class-level cache shared across all instances to prevent duplicate processing
-    _shared_ocr_cache = {}
+    # Textract jobs currently running in this process, keyed by document SHA-256
+    _inflight_jobs: Dict[str, "asyncio.Task"] = {}
     
     # Class-level flag to ensure logger is configured only once
     _logger_configured = False
@@ -62,6 +71,7 @@ class OCRToolkit:
             OCRToolkit._logger_configured = True
         
         self.supported_formats = ['.jpg', '.jpeg', '.png', '.pdf']
+        self.ocr_store = get_ocr_store()
         
         # S3 configuration for async processing
         self.s3_bucket = getattr(settings, 'AWS_S3_BUCKET', 'zivohealth-textract-temp')
@@ -104,30 +114,6 @@ class OCRToolkit:
             self.is_textract_ready = False
             self.logger.warning("AWS Textract tools are not available due to missing boto3 dependency")
     
-    def _get_file_cache_key(self, file_path: Path) -> str:
-        """Generate a cache key for a file based on path and modification time"""
-        try:
-            stat = file_path.stat()
-            # Use file path, size, and modification time to create a unique cache key
-            key_data = f"{file_path}_{stat.st_size}_{stat.st_mtime}"
-            return hashlib.md5(key_data.encode()).hexdigest()
-        except Exception:
-            # If we can't get file stats, just use the path
-            return hashlib.md5(str(file_path).encode()).hexdigest()
-    
-    def _get_cached_result(self, cache_key: str) -> Optional[str]:
-        """Get cached OCR result if it exists"""
-        return OCRToolkit._shared_ocr_cache.get(cache_key)
-    
-    def _cache_result(self, cache_key: str, result: str) -> None:
-        """Cache OCR result"""
-        # Limit cache size to prevent memory issues
-        if len(OCRToolkit._shared_ocr_cache) > 100:
-            # Remove oldest entry
-            oldest_key = next(iter(OCRToolkit._shared_ocr_cache))
-            del OCRToolkit._shared_ocr_cache[oldest_key]
-        OCRToolkit._shared_ocr_cache[cache_key] = result
-
     def get_tools(self) -> List[Tool]:
         """Get all OCR tools"""
         return [self.get_text_extraction_tool()]
@@ -179,6 +165,11 @@ class OCRToolkit:
                 self.logger.error("❌ [OCR] AWS Textract not available for image processing")
                 return "AWS Textract not available"
             
+            sha256 = OCRStore.content_hash(image_bytes)
+            stored = self._load_stored_pages(sha256, "first")
+            if stored is not None:
+                return stored.get(1, "").strip() or "No text found in image"
+            
             self.logger.debug(f"🔧 [OCR] Calling AWS Textract detect_document_text for image ({len(image_bytes)} bytes)")
             
             # Use detect_document_text for simple text extraction
@@ -195,6 +186,7 @@ class OCRToolkit:
                     text_blocks.append(block['Text'])
             
             extracted_text = '\n'.join(text_blocks)
+            self.ocr_store.put(sha256, {1: extracted_text}, 1, source="textract_image")
             result = extracted_text.strip() if extracted_text else "No text found in image"
             self.logger.info(f"✅ [OCR] AWS Textract extracted {len(result)} characters from image")
             return result
@@ -221,6 +213,9 @@ class OCRToolkit:
         """
         Extract text from PDF bytes using AWS Textract async API with S3 upload
         
+        Results are stored by content hash, so the same PDF is only sent to
+        Textract once. Prefer aextract_text_from_pdf_bytes from async code.
+        
         Args:
             pdf_bytes: PDF file content as bytes
             pages: Pages to extract. Options:
@@ -232,162 +227,63 @@ class OCRToolkit:
         Returns:
             Extracted text from specified pages
         """
-        import time
-        import uuid
+        if not self.is_textract_ready or not self.textract_client or not self.s3_client:
+            self.logger.error("❌ [OCR] AWS Textract or S3 not available for PDF processing")
+            return "AWS Textract or S3 not available"
         
-        s3_key = None
         try:
-            if not self.is_textract_ready or not self.textract_client or not self.s3_client:
-                self.logger.error("❌ [OCR] AWS Textract or S3 not available for PDF processing")
-                return "AWS Textract or S3 not available"
-            
-            self.logger.debug(f"🔧 [OCR] Starting async text detection for PDF ({len(pdf_bytes)} bytes)")
+            self.logger.debug(f"🔧 [OCR] Starting text detection for PDF ({len(pdf_bytes)} bytes)")
             if pages:
                 self.logger.debug(f"📄 [OCR] Page filter requested: {pages}")
             
-            # Upload PDF to S3 first
-            s3_key = f"textract-temp/{uuid.uuid4()}.pdf"
-            self.logger.debug(f"📤 [OCR] Uploading PDF to S3: s3://{self.s3_bucket}/{s3_key}")
+            sha256 = OCRStore.content_hash(pdf_bytes)
+            stored = self._load_stored_pages(sha256, pages)
+            if stored is not None:
+                return self._render_pages(stored)
             
+            s3_key = self._upload_temp_pdf(pdf_bytes)
             try:
-                self.s3_client.put_object(
-                    Bucket=self.s3_bucket,
-                    Key=s3_key,
-                    Body=pdf_bytes,
-                    ContentType='application/pdf'
-                )
-                self.logger.info(f"✅ [OCR] PDF uploaded to S3 successfully")
-            except ClientError as s3_error:
-                self.logger.error(f"❌ [OCR] Failed to upload PDF to S3: {s3_error}")
-                return f"Failed to upload PDF to S3: {s3_error}"
-            
-            # Start async text detection using S3 location
-            response = self.textract_client.start_document_text_detection(
-                DocumentLocation={
-                    'S3Object': {
-                        'Bucket': self.s3_bucket,
-                        'Name': s3_key
-                    }
-                }
-            )
-            
-            job_id = response['JobId']
-            self.logger.debug(f"📋 [OCR] Started async job with ID: {job_id}")
-            
-            # Poll for completion
-            max_wait_time = 300  # Maximum 5 minutes for larger documents
-            poll_interval = 2    # Poll every 2 seconds
-            total_wait = 0
+                job_id = self._start_textract_job(self.s3_bucket, s3_key)
+                response = self._wait_for_textract_job(job_id)
+                page_texts, page_count = self._finish_textract_job(job_id, response, sha256, store_response=True)
+            finally:
+                self._delete_temp_pdf(s3_key)
             
-            while total_wait < max_wait_time:
-                self.logger.debug(f"⏳ [OCR] Polling job status (waited {total_wait}s)")
-                
-                response = self.textract_client.get_document_text_detection(JobId=job_id)
-                status = response['JobStatus']
-                
-                if status == 'SUCCEEDED':
-                    self.logger.info(f"✅ [OCR] Async job completed successfully after {total_wait}s")
-                    break
-                elif status == 'FAILED':
-                    error_msg = response.get('StatusMessage', 'Unknown error')
-                    self.logger.error(f"❌ [OCR] Async job failed: {error_msg}")
-                    return f"PDF processing failed: {error_msg}"
-                elif status in ['IN_PROGRESS']:
-                    time.sleep(poll_interval)
-                    total_wait += poll_interval
-                else:
-                    self.logger.warning(f"⚠️ [OCR] Unexpected job status: {status}")
-                    time.sleep(poll_interval)
-                    total_wait += poll_interval
-            
-            if total_wait >= max_wait_time:
-                self.logger.error(f"❌ [OCR] Async job timed out after {max_wait_time}s")
-                return "PDF processing timed out. Please try with a smaller document."
-            
-            # Extract text from all pages and store AWS response
-            all_text_blocks = []  # Store all text blocks with page info
-            next_token = None
-            page_count = 0
-            all_responses = []  # Store all response data
-            current_page = 0
-            
-            while True:
-                if next_token:
-                    response = self.textract_client.get_document_text_detection(
-                        JobId=job_id, NextToken=next_token
-                    )
-                else:
-                    response = self.textract_client.get_document_text_detection(JobId=job_id)
-                
-                # Store this response batch
-                all_responses.append(response)
-                
-                # Process blocks from this batch
-                for block in response.get('Blocks', []):
-                    if block['BlockType'] == 'PAGE':
-                        current_page += 1
-                        page_count = current_page
-                    elif block['BlockType'] == 'LINE':
-                        # Store text with page information
-                        all_text_blocks.append({
-                            'text': block['Text'],
-                            'page': current_page
-                        })
-                
-                next_token = response.get('NextToken')
-                if not next_token:
-                    break
-            
-            # Store the complete AWS response to file
-            self._store_aws_response(job_id, all_responses, page_count)
-            
-            # Filter text blocks based on pages parameter
-            filtered_text_blocks = self._filter_text_blocks_by_pages(all_text_blocks, pages, page_count)
-            
-            extracted_text = '\n'.join([block['text'] for block in filtered_text_blocks])
-            result = extracted_text.strip() if extracted_text else "No text found in specified pages"
-            
-            # Log extraction results
-            extracted_pages = set(block['page'] for block in filtered_text_blocks)
-            if pages:
-                page_text = "page" if len(extracted_pages) == 1 else "pages"
-                self.logger.info(f"✅ [OCR] Successfully extracted {len(result)} characters from {len(extracted_pages)} {page_text} (pages: {sorted(extracted_pages)})")
-            else:
-                page_text = "page" if page_count == 1 else "pages"
-                self.logger.info(f"✅ [OCR] Successfully extracted {len(result)} characters from {page_count} {page_text}")
-            
-            return result
+            return self._render_pages(self._select_pages(page_texts, page_count, pages))
+        except Exception as e:
+            return self._textract_error_message(e)
+
+    async def aextract_text_from_pdf_bytes(self, pdf_bytes: bytes, pages: Union[str, List[int], None] = None) -> str:
+        """
+        Async variant of _extract_text_from_pdf_bytes.
+
+        The Textract job is polled with asyncio.sleep instead of holding a
+        thread, and concurrent requests for the same document share one job.
+        """
+        if not self.is_textract_ready or not self.textract_client or not self.s3_client:
+            self.logger.error("❌ [OCR] AWS Textract or S3 not available for PDF processing")
+            return "AWS Textract or S3 not available"
+        
+        try:
+            sha256 = OCRStore.content_hash(pdf_bytes)
+            stored = await asyncio.to_thread(self._load_stored_pages, sha256, pages)
+            if stored is not None:
+                return self._render_pages(stored)
             
-        except ClientError as e:
-            error_code = e.response['Error']['Code']
-            self.logger.error(f"❌ [OCR] AWS Textract async error: {error_code} - {e.response['Error']['Message']}")
-            if error_code == 'InvalidDocumentException':
-                return "Invalid PDF format or corrupted PDF"
-            elif error_code == 'UnsupportedDocumentException':
-                return "PDF format not supported or too large"
-            else:
-                return f"AWS Textract error: {error_code}"
-        except NoCredentialsError as e:
-            self.logger.error(f"❌ [OCR] AWS credentials not found for PDF: {e}")
-            return "AWS credentials not configured"
+            page_texts, page_count = await self._run_textract_once(
+                sha256, lambda: self._atextract_pdf_bytes(pdf_bytes, sha256)
+            )
+            return self._render_pages(self._select_pages(page_texts, page_count, pages))
         except Exception as e:
-            self.logger.error(f"❌ [OCR] Error processing PDF with Textract: {e}")
-            self.logger.error(f"❌ [OCR] Exception type: {type(e).__name__}")
-            return f"Error processing PDF: {str(e)}"
-        finally:
-            # Clean up S3 object
-            if s3_key and self.s3_client:
-                try:
-                    self.s3_client.delete_object(Bucket=self.s3_bucket, Key=s3_key)
-                    self.logger.debug(f"🗑️ [OCR] Cleaned up S3 object: s3://{self.s3_bucket}/{s3_key}")
-                except Exception as cleanup_error:
-                    self.logger.warning(f"⚠️ [OCR] Failed to cleanup S3 object: {cleanup_error}")
+            return self._textract_error_message(e)
 
     def _extract_text_from_pdf_s3_uri(self, s3_uri: str, pages: Union[str, List[int], None] = None) -> str:
         """
         Extract text from a PDF already stored in S3 using AWS Textract async API.
 
-        Assumes the input is an s3:// URI; does NOT upload the file again.
+        Assumes the input is an s3:// URI; does NOT upload the file again. The
+        object is hashed first so a previously OCR'd document is served from the
+        store. Prefer aextract_text_from_pdf_s3_uri from async code.
 
         Args:
             s3_uri: The S3 URI to the PDF, e.g., s3://bucket/key/to/file.pdf
@@ -396,86 +292,235 @@ class OCRToolkit:
         Returns:
             Extracted text from specified pages or an error string starting with a bracketed tag.
         """
-        import time
-        from urllib.parse import urlparse
+        if not self.is_textract_ready or not self.textract_client:
+            self.logger.error("❌ [OCR] AWS Textract not available for S3 PDF processing")
+            return "AWS Textract not available"
+
+        location = self._parse_s3_uri(s3_uri)
+        if location is None:
+            return "Invalid S3 URI"
+        bucket, key = location
 
         try:
-            if not self.is_textract_ready or not self.textract_client:
-                self.logger.error("❌ [OCR] AWS Textract not available for S3 PDF processing")
-                return "AWS Textract not available"
+            self.logger.debug(f"📤 [OCR] Starting text detection for S3 PDF: s3://{bucket}/{key}")
+            if pages:
+                self.logger.debug(f"📄 [OCR] Page filter requested: {pages}")
 
-            parsed = urlparse(s3_uri)
-            if parsed.scheme != "s3" or not parsed.netloc or not parsed.path:
-                return "Invalid S3 URI"
+            sha256 = self._hash_s3_object(bucket, key)
+            if sha256:
+                stored = self._load_stored_pages(sha256, pages)
+                if stored is not None:
+                    return self._render_pages(stored)
 
-            bucket = parsed.netloc
-            key = parsed.path.lstrip('/')
+            job_id = self._start_textract_job(bucket, key)
+            response = self._wait_for_textract_job(job_id)
+            page_texts, page_count = self._finish_textract_job(job_id, response, sha256)
+            return self._render_pages(self._select_pages(page_texts, page_count, pages))
+        except Exception as e:
+            return self._textract_error_message(e, "S3 PDF")
 
-            self.logger.debug(f"📤 [OCR] Starting async text detection for S3 PDF: s3://{bucket}/{key}")
-            if pages:
-                self.logger.debug(f"📄 [OCR] Page filter requested: {pages}")
+    async def aextract_text_from_pdf_s3_uri(self, s3_uri: str, pages: Union[str, List[int], None] = None) -> str:
+        """Async variant of _extract_text_from_pdf_s3_uri (see aextract_text_from_pdf_bytes)"""
+        if not self.is_textract_ready or not self.textract_client:
+            self.logger.error("❌ [OCR] AWS Textract not available for S3 PDF processing")
+            return "AWS Textract not available"
 
-            # Start async text detection using S3 location
-            response = self.textract_client.start_document_text_detection(
-                DocumentLocation={'S3Object': {'Bucket': bucket, 'Name': key}}
-            )
+        location = self._parse_s3_uri(s3_uri)
+        if location is None:
+            return "Invalid S3 URI"
+        bucket, key = location
 
-            job_id = response['JobId']
-            self.logger.debug(f"📋 [OCR] Started async job with ID: {job_id}")
-
-            # Poll for completion
-            max_wait_time = 300
-            poll_interval = 2
-            total_wait = 0
-
-            while total_wait < max_wait_time:
-                self.logger.debug(f"⏳ [OCR] Polling job status (waited {total_wait}s)")
-                response = self.textract_client.get_document_text_detection(JobId=job_id)
-                status = response['JobStatus']
-
-                if status == 'SUCCEEDED':
-                    self.logger.info(f"✅ [OCR] Async job completed successfully after {total_wait}s")
-                    break
-                if status == 'FAILED':
-                    error_msg = response.get('StatusMessage', 'Unknown error')
-                    self.logger.error(f"❌ [OCR] Async job failed: {error_msg}")
-                    return f"PDF processing failed: {error_msg}"
-
-                time.sleep(poll_interval)
-                total_wait += poll_interval
-
-            if total_wait >= max_wait_time:
-                self.logger.error(f"❌ [OCR] Async job timed out after {max_wait_time}s")
-                return "PDF processing timed out. Please try with a smaller document."
-
-            # Collect and process results
-            all_text_blocks: List[Dict] = []
-            next_token = None
-            page_count = 0
-            current_page = 0
-
-            while True:
-                if next_token:
-                    response = self.textract_client.get_document_text_detection(JobId=job_id, NextToken=next_token)
-                else:
-                    response = self.textract_client.get_document_text_detection(JobId=job_id)
+        try:
+            sha256 = await asyncio.to_thread(self._hash_s3_object, bucket, key)
+            if not sha256:
+                page_texts, page_count = await self._atextract_s3_object(bucket, key, None)
+                return self._render_pages(self._select_pages(page_texts, page_count, pages))
 
-                for block in response.get('Blocks', []):
-                    if block['BlockType'] == 'PAGE':
-                        current_page += 1
-                        page_count = current_page
-                    elif block['BlockType'] == 'LINE':
-                        all_text_blocks.append({'text': block['Text'], 'page': current_page})
+            stored = await asyncio.to_thread(self._load_stored_pages, sha256, pages)
+            if stored is not None:
+                return self._render_pages(stored)
 
-                next_token = response.get('NextToken')
-                if not next_token:
-                    break
+            page_texts, page_count = await self._run_textract_once(
+                sha256, lambda: self._atextract_s3_object(bucket, key, sha256)
+            )
+            return self._render_pages(self._select_pages(page_texts, page_count, pages))
+        except Exception as e:
+            return self._textract_error_message(e, "S3 PDF")
 
-            filtered_text_blocks = self._filter_text_blocks_by_pages(all_text_blocks, pages, page_count)
-            extracted_text = '\n'.join([blk['text'] for blk in filtered_text_blocks])
-            return extracted_text.strip() if extracted_text else "No text found in specified pages"
+    # ----- Textract job plumbing (shared by the sync and async entry points) -----
 
-        except ClientError as e:
+    @staticmethod
+    def _parse_s3_uri(s3_uri: str) -> Optional[Tuple[str, str]]:
+        parsed = urlparse(s3_uri)
+        if parsed.scheme != "s3" or not parsed.netloc or not parsed.path:
+            return None
+        return parsed.netloc, parsed.path.lstrip('/')
+
+    def _hash_s3_object(self, bucket: str, key: str) -> Optional[str]:
+        """SHA-256 of an S3 object, streamed; None if it cannot be read (the store is then skipped)"""
+        if not self.s3_client:
+            return None
+        try:
+            body = self.s3_client.get_object(Bucket=bucket, Key=key)['Body']
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: body.read(1024 * 1024), b''):
+                digest.update(chunk)
+            return digest.hexdigest()
+        except Exception as e:
+            self.logger.warning(f"⚠️ [OCR] Could not hash s3://{bucket}/{key}, skipping OCR store: {e}")
+            return None
+
+    def _load_stored_pages(self, sha256: str, pages: Union[str, List[int], None]) -> Optional[Dict[int, str]]:
+        """Text of the requested pages from the OCR store, or None if the document was never OCR'd"""
+        page_count = self.ocr_store.get_page_count(sha256)
+        if page_count is None:
+            return None
+        page_texts = self.ocr_store.get_pages(sha256, self._select_page_numbers(pages, page_count))
+        if page_texts is not None:
+            self.logger.info(f"📋 [OCR] Using stored result for document {sha256[:12]} ({page_count} pages)")
+        return page_texts
+
+    def _upload_temp_pdf(self, pdf_bytes: bytes) -> str:
+        s3_key = f"textract-temp/{uuid.uuid4()}.pdf"
+        self.logger.debug(f"📤 [OCR] Uploading PDF to S3: s3://{self.s3_bucket}/{s3_key}")
+        try:
+            self.s3_client.put_object(
+                Bucket=self.s3_bucket,
+                Key=s3_key,
+                Body=pdf_bytes,
+                ContentType='application/pdf'
+            )
+        except ClientError as s3_error:
+            self.logger.error(f"❌ [OCR] Failed to upload PDF to S3: {s3_error}")
+            raise _TextractJobError(f"Failed to upload PDF to S3: {s3_error}")
+        self.logger.info(f"✅ [OCR] PDF uploaded to S3 successfully")
+        return s3_key
+
+    def _delete_temp_pdf(self, s3_key: str) -> None:
+        try:
+            self.s3_client.delete_object(Bucket=self.s3_bucket, Key=s3_key)
+            self.logger.debug(f"🗑️ [OCR] Cleaned up S3 object: s3://{self.s3_bucket}/{s3_key}")
+        except Exception as cleanup_error:
+            self.logger.warning(f"⚠️ [OCR] Failed to cleanup S3 object: {cleanup_error}")
+
+    def _start_textract_job(self, bucket: str, key: str) -> str:
+        response = self.textract_client.start_document_text_detection(
+            DocumentLocation={'S3Object': {'Bucket': bucket, 'Name': key}}
+        )
+        job_id = response['JobId']
+        self.logger.debug(f"📋 [OCR] Started async job with ID: {job_id}")
+        return job_id
+
+    def _poll_textract_job(self, job_id: str, waited: float) -> Optional[Dict]:
+        """One status check; returns the first result page once the job has succeeded"""
+        self.logger.debug(f"⏳ [OCR] Polling job status (waited {waited:.0f}s)")
+        response = self.textract_client.get_document_text_detection(JobId=job_id)
+        status = response['JobStatus']
+
+        if status == 'SUCCEEDED':
+            self.logger.info(f"✅ [OCR] Async job completed successfully after {waited:.0f}s")
+            return response
+        if status == 'FAILED':
+            error_msg = response.get('StatusMessage', 'Unknown error')
+            self.logger.error(f"❌ [OCR] Async job failed: {error_msg}")
+            raise _TextractJobError(f"PDF processing failed: {error_msg}")
+        if status != 'IN_PROGRESS':
+            self.logger.warning(f"⚠️ [OCR] Unexpected job status: {status}")
+        if waited >= settings.OCR_TEXTRACT_MAX_WAIT_SECONDS:
+            self.logger.error(f"❌ [OCR] Async job timed out after {waited:.0f}s")
+            raise _TextractJobError("PDF processing timed out. Please try with a smaller document.")
+        return None
+
+    @staticmethod
+    def _next_poll_delay(delay: float) -> float:
+        return min(delay * 1.5, settings.OCR_TEXTRACT_POLL_MAX_SECONDS)
+
+    def _wait_for_textract_job(self, job_id: str) -> Dict:
+        waited, delay = 0.0, settings.OCR_TEXTRACT_POLL_INITIAL_SECONDS
+        while True:
+            response = self._poll_textract_job(job_id, waited)
+            if response is not None:
+                return response
+            time.sleep(delay)
+            waited += delay
+            delay = self._next_poll_delay(delay)
+
+    async def _await_textract_job(self, job_id: str) -> Dict:
+        waited, delay = 0.0, settings.OCR_TEXTRACT_POLL_INITIAL_SECONDS
+        while True:
+            response = await asyncio.to_thread(self._poll_textract_job, job_id, waited)
+            if response is not None:
+                return response
+            await asyncio.sleep(delay)
+            waited += delay
+            delay = self._next_poll_delay(delay)
+
+    def _finish_textract_job(
+        self, job_id: str, response: Dict, sha256: Optional[str], store_response: bool = False
+    ) -> Tuple[Dict[int, str], int]:
+        """Collect every result page of a finished job into per-page text and persist it"""
+        page_lines: Dict[int, List[str]] = {}
+        all_responses = []
+        current_page = 0
+
+        while True:
+            all_responses.append(response)
+            for block in response.get('Blocks', []):
+                if block['BlockType'] == 'PAGE':
+                    current_page += 1
+                elif block['BlockType'] == 'LINE':
+                    page_lines.setdefault(current_page, []).append(block['Text'])
+
+            next_token = response.get('NextToken')
+            if not next_token:
+                break
+            response = self.textract_client.get_document_text_detection(JobId=job_id, NextToken=next_token)
+
+        if store_response:
+            self._store_aws_response(job_id, all_responses, current_page)
+
+        page_texts = {page: '\n'.join(lines) for page, lines in page_lines.items()}
+        if sha256:
+            self.ocr_store.put(sha256, page_texts, current_page, source="textract")
+        return page_texts, current_page
+
+    async def _atextract_pdf_bytes(self, pdf_bytes: bytes, sha256: str) -> Tuple[Dict[int, str], int]:
+        s3_key = await asyncio.to_thread(self._upload_temp_pdf, pdf_bytes)
+        try:
+            job_id = await asyncio.to_thread(self._start_textract_job, self.s3_bucket, s3_key)
+            response = await self._await_textract_job(job_id)
+            return await asyncio.to_thread(self._finish_textract_job, job_id, response, sha256, True)
+        finally:
+            await asyncio.to_thread(self._delete_temp_pdf, s3_key)
+
+    async def _atextract_s3_object(self, bucket: str, key: str, sha256: Optional[str]) -> Tuple[Dict[int, str], int]:
+        job_id = await asyncio.to_thread(self._start_textract_job, bucket, key)
+        response = await self._await_textract_job(job_id)
+        return await asyncio.to_thread(self._finish_textract_job, job_id, response, sha256)
+
+    async def _run_textract_once(self, sha256: str, job_factory) -> Tuple[Dict[int, str], int]:
+        """Run the job as a task, letting concurrent requests for the same document await it"""
+        loop = asyncio.get_running_loop()
+        task = OCRToolkit._inflight_jobs.get(sha256)
+        if task is not None and task.get_loop() is loop:
+            self.logger.info(f"⏳ [OCR] Joining in-flight Textract job for document {sha256[:12]}")
+        else:
+            task = loop.create_task(job_factory())
+            OCRToolkit._inflight_jobs[sha256] = task
+
+            def _forget(done_task):
+                if OCRToolkit._inflight_jobs.get(sha256) is done_task:
+                    del OCRToolkit._inflight_jobs[sha256]
+
+            task.add_done_callback(_forget)
+        # Shielded so one caller being cancelled does not abort the job for the others
+        return await asyncio.shield(task)
+
+    def _textract_error_message(self, e: Exception, source: str = "PDF") -> str:
+        """Map a Textract/S3 failure to the error strings callers check for"""
+        if isinstance(e, _TextractJobError):
+            return str(e)
+        if isinstance(e, ClientError):
             error_code = e.response['Error']['Code']
             self.logger.error(f"❌ [OCR] AWS Textract async error: {error_code} - {e.response['Error']['Message']}")
             if error_code == 'InvalidDocumentException':
@@ -483,40 +528,51 @@ class OCRToolkit:
             if error_code == 'UnsupportedDocumentException':
                 return "PDF format not supported or too large"
             return f"AWS Textract error: {error_code}"
-        except NoCredentialsError as e:
+        if isinstance(e, NoCredentialsError):
             self.logger.error(f"❌ [OCR] AWS credentials not found for PDF: {e}")
             return "AWS credentials not configured"
-        except Exception as e:
-            self.logger.error(f"❌ [OCR] Error processing S3 PDF with Textract: {e}")
-            self.logger.error(f"❌ [OCR] Exception type: {type(e).__name__}")
-            return f"Error processing PDF: {str(e)}"
+        self.logger.error(f"❌ [OCR] Error processing {source} with Textract: {e}")
+        self.logger.error(f"❌ [OCR] Exception type: {type(e).__name__}")
+        return f"Error processing PDF: {str(e)}"
+
+    def _select_pages(self, page_texts: Dict[int, str], page_count: int, pages: Union[str, List[int], None]) -> Dict[int, str]:
+        return {n: page_texts.get(n, "") for n in self._select_page_numbers(pages, page_count)}
+
+    def _render_pages(self, page_texts: Dict[int, str]) -> str:
+        """Join the selected pages' text in page order"""
+        extracted_pages = [n for n in sorted(page_texts) if page_texts[n]]
+        extracted_text = '\n'.join(page_texts[n] for n in extracted_pages)
+        result = extracted_text.strip() if extracted_text else "No text found in specified pages"
+        page_text = "page" if len(extracted_pages) == 1 else "pages"
+        self.logger.info(f"✅ [OCR] Successfully extracted {len(result)} characters from {len(extracted_pages)} {page_text} (pages: {extracted_pages})")
+        return result
     
-    def _filter_text_blocks_by_pages(self, all_text_blocks: List[Dict], pages: Union[str, List[int], None], total_pages: int) -> List[Dict]:
+    def _select_page_numbers(self, pages: Union[str, List[int], None], total_pages: int) -> List[int]:
         """
-        Filter text blocks based on pages parameter
+        Resolve the pages parameter to 1-based page numbers
         
         Args:
-            all_text_blocks: List of text blocks with page information
             pages: Pages to extract (None/"all", "first", "last", or List[int])
             total_pages: Total number of pages in the document
             
         Returns:
-            Filtered list of text blocks
+            Sorted list of valid page numbers
         """
-        if not all_text_blocks:
+        all_pages = list(range(1, total_pages + 1))
+        if not all_pages:
             return []
         
         # Handle None or "all" - return all pages
         if pages is None or pages == "all":
-            return all_text_blocks
+            return all_pages
         
         # Handle "first" - return only first page
         if pages == "first":
-            return [block for block in all_text_blocks if block['page'] == 1]
+            return [1]
         
         # Handle "last" - return only last page
         if pages == "last":
-            return [block for block in all_text_blocks if block['page'] == total_pages]
+            return [total_pages]
         
         # Handle list of page numbers
         if isinstance(pages, list):
@@ -530,13 +586,12 @@ class OCRToolkit:
             
             if not valid_pages:
                 self.logger.warning(f"⚠️ [OCR] No valid page numbers found in {pages}")
-                return []
             
-            return [block for block in all_text_blocks if block['page'] in valid_pages]
+            return sorted(set(valid_pages))
         
         # Invalid pages parameter - log warning and return all pages
         self.logger.warning(f"⚠️ [OCR] Invalid pages parameter: {pages}. Returning all pages.")
-        return all_text_blocks
+        return all_pages
     
     def get_document_analysis_tool(self) -> Tool:
         """Get tool for analyzing document structure using AWS Textract"""
@@ -655,16 +710,6 @@ class OCRToolkit:
         Returns:
             Extracted text from specified pages
         """
-        # Generate cache key including pages parameter
-        pages_key = str(pages) if pages else "all"
-        cache_key = f"{self._get_file_cache_key(file_path)}_{pages_key}"
-        
-        # Check cache first
-        cached_result = self._get_cached_result(cache_key)
-        if cached_result:
-            self.logger.info(f"📋 [OCR] Using cached result for PDF: {file_path.name}")
-            return cached_result
-        
         self.logger.info(f"🔍 [OCR] Starting PDF text extraction for: {file_path.name}")
         if not self.is_textract_ready:
             # Fallback for when AWS credentials are not configured
@@ -686,8 +731,6 @@ class OCRToolkit:
                 self.logger.error(f"❌ [OCR] PDF processing failed: {result}")
                 return f"[OCR ERROR] {result}"
             
-            # Cache the successful result
-            self._cache_result(cache_key, result)
             self.logger.info(f"✅ [OCR] Successfully extracted {len(result)} characters from PDF: {file_path.name}")
             return result
         except Exception as e:
@@ -697,15 +740,6 @@ class OCRToolkit:
     
     def _extract_text_from_image(self, file_path: Path) -> str:
         """Extract text from image file - public method with fallback"""
-        # Generate cache key
-        cache_key = self._get_file_cache_key(file_path)
-        
-        # Check cache first
-        cached_result = self._get_cached_result(cache_key)
-        if cached_result:
-            self.logger.info(f"📋 [OCR] Using cached result for image: {file_path.name}")
-            return cached_result
-        
         self.logger.info(f"🔍 [OCR] Starting image text extraction for: {file_path.name}")
         
         if not self.is_textract_ready:
@@ -728,8 +762,6 @@ class OCRToolkit:
                 self.logger.error(f"❌ [OCR] Image processing failed: {result}")
                 return f"[OCR ERROR] {result}"
             
-            # Cache the successful result
-            self._cache_result(cache_key, result)
             self.logger.info(f"✅ [OCR] Successfully extracted {len(result)} characters from image: {file_path.name}")
             return result
         except Exception as e:
@@ -2,6 +2,11 @@
 """
 URL Reader Tool
 Fetch and read content from URLs (HTML and PDF) with local caching.
+
+Each URL's raw download and its extracted text/title/pages are cached under
+data/web_cache. A cached entry is served without network access for
+URL_CACHE_REVALIDATE_SECONDS, then revalidated with a conditional GET; the
+cache is kept under URL_CACHE_MAX_BYTES by evicting least recently used entries.
 """
 
 from __future__ import annotations
@@ -10,6 +15,9 @@ import asyncio
 import hashlib
 import json
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, Optional
@@ -40,6 +48,27 @@ class FetchResult:
     meta_path: str
 
 
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0 Safari/537.36"
+)
+
+# Bump when _read_html/_read_pdf output changes so stored extractions are rebuilt
+EXTRACTOR_VERSION = 1
+RAW_EXTENSIONS = (".pdf", ".html")
+
+# url hash -> [lock, holders]; concurrent fetches of one URL wait for the first
+_url_locks: Dict[str, list] = {}
+_url_locks_guard = threading.Lock()
+
+
+class _TooLarge(Exception):
+    def __init__(self, content_length: Optional[int], content_type: str):
+        super().__init__("File exceeds size limit")
+        self.content_length = content_length
+        self.content_type = content_type
+
+
 def _ensure_dir(directory: Path) -> None:
     directory.mkdir(parents=True, exist_ok=True)
 
@@ -48,75 +77,171 @@ def _hash_url(url: str) -> str:
     return hashlib.sha256(url.encode("utf-8")).hexdigest()
 
 
-def _detect_content_type(url: str, timeout: float = 10.0) -> Dict[str, Optional[str]]:
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0 Safari/537.36"
-        )
-    }
+def _cache_dir() -> Path:
+    # Choose cache directory under backend/data to persist across runs
+    base_dir = Path(settings.BASE_DIR if hasattr(settings, "BASE_DIR") else ".").resolve()
+    # Default to backend/data/web_cache relative to repo root
+    repo_root = base_dir
+    # Try to detect repository root if BASE_DIR points to backend/app
+    if (base_dir / "app").exists() and (base_dir.parent / "data").exists():
+        repo_root = base_dir.parent
+    return repo_root / "data" / "web_cache"
+
+
+@contextmanager
+def _url_lock(key: str):
+    with _url_locks_guard:
+        entry = _url_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
     try:
-        head = requests.head(url, headers=headers, allow_redirects=True, timeout=timeout)
-        ct = head.headers.get("Content-Type")
-        etag = head.headers.get("ETag")
-        lm = head.headers.get("Last-Modified")
-        cl = head.headers.get("Content-Length")
-        return {"content_type": ct, "etag": etag, "last_modified": lm, "content_length": cl}
+        with entry[0]:
+            yield
+    finally:
+        with _url_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                _url_locks.pop(key, None)
+
+
+def _load_meta(meta_path: Path) -> Optional[Dict[str, Any]]:
+    """Cached entry metadata, or None if missing or its raw file is gone"""
+    try:
+        with open(meta_path, "r", encoding="utf-8") as m:
+            meta = json.load(m)
     except Exception:
-        return {"content_type": None, "etag": None, "last_modified": None, "content_length": None}
+        return None
+    if not meta.get("path") or not Path(meta["path"]).exists():
+        return None
+    return meta
 
 
-def _download_to_cache(url: str, cache_dir: Path, max_bytes: int, meta: Dict[str, Optional[str]]) -> Path:
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0 Safari/537.36"
-        )
-    }
-    # Determine extension
-    content_type = (meta.get("content_type") or "").lower()
-    ext = ".pdf" if "pdf" in content_type or url.lower().endswith(".pdf") else ".html"
-    file_hash = _hash_url(url)
-    file_path = cache_dir / f"{file_hash}{ext}"
-    meta_path = cache_dir / f"{file_hash}.json"
+def _write_meta(meta_path: Path, meta: Dict[str, Any]) -> None:
+    tmp_path = meta_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as m:
+        json.dump(meta, m)
+    os.replace(tmp_path, meta_path)
+
 
-    # If we already have the file, respect cache
-    if file_path.exists() and meta_path.exists():
-        return file_path
+def _download_to_cache(url: str, cache_dir: Path, file_hash: str, max_bytes: int, meta: Optional[Dict[str, Any]]):
+    """GET the URL into the cache, conditionally when validators are known
+
+    Returns (path, headers); path is None when the origin answered 304 Not Modified.
+    """
+    headers = {"User-Agent": USER_AGENT}
+    if meta:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
 
     with requests.get(url, headers=headers, stream=True, timeout=20) as r:
+        if r.status_code == 304 and meta:
+            return None, r.headers
         r.raise_for_status()
+
+        content_type = (r.headers.get("Content-Type") or "").lower()
+        declared_len = None
+        try:
+            if r.headers.get("Content-Length") is not None:
+                declared_len = int(r.headers["Content-Length"])
+        except ValueError:
+            declared_len = None
+        # Check declared size before downloading
+        if declared_len is not None and declared_len > max_bytes:
+            raise _TooLarge(declared_len, content_type)
+
+        ext = ".pdf" if "pdf" in content_type or url.lower().endswith(".pdf") else ".html"
+        file_path = cache_dir / f"{file_hash}{ext}"
+        part_path = cache_dir / f"{file_hash}.part"
         total = 0
-        _ensure_dir(cache_dir)
-        with open(file_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=65536):
-                if not chunk:
-                    continue
-                total += len(chunk)
-                if total > max_bytes:
-                    f.close()
-                    try:
-                        file_path.unlink(missing_ok=True)  # type: ignore[arg-type]
-                    except Exception:
-                        pass
-                    raise ValueError("File exceeds size limit")
-                f.write(chunk)
-
-    # Write metadata for future conditional requests
-    try:
-        meta_out = {
-            "url": url,
-            "etag": meta.get("etag"),
-            "last_modified": meta.get("last_modified"),
-            "content_type": content_type or ("application/pdf" if ext == ".pdf" else "text/html"),
-            "path": str(file_path),
-        }
-        with open(meta_path, "w", encoding="utf-8") as m:
-            json.dump(meta_out, m)
-    except Exception:
-        pass
+        try:
+            with open(part_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size=65536):
+                    if not chunk:
+                        continue
+                    total += len(chunk)
+                    if total > max_bytes:
+                        raise _TooLarge(declared_len, content_type)
+                    f.write(chunk)
+            os.replace(part_path, file_path)
+        finally:
+            part_path.unlink(missing_ok=True)
+
+    # A URL that switched between HTML and PDF leaves a stale raw file behind
+    for other in RAW_EXTENSIONS:
+        if other != ext:
+            (cache_dir / f"{file_hash}{other}").unlink(missing_ok=True)
+    return file_path, r.headers
+
+
+def _extract(path: Path, content_type: str) -> Dict[str, Any]:
+    if path.suffix.lower() == ".pdf" or "pdf" in content_type:
+        result = _read_pdf(path)
+    else:
+        result = _read_html(path)
+    if not result.content_type:
+        result.content_type = "application/pdf" if path.suffix.lower() == ".pdf" else "text/html"
+    return {
+        "content_type": result.content_type,
+        "byte_size": result.byte_size,
+        "title": result.title,
+        "text": result.text,
+        "pages": result.pages,
+    }
 
-    return file_path
+
+def _cached_response(url: str, meta: Dict[str, Any], meta_path: Path) -> Dict[str, Any]:
+    """Serve a stored extraction, re-parsing only if it predates EXTRACTOR_VERSION"""
+    if meta.get("extractor_version") != EXTRACTOR_VERSION or not meta.get("result"):
+        meta["result"] = _extract(Path(meta["path"]), (meta.get("content_type") or "").lower())
+        meta["extractor_version"] = EXTRACTOR_VERSION
+        _write_meta(meta_path, meta)
+    else:
+        # The meta file's mtime is the entry's last access for LRU eviction
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+    return {
+        "url": url,
+        **meta["result"],
+        "cache_path": meta["path"],
+        "meta_path": str(meta_path),
+    }
+
+
+def _enforce_quota(cache_dir: Path, keep: str) -> None:
+    """Evict least recently used entries until the cache fits URL_CACHE_MAX_BYTES"""
+    limit = settings.URL_CACHE_MAX_BYTES
+    if limit <= 0:
+        return
+
+    entries: Dict[str, Dict[str, Any]] = {}
+    for path in cache_dir.iterdir():
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entry = entries.setdefault(path.name.split(".", 1)[0], {"size": 0, "accessed": 0.0, "paths": []})
+        entry["size"] += stat.st_size
+        entry["paths"].append(path)
+        if path.name.endswith(".json"):
+            entry["accessed"] = stat.st_mtime
+
+    total = sum(entry["size"] for entry in entries.values())
+    if total <= limit:
+        return
+    # Entries without metadata (orphans) sort first
+    for key, entry in sorted(entries.items(), key=lambda item: item[1]["accessed"]):
+        if total <= limit:
+            break
+        with _url_locks_guard:
+            busy = key in _url_locks
+        if key == keep or busy:
+            continue
+        for path in entry["paths"]:
+            path.unlink(missing_ok=True)
+        total -= entry["size"]
 
 
 def _read_html(path: Path) -> FetchResult:
@@ -202,71 +327,70 @@ def _read_pdf(path: Path) -> FetchResult:
     )
 
 
+def _too_large(url: str, max_bytes: int, e: _TooLarge) -> Dict[str, Any]:
+    return {
+        "url": url,
+        "error": "too_large",
+        "too_large": True,
+        "limit_bytes": max_bytes,
+        "content_length_bytes": e.content_length,
+        "content_type": e.content_type,
+    }
+
+
 def _fetch_and_read_sync(url: str, max_bytes: int = 10_000_000) -> Dict[str, Any]:
-    # Choose cache directory under backend/data to persist across runs
-    base_dir = Path(settings.BASE_DIR if hasattr(settings, "BASE_DIR") else ".").resolve()
-    # Default to backend/data/web_cache relative to repo root
-    repo_root = base_dir
-    # Try to detect repository root if BASE_DIR points to backend/app
-    if (base_dir / "app").exists() and (base_dir.parent / "data").exists():
-        repo_root = base_dir.parent
-    cache_dir = repo_root / "data" / "web_cache"
+    cache_dir = _cache_dir()
     _ensure_dir(cache_dir)
+    file_hash = _hash_url(url)
+    meta_path = cache_dir / f"{file_hash}.json"
 
-    # Detect content type and metadata
-    meta = _detect_content_type(url)
-    # Check declared size before downloading
-    declared_len = None
-    try:
-        if meta.get("content_length") is not None:
-            declared_len = int(meta.get("content_length"))  # type: ignore[arg-type]
-    except Exception:
-        declared_len = None
-    if declared_len is not None and declared_len > max_bytes:
-        return {
+    with _url_lock(file_hash):
+        meta = _load_meta(meta_path)
+        if meta and time.time() - meta.get("checked_at", 0) < settings.URL_CACHE_REVALIDATE_SECONDS:
+            return _cached_response(url, meta, meta_path)
+
+        try:
+            file_path, headers = _download_to_cache(url, cache_dir, file_hash, max_bytes, meta)
+        except _TooLarge as e:
+            return _too_large(url, max_bytes, e)
+        except Exception:
+            if meta:
+                # Origin unreachable or erroring: a stale copy beats no copy
+                return _cached_response(url, meta, meta_path)
+            raise
+
+        if file_path is None:
+            # 304 Not Modified: keep the stored extraction, refresh validators
+            meta["checked_at"] = time.time()
+            meta["etag"] = headers.get("ETag") or meta.get("etag")
+            meta["last_modified"] = headers.get("Last-Modified") or meta.get("last_modified")
+            _write_meta(meta_path, meta)
+            return _cached_response(url, meta, meta_path)
+
+        content_type = (headers.get("Content-Type") or "").lower()
+        result = _extract(file_path, content_type)
+        meta = {
             "url": url,
-            "error": "too_large",
-            "too_large": True,
-            "limit_bytes": max_bytes,
-            "content_length_bytes": declared_len,
-            "content_type": meta.get("content_type") or "",
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "content_type": content_type or result["content_type"],
+            "path": str(file_path),
+            "checked_at": time.time(),
+            "extractor_version": EXTRACTOR_VERSION,
+            "result": result,
         }
+        _write_meta(meta_path, meta)
 
     try:
-        file_path = _download_to_cache(url, cache_dir, max_bytes, meta)
-    except ValueError as e:
-        # Catch explicit size limit breaches during streaming
-        if "size limit" in str(e).lower():
-            return {
-                "url": url,
-                "error": "too_large",
-                "too_large": True,
-                "limit_bytes": max_bytes,
-                "content_length_bytes": declared_len,
-                "content_type": meta.get("content_type") or "",
-            }
-        raise
-    content_type = (meta.get("content_type") or "").lower()
-
-    if file_path.suffix.lower() == ".pdf" or "pdf" in content_type:
-        result = _read_pdf(file_path)
-    else:
-        result = _read_html(file_path)
-
-    # Attach URL and recompute content-type by extension if missing
-    result.url = url
-    if not result.content_type:
-        result.content_type = "application/pdf" if file_path.suffix.lower() == ".pdf" else "text/html"
+        _enforce_quota(cache_dir, keep=file_hash)
+    except Exception:
+        pass
 
     return {
-        "url": result.url,
-        "content_type": result.content_type,
-        "byte_size": result.byte_size,
-        "title": result.title,
-        "text": result.text,
-        "pages": result.pages,
-        "cache_path": result.cache_path,
-        "meta_path": result.meta_path,
+        "url": url,
+        **result,
+        "cache_path": str(file_path),
+        "meta_path": str(meta_path),
     }
 
 
@@ -276,7 +400,8 @@ async def fetch_and_read_url(url: str, max_bytes: Optional[int] = None) -> Dict[
     Fetch a URL and return extracted text content and metadata.
 
     - Supports HTML and PDF URLs
-    - Caches downloads under backend/data/web_cache to avoid re-downloading
+    - Caches downloads and their extracted text under backend/data/web_cache;
+      entries are revalidated with ETag/Last-Modified and evicted LRU past a disk quota
     - For PDFs, uses PyPDF2 text extraction, falling back to AWS Textract OCR when needed
 
     Args:
@@ -28,7 +28,7 @@ sys.path.insert(0, str(backend_path))
 
 from langgraph.graph import StateGraph, END, START
 from langgraph.prebuilt import ToolNode, tools_condition, create_react_agent
-from langchain_openai import ChatOpenAI
+from app.agentsv2.workflow_registry import get_chat_model, get_tracer
 from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, ToolMessage
 from langchain_core.tools import tool
 from app.core.config import settings
@@ -45,7 +45,6 @@ from app.utils.unit_converter import VitalUnitConverter, UnitConversionError
 
 # LangSmith tracing imports
 from langsmith import Client
-from langchain.callbacks.tracers import LangChainTracer
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
@@ -172,14 +171,14 @@ class VitalsAgentLangGraph:
                 os.environ["LANGCHAIN_PROJECT"] = settings.LANGCHAIN_PROJECT
         # Initialize two LLMs for different purposes
         # Basic analysis LLM for intent analysis, classification, etc.
-        self.llm = ChatOpenAI(
+        self.llm = get_chat_model(
             model=settings.VITALS_AGENT_MODEL ,
             api_key=settings.OPENAI_API_KEY
         )
         
         # Vision LLM for image analysis only  
         vision_model = settings.VITALS_VISION_MODEL
-        self.vision_llm = ChatOpenAI(
+        self.vision_llm = get_chat_model(
             model=vision_model,
             api_key=settings.OPENAI_API_KEY,
             timeout=300
@@ -1071,7 +1070,7 @@ IMPORTANT:
             if hasattr(settings, 'LANGCHAIN_TRACING_V2') and settings.LANGCHAIN_TRACING_V2:
                 config = {
                     "configurable": {"thread_id": f"vitals-agent-{user_id}-{session_id}" if session_id is not None else f"vitals-agent-{user_id}"},
-                    "callbacks": [LangChainTracer()]
+                    "callbacks": [get_tracer()]
                 }
             if config:
                 result = await self.workflow.ainvoke(initial_state, config=config)
@@ -1189,15 +1188,21 @@ IMPORTANT:
 
 
 
-    async def _use_advanced_retrieval(self, user_request: str) -> Dict[str, Any]:
-        """Use LangGraph ReAct agent for retrieval (same logic as original ReAct agent)"""
-        try:
-            # Create a ReAct agent using LangGraph (replaces initialize_agent)
-            agent = create_react_agent(
+    def _get_retrieval_agent(self):
+        """SQL retrieval ReAct agent, compiled once per (shared) agent instance"""
+        if getattr(self, "_retrieval_agent", None) is None:
+            self._retrieval_agent = create_react_agent(
                 model=self.llm,
                 tools=self.tools,
                 prompt=VITALS_SQL_GENERATION_SYSTEM_PROMPT
             )
+        return self._retrieval_agent
+
+    async def _use_advanced_retrieval(self, user_request: str) -> Dict[str, Any]:
+        """Use LangGraph ReAct agent for retrieval (same logic as original ReAct agent)"""
+        try:
+            # Create a ReAct agent using LangGraph (replaces initialize_agent)
+            agent = self._get_retrieval_agent()
             
             # Run the agent (same as original ReAct agent logic) - use ainvoke for async tools
             result = await agent.ainvoke({"messages": [HumanMessage(content=user_request)]})
@@ -22,7 +22,6 @@ sys.path.insert(0, str(project_root))
 sys.path.insert(0, str(backend_path))
 
 from langgraph.graph import StateGraph, END, START
-from langchain_openai import ChatOpenAI
 from app.core.config import settings
 from app.utils.timezone import now_local, isoformat_now
 from app.configurations.vitals_config import VITALS_TABLES, PRIMARY_VITALS_TABLE
@@ -41,6 +40,7 @@ from langchain.callbacks.manager import CallbackManager
 
 # Import create_react_agent for simplified tool handling
 from langgraph.prebuilt import create_react_agent
+from app.agentsv2.workflow_registry import RequestScopedAttributes, get_chat_model, get_tracer
 from app.agentsv2.tools.web_search_tool import web_search_tool
 
 @dataclass
@@ -82,13 +82,22 @@ class VitalsAnalyzeWorkflowState:
     # LangGraph message handling
     messages: Annotated[Sequence[BaseMessage], operator.add] = field(default_factory=list)
 
-class VitalsAnalyzeWorkflow:
+class VitalsAnalyzeWorkflow(RequestScopedAttributes):
     """
     LangGraph-based analyze workflow for vitals data analysis.
     
     Thread-safe and designed for shared instance usage.
     All state is managed through VitalsAnalyzeWorkflowState objects passed to methods.
     """
+
+    REQUEST_SCOPED_ATTRIBUTES = {
+        "current_user_id": lambda: None,
+        "current_data": dict,
+        "current_results": dict,
+        "current_plots": list,
+        "downloaded_plot_files": list,
+        "retrieved_data_json": lambda: None,
+    }
     
     def __init__(self, vitals_agent_instance=None):
         # Set up LangSmith tracing configuration
@@ -100,7 +109,7 @@ class VitalsAnalyzeWorkflow:
             if hasattr(settings, 'LANGCHAIN_PROJECT') and settings.LANGCHAIN_PROJECT:
                 os.environ["LANGCHAIN_PROJECT"] = settings.LANGCHAIN_PROJECT
         
-        self.llm = ChatOpenAI(model=settings.DEFAULT_AI_MODEL)
+        self.llm = get_chat_model(settings.DEFAULT_AI_MODEL)
         
         # Store reference to the parent vitals agent for method reuse
         self.vitals_agent = vitals_agent_instance
@@ -370,6 +379,14 @@ class VitalsAnalyzeWorkflow:
         
         return [web_search, retrieve_vitals_data, execute_python_code]
     
+    def _get_react_agent(self):
+        """ReAct agent over this workflow's tools, compiled once per instance"""
+        agent = self.__dict__.get("_react_agent")
+        if agent is None:
+            agent = create_react_agent(model=self.llm, tools=self.get_tools())
+            self._react_agent = agent
+        return agent
+
     def get_tools(self):
         """Get the list of available tools."""
         return self.tools
@@ -829,10 +846,7 @@ class VitalsAnalyzeWorkflow:
                 state.messages = messages
             
             # Create a ReAct agent that can execute tools automatically
-            react_agent = create_react_agent(
-                model=self.llm,
-                tools=self.get_tools()
-            )
+            react_agent = self._get_react_agent()
             
             # Use the ReAct agent to process the request with tool execution
             result = await react_agent.ainvoke({"messages": state.messages})
@@ -1049,6 +1063,7 @@ class VitalsAnalyzeWorkflow:
         Returns:
             Dict containing the analysis results
         """
+        self.begin_request_scope()
         try:
             # Initialize state without pre-retrieved data - agent will retrieve as needed
             initial_state = VitalsAnalyzeWorkflowState(
@@ -1068,7 +1083,7 @@ class VitalsAnalyzeWorkflow:
                         "thread_id": f"vitals-code-interpreter-{user_id}",
                         "recursion_limit": 35
                     },
-                    "callbacks": [LangChainTracer()]
+                    "callbacks": [get_tracer()]
                 }
             )
             
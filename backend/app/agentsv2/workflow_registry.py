@@ -0,0 +1,246 @@
+"""
+Process-wide registry of compiled LangGraph workflows, agent instances and LLM clients.
+
+Building a StateGraph, compiling it and constructing ChatOpenAI clients is
+expensive, so each is done once per process and shared by every request.
+Per-request data must therefore travel only through graph state and the
+invocation config; agents obtained here must not keep request data on self
+(analyze workflows use RequestScopedAttributes for their scratch state).
+"""
+import asyncio
+import importlib
+import logging
+import threading
+import time
+import weakref
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# name -> (module, class) for specialist agents shared across requests
+AGENT_CLASSES: Dict[str, Tuple[str, str]] = {
+    "vitals": ("app.agentsv2.vitals_agent", "VitalsAgentLangGraph"),
+    "nutrition": ("app.agentsv2.nutrition_agent", "NutritionAgentLangGraph"),
+    "pharmacy": ("app.agentsv2.pharmacy_agent", "PharmacyAgentLangGraph"),
+    "lab": ("app.agentsv2.lab_agent", "LabAgentLangGraph"),
+    "prescription_clinical": ("app.agentsv2.prescription_clinical_agent", "PrescriptionClinicalAgentLangGraph"),
+}
+
+# Modules that register their workflow builders on import
+WORKFLOW_MODULES: List[str] = [
+    "app.agentsv2.customer_workflow",
+    "app.agentsv2.document_workflow",
+    "app.agentsv2.medical_doctor_workflow",
+]
+
+_lock = threading.RLock()
+_chat_models: Dict[Tuple[Any, ...], Any] = {}
+_builders: Dict[str, Callable[[], Any]] = {}
+_workflows: Dict[str, Any] = {}
+_agents: Dict[str, Any] = {}
+_metrics: Dict[str, Dict[str, Any]] = {}
+_tracer = None
+_llm_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _record(kind: str, name: str, build_ms: float):
+    _metrics[f"{kind}:{name}"] = {
+        "kind": kind,
+        "name": name,
+        "build_ms": round(build_ms, 2),
+        "built_at": time.time(),
+        "hits": 0,
+    }
+    logger.info(f"🧩 [WorkflowRegistry] Built {kind} '{name}' in {build_ms:.1f}ms")
+
+
+def _hit(kind: str, name: str):
+    entry = _metrics.get(f"{kind}:{name}")
+    if entry is not None:
+        entry["hits"] += 1
+
+
+def get_chat_model(model: Optional[str], **kwargs) -> Any:
+    """Shared ChatOpenAI client for (model, kwargs); clients are stateless and safe to reuse"""
+    key = (model, tuple(sorted(kwargs.items())))
+    with _lock:
+        client = _chat_models.get(key)
+        if client is None:
+            from langchain_openai import ChatOpenAI
+            started = time.perf_counter()
+            client = ChatOpenAI(model=model, **kwargs)
+            _chat_models[key] = client
+            _record("llm", str(model), (time.perf_counter() - started) * 1000)
+        else:
+            _hit("llm", str(model))
+        return client
+
+
+def get_tracer() -> Any:
+    """Shared LangChainTracer; runs are tracked by run_id so one instance serves all requests"""
+    global _tracer
+    with _lock:
+        if _tracer is None:
+            from langchain.callbacks.tracers import LangChainTracer
+            _tracer = LangChainTracer()
+        return _tracer
+
+
+def get_llm_semaphore() -> asyncio.Semaphore:
+    """Process-wide cap on concurrent LLM extraction branches (one semaphore per event loop)
+
+    Acquire it around a whole branch, not around nested calls, so an agent
+    holding a slot never waits on another slot.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        semaphore = _llm_semaphores.get(loop)
+        if semaphore is None:
+            from app.core.config import settings
+            semaphore = asyncio.Semaphore(max(1, settings.AGENT_LLM_MAX_CONCURRENCY))
+            _llm_semaphores[loop] = semaphore
+        return semaphore
+
+
+def register_workflow(name: str, builder: Callable[[], Any]):
+    """Register a zero-argument builder returning a compiled graph"""
+    with _lock:
+        _builders[name] = builder
+
+
+def get_compiled_workflow(name: str, builder: Optional[Callable[[], Any]] = None) -> Any:
+    """Return the compiled graph for ``name``, compiling it on first use"""
+    compiled = _workflows.get(name)
+    if compiled is not None:
+        _hit("workflow", name)
+        return compiled
+
+    with _lock:
+        compiled = _workflows.get(name)
+        if compiled is not None:
+            return compiled
+        if builder is not None:
+            _builders.setdefault(name, builder)
+        build = _builders.get(name)
+        if build is None:
+            raise KeyError(f"No workflow builder registered for '{name}'")
+        started = time.perf_counter()
+        compiled = build()
+        _workflows[name] = compiled
+        _record("workflow", name, (time.perf_counter() - started) * 1000)
+        return compiled
+
+
+def get_agent(name: str) -> Any:
+    """Return the shared instance of a specialist agent (see AGENT_CLASSES)"""
+    agent = _agents.get(name)
+    if agent is not None:
+        _hit("agent", name)
+        return agent
+
+    with _lock:
+        agent = _agents.get(name)
+        if agent is not None:
+            return agent
+        if name not in AGENT_CLASSES:
+            raise KeyError(f"Unknown agent '{name}'")
+        module_name, class_name = AGENT_CLASSES[name]
+        agent_cls = getattr(importlib.import_module(module_name), class_name)
+        started = time.perf_counter()
+        agent = agent_cls()
+        _agents[name] = agent
+        _record("agent", name, (time.perf_counter() - started) * 1000)
+        return agent
+
+
+def warm_up(agent_names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Construct agents and compile registered workflows ahead of the first request"""
+    started = time.perf_counter()
+    errors: Dict[str, str] = {}
+
+    for module_name in WORKFLOW_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            errors[module_name] = str(e)
+
+    for name in list(agent_names if agent_names is not None else AGENT_CLASSES):
+        try:
+            get_agent(name)
+        except Exception as e:
+            errors[f"agent:{name}"] = str(e)
+
+    for name in list(_builders):
+        try:
+            get_compiled_workflow(name)
+        except Exception as e:
+            errors[f"workflow:{name}"] = str(e)
+
+    total_ms = (time.perf_counter() - started) * 1000
+    if errors:
+        logger.warning(f"⚠️ [WorkflowRegistry] Warm-up finished in {total_ms:.0f}ms with errors: {errors}")
+    else:
+        logger.info(f"✅ [WorkflowRegistry] Warm-up finished in {total_ms:.0f}ms")
+    return {"total_ms": round(total_ms, 2), "errors": errors, "metrics": get_metrics()}
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Build times and reuse counts for everything the registry holds"""
+    with _lock:
+        return {
+            "workflows": sorted(_workflows),
+            "agents": sorted(_agents),
+            "llm_clients": len(_chat_models),
+            "entries": [dict(entry) for entry in _metrics.values()],
+        }
+
+
+_request_scopes: ContextVar[Optional[Dict[int, Dict[str, Any]]]] = ContextVar("agent_request_scopes", default=None)
+
+
+class RequestScopedAttributes:
+    """
+    Mixin for shared workflow objects that keep scratch data on self.
+
+    Attributes named in REQUEST_SCOPED_ATTRIBUTES (name -> default factory) are
+    stored per request in a context variable instead of on the instance, so
+    concurrent requests using the same instance do not see each other's data.
+    Call begin_request_scope() at the start of each run; tools and nodes spawned
+    from that run share the scope.
+
+    Instances are process-wide singletons (get_agent), so every attribute a run
+    writes - user ids, retrieved rows, tool outputs, plots - must be listed;
+    anything else set on self after __init__ is visible to every user.
+    """
+
+    REQUEST_SCOPED_ATTRIBUTES: Dict[str, Callable[[], Any]] = {}
+
+    def begin_request_scope(self):
+        scopes = dict(_request_scopes.get() or {})
+        scopes[id(self)] = {name: factory() for name, factory in self.REQUEST_SCOPED_ATTRIBUTES.items()}
+        _request_scopes.set(scopes)
+
+    def _request_scope(self) -> Dict[str, Any]:
+        scopes = _request_scopes.get()
+        if scopes is not None and id(self) in scopes:
+            return scopes[id(self)]
+        # Outside a run (e.g. during __init__) fall back to instance-level storage
+        default_scope = self.__dict__.get("_default_request_scope")
+        if default_scope is None:
+            default_scope = {name: factory() for name, factory in self.REQUEST_SCOPED_ATTRIBUTES.items()}
+            self.__dict__["_default_request_scope"] = default_scope
+        return default_scope
+
+    def __getattr__(self, name: str) -> Any:
+        if name in type(self).REQUEST_SCOPED_ATTRIBUTES:
+            scope = self._request_scope()
+            if name in scope:
+                return scope[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __setattr__(self, name: str, value: Any):
+        if name in type(self).REQUEST_SCOPED_ATTRIBUTES:
+            self._request_scope()[name] = value
+        else:
+            object.__setattr__(self, name, value)
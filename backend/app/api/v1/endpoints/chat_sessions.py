@@ -1,6 +1,6 @@
 from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, WebSocket, WebSocketDisconnect, Header, Query
 from starlette.websockets import WebSocketState
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
@@ -17,6 +17,8 @@ from app import crud, models, schemas
 from app.api import deps
 from app.core.telemetry_simple import trace_agent_operation, log_agent_interaction
 from app.core.config import settings
+from app.core.chat_stream import TERMINAL_EVENTS, get_chat_streams, publish_chat_event
+from app.core.chat_broadcast import SessionBroadcast
 from app.models.chat_session import ChatMessage as ChatMessageModel, ChatSession as ChatSessionModel
 from app.schemas.chat_session import (
     ChatSessionCreate, ChatSessionUpdate, ChatSessionWithMessages,
@@ -71,58 +73,130 @@ def _enrich_visualizations_with_presigned_urls(visualizations):
     return enriched_list
 
 
+class _SocketSender:
+    """Bounded outbound queue and writer task for one WebSocket"""
+
+    def __init__(self, websocket: WebSocket, on_dead):
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=settings.CHAT_WS_SEND_QUEUE_SIZE)
+        self._on_dead = on_dead
+        self.task = asyncio.create_task(self._run())
+
+    def offer(self, message: str) -> bool:
+        """Queue a message without waiting; False when the client has fallen too far behind"""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _run(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                await asyncio.wait_for(self.websocket.send_text(message), settings.CHAT_WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"⚠️ [ChatConnectionManager] Send failed, evicting socket: {e}")
+            self._on_dead()
+
+
 # WebSocket Connection Manager for real-time chat status
 class ChatConnectionManager:
-    """Manages WebSocket connections for real-time chat status updates"""
+    """Manages WebSocket connections for real-time chat status updates.
+
+    Status updates are published through SessionBroadcast (app/core/chat_broadcast.py)
+    so they reach sockets held by any worker; each worker writes only to its own
+    sockets, through one bounded queue per socket.
+    """
     
     def __init__(self):
-        self.active_connections: dict[int, list[WebSocket]] = {}  # session_id -> [websockets]
+        self.active_connections: dict[int, dict[WebSocket, _SocketSender]] = {}  # session_id -> {websocket: sender}
         # Track last status per session to let heartbeat logic stop after completion
         self.last_status_by_session: dict[int, str] = {}
+        self.broadcast = SessionBroadcast(self._deliver_local, lambda session_id: session_id in self.active_connections)
     
     async def connect(self, websocket: WebSocket, session_id: int):
         await websocket.accept()
-        if session_id not in self.active_connections:
-            self.active_connections[session_id] = []
-        self.active_connections[session_id].append(websocket)
+        first_local = session_id not in self.active_connections
+        self.active_connections.setdefault(session_id, {})[websocket] = _SocketSender(
+            websocket, lambda: self.disconnect(websocket, session_id)
+        )
         print(f"🔌 [ChatConnectionManager] WebSocket connected for session {session_id}")
+        try:
+            if first_local:
+                await self.broadcast.subscribe(session_id)
+            # Events published while no socket was connected anywhere
+            for message in await self.broadcast.take_pending(session_id):
+                self._deliver_local(session_id, message)
+        except Exception as e:
+            print(f"⚠️ [ChatConnectionManager] Broadcast attach failed for session {session_id}: {e}")
     
     def disconnect(self, websocket: WebSocket, session_id: int):
+        senders = self.active_connections.get(session_id)
+        if not senders or websocket not in senders:
+            return  # WebSocket already removed
+        sender = senders.pop(websocket)
+        if sender.task is not asyncio.current_task():
+            sender.task.cancel()
+        if not senders:
+            del self.active_connections[session_id]
+            asyncio.get_running_loop().create_task(self._release(session_id))
+        print(f"🔌 [ChatConnectionManager] WebSocket disconnected for session {session_id}")
+
+    async def _release(self, session_id: int):
+        # A socket may have reconnected while this was scheduled
         if session_id in self.active_connections:
-            try:
-                self.active_connections[session_id].remove(websocket)
-                if not self.active_connections[session_id]:
-                    del self.active_connections[session_id]
-                print(f"🔌 [ChatConnectionManager] WebSocket disconnected for session {session_id}")
-            except ValueError:
-                pass  # WebSocket already removed
+            return
+        try:
+            await self.broadcast.unsubscribe(session_id)
+        except Exception as e:
+            print(f"⚠️ [ChatConnectionManager] Unsubscribe failed for session {session_id}: {e}")
+
+    def send_local(self, websocket: WebSocket, session_id: int, message: str) -> bool:
+        """Queue a message for one local socket (heartbeats); evicts it if it cannot keep up"""
+        sender = self.active_connections.get(session_id, {}).get(websocket)
+        if sender is None:
+            return False
+        if not sender.offer(message):
+            self._evict_slow(websocket, session_id)
+            return False
+        return True
+
+    def _evict_slow(self, websocket: WebSocket, session_id: int):
+        print(f"🐢 [ChatConnectionManager] Send queue full, evicting slow socket for session {session_id}")
+        self.disconnect(websocket, session_id)
+        # Close so the client reconnects and picks up fresh state
+        asyncio.get_running_loop().create_task(self._close_quietly(websocket))
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    def _deliver_local(self, session_id: int, message: str):
+        """Hand a broadcast event to this worker's sockets for the session"""
+        senders = self.active_connections.get(session_id)
+        if not senders:
+            return
+        for websocket, sender in list(senders.items()):
+            if not sender.offer(message):
+                self._evict_slow(websocket, session_id)
+        # Record last status (except heartbeats) for heartbeat control
+        try:
+            status_value = json.loads(message).get("status")
+            if status_value and status_value != "heartbeat":
+                self.last_status_by_session[session_id] = status_value
+        except Exception:
+            pass
     
     async def send_status_update(self, session_id: int, status_message: ChatStatusMessage):
-        """Send status update to all connected clients for a session - NO DATABASE SAVING"""
-        
-        # Simply send WebSocket status update - don't save to database
-        if session_id in self.active_connections:
-            message = status_message.model_dump_json()
-            disconnected = []
-            
-            for connection in self.active_connections[session_id]:
-                try:
-                    await connection.send_text(message)
-                    print(f"📡 [Status] Sent status update: {status_message.status} to session {session_id}")
-                except:
-                    disconnected.append(connection)
-            
-            # Clean up disconnected connections
-            for connection in disconnected:
-                self.disconnect(connection, session_id)
-            # Record last status (except heartbeats) for heartbeat control
-            try:
-                if status_message.status and status_message.status != "heartbeat":
-                    self.last_status_by_session[session_id] = status_message.status
-            except Exception:
-                pass
-        else:
-            print(f"⚠️ [Status] No active connections for session {session_id}")
+        """Send status update to all connected clients for a session, on any worker - NO DATABASE SAVING"""
+        await self.broadcast.publish(session_id, status_message.model_dump_json())
+        print(f"📡 [Status] Published status update: {status_message.status} to session {session_id}")
     
     async def notify_message_added(self, session_id: int, new_message: ChatMessage, total_count: int):
         """Convenience method to notify about a new message being added"""
@@ -159,27 +233,14 @@ class ChatConnectionManager:
 # Global connection manager instance
 connection_manager = ChatConnectionManager()
 
-# Cache for storing processed messages for streaming
-message_cache: dict[str, dict[str, Any]] = {}
-
 # Centralized pending-response coordination for agent questions
 pending_response_events: dict[str, asyncio.Event] = {}
 pending_responses: dict[str, str] = {}
 _pending_lock = threading.Lock()
-async def _wait_for_ws_connection(session_id: int, timeout_seconds: float = 20.0):
-    """Wait briefly for a /status WebSocket connection to be active for this session."""
-    try:
-        checks = int(timeout_seconds * 10)
-        for _ in range(checks):
-            if connection_manager.active_connections.get(session_id):
-                return
-            await asyncio.sleep(0.1)
-    except Exception:
-        pass
 
 
 async def persist_assistant_message_and_notify(session_id: int, message_in: ChatMessageCreate) -> ChatMessage:
-    """Persist an assistant message and notify connected clients, waiting briefly for WS attachment."""
+    """Persist an assistant message and notify connected clients (replayed to a socket that attaches shortly after)."""
     from app.core.database_utils import get_db_session
     with get_db_session() as db:
         # Ensure role is assistant for clarity
@@ -189,9 +250,6 @@ async def persist_assistant_message_and_notify(session_id: int, message_in: Chat
 
         message = crud.chat_message.create_with_session(db=db, obj_in=message_in, session_id=session_id)
 
-        # Wait for WS connection if needed (longer to catch UI attachment)
-        await _wait_for_ws_connection(session_id, 20.0)
-
         # Notify clients
         try:
             from app.schemas.chat_session import ChatMessage as ChatMessageSchema
@@ -775,8 +833,9 @@ async def websocket_chat_status(
                         progress=0.0,
                         agent_name="System"
                     )
-                    await websocket.send_text(hb.model_dump_json())
-                    print(f"💓 [WebSocket] Heartbeat sent for session {session_id}")
+                    if not connection_manager.send_local(websocket, session_id, hb.model_dump_json()):
+                        raise RuntimeError("socket no longer writable")
+                    print(f"💓 [WebSocket] Heartbeat queued for session {session_id}")
                 except Exception as _hb_e:
                     print(f"❌ [WebSocket] Heartbeat failed for session {session_id}: {_hb_e}")
                     try:
@@ -824,29 +883,23 @@ async def stream_message_with_file_to_session(
         if ext not in allowed_types:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"File type {ext} not supported. Allowed types: {', '.join(allowed_types)}")
         
-        # Read uploaded content into memory once
-        content_bytes = await file.read()
-        
-        # Use unified storage helper (writes temp and durable storage)
+        # Stream the upload to temp and durable storage (hashed, deduplicated per user)
         try:
-            from app.services.file_storage import store_file
-            stored_meta = store_file(content_bytes, file.filename or f"upload.{ext}", current_user.id, session_id)
+            from app.services.file_storage import store_upload
+            stored_meta = await store_upload(file, file.filename or f"upload.{ext}", current_user.id, session_id)
             stored_file_path = stored_meta.get("stored_url")
             temp_path = stored_meta.get("temp_path")
         except Exception as e:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"File storage failed: {str(e)}")
-            upload_dir = "data/uploads/chat"
-            os.makedirs(upload_dir, exist_ok=True)
-            stored_file_path = os.path.join(upload_dir, filename)
-            with open(stored_file_path, "wb") as f_out:
-                f_out.write(content_bytes)
         
         file_info = {
             # DB should hold S3 URI when enabled, else local path
             "file_path": stored_file_path,
             "file_type": ext,
             "original_name": file.filename,
-            "size": len(content_bytes),
+            "size": stored_meta.get("size"),
+            # Content hash, stable across re-uploads, for downstream caches
+            "sha256": stored_meta.get("sha256"),
             # Include temp path for local processing
             "temp_path": temp_path
         }
@@ -970,10 +1023,7 @@ async def stream_message_to_session(
             )
             
             # Mark this request as a user response (no streaming needed)
-            message_cache[request_id] = {
-                "status": "user_response",
-                "message": "User response processed"
-            }
+            await publish_chat_event(request_id, "user_response", content="User response processed")
             
             return StreamingChatResponse(
                 request_id=request_id,
@@ -1051,87 +1101,51 @@ async def stream_message_to_session(
 async def get_streaming_response(
     session_id: int,
     request_id: str,
+    last_event_id: Optional[str] = Query(None, description="Resume after this event id"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
     current_user: models.User = Depends(deps.get_current_active_user),
 ):
-    """Stream the AI response for a specific request"""
-    
+    """Stream the AI response for a specific request.
+
+    Events come from the request's chat stream (app/core/chat_stream.py), so the
+    GET may land on any worker. Each SSE message carries an ``id:``; reconnecting
+    with Last-Event-ID (or ?last_event_id=) resumes after it.
+    """
+    # Request ids are "[upload_]stream_{user_id}_{session_id}_{suffix}"
+    if not request_id.partition("stream_")[2].startswith(f"{current_user.id}_{session_id}_"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stream not found")
+
     async def generate_stream():
         """Generator for streaming response chunks"""
+        cursor = last_event_id or last_event_id_header or "0"
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + settings.CHAT_STREAM_TIMEOUT_SECONDS
         try:
-            # Wait for processing to complete and stream results
-            timeout = 300  # 5 minute timeout
-            start_time = asyncio.get_event_loop().time()
-            
+            streams = await get_chat_streams()
             while True:
-                current_time = asyncio.get_event_loop().time()
-                
-                # Check if processing is complete by looking in message cache
-                if request_id in message_cache:
-                    cached_data = message_cache[request_id]
-                    
-                    if cached_data["status"] == "complete":
-                        # Send the actual AI response content
-                        content_chunk = StreamingChunk(
-                            type="content",
-                            content=cached_data["ai_response"],
-                            progress=1.0
-                        )
-                        yield f"data: {content_chunk.model_dump_json()}\n\n"
-                        
-                        # Send completion signal
-                        completion = StreamingChunk(type="complete", content="")
-                        yield f"data: {completion.model_dump_json()}\n\n"
-                        
-                        # Clean up cache
-                        del message_cache[request_id]
-                        break
-                        
-                    elif cached_data["status"] == "user_response":
-                        # This was a user response to agent question - no processing needed
-                        # Just send completion signal immediately
-                        completion = StreamingChunk(
-                            type="complete", 
-                            content="",
-                            progress=1.0
-                        )
-                        yield f"data: {completion.model_dump_json()}\n\n"
-                        
-                        # Clean up cache
-                        del message_cache[request_id]
-                        break
-                        
-                    elif cached_data["status"] == "error":
-                        # Send error from processing
-                        error_chunk = StreamingChunk(
-                            type="error",
-                            content=cached_data.get("error_message", "Processing failed")
-                        )
-                        yield f"data: {error_chunk.model_dump_json()}\n\n"
-                        
-                        # Clean up cache
-                        del message_cache[request_id]
+                remaining_ms = int((deadline - loop.time()) * 1000)
+                if remaining_ms <= 0:
+                    error_chunk = StreamingChunk(type="error", content="Request timeout")
+                    yield f"data: {error_chunk.model_dump_json()}\n\n"
+                    break
+
+                entries = await streams.read(request_id, cursor, min(settings.CHAT_STREAM_BLOCK_MS, remaining_ms))
+                if not entries:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+
+                finished = False
+                for event_id, event in entries:
+                    cursor = event_id
+                    chunk = _stream_event_to_chunk(event)
+                    yield f"id: {event_id}\ndata: {chunk.model_dump_json()}\n\n"
+                    if event.get("type") in TERMINAL_EVENTS:
+                        finished = True
                         break
-                
-                # Check for timeout
-                if current_time - start_time > timeout:
-                    yield f"data: {json.dumps({'type': 'error', 'content': 'Request timeout'})}\n\n"
-                    # Clean up cache on timeout
-                    if request_id in message_cache:
-                        del message_cache[request_id]
+                if finished:
                     break
-                
-                # Wait before checking again
-                await asyncio.sleep(0.5)
-                
-                # Send progress update while waiting
-                progress = min(0.9, (current_time - start_time) / 60)  # Up to 90% progress while waiting
-                progress_chunk = StreamingChunk(
-                    type="progress",
-                    content=f"Processing... {int(progress * 100)}%",
-                    progress=progress
-                )
-                yield f"data: {progress_chunk.model_dump_json()}\n\n"
-                    
+
         except Exception as e:
             error_chunk = StreamingChunk(
                 type="error",
@@ -1145,11 +1159,29 @@ async def get_streaming_response(
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-            "Content-Type": "text/event-stream"
+            "Content-Type": "text/event-stream",
+            "X-Accel-Buffering": "no"
         }
     )
 
 
+def _stream_event_to_chunk(event: dict) -> StreamingChunk:
+    """Map a chat stream event onto the SSE chunk schema"""
+    event_type = event.get("type")
+    if event_type == "token":
+        return StreamingChunk(type="token", content=event.get("content", ""), metadata={"node": event.get("node")})
+    if event_type == "node":
+        return StreamingChunk(type="status", status=event.get("node"), metadata={"node": event.get("node")})
+    if event_type == "content":
+        return StreamingChunk(type="content", content=event.get("content", ""), progress=1.0,
+                              metadata=event.get("metadata"))
+    if event_type in ("complete", "user_response"):
+        return StreamingChunk(type="complete", content="", progress=1.0)
+    if event_type == "error":
+        return StreamingChunk(type="error", content=event.get("content") or "Processing failed")
+    return StreamingChunk(type=event_type or "status", content=event.get("content"))
+
+
 async def process_streaming_response(
     db: Session,
     session_id: int,
@@ -1172,18 +1204,13 @@ async def process_streaming_response(
             )
         )
         
-        # Get existing messages for context (open a fresh short-lived session to avoid long-held connections)
+        # Recent turns within the token budget plus the session's rolling summary
         try:
-            from app.db.session import SessionLocal as _SessionLocal
-            with _SessionLocal() as _db_ctx:
-                existing_messages = crud.chat_message.get_session_messages(
-                    db=_db_ctx, session_id=session_id, skip=0, limit=50
-                )
-        except Exception:
-            existing_messages = []
-        
-        # Prepare conversation history for context
-        messages = [{"role": msg.role, "content": msg.content} for msg in existing_messages]
+            from app.services.chat_history import build_conversation_history
+            messages = await build_conversation_history(session_id)
+        except Exception as e:
+            print(f"⚠️ [Streaming] Could not build conversation history for session {session_id}: {e}")
+            messages = []
         
         # Send agent processing status
         await connection_manager.send_status_update(
@@ -1238,7 +1265,8 @@ async def process_streaming_response(
             user_input=user_message,
             conversation_history=messages,
             uploaded_file=uploaded_file,
-            session_id=session_id  # Pass session_id to the workflow
+            session_id=session_id,  # Pass session_id to the workflow
+            request_id=request_id  # Node transitions and answer tokens go to the chat stream
         )
         
         # Extract AI response from standardized response_data format or fallback to legacy format
@@ -1392,12 +1420,7 @@ async def process_streaming_response(
                 "visualizations": _enrich_visualizations_with_presigned_urls(ai_msg_payload["visualizations"]),
             }
         }
-        # If the client temporarily disconnected, wait for WS to reattach before sending final status
-        try:
-            await _wait_for_ws_connection(session_id, 30.0)
-        except Exception:
-            pass
-
+        # If the client is temporarily disconnected, the broadcast replays this to the next socket
         await connection_manager.send_status_update(
             session_id,
             ChatStatusMessage(
@@ -1408,28 +1431,30 @@ async def process_streaming_response(
             )
         )
         
-        # Store the processed message for the streaming endpoint to retrieve
-        # Store only serializable payloads to avoid detached-instance access
-        message_cache[request_id] = {
-            "ai_message": ai_msg_payload,
-            "ai_response": ai_response,
-            "status": "complete",
-            "interactive_components": interactive_components,
-        }
+        # Publish the persisted answer and the terminal event for SSE readers on any worker
+        # Only serializable payloads go on the stream to avoid detached-instance access
+        await publish_chat_event(
+            request_id,
+            "content",
+            content=ai_response,
+            metadata={
+                "message_id": ai_msg_payload["id"],
+                "title": ai_title,
+                "interactive_components": [component.model_dump() for component in interactive_components],
+            },
+        )
+        await publish_chat_event(request_id, "complete")
         
         # Note: WebSocket notification already sent above via notify_message_added
         # No need for additional status update to avoid duplicate notifications
         
-        print(f"✅ [Streaming] Completed processing for request {request_id} - Message cached and notified")
+        print(f"✅ [Streaming] Completed processing for request {request_id} - Message published and notified")
         
     except Exception as e:
         print(f"❌ [Streaming] Error processing request {request_id}: {e}")
         
-        # Store error in cache for streaming endpoint
-        message_cache[request_id] = {
-            "status": "error",
-            "error_message": str(e)
-        }
+        # Terminal error event for the streaming endpoint
+        await publish_chat_event(request_id, "error", content=str(e))
         
         await connection_manager.send_status_update(
             session_id,
@@ -38,18 +38,14 @@ async def chat_sessions_statistics(hours: int = 24, limit: int = 100, current=De
     Admin-only chat sessions summary built from telemetry spans.
     Returns a structure compatible with the dashboard's expectations.
     """
-    recent_spans = legacy_dashboard.redis_client.zrange('telemetry:recent_spans', 0, -1)
-    if not recent_spans:
+    span_ids = await legacy_dashboard.async_redis_client.zrange('telemetry:recent_spans', 0, -1)
+    if not span_ids:
         return {"sessions": []}
 
     cutoff = legacy_dashboard.now_local() - timedelta(hours=hours)
     sessions = {}
 
-    for span_id in recent_spans:
-        span_data = legacy_dashboard.redis_client.get(f'telemetry:span:{span_id}')
-        if not span_data:
-            continue
-        span = legacy_dashboard.json.loads(span_data)
+    for span in await legacy_dashboard._get_spans(span_ids):
         span_time = datetime.fromtimestamp(span.get('start_time', 0))
         if span_time < cutoff:
             continue
@@ -29,7 +29,7 @@ def get_today_health_score(
 ):
     today = datetime.now().date()
     svc = HealthScoringService(db)
-    result = svc.compute_daily(user_id=current_user.id, day=today)
+    result = svc.get_or_compute_daily(user_id=current_user.id, day=today)
     return {
         "date": today.isoformat(),
         "overall": result.overall_score,
@@ -3,13 +3,13 @@ from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from typing import List, Optional
 from datetime import date, datetime
-from sqlalchemy.sql import func
 
 from app.api.deps import get_current_user, get_db
 from app.models.user import User
 from app.models.lab_test_mapping import LabTestMapping
 from app.models.health_data import LabReportCategorized
-from app.models.lab_aggregation import LabReportDaily, LabReportMonthly, LabReportQuarterly, LabReportYearly
+from app.models.lab_aggregation import LabReportDaily, LabReportMonthly, LabReportQuarterly, LabReportYearly, LabCategorySummary
+from app.crud.lab_aggregation import LabAggregationCRUD
 from app.schemas.lab_reports import (
     LabReportCategoriesResponse, 
     LabTestCategoryResponse,
@@ -20,6 +20,27 @@ from app.schemas.lab_reports import (
 
 router = APIRouter()
 
+def _get_category_summaries(db: Session, user_id: int) -> List[LabCategorySummary]:
+    """Precomputed per-category status counts, built on first use for users aggregated before the table existed"""
+    summaries = db.query(LabCategorySummary).filter(
+        LabCategorySummary.user_id == user_id
+    ).order_by(LabCategorySummary.category).all()
+    if summaries:
+        return summaries
+
+    has_reports = db.query(LabReportCategorized.id).filter(
+        LabReportCategorized.user_id == user_id
+    ).first()
+    if not has_reports:
+        return []
+
+    print(f"🔄 [LabCategorySummary] Building category summary for user {user_id}")
+    LabAggregationCRUD.refresh_category_summary(db, user_id)
+    db.commit()
+    return db.query(LabCategorySummary).filter(
+        LabCategorySummary.user_id == user_id
+    ).order_by(LabCategorySummary.category).all()
+
 @router.get("/categories", response_model=LabReportCategoriesResponse)
 def get_lab_categories(
     current_user: User = Depends(get_current_user),
@@ -27,51 +48,25 @@ def get_lab_categories(
 ):
     """Get all lab test categories with status counts"""
     
-    # Get all active categories from lab_test_mappings
-    categories = db.query(LabTestMapping.test_category).distinct().filter(
-        LabTestMapping.is_active == True
-    ).all()
+    # Only report categories that are active in lab_test_mappings
+    active_categories = {
+        row[0] for row in db.query(LabTestMapping.test_category).distinct().filter(
+            LabTestMapping.is_active == True
+        ).all()
+    }
     
     category_responses = []
     
-    for category_tuple in categories:
-        category = category_tuple[0]
-        
-        # Count total tests in this category from categorized table
-        total_tests = db.query(LabReportCategorized).filter(
-            LabReportCategorized.user_id == current_user.id,
-            LabReportCategorized.inferred_test_category == category
-        ).distinct(LabReportCategorized.loinc_code).count()
-        
-        # Count status distribution from actual lab results
-        green_count = db.query(LabReportCategorized).filter(
-            LabReportCategorized.user_id == current_user.id,
-            LabReportCategorized.inferred_test_category == category,
-            LabReportCategorized.test_status.in_(['Normal', 'normal'])
-        ).distinct(LabReportCategorized.loinc_code).count()
-        
-        amber_count = db.query(LabReportCategorized).filter(
-            LabReportCategorized.user_id == current_user.id,
-            LabReportCategorized.inferred_test_category == category,
-            LabReportCategorized.test_status.in_(['High', 'Low', 'Elevated', 'high', 'low', 'elevated'])
-        ).distinct(LabReportCategorized.loinc_code).count()
-        
-        red_count = db.query(LabReportCategorized).filter(
-            LabReportCategorized.user_id == current_user.id,
-            LabReportCategorized.inferred_test_category == category,
-            LabReportCategorized.test_status.in_(['Critical', 'Abnormal', 'critical', 'abnormal'])
-        ).distinct(LabReportCategorized.loinc_code).count()
-        
-        # Ensure counts don't exceed total
-        if total_tests == 0:
+    for summary in _get_category_summaries(db, current_user.id):
+        if summary.category not in active_categories or summary.total_tests == 0:
             continue
         
         category_responses.append(LabTestCategoryResponse(
-            category=category,
-            total_tests=total_tests,
-            green_count=green_count,
-            amber_count=amber_count,
-            red_count=red_count
+            category=summary.category,
+            total_tests=summary.total_tests,
+            green_count=summary.normal_count,
+            amber_count=summary.abnormal_count,
+            red_count=summary.critical_count
         ))
     
     return LabReportCategoriesResponse(categories=category_responses)
@@ -474,79 +469,23 @@ def get_available_categories(
     
     print(f"🔍 [AvailableCategories] Getting categories for user {current_user.id}")
     
-    # Get all unique categories for this user
-    user_categories = db.query(LabReportCategorized.inferred_test_category).filter(
-        LabReportCategorized.user_id == current_user.id,
-        LabReportCategorized.inferred_test_category.isnot(None)
-    ).distinct().all()
-    
     categories = []
     
-    for category_tuple in user_categories:
-        category = category_tuple[0]
-        if not category:
-            continue
-            
-        print(f"📋 [AvailableCategories] Processing category: {category}")
-        
-        # Count unique tests in this category
-        total_tests = db.query(LabReportCategorized.loinc_code).filter(
-            LabReportCategorized.user_id == current_user.id,
-            LabReportCategorized.inferred_test_category == category
-        ).distinct().count()
-        
-        # Get most recent test for each unique loinc_code to determine status
-        recent_tests_subquery = db.query(
-            LabReportCategorized.loinc_code,
-            func.max(LabReportCategorized.test_date).label('max_date')
-        ).filter(
-            LabReportCategorized.user_id == current_user.id,
-            LabReportCategorized.inferred_test_category == category
-        ).group_by(LabReportCategorized.loinc_code).subquery()
-        
-        # Get the actual recent reports
-        recent_reports = db.query(LabReportCategorized).join(
-            recent_tests_subquery,
-            (LabReportCategorized.loinc_code == recent_tests_subquery.c.loinc_code) &
-            (LabReportCategorized.test_date == recent_tests_subquery.c.max_date)
-        ).filter(
-            LabReportCategorized.user_id == current_user.id,
-            LabReportCategorized.inferred_test_category == category
-        ).all()
-        
-        # Count status distribution
-        green_count = 0
-        amber_count = 0
-        red_count = 0
-        
-        for report in recent_reports:
-            status = (report.test_status or "").lower()
-            if status in ['normal', 'green']:
-                green_count += 1
-            elif status in ['high', 'low', 'elevated', 'amber', 'orange']:
-                amber_count += 1
-            elif status in ['critical', 'abnormal', 'red']:
-                red_count += 1
-            else:
-                # Default unknown status to normal
-                green_count += 1
-        
-        # Determine category icon based on the category name
-        icon = get_category_icon(category)
-        icon_color = get_category_color(category)
+    # Status counts reflect each test's most recent result (maintained by lab aggregation)
+    for summary in _get_category_summaries(db, current_user.id):
+        category = summary.category
         
         category_data = {
             "name": category,
-            "icon": icon,
-            "iconColor": icon_color,
-            "totalTests": total_tests,
-            "greenCount": green_count,
-            "amberCount": amber_count,
-            "redCount": red_count
+            "icon": get_category_icon(category),
+            "iconColor": get_category_color(category),
+            "totalTests": summary.total_tests,
+            "greenCount": summary.latest_green_count,
+            "amberCount": summary.latest_amber_count,
+            "redCount": summary.latest_red_count
         }
         
         categories.append(category_data)
-        print(f"✅ [AvailableCategories] {category}: {total_tests} tests ({green_count}G, {amber_count}A, {red_count}R)")
     
     print(f"📊 [AvailableCategories] Returning {len(categories)} categories")
     
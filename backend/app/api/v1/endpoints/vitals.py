@@ -30,6 +30,7 @@ from app.models.vitals_data import VitalsRawData, VitalsSyncStatus, VitalsDailyA
 import logging
 import uuid
 from app.core.sync_state import sync_state_manager
+from app.core.database_utils import run_db
 from app.utils.sqs_client import get_ml_worker_client
 import asyncio
 
@@ -37,6 +38,15 @@ router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
+def trigger_ml_worker(user_id: int):
+    """Trigger ML worker via SQS to process pending vitals (fire-and-forget, blocking boto3 call)"""
+    try:
+        ml_worker_client = get_ml_worker_client()
+        if ml_worker_client.is_enabled():
+            ml_worker_client.send_vitals_processing_trigger(user_id=user_id, priority='normal')
+    except Exception as e:
+        logger.warning(f"⚠️  Failed to trigger ML worker for vitals: {e}")
+
 def standardize_vital_data(data: VitalDataSubmission) -> VitalDataSubmission:
     """
     Standardize vital data by converting units to standard format
@@ -97,10 +107,11 @@ async def submit_vital_data(
         # Standardize units before storage
         standardized_data = standardize_vital_data(data)
         
-        db_data = VitalsCRUD.create_raw_data(db, current_user.id, standardized_data)
+        db_data = await run_db(VitalsCRUD.create_raw_data, db, current_user.id, standardized_data)
         
         # Update sync status to track the submission
-        VitalsCRUD.update_sync_status(
+        await run_db(
+            VitalsCRUD.update_sync_status,
             db=db,
             user_id=current_user.id,
             data_source=data.data_source,
@@ -110,12 +121,7 @@ async def submit_vital_data(
         )
         
         # Trigger ML worker via SQS to process pending vitals (fire-and-forget)
-        try:
-            ml_worker_client = get_ml_worker_client()
-            if ml_worker_client.is_enabled():
-                ml_worker_client.send_vitals_processing_trigger(user_id=current_user.id, priority='normal')
-        except Exception as e:
-            logger.warning(f"⚠️  Failed to trigger ML worker for vitals: {e}")
+        await asyncio.to_thread(trigger_ml_worker, current_user.id)
         
         return VitalSubmissionResponse(
             success=True,
@@ -129,7 +135,8 @@ async def submit_vital_data(
         
         # Update sync status to track the failure
         try:
-            VitalsCRUD.update_sync_status(
+            await run_db(
+                VitalsCRUD.update_sync_status,
                 db=db,
                 user_id=current_user.id,
                 data_source=data.data_source,
@@ -171,21 +178,23 @@ async def bulk_submit_vital_data(
         # Standardize units for all data points before storage
         standardized_data = [standardize_vital_data(vital_data) for vital_data in data.data]
         
-        # Insert raw data (fast operation)
-        db_entries = VitalsCRUD.bulk_create_raw_data(db, current_user.id, standardized_data)
-        batch_size = len(db_entries)
+        def store_batch():
+            # Insert raw data, then update sync status for each data source in this batch
+            entries = VitalsCRUD.bulk_create_raw_data(db, current_user.id, standardized_data)
+            data_sources = {item.data_source for item in data.data}
+            for data_source in data_sources:
+                VitalsCRUD.update_sync_status(
+                    db=db,
+                    user_id=current_user.id,
+                    data_source=data_source,
+                    last_sync_date=now_local(),
+                    success=True,
+                    error_message=None
+                )
+            return entries
         
-        # Update sync status for each data source in this batch
-        data_sources = {item.data_source for item in data.data}
-        for data_source in data_sources:
-            VitalsCRUD.update_sync_status(
-                db=db,
-                user_id=current_user.id,
-                data_source=data_source,
-                last_sync_date=now_local(),
-                success=True,
-                error_message=None
-            )
+        db_entries = await run_db(store_batch)
+        batch_size = len(db_entries)
         
         if is_chunked_submission:
             logger.info(f"📱 [BulkSubmit] Chunk {chunk_number}/{total_chunks} submitted: {batch_size} data points for user {current_user.id} (session: {session_id})")
@@ -198,12 +207,7 @@ async def bulk_submit_vital_data(
         if should_trigger_aggregation:
             logger.info(f"🚀 [BulkSubmit] Final chunk received - triggering coalesced vitals aggregation for session {session_id}")
             # Trigger ML worker via SQS (fire-and-forget)
-            try:
-                ml_worker_client = get_ml_worker_client()
-                if ml_worker_client.is_enabled():
-                    ml_worker_client.send_vitals_processing_trigger(user_id=current_user.id, priority='normal')
-            except Exception as e:
-                logger.warning(f"⚠️  Failed to trigger ML worker for vitals: {e}") 
+            await asyncio.to_thread(trigger_ml_worker, current_user.id)
         else:
             logger.info(f"⏳ [BulkSubmit] Intermediate chunk {chunk_number}/{total_chunks} - aggregation deferred until final chunk")
         
@@ -227,7 +231,8 @@ async def bulk_submit_vital_data(
         sync_state_manager.end_sync_operation(current_user.id, operation_id)
         
         # Update sync status to track the failure for all data sources in this batch
-        try:
+        def record_failure():
+            db.rollback()
             data_sources = {item.data_source for item in data.data}
             for data_source in data_sources:
                 VitalsCRUD.update_sync_status(
@@ -238,6 +243,9 @@ async def bulk_submit_vital_data(
                     success=False,
                     error_message=str(e)
                 )
+        
+        try:
+            await run_db(record_failure)
         except Exception as sync_error:
             logger.error(f"Failed to update sync status: {sync_error}")
         
@@ -255,7 +263,7 @@ async def get_vitals_dashboard(
 ):
     """Get vitals dashboard data for the current user"""
     try:
-        dashboard_data = VitalsCRUD.get_dashboard_data(db, current_user.id, days)
+        dashboard_data = await run_db(VitalsCRUD.get_dashboard_data, db, current_user.id, days)
         return VitalsDashboard(**dashboard_data)
     except Exception as e:
         logger.error(f"Error getting vitals dashboard: {str(e)}")
@@ -277,27 +285,31 @@ async def get_vitals_charts(
         end_date = today_local()
         start_date = end_date - timedelta(days=days)
         
-        logger.info(f"📊 [VitalsCharts] Request for user {current_user.id}: metric_types={[mt.value for mt in metric_types]}, granularity={granularity.value}, days={days}")
+        logger.info(f"📊 [VitalsCharts] Request for user {current_user.id}: metric_types={[mt.value for mt in metric_types or []]}, granularity={granularity.value}, days={days}")
         
-        # If no metric types specified, get all available for user
-        if not metric_types:
-            available_metrics = db.query(VitalsRawData.metric_type).filter(
-                VitalsRawData.user_id == current_user.id
-            ).distinct().all()
-            metric_types = [m[0] for m in available_metrics]
-            logger.info(f"📊 [VitalsCharts] No metric types specified, found available: {[mt.value for mt in metric_types]}")
-        
-        charts = []
-        for metric_type in metric_types:
-            logger.info(f"📊 [VitalsCharts] Processing metric: {metric_type.value}")
-            chart_data = await get_chart_data(
-                db, current_user.id, metric_type, granularity, start_date, end_date
-            )
-            if chart_data:
-                logger.info(f"📊 [VitalsCharts] Found {len(chart_data.data_points)} data points for {metric_type.value}")
-                charts.append(chart_data)
-            else:
-                logger.info(f"📊 [VitalsCharts] No data found for {metric_type.value}")
+        def collect_charts(metric_types):
+            # If no metric types specified, get all available for user
+            if not metric_types:
+                available_metrics = db.query(VitalsRawData.metric_type).filter(
+                    VitalsRawData.user_id == current_user.id
+                ).distinct().all()
+                metric_types = [m[0] for m in available_metrics]
+                logger.info(f"📊 [VitalsCharts] No metric types specified, found available: {[mt.value for mt in metric_types]}")
+            
+            charts = []
+            for metric_type in metric_types:
+                logger.info(f"📊 [VitalsCharts] Processing metric: {metric_type.value}")
+                chart_data = get_chart_data(
+                    db, current_user.id, metric_type, granularity, start_date, end_date
+                )
+                if chart_data:
+                    logger.info(f"📊 [VitalsCharts] Found {len(chart_data.data_points)} data points for {metric_type.value}")
+                    charts.append(chart_data)
+                else:
+                    logger.info(f"📊 [VitalsCharts] No data found for {metric_type.value}")
+            return charts
+        
+        charts = await run_db(collect_charts, metric_types)
         
         logger.info(f"📊 [VitalsCharts] Returning {len(charts)} charts for user {current_user.id}")
         return VitalMetricsChartsResponse(
@@ -322,7 +334,7 @@ async def get_aggregation_status(
 ):
     """Get aggregation status for user's data"""
     try:
-        status_counts = VitalsCRUD.get_aggregation_status_counts(db, current_user.id)
+        status_counts = await run_db(VitalsCRUD.get_aggregation_status_counts, db, current_user.id)
         
         # Calculate total records
         total_records = sum(status_counts.values())
@@ -361,24 +373,24 @@ async def get_vitals_data_count(
         if not metric_types:
             metric_types = list(VitalMetricType)
         
-        counts = {}
-        total_count = 0
-        
-        for metric_type in metric_types:
-            count = db.query(VitalsRawData).filter(
-                VitalsRawData.user_id == current_user.id,
-                VitalsRawData.metric_type == metric_type.value,
-                VitalsRawData.start_date >= start_date,
-                VitalsRawData.start_date <= end_date
-            ).count()
+        def count_data():
+            counts = {}
+            for metric_type in metric_types:
+                counts[metric_type.value] = db.query(VitalsRawData).filter(
+                    VitalsRawData.user_id == current_user.id,
+                    VitalsRawData.metric_type == metric_type.value,
+                    VitalsRawData.start_date >= start_date,
+                    VitalsRawData.start_date <= end_date
+                ).count()
             
-            counts[metric_type.value] = count
-            total_count += count
+            # Get the most recent data point timestamp
+            latest_data = db.query(VitalsRawData).filter(
+                VitalsRawData.user_id == current_user.id
+            ).order_by(VitalsRawData.start_date.desc()).first()
+            return counts, latest_data
         
-        # Get the most recent data point timestamp
-        latest_data = db.query(VitalsRawData).filter(
-            VitalsRawData.user_id == current_user.id
-        ).order_by(VitalsRawData.start_date.desc()).first()
+        counts, latest_data = await run_db(count_data)
+        total_count = sum(counts.values())
         
         return {
             "user_id": current_user.id,
@@ -406,7 +418,7 @@ async def get_sync_status(
 ):
     """Get sync status for a specific data source"""
     try:
-        sync_status = VitalsCRUD.get_sync_status(db, current_user.id, data_source)
+        sync_status = await run_db(VitalsCRUD.get_sync_status, db, current_user.id, data_source)
         
         if not sync_status:
             # Create default sync status
@@ -440,11 +452,14 @@ async def enable_sync(
 ):
     """Enable sync for a specific data source"""
     try:
-        sync_status = VitalsCRUD.update_sync_status(
-            db, current_user.id, data_source, success=True
-        )
-        sync_status.sync_enabled = "true"
-        db.commit()
+        def enable():
+            sync_status = VitalsCRUD.update_sync_status(
+                db, current_user.id, data_source, success=True
+            )
+            sync_status.sync_enabled = "true"
+            db.commit()
+        
+        await run_db(enable)
         
         return {"message": f"Sync enabled for {data_source}"}
     except Exception as e:
@@ -474,15 +489,10 @@ async def update_weight(
             notes=weight_data.notes
         )
         
-        db_data = VitalsCRUD.create_raw_data(db, current_user.id, vital_data)
+        db_data = await run_db(VitalsCRUD.create_raw_data, db, current_user.id, vital_data)
         
         # Trigger ML worker via SQS to process pending vitals (fire-and-forget)
-        try:
-            ml_worker_client = get_ml_worker_client()
-            if ml_worker_client.is_enabled():
-                ml_worker_client.send_vitals_processing_trigger(user_id=current_user.id, priority='normal')
-        except Exception as e:
-            logger.warning(f"⚠️  Failed to trigger ML worker for vitals: {e}") 
+        await asyncio.to_thread(trigger_ml_worker, current_user.id)
         
         return WeightUpdateResponse(
             success=True,
@@ -507,18 +517,9 @@ async def trigger_manual_aggregation(
 ):
     """Manually trigger aggregation for a specific date"""
     try:
-        hourly_count = VitalsCRUD.aggregate_hourly_data(db, current_user.id, target_date)
-        daily_count = VitalsCRUD.aggregate_daily_data(db, current_user.id, target_date)
-        
-        # Calculate week start (Monday) for weekly aggregation
-        days_since_monday = target_date.weekday()
-        week_start = target_date - timedelta(days=days_since_monday)
-        
-        # Aggregate weekly data
-        weekly_count = VitalsCRUD.aggregate_weekly_data(db, current_user.id, week_start)
-        
-        # Aggregate monthly data
-        monthly_count = VitalsCRUD.aggregate_monthly_data(db, current_user.id, target_date.year, target_date.month)
+        hourly_count, daily_count, weekly_count, monthly_count = await run_db(
+            aggregate_all_levels, db, current_user.id, target_date
+        )
         
         return {
             "message": f"Aggregation completed for {target_date}",
@@ -535,23 +536,30 @@ async def trigger_manual_aggregation(
         )
 
 # Helper functions
+def aggregate_all_levels(db: Session, user_id: int, target_date: date):
+    """Run hourly, daily, weekly and monthly aggregation for a date (blocking; use via run_db)"""
+    # Aggregate hourly data first
+    hourly_count = VitalsCRUD.aggregate_hourly_data(db, user_id, target_date)
+    # Then aggregate daily data
+    daily_count = VitalsCRUD.aggregate_daily_data(db, user_id, target_date)
+    
+    # Calculate week start (Monday) for weekly aggregation
+    days_since_monday = target_date.weekday()
+    week_start = target_date - timedelta(days=days_since_monday)
+    
+    # Aggregate weekly data
+    weekly_count = VitalsCRUD.aggregate_weekly_data(db, user_id, week_start)
+    
+    # Aggregate monthly data
+    monthly_count = VitalsCRUD.aggregate_monthly_data(db, user_id, target_date.year, target_date.month)
+    return hourly_count, daily_count, weekly_count, monthly_count
+
 async def trigger_sync_aggregation(db: Session, user_id: int, target_date: date):
     """Trigger synchronous aggregation for small batches"""
     try:
-        # Aggregate hourly data first
-        hourly_count = VitalsCRUD.aggregate_hourly_data(db, user_id, target_date)
-        # Then aggregate daily data
-        daily_count = VitalsCRUD.aggregate_daily_data(db, user_id, target_date)
-        
-        # Calculate week start (Monday) for weekly aggregation
-        days_since_monday = target_date.weekday()
-        week_start = target_date - timedelta(days=days_since_monday)
-        
-        # Aggregate weekly data
-        weekly_count = VitalsCRUD.aggregate_weekly_data(db, user_id, week_start)
-        
-        # Aggregate monthly data
-        monthly_count = VitalsCRUD.aggregate_monthly_data(db, user_id, target_date.year, target_date.month)
+        hourly_count, daily_count, weekly_count, monthly_count = await run_db(
+            aggregate_all_levels, db, user_id, target_date
+        )
         
         logger.debug(f"📊 [SyncAggregation] Created {hourly_count} hourly, {daily_count} daily, {weekly_count} weekly, {monthly_count} monthly aggregates for {target_date}")
     except Exception as e:
@@ -560,15 +568,18 @@ async def trigger_sync_aggregation(db: Session, user_id: int, target_date: date)
 
 async def trigger_aggregation(db: Session, user_id: int, target_date: date):
     """Trigger background aggregation for a specific date (legacy function)"""
-    try:
+    def aggregate():
         # Aggregate hourly data first
         VitalsCRUD.aggregate_hourly_data(db, user_id, target_date)
         # Then aggregate daily data
         VitalsCRUD.aggregate_daily_data(db, user_id, target_date)
+    
+    try:
+        await run_db(aggregate)
     except Exception as e:
         logger.error(f"Error in background aggregation: {str(e)}")
 
-async def get_chart_data(
+def get_chart_data(
     db: Session, 
     user_id: int, 
     metric_type: VitalMetricType, 
@@ -576,7 +587,7 @@ async def get_chart_data(
     start_date: date,
     end_date: date
 ) -> Optional[ChartData]:
-    """Get chart data for a specific metric"""
+    """Get chart data for a specific metric (blocking; call via run_db)"""
     try:
         logger.info(f"📊 [get_chart_data] Getting data for {metric_type.value}, user {user_id}, {start_date} to {end_date}")
         data_points = []
@@ -759,7 +770,7 @@ async def trigger_worker_process(
     
     try:
         # Check if there's pending work
-        pending_count = len(VitalsCRUD.get_pending_aggregation_entries(db, limit=1))
+        pending_count = len(await run_db(VitalsCRUD.get_pending_aggregation_entries, db, limit=1))
         
         if pending_count == 0:
             return {
@@ -770,7 +781,7 @@ async def trigger_worker_process(
             }
         
         # Get total pending count for reporting
-        total_pending = len(VitalsCRUD.get_pending_aggregation_entries(db, limit=100000))
+        total_pending = len(await run_db(VitalsCRUD.get_pending_aggregation_entries, db, limit=100000))
         
         # Trigger worker process in background
         worker_script = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "..", "aggregation", "worker_process.py")
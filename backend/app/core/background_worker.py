@@ -146,6 +146,14 @@ class SmartDelayedAggregationWorker:
                 # Small delay between batches to prevent overwhelming the database
                 await asyncio.sleep(0.1)
             
+            # Refresh daily health scores invalidated by the aggregates written above
+            try:
+                from app.health_scoring.invalidation import recompute_stale_scores
+                with get_db_session() as db:
+                    recompute_stale_scores(db)
+            except Exception as e:
+                logger.error(f"❌ [SmartWorker] Health score recompute failed: {e}")
+            
             # Final statistics
             duration = (now_local() - self.start_time).total_seconds()
             throughput = self.total_processed / duration if duration > 0 else 0
@@ -0,0 +1,137 @@
+"""
+Cross-worker fan-out for chat session WebSocket events.
+
+ChatConnectionManager publishes every status/message event here instead of
+writing to its own sockets. Each worker subscribes to
+
+    chat:ws:{session_id}            Redis pub/sub channel
+
+while it holds at least one socket for that session, and delivers what
+arrives to those local sockets only. PUBLISH reports how many workers received
+an event; when none did (no socket anywhere, e.g. the app is reconnecting)
+the event is parked in
+
+    chat:ws:pending:{session_id}    Redis list of {"ts", "payload"}
+
+for CHAT_WS_REPLAY_SECONDS and handed to the next socket that connects, on
+whichever worker that is.
+
+With CHAT_STREAM_BACKEND="memory" (or Redis unreachable at first use) the
+same flow runs in-process and only reaches sockets on this worker.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "chat:ws"
+PENDING_PREFIX = "chat:ws:pending"
+PENDING_MAX_EVENTS = 50
+
+
+def channel_name(session_id: int) -> str:
+    return f"{CHANNEL_PREFIX}:{session_id}"
+
+
+def pending_key(session_id: int) -> str:
+    return f"{PENDING_PREFIX}:{session_id}"
+
+
+class SessionBroadcast:
+    """Publish session events to every worker; deliver incoming ones through ``deliver``"""
+
+    def __init__(self, deliver: Callable[[int, str], None], has_local: Callable[[int], bool]):
+        self._deliver = deliver
+        self._has_local = has_local
+        self._client = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._backend: Optional[str] = None
+        self._backend_lock = asyncio.Lock()
+        # In-process replay buffer: session_id -> [(ts, payload)]
+        self._pending: Dict[int, List[Tuple[float, str]]] = {}
+
+    async def _use_redis(self) -> bool:
+        if self._backend is None:
+            async with self._backend_lock:
+                if self._backend is None:
+                    backend = "memory"
+                    if settings.CHAT_STREAM_BACKEND == "redis":
+                        from app.core.redis import async_redis_client
+                        try:
+                            await async_redis_client.ping()
+                            self._client = async_redis_client
+                            self._pubsub = async_redis_client.pubsub(ignore_subscribe_messages=True)
+                            backend = "redis"
+                        except Exception as e:
+                            logger.warning(f"⚠️ [ChatBroadcast] Redis unavailable, fan-out limited to this worker: {e}")
+                    self._backend = backend
+        return self._backend == "redis"
+
+    async def publish(self, session_id: int, payload: str) -> None:
+        if await self._use_redis():
+            try:
+                receivers = await self._client.publish(channel_name(session_id), payload)
+                if not receivers:
+                    key = pending_key(session_id)
+                    pipe = self._client.pipeline(transaction=False)
+                    pipe.rpush(key, json.dumps({"ts": time.time(), "payload": payload}))
+                    pipe.ltrim(key, -PENDING_MAX_EVENTS, -1)
+                    pipe.expire(key, settings.CHAT_WS_REPLAY_SECONDS)
+                    await pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"⚠️ [ChatBroadcast] Publish failed for session {session_id}, delivering locally: {e}")
+
+        if self._has_local(session_id):
+            self._deliver(session_id, payload)
+        else:
+            pending = self._pending.setdefault(session_id, [])
+            pending.append((time.time(), payload))
+            del pending[:-PENDING_MAX_EVENTS]
+
+    async def subscribe(self, session_id: int) -> None:
+        """Start receiving a session's events on this worker"""
+        if not await self._use_redis():
+            return
+        await self._pubsub.subscribe(channel_name(session_id))
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def unsubscribe(self, session_id: int) -> None:
+        if self._backend == "redis":
+            await self._pubsub.unsubscribe(channel_name(session_id))
+
+    async def take_pending(self, session_id: int) -> List[str]:
+        """Events published while nobody was connected, still inside the replay window"""
+        cutoff = time.time() - settings.CHAT_WS_REPLAY_SECONDS
+        if await self._use_redis():
+            pipe = self._client.pipeline(transaction=True)
+            pipe.lrange(pending_key(session_id), 0, -1)
+            pipe.delete(pending_key(session_id))
+            raw, _ = await pipe.execute()
+            entries = [json.loads(item) for item in raw or []]
+            return [entry["payload"] for entry in entries if entry["ts"] >= cutoff]
+        return [payload for ts, payload in self._pending.pop(session_id, []) if ts >= cutoff]
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    await asyncio.sleep(0.5)
+                    continue
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message.get("type") == "message":
+                    session_id = int(message["channel"].rsplit(":", 1)[1])
+                    self._deliver(session_id, message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ [ChatBroadcast] Listener error: {e}")
+                await asyncio.sleep(1.0)
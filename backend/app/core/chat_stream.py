@@ -0,0 +1,158 @@
+"""
+Per-request chat event streams behind the SSE endpoint.
+
+process_streaming_response and the customer workflow publish events while a
+request runs; GET /chat-sessions/{session_id}/stream/{request_id} reads them
+with blocking reads, resuming after the last event id the client saw:
+
+    chat:stream:{request_id}    Redis stream, one JSON event per entry ("event" field)
+
+Event types:
+    node            workflow node started ({"node": name})
+    token           answer text delta ({"content": delta, "node": name})
+    content         full answer once it is persisted ({"content": text})
+    complete        terminal success
+    user_response   terminal, the message answered a pending agent question
+    error           terminal failure ({"content": message})
+
+Streams are capped at CHAT_STREAM_MAXLEN entries and expire
+CHAT_STREAM_TTL_SECONDS after the last write, so a client that reconnects, or
+whose GET lands on another worker than its POST, replays what it missed.
+
+With CHAT_STREAM_BACKEND="memory" (or Redis unreachable at first use) an
+in-process stream is used instead; it only serves readers on the same worker.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+STREAM_PREFIX = "chat:stream"
+TERMINAL_EVENTS = frozenset({"complete", "user_response", "error"})
+
+# (event id, event) pairs returned by reads
+StreamEntry = Tuple[str, Dict[str, Any]]
+
+
+def stream_key(request_id: str) -> str:
+    return f"{STREAM_PREFIX}:{request_id}"
+
+
+class RedisChatStreams:
+    """Redis Streams backend shared by every worker"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def publish(self, request_id: str, event: Dict[str, Any]) -> str:
+        key = stream_key(request_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xadd(key, {"event": json.dumps(event, default=str)},
+                  maxlen=settings.CHAT_STREAM_MAXLEN, approximate=True)
+        pipe.expire(key, settings.CHAT_STREAM_TTL_SECONDS)
+        event_id, _ = await pipe.execute()
+        return event_id
+
+    async def read(self, request_id: str, last_id: str, block_ms: int) -> List[StreamEntry]:
+        response = await self.client.xread({stream_key(request_id): last_id or "0"}, block=block_ms)
+        entries = []
+        for _key, messages in response or []:
+            for event_id, fields in messages:
+                entries.append((event_id, json.loads(fields["event"])))
+        return entries
+
+
+class _MemoryStream:
+    def __init__(self):
+        self.entries: List[Dict[str, Any]] = []
+        self.trimmed = 0  # entries dropped from the front by the MAXLEN cap
+        self.updated = time.monotonic()
+        self.changed = asyncio.Condition()
+
+
+class MemoryChatStreams:
+    """In-process stand-in with the same ids and resume semantics (``{seq}-0``)"""
+
+    def __init__(self):
+        self._streams: Dict[str, _MemoryStream] = {}
+
+    def _stream(self, request_id: str) -> _MemoryStream:
+        stream = self._streams.get(request_id)
+        if stream is None:
+            stream = self._streams[request_id] = _MemoryStream()
+        return stream
+
+    def _purge_expired(self) -> None:
+        cutoff = time.monotonic() - settings.CHAT_STREAM_TTL_SECONDS
+        for request_id in [rid for rid, s in self._streams.items() if s.updated < cutoff]:
+            del self._streams[request_id]
+
+    async def publish(self, request_id: str, event: Dict[str, Any]) -> str:
+        self._purge_expired()
+        stream = self._stream(request_id)
+        async with stream.changed:
+            stream.entries.append(event)
+            last_seq = stream.trimmed + len(stream.entries)
+            overflow = len(stream.entries) - settings.CHAT_STREAM_MAXLEN
+            if overflow > 0:
+                del stream.entries[:overflow]
+                stream.trimmed += overflow
+            stream.updated = time.monotonic()
+            stream.changed.notify_all()
+        return f"{last_seq}-0"
+
+    async def read(self, request_id: str, last_id: str, block_ms: int) -> List[StreamEntry]:
+        stream = self._stream(request_id)
+        seq = int((last_id or "0").split("-")[0])
+
+        def last_seq() -> int:
+            return stream.trimmed + len(stream.entries)
+
+        async with stream.changed:
+            if last_seq() <= seq:
+                try:
+                    await asyncio.wait_for(stream.changed.wait_for(lambda: last_seq() > seq), block_ms / 1000)
+                except asyncio.TimeoutError:
+                    return []
+            start = max(seq - stream.trimmed, 0)
+            return [(f"{stream.trimmed + i + 1}-0", event)
+                    for i, event in enumerate(stream.entries[start:], start)]
+
+
+_backend = None
+_backend_lock = asyncio.Lock()
+
+
+async def get_chat_streams():
+    """Process-wide backend, chosen on first use"""
+    global _backend
+    if _backend is not None:
+        return _backend
+    async with _backend_lock:
+        if _backend is None:
+            backend = None
+            if settings.CHAT_STREAM_BACKEND == "redis":
+                from app.core.redis import async_redis_client
+                try:
+                    await async_redis_client.ping()
+                    backend = RedisChatStreams(async_redis_client)
+                except Exception as e:
+                    logger.warning(f"⚠️ [ChatStream] Redis unavailable, using in-process streams: {e}")
+            _backend = backend or MemoryChatStreams()
+    return _backend
+
+
+async def publish_chat_event(request_id: str, event_type: str, **fields: Any) -> Optional[str]:
+    """Append an event to a request's stream; failures are logged, never raised"""
+    try:
+        streams = await get_chat_streams()
+        return await streams.publish(request_id, {"type": event_type, **fields})
+    except Exception as e:
+        logger.warning(f"⚠️ [ChatStream] Failed to publish {event_type} for {request_id}: {e}")
+        return None
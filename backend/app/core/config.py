@@ -32,6 +32,7 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
     SQLALCHEMY_DATABASE_URI: Optional[str] = None
+    DB_EXECUTOR_MAX_WORKERS: int = 16  # Threads for blocking DB calls from async endpoints (keep below pool size + overflow)
 
     # Security
     SECRET_KEY: str
@@ -64,9 +65,20 @@ class Settings(BaseSettings):
     UPLOADS_S3_PREFIX: Optional[str] = "uploads"  # Optional S3 key prefix, e.g., "uploads"
     UPLOADS_TMP_DIR: Optional[str] = None  # Local temp directory for processing (derived if not set)
     UPLOADS_LOCAL_DIR: Optional[str] = None  # Local durable storage when S3 disabled (derived if not set)
+    UPLOADS_MULTIPART_THRESHOLD_BYTES: int = 8 * 1024 * 1024  # S3 uploads above this size use multipart
+    UPLOADS_MULTIPART_CHUNK_BYTES: int = 8 * 1024 * 1024  # Part size for multipart S3 uploads
+    S3_MAX_POOL_CONNECTIONS: int = 32  # Connection pool size of the shared S3 client
 
     # Chat / WebSocket behavior
     CHAT_WS_HEARTBEAT_MAX_SECONDS: int  # After this duration, auto-send complete to clear UI
+    CHAT_STREAM_BACKEND: str = "redis"  # SSE streams and WebSocket fan-out: "redis" (shared across workers) or "memory" (single worker / dev)
+    CHAT_STREAM_TTL_SECONDS: int = 900  # Per-request event streams expire this long after the last event
+    CHAT_STREAM_MAXLEN: int = 5000  # Approximate cap on events kept per request stream
+    CHAT_STREAM_BLOCK_MS: int = 15000  # Blocking read window; an SSE keep-alive is sent when it elapses
+    CHAT_STREAM_TIMEOUT_SECONDS: int = 300  # SSE readers give up after this long without a terminal event
+    CHAT_WS_SEND_QUEUE_SIZE: int = 100  # Outbound messages buffered per WebSocket; a client this far behind is evicted
+    CHAT_WS_SEND_TIMEOUT_SECONDS: float = 10.0  # A single WebSocket send taking longer evicts the socket
+    CHAT_WS_REPLAY_SECONDS: int = 30  # Events published while no socket is connected are replayed to the next one within this window
 
     # --- Validators & Derived Settings ---
     @field_validator("AWS_S3_BUCKET", mode="before")
@@ -164,6 +176,66 @@ class Settings(BaseSettings):
     VITALS_AGGREGATION_DELAY_BULK: int = 60      # Delay for bulk loads (seconds)
     VITALS_AGGREGATION_DELAY_INCREMENTAL: int = 15  # Delay for incremental loads (seconds)
     
+    # Vitals LOINC resolution (in-process vitals_mappings index)
+    VITALS_LOINC_CACHE_TTL_SECONDS: int = 600  # Reload vitals_mappings after this many seconds
+    
+    # Agent SQL tools (read-only pool used by query_*_db tools)
+    AGENT_SQL_POOL_MIN_CONN: int = 1
+    AGENT_SQL_POOL_MAX_CONN: int = 10
+    AGENT_SQL_POOL_WAIT_SECONDS: float = 5.0  # Wait for a free pooled connection before opening a direct one
+    AGENT_SQL_STATEMENT_TIMEOUT_MS: int = 15000  # Server-side statement_timeout for agent queries
+    AGENT_SQL_MAX_ROWS: int = 500  # Row cap per agent query result
+    AGENT_SQL_MAX_BYTES: int = 200000  # Approximate JSON byte budget per agent query result
+    AGENT_SQL_FETCH_SIZE: int = 200  # Rows fetched per round trip from the server-side cursor
+    
+    # LOINC mapping cache (Postgres loinc_mapping_cache + Redis front)
+    LOINC_MAPPER_VERSION: str = "v1"  # Bump when the LOINC prompt/model changes to invalidate cached selections
+    LOINC_CACHE_REDIS_TTL_SECONDS: int = 7 * 24 * 3600
+    LOINC_CACHE_NEGATIVE_TTL_SECONDS: int = 24 * 3600  # Retry unresolved test names after this long
+
+    # Telemetry span export (RedisSpanProcessor background batching)
+    TELEMETRY_SPAN_BUFFER_SIZE: int = 4096  # Max spans held in memory before dropping
+    TELEMETRY_SPAN_BATCH_SIZE: int = 256  # Max spans written per Redis pipeline
+    TELEMETRY_SPAN_FLUSH_INTERVAL_MS: int = 500
+    TELEMETRY_SPAN_BACKPRESSURE_RATIO: float = 0.75  # Start sampling when the buffer is this full
+    TELEMETRY_SPAN_BACKPRESSURE_SAMPLE_RATE: float = 0.1  # Fraction of non-error spans kept under backpressure
+    TELEMETRY_SPAN_SHUTDOWN_TIMEOUT_MS: int = 5000  # Flush deadline on shutdown
+
+    # Telemetry dashboard rollups (per-minute and per-hour buckets kept by the span writer)
+    TELEMETRY_ROLLUP_TTL_SECONDS: int = 8 * 24 * 3600  # Longest dashboard window (7 days) plus slack
+    TELEMETRY_RECENT_ERRORS_LIMIT: int = 1000  # Error span ids kept for error-analysis samples
+
+    # Agent workflow registry (compile graphs / build agents once per process)
+    AGENT_WARMUP_ON_STARTUP: bool = True  # Build agents and compile workflows in the background at startup
+    AGENT_LLM_MAX_CONCURRENCY: int = 16  # Concurrent LLM extraction branches per process (shared semaphore)
+
+    # Agent checkpoints (durable LangGraph thread state in Postgres)
+    AGENT_CHECKPOINT_TTL_SECONDS: int = 7 * 24 * 3600  # Checkpoints older than this are ignored and purged
+    AGENT_CHECKPOINT_MAX_PER_THREAD: int = 3  # Newest checkpoints kept per thread
+    AGENT_CHECKPOINT_MAX_BYTES_PER_THREAD: int = 2 * 1024 * 1024  # Serialized byte budget per thread
+    AGENT_CHECKPOINT_CACHE_SIZE: int = 512  # In-process LRU of latest checkpoints (0 disables)
+    AGENT_CHECKPOINT_PURGE_INTERVAL_SECONDS: int = 600  # Minimum gap between expired-row purges
+
+    # OCR result store (Textract output keyed by document SHA-256) and job polling
+    OCR_STORE_MEMORY_ENTRIES: int = 128  # Documents kept in the in-process LRU (0 disables)
+    OCR_TEXTRACT_MAX_WAIT_SECONDS: int = 300  # Give up on a Textract job after this long
+    OCR_TEXTRACT_POLL_INITIAL_SECONDS: float = 1.0  # First poll delay; grows 1.5x per poll
+    OCR_TEXTRACT_POLL_MAX_SECONDS: float = 10.0  # Poll delay cap
+
+    # Health score materialization (health_score_results_daily + health_score_dirty)
+    HEALTH_SCORE_CONFIG_REFRESH_SECONDS: int = 60  # How often the cached anchors/spec check their version
+    HEALTH_SCORE_STALE_GRACE_SECONDS: int = 120  # Serve a stale score this long while the ML worker recomputes it
+    HEALTH_SCORE_RECOMPUTE_MAX_DAYS: int = 30  # Oldest stored score (days before today) refreshed on invalidation
+    HEALTH_SCORE_RECOMPUTE_BATCH_USERS: int = 100  # Users claimed per recompute pass
+
+    # Chat history passed to the agents (recent turns verbatim + rolling summary on chat_sessions)
+    CHAT_HISTORY_TOKEN_BUDGET: int = 3000  # Verbatim recent turns; older turns are folded into the session summary
+    CHAT_HISTORY_MAX_MESSAGES: int = 100  # Unsummarized messages read per request
+    CHAT_HISTORY_SUMMARY_BATCH_MESSAGES: int = 40  # Most messages folded into the summary per request
+    CHAT_HISTORY_SUMMARY_MAX_TOKENS: int = 600  # Target length of the rolling summary
+    CHAT_HISTORY_SUMMARY_MODEL: Optional[str] = None  # Defaults to CUSTOMER_AGENT_MODEL
+    CHAT_HISTORY_CACHE_SESSIONS: int = 256  # Sessions whose per-message token counts stay cached in-process (0 disables)
+
     # AI Model Configuration
     # All models default to the main model if not specified
     DEFAULT_AI_MODEL: Optional[str] = None  # Single fallback model
@@ -213,6 +285,11 @@ class Settings(BaseSettings):
     PRESCRIPTION_CLINICAL_AGENT_MODEL: Optional[str] = None  # Prescription clinical agent model
     PRESCRIPTION_CLINICAL_VISION_MODEL: Optional[str] = None  # Prescription clinical vision model (for image analysis)
     PRESCRIPTION_CLINICAL_VISION_MAX_TOKENS: Optional[int] = None  # Prescription clinical vision max tokens
+    PRESCRIPTION_CLINICAL_COMPONENT_TIMEOUT_SECONDS: int = 180  # Per-component extraction timeout in process_components
+    
+    # URL reader cache (data/web_cache, used by fetch_and_read_url)
+    URL_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024  # Disk quota; least recently used entries are evicted
+    URL_CACHE_REVALIDATE_SECONDS: int = 3600  # Serve cached text without contacting the origin for this long
     
     # LiveKit (Self-hosted or Cloud) - used for video consultations
     LIVEKIT_URL: Optional[str] = None  # e.g., wss://your-subdomain.livekit.cloud or ws://<host>:7880
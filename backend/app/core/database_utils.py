@@ -5,11 +5,17 @@ This module provides centralized database connection management to prevent conne
 and ensure proper resource cleanup.
 """
 
+import asyncio
+import functools
 import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Generator, Dict, Any, List, Optional
+from typing import Callable, Generator, Dict, Any, List, Optional, Tuple, TypeVar
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import pool as pg_pool
 import json
 from sqlalchemy.orm import Session
 
@@ -85,12 +91,227 @@ def get_raw_db_connection() -> Generator[psycopg2.extensions.connection, None, N
             conn.close()  # Always close the connection
 
 
+T = TypeVar("T")
+
+# Bounded executor for synchronous SQLAlchemy work issued from async endpoints
+_db_executor: Optional[ThreadPoolExecutor] = None
+_db_executor_pid: Optional[int] = None
+_db_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """
+    Get the process-wide executor used by run_db().
+    
+    It is sized below the SQLAlchemy pool (pool_size + max_overflow) so offloaded
+    queries queue here instead of waiting on pool checkout while holding a thread.
+    """
+    global _db_executor, _db_executor_pid
+    with _db_executor_lock:
+        if _db_executor is None or _db_executor_pid != os.getpid():
+            _db_executor = ThreadPoolExecutor(
+                max_workers=settings.DB_EXECUTOR_MAX_WORKERS,
+                thread_name_prefix="db-executor",
+            )
+            _db_executor_pid = os.getpid()
+        return _db_executor
+
+
+async def run_db(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run blocking database code from an async endpoint without stalling the event loop.
+    
+    Usage:
+        dashboard = await run_db(VitalsCRUD.get_dashboard_data, db, user_id, days)
+    
+    A request's Session must only be used by one call at a time; await each
+    run_db() before issuing the next one for the same session.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(func, *args, **kwargs))
+
+
+# Read-only connection pool for agent SQL tools (created lazily, once per process)
+_agent_pool: Optional[pg_pool.ThreadedConnectionPool] = None
+_agent_pool_pid: Optional[int] = None
+_agent_pool_lock = threading.Lock()
+# Counts free pool slots: ThreadedConnectionPool.getconn() raises instead of waiting when exhausted
+_agent_pool_slots: Optional[threading.BoundedSemaphore] = None
+
+
+def _agent_connect_kwargs() -> Dict[str, Any]:
+    return dict(
+        host=settings.POSTGRES_SERVER,
+        port=settings.POSTGRES_PORT,
+        database=settings.POSTGRES_DB,
+        user=settings.POSTGRES_USER,
+        password=settings.POSTGRES_PASSWORD or "",
+        options=(
+            f"-c statement_timeout={settings.AGENT_SQL_STATEMENT_TIMEOUT_MS} "
+            f"-c idle_in_transaction_session_timeout={settings.AGENT_SQL_STATEMENT_TIMEOUT_MS * 2} "
+            "-c default_transaction_read_only=on"
+        ),
+        application_name="zivo-agent-sql",
+    )
+
+
+def _get_agent_pool() -> pg_pool.ThreadedConnectionPool:
+    """
+    Get the process-wide read-only pool used by agent queries.
+    
+    Connections are opened with a server-side statement_timeout and default read-only
+    transactions, so a runaway LLM-generated query is cancelled by Postgres itself.
+    The pool is rebuilt after a fork so workers never share sockets with the parent.
+    """
+    global _agent_pool, _agent_pool_pid, _agent_pool_slots
+    with _agent_pool_lock:
+        if _agent_pool is None or _agent_pool_pid != os.getpid():
+            _agent_pool = pg_pool.ThreadedConnectionPool(
+                settings.AGENT_SQL_POOL_MIN_CONN,
+                settings.AGENT_SQL_POOL_MAX_CONN,
+                **_agent_connect_kwargs(),
+            )
+            _agent_pool_slots = threading.BoundedSemaphore(settings.AGENT_SQL_POOL_MAX_CONN)
+            _agent_pool_pid = os.getpid()
+            logger.info(
+                f"Agent SQL pool created (min={settings.AGENT_SQL_POOL_MIN_CONN}, "
+                f"max={settings.AGENT_SQL_POOL_MAX_CONN}, timeout={settings.AGENT_SQL_STATEMENT_TIMEOUT_MS}ms)"
+            )
+        return _agent_pool
+
+
+@contextmanager
+def get_readonly_agent_connection() -> Generator[psycopg2.extensions.connection, None, None]:
+    """
+    Borrow a pooled read-only connection for agent queries.
+    
+    The transaction is always rolled back on release (nothing can be written anyway)
+    and broken connections are discarded instead of being returned to the pool.
+    When every pooled connection is busy, waits up to AGENT_SQL_POOL_WAIT_SECONDS
+    for one and then falls back to a direct connection with the same settings.
+    
+    Yields:
+        psycopg2.connection: Pooled (or, under overload, direct) read-only connection
+    """
+    agent_pool = _get_agent_pool()
+    slots = _agent_pool_slots
+    if not slots.acquire(timeout=settings.AGENT_SQL_POOL_WAIT_SECONDS):
+        logger.warning(
+            f"⚠️ Agent SQL pool exhausted ({settings.AGENT_SQL_POOL_MAX_CONN} connections busy "
+            f"for {settings.AGENT_SQL_POOL_WAIT_SECONDS}s); using a direct connection"
+        )
+        conn = psycopg2.connect(**_agent_connect_kwargs())
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+
+    try:
+        conn = agent_pool.getconn()
+    except Exception:
+        slots.release()
+        raise
+    discard = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        discard = True
+        raise
+    finally:
+        try:
+            if not conn.closed:
+                conn.rollback()
+        except Exception:
+            discard = True
+        try:
+            agent_pool.putconn(conn, close=discard or bool(conn.closed))
+        finally:
+            slots.release()
+
+
+def _is_cursor_compatible(query: str) -> bool:
+    """Server-side (named) cursors only accept SELECT/VALUES statements"""
+    head = query.lstrip().split(None, 1)
+    return bool(head) and head[0].lower() in ("select", "with", "values", "table")
+
+
+def stream_query_rows(
+    query: str,
+    params: Optional[tuple] = None,
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> Tuple[List[str], List[List[Any]], Optional[str]]:
+    """
+    Execute a read-only query and stream rows through a server-side cursor.
+    
+    Rows are pulled in AGENT_SQL_FETCH_SIZE chunks and collection stops as soon as
+    the row cap or the approximate JSON byte budget is reached, so an unbounded
+    SELECT never materializes the full result in the worker.
+    
+    Args:
+        query: SQL query string
+        params: Optional query parameters tuple
+        max_rows: Row cap (defaults to AGENT_SQL_MAX_ROWS)
+        max_bytes: JSON byte budget (defaults to AGENT_SQL_MAX_BYTES)
+        
+    Returns:
+        Tuple of (column names, rows as lists, truncation reason or None)
+    """
+    max_rows = max_rows if max_rows is not None else settings.AGENT_SQL_MAX_ROWS
+    max_bytes = max_bytes if max_bytes is not None else settings.AGENT_SQL_MAX_BYTES
+    fetch_size = max(1, min(settings.AGENT_SQL_FETCH_SIZE, max_rows + 1))
+
+    with get_readonly_agent_connection() as conn:
+        server_side = _is_cursor_compatible(query)
+        if server_side:
+            cursor = conn.cursor(name=f"agent_{uuid.uuid4().hex[:12]}")
+            cursor.itersize = fetch_size
+        else:
+            cursor = conn.cursor()
+        try:
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            if not server_side and cursor.description is None:
+                return [], [], None
+
+            # A named cursor only DECLAREs on execute(); description is set by the first fetch
+            chunk = cursor.fetchmany(fetch_size)
+            columns = [col[0] for col in cursor.description or []]
+            rows: List[List[Any]] = []
+            used_bytes = 0
+            truncated: Optional[str] = None
+
+            while truncated is None:
+                if not chunk:
+                    break
+                for record in chunk:
+                    if len(rows) >= max_rows:
+                        truncated = "row_limit"
+                        break
+                    row = list(record)
+                    used_bytes += len(json.dumps(row, default=str, separators=(",", ":")))
+                    if used_bytes > max_bytes:
+                        truncated = "byte_limit"
+                        break
+                    rows.append(row)
+                if truncated is None:
+                    chunk = cursor.fetchmany(fetch_size)
+
+            return columns, rows, truncated
+        finally:
+            cursor.close()
+
+
 def execute_query_safely(query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
     """
     Execute a SQL query safely with proper connection management.
     
     This is a convenience function for simple queries that returns results as dictionaries.
-    Handles all connection management automatically.
+    Runs on the pooled read-only connection and is bounded by AGENT_SQL_MAX_ROWS /
+    AGENT_SQL_MAX_BYTES.
     
     Args:
         query: SQL query string
@@ -103,14 +324,10 @@ def execute_query_safely(query: str, params: Optional[tuple] = None) -> List[Dic
         Exception: If query execution fails
     """
     try:
-        with get_raw_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                if params:
-                    cursor.execute(query, params)
-                else:
-                    cursor.execute(query)
-                results = cursor.fetchall()
-                return [dict(row) for row in results]
+        columns, rows, truncated = stream_query_rows(query, params)
+        if truncated:
+            logger.warning(f"Query result truncated ({truncated}) after {len(rows)} rows: {query[:100]}...")
+        return [dict(zip(columns, row)) for row in rows]
     except Exception as e:
         logger.error(f"Query execution failed: {query[:100]}... Error: {e}")
         raise
@@ -118,10 +335,13 @@ def execute_query_safely(query: str, params: Optional[tuple] = None) -> List[Dic
 
 def execute_query_safely_json(query: str, params: Optional[tuple] = None) -> str:
     """
-    Execute a SQL query safely and return results as JSON string.
+    Execute a SQL query safely and return results as compact columnar JSON.
     
-    This is specifically for agent tools that need JSON responses.
-    Handles all connection management automatically.
+    This is specifically for agent tools that need JSON responses. Column names are
+    emitted once instead of per row:
+        {"columns":[...],"rows":[[...],...],"row_count":N,"truncated":false}
+    When the row cap or byte budget is hit, "truncated" is true and
+    "truncated_reason" says which limit applied.
     
     Args:
         query: SQL query string
@@ -134,8 +354,16 @@ def execute_query_safely_json(query: str, params: Optional[tuple] = None) -> str
         Exception: If query execution fails
     """
     try:
-        results = execute_query_safely(query, params)
-        return json.dumps(results, default=str)
+        columns, rows, truncated = stream_query_rows(query, params)
+        payload: Dict[str, Any] = {
+            "columns": columns,
+            "rows": rows,
+            "row_count": len(rows),
+            "truncated": truncated is not None,
+        }
+        if truncated:
+            payload["truncated_reason"] = truncated
+        return json.dumps(payload, default=str, separators=(",", ":"))
     except Exception as e:
         logger.error(f"Query JSON execution failed: {query[:100]}... Error: {e}")
         return f"Query Error: {e}"
@@ -1,4 +1,5 @@
 import redis
+import redis.asyncio as aioredis
 from app.core.config import settings
 
 redis_client = redis.Redis(
@@ -8,8 +9,16 @@ redis_client = redis.Redis(
     decode_responses=True
 )
 
+# For async request handlers; commands await instead of blocking the event loop
+async_redis_client = aioredis.Redis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=settings.REDIS_DB,
+    decode_responses=True
+)
+
 def get_redis():
     try:
         yield redis_client
     finally:
-        pass  # Redis connection is managed by the client pool 
\ No newline at end of file
+        pass  # Redis connection is managed by the client pool 
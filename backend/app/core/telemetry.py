@@ -1,6 +1,10 @@
 import json
+import os
+import random
+import threading
 import uuid
 import time
+from collections import defaultdict, deque
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 from contextlib import contextmanager
@@ -19,6 +23,7 @@ from opentelemetry.instrumentation.redis import RedisInstrumentor
 from app.models.health_data import OpenTelemetryTrace
 from app.db.session import SessionLocal
 from app.core.redis import redis_client
+from app.core.config import settings
 
 class ZivoHealthTelemetry:
     """Enhanced telemetry system for ZivoHealth agents with Redis persistence"""
@@ -152,12 +157,48 @@ class ZivoHealthTelemetry:
             )
 
 class RedisSpanProcessor:
-    """Custom span processor that stores traces to Redis for fast access and analysis"""
-    
-    def __init__(self):
+    """
+    Custom span processor that stores traces to Redis for fast access and analysis.
+
+    on_end only appends the finished span to a bounded in-memory buffer; a
+    background thread serializes buffered spans and writes them in coalesced
+    pipelines, so the Redis round trip is off the agent's hot path. Under
+    backpressure non-error spans are sampled, and spans arriving at a full buffer
+    are dropped; both are counted and reported in telemetry:metrics:exporter.
+    """
+
+    SPAN_TTL_SECONDS = 604800  # 7 days
+    DAILY_METRICS_TTL_SECONDS = 2592000  # 30 days
+    RECENT_SPANS_LIMIT = 1000
+
+    def __init__(
+        self,
+        max_queue_size: Optional[int] = None,
+        max_batch_size: Optional[int] = None,
+        flush_interval_ms: Optional[int] = None,
+    ):
         self.redis_client = None
+        self.max_queue_size = max_queue_size or settings.TELEMETRY_SPAN_BUFFER_SIZE
+        self.max_batch_size = max_batch_size or settings.TELEMETRY_SPAN_BATCH_SIZE
+        self.flush_interval = (flush_interval_ms or settings.TELEMETRY_SPAN_FLUSH_INTERVAL_MS) / 1000.0
+        self.backpressure_threshold = int(self.max_queue_size * settings.TELEMETRY_SPAN_BACKPRESSURE_RATIO)
+        self.backpressure_sample_rate = settings.TELEMETRY_SPAN_BACKPRESSURE_SAMPLE_RATE
+
+        self._queue: deque = deque()
+        self._condition = threading.Condition(threading.Lock())
+        self._flush_requests: List[threading.Event] = []
+        self._shutdown = False
+        self._worker: Optional[threading.Thread] = None
+        self._worker_pid: Optional[int] = None
+
+        # Counters since the last flush; reported to Redis with each batch
+        self.dropped_spans = 0
+        self.sampled_out_spans = 0
+        self.failed_spans = 0
+        self.exported_spans = 0
+
         self._initialize_redis()
-        
+
     def _initialize_redis(self):
         """Initialize Redis connection"""
         try:
@@ -167,133 +208,240 @@ class RedisSpanProcessor:
         except Exception as e:
             print(f"Failed to initialize Redis for telemetry: {e}")
             self.redis_client = None
-    
+
+    def _ensure_worker(self):
+        """Start the flusher thread lazily (and again in forked worker processes)"""
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        self._worker_pid = pid
+        self._worker = threading.Thread(target=self._run, name="RedisSpanProcessor", daemon=True)
+        self._worker.start()
+
     def on_start(self, span, parent_context=None):
         """Called when a span starts"""
         pass
-    
+
     def on_end(self, span):
-        """Called when a span ends - store to Redis"""
-        if not self.redis_client:
+        """Called when a span ends - enqueue for the background flusher"""
+        if not self.redis_client or self._shutdown:
             return
-            
-        try:
-            self._store_span_to_redis(span)
-        except Exception as e:
-            print(f"Failed to store span to Redis: {e}")
-    
-    def _store_span_to_redis(self, span):
-        """Store span data to Redis with efficient data structures"""
+
+        with self._condition:
+            queued = len(self._queue)
+            if queued >= self.max_queue_size:
+                self.dropped_spans += 1
+                return
+            if queued >= self.backpressure_threshold and not self._is_error(span):
+                if random.random() >= self.backpressure_sample_rate:
+                    self.sampled_out_spans += 1
+                    return
+            self._queue.append(span)
+            if len(self._queue) >= self.max_batch_size:
+                self._condition.notify()
+
+        self._ensure_worker()
+
+    @staticmethod
+    def _is_error(span) -> bool:
+        return bool(span.status and span.status.status_code == trace.StatusCode.ERROR)
+
+    def _run(self):
+        """Flusher loop: write a batch whenever one is full or the interval elapses"""
+        while True:
+            with self._condition:
+                if not self._shutdown and not self._flush_requests and len(self._queue) < self.max_batch_size:
+                    self._condition.wait(self.flush_interval)
+                if self._shutdown and not self._queue:
+                    break
+                flush_requests, self._flush_requests = self._flush_requests, []
+
+            self._drain()
+            for event in flush_requests:
+                event.set()
+
+    def _drain(self, deadline: Optional[float] = None):
+        """Export everything currently buffered, one pipeline per batch"""
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            with self._condition:
+                if not self._queue:
+                    return
+                batch = [self._queue.popleft() for _ in range(min(self.max_batch_size, len(self._queue)))]
+            self._export_batch(batch)
+
+    def _export_batch(self, spans: List[Any]):
+        """Store a batch of spans to Redis in a single coalesced pipeline"""
         if not self.redis_client:
             return
-            
+
+        deltas: Dict[str, int] = {}
         try:
-            # Extract span context
-            span_context = span.get_span_context()
-            trace_id = f"{span_context.trace_id:032x}"
-            span_id = f"{span_context.span_id:016x}"
-            
-            # Calculate timing
-            start_time = datetime.fromtimestamp(span.start_time / 1e9)
-            end_time = datetime.fromtimestamp(span.end_time / 1e9) if span.end_time else None
-            duration_ms = (span.end_time - span.start_time) / 1e6 if span.end_time else None
-            
-            # Extract attributes
-            attributes = dict(span.attributes) if span.attributes else {}
-            
-            # Extract events
-            events = []
-            if span.events:
-                for event in span.events:
-                    events.append({
-                        "name": event.name,
-                        "timestamp": datetime.fromtimestamp(event.timestamp / 1e9).isoformat(),
-                        "attributes": dict(event.attributes) if event.attributes else {}
-                    })
-            
-            # Create span data
-            span_data = {
-                "trace_id": trace_id,
-                "span_id": span_id,
-                "parent_span_id": f"{span.parent.span_id:016x}" if span.parent else None,
-                "span_name": span.name,
-                "span_kind": span.kind.name if span.kind else "INTERNAL",
-                "status_code": span.status.status_code.name if span.status else "UNSET",
-                "status_message": span.status.description if span.status else None,
-                "start_time": start_time.isoformat(),
-                "end_time": end_time.isoformat() if end_time else None,
-                "duration_ms": duration_ms,
-                "service_name": attributes.get("service.name", "zivohealth-agents"),
-                "operation_name": attributes.get("agent.operation"),
-                "attributes": attributes,
-                "events": events,
-                "user_id": attributes.get("user.id"),
-                "session_id": attributes.get("session.id"),
-                "request_id": attributes.get("request.id"),
-                "document_id": attributes.get("document.id"),
-                "agent_name": attributes.get("agent.name"),
-                "agent_type": attributes.get("agent.type"),
-                "workflow_step": attributes.get("agent.operation"),
-                "created_at": datetime.utcnow().isoformat()
-            }
-            
-            # Store in Redis with multiple data structures for efficient querying
-            pipe = self.redis_client.pipeline()
-            
-            # 1. Store individual span (expires in 7 days)
-            span_key = f"telemetry:span:{span_id}"
-            pipe.setex(span_key, 604800, json.dumps(span_data))  # 7 days TTL
-            
-            # 2. Add to trace (sorted set by start time)
-            trace_key = f"telemetry:trace:{trace_id}"
-            pipe.zadd(trace_key, {span_id: span.start_time})
-            pipe.expire(trace_key, 604800)  # 7 days TTL
-            
-            # 3. Add to agent operations index
-            if attributes.get("agent.name"):
-                agent_key = f"telemetry:agent:{attributes['agent.name']}"
-                pipe.zadd(agent_key, {span_id: span.start_time})
-                pipe.expire(agent_key, 604800)
-            
-            # 4. Add to user sessions index
-            if attributes.get("user.id") and attributes.get("session.id"):
-                session_key = f"telemetry:session:{attributes['user.id']}:{attributes['session.id']}"
-                pipe.zadd(session_key, {span_id: span.start_time})
-                pipe.expire(session_key, 604800)
-            
-            # 5. Add to recent spans (for dashboard)
-            recent_key = "telemetry:recent_spans"
-            pipe.zadd(recent_key, {span_id: span.start_time})
-            pipe.zremrangebyrank(recent_key, 0, -1001)  # Keep only last 1000 spans
-            
-            # 6. Update metrics counters
-            today = datetime.utcnow().strftime("%Y-%m-%d")
-            hour = datetime.utcnow().strftime("%Y-%m-%d:%H")
-            
-            pipe.incr(f"telemetry:metrics:spans:daily:{today}")
-            pipe.expire(f"telemetry:metrics:spans:daily:{today}", 2592000)  # 30 days
-            
-            pipe.incr(f"telemetry:metrics:spans:hourly:{hour}")
-            pipe.expire(f"telemetry:metrics:spans:hourly:{hour}", 604800)  # 7 days
-            
-            if attributes.get("agent.name"):
-                pipe.incr(f"telemetry:metrics:agent:{attributes['agent.name']}:daily:{today}")
-                pipe.expire(f"telemetry:metrics:agent:{attributes['agent.name']}:daily:{today}", 2592000)
-            
-            # Execute pipeline
+            span_records = [self._span_to_dict(span) for span in spans]
+
+            pipe = self.redis_client.pipeline(transaction=False)
+            index_members: Dict[str, Dict[str, int]] = defaultdict(dict)
+            counters: Dict[str, int] = defaultdict(int)
+            counter_ttls: Dict[str, int] = {}
+
+            for span_data, start_time_ns, end_time_ns in span_records:
+                span_id = span_data["span_id"]
+
+                # 1. Store individual span (expires in 7 days)
+                pipe.setex(f"telemetry:span:{span_id}", self.SPAN_TTL_SECONDS, json.dumps(span_data))
+
+                # 2. Add to trace (sorted set by start time)
+                index_members[f"telemetry:trace:{span_data['trace_id']}"][span_id] = start_time_ns
+
+                # 3. Add to agent operations index
+                agent_name = span_data["agent_name"]
+                if agent_name:
+                    index_members[f"telemetry:agent:{agent_name}"][span_id] = start_time_ns
+
+                # 4. Add to user sessions index
+                if span_data["user_id"] and span_data["session_id"]:
+                    index_members[f"telemetry:session:{span_data['user_id']}:{span_data['session_id']}"][span_id] = start_time_ns
+
+                # 5. Add to recent spans (for dashboard)
+                index_members["telemetry:recent_spans"][span_id] = start_time_ns
+
+                # 6. Metrics counters, bucketed by when the span ended
+                ended_at = datetime.utcfromtimestamp((end_time_ns or start_time_ns) / 1e9)
+                today = ended_at.strftime("%Y-%m-%d")
+                hour = ended_at.strftime("%Y-%m-%d:%H")
+                daily_key = f"telemetry:metrics:spans:daily:{today}"
+                hourly_key = f"telemetry:metrics:spans:hourly:{hour}"
+                counters[daily_key] += 1
+                counter_ttls[daily_key] = self.DAILY_METRICS_TTL_SECONDS
+                counters[hourly_key] += 1
+                counter_ttls[hourly_key] = self.SPAN_TTL_SECONDS
+                if agent_name:
+                    agent_key = f"telemetry:metrics:agent:{agent_name}:daily:{today}"
+                    counters[agent_key] += 1
+                    counter_ttls[agent_key] = self.DAILY_METRICS_TTL_SECONDS
+
+            for key, members in index_members.items():
+                pipe.zadd(key, members)
+                if key == "telemetry:recent_spans":
+                    pipe.zremrangebyrank(key, 0, -(self.RECENT_SPANS_LIMIT + 1))  # Keep only last 1000 spans
+                else:
+                    pipe.expire(key, self.SPAN_TTL_SECONDS)
+
+            for key, count in counters.items():
+                pipe.incrby(key, count)
+                pipe.expire(key, counter_ttls[key])
+
+            deltas = self._add_exporter_counters(pipe, exported=len(span_records))
             pipe.execute()
-            
+
         except Exception as e:
-            print(f"Error storing span to Redis: {e}")
-    
-    def shutdown(self):
-        """Cleanup processor"""
-        if self.redis_client:
-            self.redis_client.close()
-    
+            with self._condition:
+                # Keep unreported drop/sample counts for the next batch
+                self.exported_spans -= deltas.get("exported", 0)
+                self.dropped_spans += deltas.get("dropped", 0)
+                self.sampled_out_spans += deltas.get("sampled_out", 0)
+                self.failed_spans += deltas.get("failed", 0) + len(spans)
+            print(f"Error storing {len(spans)} spans to Redis: {e}")
+
+    def _add_exporter_counters(self, pipe, exported: int) -> Dict[str, int]:
+        """Move the local drop/sample/failure counters into the pipeline; returns the deltas queued"""
+        with self._condition:
+            self.exported_spans += exported
+            deltas = {
+                "exported": exported,
+                "dropped": self.dropped_spans,
+                "sampled_out": self.sampled_out_spans,
+                "failed": self.failed_spans,
+            }
+            self.dropped_spans = self.sampled_out_spans = self.failed_spans = 0
+
+        for field, value in deltas.items():
+            if value:
+                pipe.hincrby("telemetry:metrics:exporter", field, value)
+        return deltas
+
+    def _span_to_dict(self, span):
+        """Serialize a finished span; returns (span_data, start_time_ns, end_time_ns)"""
+        # Extract span context
+        span_context = span.get_span_context()
+        trace_id = f"{span_context.trace_id:032x}"
+        span_id = f"{span_context.span_id:016x}"
+
+        # Calculate timing
+        start_time = datetime.fromtimestamp(span.start_time / 1e9)
+        end_time = datetime.fromtimestamp(span.end_time / 1e9) if span.end_time else None
+        duration_ms = (span.end_time - span.start_time) / 1e6 if span.end_time else None
+
+        # Extract attributes
+        attributes = dict(span.attributes) if span.attributes else {}
+
+        # Extract events
+        events = []
+        if span.events:
+            for event in span.events:
+                events.append({
+                    "name": event.name,
+                    "timestamp": datetime.fromtimestamp(event.timestamp / 1e9).isoformat(),
+                    "attributes": dict(event.attributes) if event.attributes else {}
+                })
+
+        span_data = {
+            "trace_id": trace_id,
+            "span_id": span_id,
+            "parent_span_id": f"{span.parent.span_id:016x}" if span.parent else None,
+            "span_name": span.name,
+            "span_kind": span.kind.name if span.kind else "INTERNAL",
+            "status_code": span.status.status_code.name if span.status else "UNSET",
+            "status_message": span.status.description if span.status else None,
+            "start_time": start_time.isoformat(),
+            "end_time": end_time.isoformat() if end_time else None,
+            "duration_ms": duration_ms,
+            "service_name": attributes.get("service.name", "zivohealth-agents"),
+            "operation_name": attributes.get("agent.operation"),
+            "attributes": attributes,
+            "events": events,
+            "user_id": attributes.get("user.id"),
+            "session_id": attributes.get("session.id"),
+            "request_id": attributes.get("request.id"),
+            "document_id": attributes.get("document.id"),
+            "agent_name": attributes.get("agent.name"),
+            "agent_type": attributes.get("agent.type"),
+            "workflow_step": attributes.get("agent.operation"),
+            "created_at": datetime.utcnow().isoformat()
+        }
+        return span_data, span.start_time, span.end_time
+
     def force_flush(self, timeout_millis=30000):
-        """Force flush - Redis writes are immediate"""
-        return True
+        """Block until everything buffered before this call has been written"""
+        if not self._worker or not self._worker.is_alive():
+            self._drain(deadline=time.monotonic() + timeout_millis / 1000.0)
+            return not self._queue
+
+        event = threading.Event()
+        with self._condition:
+            self._flush_requests.append(event)
+            self._condition.notify()
+        return event.wait(timeout_millis / 1000.0)
+
+    def shutdown(self):
+        """Stop accepting spans and flush the buffer within the shutdown deadline"""
+        timeout = settings.TELEMETRY_SPAN_SHUTDOWN_TIMEOUT_MS / 1000.0
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+
+        if self._worker and self._worker.is_alive():
+            self._worker.join(timeout)
+        else:
+            self._drain(deadline=deadline)
+
+        with self._condition:
+            remaining = len(self._queue)
+            self._queue.clear()
+        if remaining:
+            print(f"Telemetry shutdown deadline reached; dropped {remaining} buffered spans")
 
 # Global telemetry instance
 # telemetry = ZivoHealthTelemetry()  # Temporarily disabled
@@ -0,0 +1,198 @@
+"""
+Rolling telemetry rollups for the admin dashboard.
+
+The span writer (SimpleTelemetry._store_span) calls ``add_span_to_rollups`` on
+its pipeline for every span. That increments one per-minute and one per-hour
+bucket:
+
+    telemetry:rollup:m:{epoch_minute}    hash of counters
+    telemetry:rollup:h:{epoch_hour}      same counters, hour granularity
+    ...:{sessions|agents|tools}          HyperLogLogs of distinct values
+
+Hash fields:
+    spans, errors, duration_ms_sum, duration_count, hist:{le_ms}
+    agent:{name}:{spans|errors|duration_ms_sum|duration_count}
+    tool:{name}:{uses|errors|duration_ms_sum}
+    agent_tool:{agent}|{tool}           spans using a tool, for distinct pairs
+    error:{agent}|{error_type}          error counts for error analysis
+
+Error span ids also go to telemetry:recent_errors so error analysis can show
+sample messages without scanning every span.
+
+Readers cover a window with minute buckets up to the first full hour and hour
+buckets after it, so any window up to 7 days costs at most ~230 pipelined reads.
+"""
+
+import math
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+ROLLUP_PREFIX = "telemetry:rollup"
+RECENT_ERRORS_KEY = "telemetry:recent_errors"
+HLL_DIMENSIONS = ("sessions", "agents", "tools")
+
+# Duration histogram upper bounds in ms; the last bucket is open-ended
+DURATION_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, math.inf)
+
+
+def _bucket_label(bound: float) -> str:
+    return "inf" if math.isinf(bound) else str(int(bound))
+
+
+def minute_key(ts: float) -> str:
+    return f"{ROLLUP_PREFIX}:m:{int(ts // 60) * 60}"
+
+
+def hour_key(ts: float) -> str:
+    return f"{ROLLUP_PREFIX}:h:{int(ts // 3600) * 3600}"
+
+
+def add_span_to_rollups(pipe, span: Dict[str, Any]) -> None:
+    """Queue the rollup updates for one stored span onto a Redis pipeline"""
+    start_time = span.get("start_time")
+    if start_time is None:
+        return
+
+    agent = span.get("agent_name")
+    metadata = span.get("metadata") or {}
+    tool = metadata.get("tool_used")
+    is_error = span.get("status") == "ERROR"
+    duration = span.get("duration_ms")
+    user_id = span.get("user_id")
+    session_id = span.get("session_id")
+
+    # Integer counters use HINCRBY, duration sums HINCRBYFLOAT (a field never mixes the two)
+    counts: Dict[str, int] = defaultdict(int)
+    sums: Dict[str, float] = defaultdict(float)
+    counts["spans"] += 1
+    if is_error:
+        counts["errors"] += 1
+        error_type = metadata.get("error_type", "General Error")
+        counts[f"error:{agent or 'Unknown'}|{error_type}"] += 1
+    if duration:
+        sums["duration_ms_sum"] += duration
+        counts["duration_count"] += 1
+        bound = next(b for b in DURATION_BUCKETS_MS if duration <= b)
+        counts[f"hist:{_bucket_label(bound)}"] += 1
+    if agent:
+        counts[f"agent:{agent}:spans"] += 1
+        if is_error:
+            counts[f"agent:{agent}:errors"] += 1
+        if duration:
+            sums[f"agent:{agent}:duration_ms_sum"] += duration
+            counts[f"agent:{agent}:duration_count"] += 1
+    if tool:
+        counts[f"tool:{tool}:uses"] += 1
+        if is_error:
+            counts[f"tool:{tool}:errors"] += 1
+        if duration:
+            sums[f"tool:{tool}:duration_ms_sum"] += duration
+        counts[f"agent_tool:{agent or ''}|{tool}"] += 1
+
+    distinct = {
+        "sessions": f"{user_id}:{session_id}" if user_id and session_id else None,
+        "agents": agent,
+        "tools": tool,
+    }
+
+    ttl = settings.TELEMETRY_ROLLUP_TTL_SECONDS
+    for key in (minute_key(start_time), hour_key(start_time)):
+        for field, value in counts.items():
+            pipe.hincrby(key, field, value)
+        for field, value in sums.items():
+            pipe.hincrbyfloat(key, field, value)
+        pipe.expire(key, ttl)
+        for dimension, member in distinct.items():
+            if member:
+                pipe.pfadd(f"{key}:{dimension}", member)
+                pipe.expire(f"{key}:{dimension}", ttl)
+
+    if is_error and span.get("span_id"):
+        pipe.zadd(RECENT_ERRORS_KEY, {span["span_id"]: start_time})
+        pipe.zremrangebyrank(RECENT_ERRORS_KEY, 0, -(settings.TELEMETRY_RECENT_ERRORS_LIMIT + 1))
+
+
+def window_bucket_keys(start_ts: float, end_ts: float) -> List[str]:
+    """Minute buckets up to the first full hour, hour buckets from there to end_ts"""
+    first_hour = math.ceil(start_ts / 3600) * 3600
+    keys = []
+    minute = int(start_ts // 60) * 60
+    while minute < min(first_hour, end_ts + 1):
+        keys.append(f"{ROLLUP_PREFIX}:m:{minute}")
+        minute += 60
+    hour = first_hour
+    while hour <= end_ts:
+        keys.append(f"{ROLLUP_PREFIX}:h:{hour}")
+        hour += 3600
+    return keys
+
+
+class RollupWindow:
+    """Counters merged over a window's buckets, plus distinct counts"""
+
+    def __init__(self, fields: Dict[str, float], distinct: Dict[str, int]):
+        self.fields = fields
+        self.distinct = distinct
+
+    def get(self, field: str) -> float:
+        return self.fields.get(field, 0.0)
+
+    def grouped(self, prefix: str) -> Dict[str, Dict[str, float]]:
+        """``{prefix}{name}:{metric}`` fields as {name: {metric: value}}"""
+        groups: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for field, value in self.fields.items():
+            if field.startswith(prefix):
+                name, metric = field[len(prefix):].rsplit(":", 1)
+                groups[name][metric] = value
+        return groups
+
+    def pairs(self, prefix: str) -> Dict[Tuple[str, str], float]:
+        """``{prefix}{a}|{b}`` fields as {(a, b): value}"""
+        result = {}
+        for field, value in self.fields.items():
+            if field.startswith(prefix):
+                a, b = field[len(prefix):].rsplit("|", 1)
+                result[(a, b)] = value
+        return result
+
+    def duration_percentile(self, q: float) -> Optional[float]:
+        """Upper bound (ms) of the histogram bucket holding the q-th quantile"""
+        total = self.get("duration_count")
+        if not total:
+            return None
+        seen = 0.0
+        for bound in DURATION_BUCKETS_MS:
+            seen += self.get(f"hist:{_bucket_label(bound)}")
+            if seen >= q * total:
+                return None if math.isinf(bound) else float(bound)
+        return None
+
+
+async def read_window(client, start_ts: float, end_ts: float) -> RollupWindow:
+    """Merge all buckets covering [start_ts, end_ts] in one pipelined round trip"""
+    keys = window_bucket_keys(start_ts, end_ts)
+    if not keys:
+        return RollupWindow({}, {dimension: 0 for dimension in HLL_DIMENSIONS})
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.hgetall(key)
+    for dimension in HLL_DIMENSIONS:
+        pipe.pfcount(*[f"{key}:{dimension}" for key in keys])
+    results = await pipe.execute()
+
+    fields: Dict[str, float] = defaultdict(float)
+    for bucket in results[:len(keys)]:
+        for field, value in (bucket or {}).items():
+            fields[field] += float(value)
+    distinct = dict(zip(HLL_DIMENSIONS, (int(n or 0) for n in results[len(keys):])))
+    return RollupWindow(dict(fields), distinct)
+
+
+async def hourly_distinct(client, hour_starts: List[float], dimension: str) -> List[int]:
+    """Distinct ``dimension`` count for each hour bucket"""
+    pipe = client.pipeline(transaction=False)
+    for ts in hour_starts:
+        pipe.pfcount(f"{hour_key(ts)}:{dimension}")
+    return [int(n or 0) for n in await pipe.execute()]
@@ -10,6 +10,7 @@ from typing import Dict, Any, Optional
 from datetime import datetime
 from contextlib import contextmanager
 from app.core.redis import redis_client
+from app.core.telemetry_rollups import add_span_to_rollups
 
 class SimpleTelemetry:
     """Simplified telemetry system with Redis storage"""
@@ -220,33 +221,41 @@ class SimpleTelemetry:
             
             span_id = core_data['span_id']
             
+            # All writes for the span go out in one round trip
+            pipe = self.redis.pipeline(transaction=False)
+            
             # Store individual span
             span_key = f"telemetry:span:{span_id}"
-            self.redis.setex(span_key, 604800, json.dumps(core_data))  # 7 days TTL
+            pipe.setex(span_key, 604800, json.dumps(core_data))  # 7 days TTL
             
             # Add to recent spans
-            self.redis.zadd("telemetry:recent_spans", {span_id: core_data['start_time']})
+            pipe.zadd("telemetry:recent_spans", {span_id: core_data['start_time']})
             
             # Keep only last 1000 spans
-            self.redis.zremrangebyrank("telemetry:recent_spans", 0, -1001)
+            pipe.zremrangebyrank("telemetry:recent_spans", 0, -1001)
             
             # Add to agent index if agent_name exists
             if core_data.get('agent_name'):
                 agent_key = f"telemetry:agent:{core_data['agent_name']}"
-                self.redis.zadd(agent_key, {span_id: core_data['start_time']})
-                self.redis.expire(agent_key, 604800)  # 7 days TTL
+                pipe.zadd(agent_key, {span_id: core_data['start_time']})
+                pipe.expire(agent_key, 604800)  # 7 days TTL
             
             # Add to session index if user and session exist
             if core_data.get('user_id') and core_data.get('session_id'):
                 session_key = f"telemetry:session:{core_data['user_id']}:{core_data['session_id']}"
-                self.redis.zadd(session_key, {span_id: core_data['start_time']})
-                self.redis.expire(session_key, 604800)  # 7 days TTL
+                pipe.zadd(session_key, {span_id: core_data['start_time']})
+                pipe.expire(session_key, 604800)  # 7 days TTL
             
             # NEW: Add to hierarchy index if parent exists
             if core_data.get('parent_span_id'):
                 hierarchy_key = f"telemetry:hierarchy:{core_data['parent_span_id']}"
-                self.redis.sadd(hierarchy_key, span_id)
-                self.redis.expire(hierarchy_key, 604800)  # 7 days TTL
+                pipe.sadd(hierarchy_key, span_id)
+                pipe.expire(hierarchy_key, 604800)  # 7 days TTL
+            
+            # Per-minute/hour rollups read by the dashboard charts
+            add_span_to_rollups(pipe, core_data)
+            
+            pipe.execute()
                 
         except Exception as e:
             # Don't let telemetry failures affect the main application
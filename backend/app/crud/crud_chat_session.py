@@ -171,6 +171,19 @@ class CRUDChatMessage(CRUDBase[ChatMessage, ChatMessageCreate, ChatMessageUpdate
             .all()
         )
 
+    def get_messages_after(
+        self, db: Session, *, session_id: int, after_id: Optional[int] = None,
+        before_id: Optional[int] = None, limit: int = 100, newest_first: bool = False
+    ) -> List[ChatMessage]:
+        """Messages with after_id < id < before_id, oldest first unless newest_first"""
+        query = db.query(self.model).filter(ChatMessage.session_id == session_id)
+        if after_id is not None:
+            query = query.filter(ChatMessage.id > after_id)
+        if before_id is not None:
+            query = query.filter(ChatMessage.id < before_id)
+        order = ChatMessage.id.desc() if newest_first else ChatMessage.id.asc()
+        return query.order_by(order).limit(limit).all()
+
 
 class CRUDPrescription(CRUDBase[Prescription, PrescriptionCreate, PrescriptionUpdate]):
     def create_with_session(
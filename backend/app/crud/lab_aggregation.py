@@ -14,7 +14,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 
 from app.models.health_data import LabReportCategorized
-from app.models.lab_aggregation import LabReportDaily
+from app.models.lab_aggregation import LabReportDaily, LabCategorySummary
+from app.health_scoring.invalidation import mark_scores_stale
 
 logger = logging.getLogger(__name__)
 
@@ -175,6 +176,14 @@ class LabAggregationCRUD:
                             "updated_at": datetime.utcnow()
                         })
 
+                earliest_dates = {}
+                for report in categorized_reports:
+                    if report.user_id not in earliest_dates or report.test_date < earliest_dates[report.user_id]:
+                        earliest_dates[report.user_id] = report.test_date
+                for summary_user_id in sorted(earliest_dates):
+                    LabAggregationCRUD.refresh_category_summary(db, summary_user_id)
+                    mark_scores_stale(db, summary_user_id, earliest_dates[summary_user_id])
+
                 logger.info(f"✅ [LabAggregation] Aggregated {processed_count} categorized reports into daily summaries")
                 
             else:
@@ -350,6 +359,8 @@ class LabAggregationCRUD:
 
                 logger.info(f"✅ [LabAggregation] Created {processed_count} daily aggregates for user {user_id}, date {target_date}")
 
+            LabAggregationCRUD.refresh_category_summary(db, user_id)
+            mark_scores_stale(db, user_id, target_date)
             db.commit()
             return processed_count
 
@@ -1026,6 +1037,115 @@ class LabAggregationCRUD:
             logger.error(f"❌ [LabAggregation] Error getting pending aggregation entries: {e}")
             return []
 
+    @staticmethod
+    def refresh_category_summary(db: Session, user_id: int) -> int:
+        """
+        Recompute lab_category_summary rows for one user from lab_report_categorized.
+
+        Runs in a savepoint inside the caller's transaction, so the summary commits
+        together with the aggregates that changed it; a failure here is logged and
+        does not abort the aggregation. Returns the number of categories written.
+        """
+        try:
+            with db.begin_nested():
+                result = db.execute(text("""
+                    WITH scoped AS (
+                        SELECT loinc_code, test_date, test_status, inferred_test_category AS category
+                        FROM lab_report_categorized
+                        WHERE user_id = :user_id
+                        AND inferred_test_category IS NOT NULL
+                        AND inferred_test_category <> ''
+                    ),
+                    latest AS (
+                        SELECT s.category, lower(COALESCE(s.test_status, '')) AS status
+                        FROM scoped s
+                        JOIN (
+                            SELECT category, loinc_code, MAX(test_date) AS max_date
+                            FROM scoped
+                            GROUP BY category, loinc_code
+                        ) m ON m.category = s.category
+                            AND m.loinc_code = s.loinc_code
+                            AND m.max_date = s.test_date
+                    ),
+                    latest_counts AS (
+                        SELECT
+                            category,
+                            COUNT(*) FILTER (WHERE status IN ('high', 'low', 'elevated', 'amber', 'orange')) AS amber,
+                            COUNT(*) FILTER (WHERE status IN ('critical', 'abnormal', 'red')) AS red,
+                            COUNT(*) AS total
+                        FROM latest
+                        GROUP BY category
+                    ),
+                    totals AS (
+                        SELECT
+                            category,
+                            COUNT(DISTINCT COALESCE(loinc_code, '')) AS total_tests,
+                            COUNT(DISTINCT COALESCE(loinc_code, ''))
+                                FILTER (WHERE test_status IN ('Normal', 'normal')) AS normal_count,
+                            COUNT(DISTINCT COALESCE(loinc_code, ''))
+                                FILTER (WHERE test_status IN ('High', 'Low', 'Elevated', 'high', 'low', 'elevated')) AS abnormal_count,
+                            COUNT(DISTINCT COALESCE(loinc_code, ''))
+                                FILTER (WHERE test_status IN ('Critical', 'Abnormal', 'critical', 'abnormal')) AS critical_count,
+                            MAX(test_date) AS last_test_date
+                        FROM scoped
+                        GROUP BY category
+                    )
+                    INSERT INTO lab_category_summary (
+                        user_id, category, total_tests, normal_count, abnormal_count, critical_count,
+                        latest_green_count, latest_amber_count, latest_red_count, last_test_date,
+                        created_at, updated_at
+                    )
+                    SELECT
+                        :user_id, t.category, t.total_tests, t.normal_count, t.abnormal_count, t.critical_count,
+                        COALESCE(l.total - l.amber - l.red, 0), COALESCE(l.amber, 0), COALESCE(l.red, 0),
+                        t.last_test_date, :now, :now
+                    FROM totals t
+                    LEFT JOIN latest_counts l ON l.category = t.category
+                    ON CONFLICT (user_id, category) DO UPDATE SET
+                        total_tests = EXCLUDED.total_tests,
+                        normal_count = EXCLUDED.normal_count,
+                        abnormal_count = EXCLUDED.abnormal_count,
+                        critical_count = EXCLUDED.critical_count,
+                        latest_green_count = EXCLUDED.latest_green_count,
+                        latest_amber_count = EXCLUDED.latest_amber_count,
+                        latest_red_count = EXCLUDED.latest_red_count,
+                        last_test_date = EXCLUDED.last_test_date,
+                        updated_at = EXCLUDED.updated_at
+                    RETURNING category
+                """), {"user_id": user_id, "now": datetime.utcnow()})
+                categories = [row[0] for row in result]
+
+                # Drop categories the user no longer has results in
+                db.query(LabCategorySummary).filter(
+                    LabCategorySummary.user_id == user_id,
+                    ~LabCategorySummary.category.in_(categories)
+                ).delete(synchronize_session=False)
+
+            logger.debug(f"📋 [LabAggregation] Refreshed {len(categories)} category summaries for user {user_id}")
+            return len(categories)
+
+        except Exception as e:
+            logger.error(f"❌ [LabAggregation] Error refreshing category summary for user {user_id}: {e}")
+            return 0
+
+    @staticmethod
+    def rebuild_category_summaries(db: Session, user_id: Optional[int] = None) -> int:
+        """Rebuild lab_category_summary for one user, or every user with categorized lab results"""
+        if user_id is not None:
+            user_ids = [user_id]
+        else:
+            user_ids = [row[0] for row in db.execute(text(
+                "SELECT DISTINCT user_id FROM lab_report_categorized ORDER BY user_id"
+            ))]
+
+        total = 0
+        for uid in user_ids:
+            total += LabAggregationCRUD.refresh_category_summary(db, uid)
+            db.commit()
+
+        logger.info(f"✅ [LabAggregation] Rebuilt {total} category summaries for {len(user_ids)} user(s)")
+        return total
+
     @staticmethod
     def aggregate_daily_records(db: Session, categorized_reports: List[LabReportCategorized]) -> int:
         """Alias for aggregate_daily_data in batch mode for backward compatibility"""
@@ -48,36 +48,65 @@ class LabCategorizationCRUD:
     """CRUD operations for lab categorization and processing"""
     
     @staticmethod
-    def get_loinc_code_for_test(test_name: str, test_category: str, test_unit: str = None, reference_range: str = None, loinc_mapper: Optional[Any] = None) -> tuple[Optional[str], Optional[str]]:
-        """Get LOINC code for a lab test using the LOINC mapper"""
+    def loinc_lookup_name(mapping: LabTestMapping) -> str:
+        """Test name an existing mapping's LOINC code is resolved and cached under.
+
+        Reports match mappings on test_name (case-insensitively), so that is the
+        name the lookup uses - not test_name_standardized. Cache warmers must use
+        this too, or they fill keys that are never read.
+        """
+        return mapping.test_name
+    
+    @staticmethod
+    def get_loinc_code_for_test(test_name: str, test_category: str, test_unit: str = None, reference_range: str = None, loinc_mapper: Optional[Any] = None, refresh_cache: bool = False) -> tuple[Optional[str], Optional[str]]:
+        """
+        Get LOINC code for a lab test using the LOINC mapper.
+
+        Selections are memoized in the shared loinc_mapping_cache, so repeated test
+        names skip the embedding search and LLM call across workers and restarts.
+        """
         try:
             # Check if LOINC mapper is available
             if not loinc_mapper:
                 logger.debug("LOINC mapper not available - skipping LOINC code assignment")
                 return None, None
-            
-            # Create a LabTest object for the LOINC mapper
-            lab_test = LabTest(
-                id=0,  # Not used for LOINC lookup
-                test_name=test_name,
-                test_code=None,  # Will be determined by the mapper
-                test_category=test_category,
-                description=f"Lab test: {test_name}",
-                common_units=test_unit,
-                normal_range_info=reference_range,
-                loinc_code=None
+
+            def resolve() -> tuple[Optional[str], Optional[str], Optional[float]]:
+                # Create a LabTest object for the LOINC mapper
+                lab_test = LabTest(
+                    id=0,  # Not used for LOINC lookup
+                    test_name=test_name,
+                    test_code=None,  # Will be determined by the mapper
+                    test_category=test_category,
+                    description=f"Lab test: {test_name}",
+                    common_units=test_unit,
+                    normal_range_info=reference_range,
+                    loinc_code=None
+                )
+
+                # Search for similar LOINC codes
+                similar_codes = loinc_mapper.search_similar_loinc_codes(lab_test, k=50)
+
+                if not similar_codes:
+                    logger.debug(f"🔍 No similar LOINC codes found for '{test_name}'")
+                    return None, None, None
+
+                # Get LOINC code using ChatGPT
+                loinc_code, source = loinc_mapper.get_chatgpt_loinc_code(lab_test, similar_codes)
+                if not loinc_code:
+                    return None, None, None
+
+                # Codes picked from the retrieved candidates are more trustworthy than free-form answers
+                candidate_codes = {code.get('loinc_num') for code in similar_codes}
+                confidence = 0.9 if loinc_code in candidate_codes else 0.6
+                return loinc_code, source, confidence
+
+            from app.utils.loinc_mapping_cache import loinc_mapping_cache
+
+            loinc_code, source = loinc_mapping_cache.get_or_resolve(
+                test_name, test_category, test_unit, resolve, refresh=refresh_cache
             )
-            
-            # Search for similar LOINC codes
-            similar_codes = loinc_mapper.search_similar_loinc_codes(lab_test, k=50)
-            
-            if not similar_codes:
-                logger.debug(f"🔍 No similar LOINC codes found for '{test_name}'")
-                return None, None
-            
-            # Get LOINC code using ChatGPT
-            loinc_code, source = loinc_mapper.get_chatgpt_loinc_code(lab_test, similar_codes)
-            
+
             if loinc_code:
                 logger.info(f"✅ Found LOINC code '{loinc_code}' for test '{test_name}' (Source: {source})")
                 return loinc_code, source
@@ -283,7 +312,7 @@ class LabCategorizationCRUD:
                 # Check if we need to get LOINC code for existing mapping
                 if not existing_mapping.loinc_code and loinc_mapper:
                     loinc_code, loinc_source = LabCategorizationCRUD.get_loinc_code_for_test(
-                        test_name=test_name,
+                        test_name=LabCategorizationCRUD.loinc_lookup_name(existing_mapping),
                         test_category=existing_mapping.test_category,
                         test_unit=None,
                         reference_range=None,
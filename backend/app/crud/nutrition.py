@@ -6,6 +6,7 @@ from app.utils.timezone import to_local_naive, local_now_db_func
 import json
 
 from app.crud.base import CRUDBase
+from app.health_scoring.invalidation import mark_scores_stale
 from app.models.nutrition_data import (
     NutritionRawData, 
     NutritionDailyAggregate, 
@@ -296,6 +297,7 @@ class CRUDNutritionData(CRUDBase[NutritionRawData, NutritionDataCreate, Nutritio
         # Mark only the pending data as aggregated (don't re-mark completed records)
         pending_record_ids = [record.id for record in pending_data]
         self.mark_as_aggregated(db, record_ids=pending_record_ids)
+        mark_scores_stale(db, user_id, target_date)
 
         db.commit()
         return 1  # One daily aggregate created/updated
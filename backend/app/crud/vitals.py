@@ -1,11 +1,11 @@
 from datetime import datetime, date, timedelta
+from contextlib import contextmanager
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func, desc, asc, text
 from sqlalchemy.exc import IntegrityError
 from app.models.vitals_data import (
     VitalsRawData, 
-    VitalsHourlyAggregate, 
     VitalsDailyAggregate, 
     VitalsWeeklyAggregate, 
     VitalsMonthlyAggregate, 
@@ -18,7 +18,6 @@ from app.models.vitals_data import (
 from app.schemas.vitals import VitalDataSubmission
 from app.utils.timezone import now_local, to_local_naive
 import calendar
-import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -254,241 +253,21 @@ class VitalsCRUD:
     
     @staticmethod
     def aggregate_hourly_data(db: Session, user_id: int, target_date: date) -> int:
-        """Aggregate categorized data into hourly aggregates for a specific date (optimized)"""
-        aggregated_count = 0
-        
-        # Get all categorized data for the target date in one query
-        categorized_data_query = db.query(VitalsRawCategorized).filter(
-            and_(
-                VitalsRawCategorized.user_id == user_id,
-                func.date(VitalsRawCategorized.start_date) == target_date
-            )
-        ).all()
-        
-        if not categorized_data_query:
-            return 0
-        
-        # Group data by metric type and hour
-        hourly_groups = {}
-        for entry in categorized_data_query:
-            hour_start = to_local_naive(entry.start_date).replace(minute=0, second=0, microsecond=0)
-            key = (entry.metric_type, hour_start)
-            
-            if key not in hourly_groups:
-                hourly_groups[key] = []
-            hourly_groups[key].append(entry)
-        
-        # Get existing hourly aggregates for this date in one query
-        existing_aggregates = {}
-        if hourly_groups:
-            existing_query = db.query(VitalsHourlyAggregate).filter(
-                    and_(
-                    VitalsHourlyAggregate.user_id == user_id,
-                    func.date(VitalsHourlyAggregate.hour_start) == target_date
-                    )
-                ).all()
-                
-            for agg in existing_query:
-                key = (agg.metric_type, agg.hour_start)
-                existing_aggregates[key] = agg
-        
-        # Process each hourly group
-        new_aggregates = []
-        for (metric_type, hour_start), categorized_entries in hourly_groups.items():
-            sources = list(set([r.data_source for r in categorized_entries]))
-            latest_entry = max(categorized_entries, key=lambda x: to_local_naive(x.start_date))
-            
-            # Get LOINC code from the latest entry (all entries in group should have same LOINC code)
-            loinc_code = latest_entry.loinc_code
-            
-            # Special handling for sleep data
-            if metric_type == VitalMetricType.SLEEP:
-                sleep_stats = VitalsCRUD._aggregate_sleep_data(categorized_entries)
-                total_value = sleep_stats["total_hours"]
-                average_value = sleep_stats["average_hours"] 
-                min_value = sleep_stats["min_hours"]
-                max_value = sleep_stats["max_hours"]
-                count = sleep_stats["count"]
-                unit = "hours"  # Standardize sleep unit to hours
-            else:
-                # Standard aggregation for other metrics
-                values = [r.value for r in categorized_entries]
-                total_value = sum(values) if metric_type in [VitalMetricType.STEP_COUNT, VitalMetricType.ACTIVE_ENERGY, VitalMetricType.WORKOUT_DURATION, VitalMetricType.WORKOUT_CALORIES, VitalMetricType.WORKOUT_DISTANCE] else None
-                average_value = sum(values) / len(values)
-                min_value = min(values)
-                max_value = max(values)
-                count = len(values)
-                unit = latest_entry.unit
-            
-            key = (metric_type, hour_start)
-            if key in existing_aggregates:
-                # Update existing aggregate
-                existing = existing_aggregates[key]
-                existing.total_value = total_value
-                existing.average_value = average_value
-                existing.min_value = min_value
-                existing.max_value = max_value
-                existing.count = count
-                existing.unit = unit
-                existing.loinc_code = loinc_code  # Copy LOINC code
-                existing.primary_source = latest_entry.data_source
-                existing.sources_included = json.dumps([str(s) for s in sources])
-                existing.updated_at = datetime.utcnow()
-            else:
-                # Create new aggregate
-                aggregate = VitalsHourlyAggregate(
-                    user_id=user_id,
-                    metric_type=metric_type,
-                    loinc_code=loinc_code,  # Copy LOINC code
-                    hour_start=hour_start,
-                    total_value=total_value,
-                    average_value=average_value,
-                    min_value=min_value,
-                    max_value=max_value,
-                    count=count,
-                    unit=unit,
-                    primary_source=latest_entry.data_source,
-                    sources_included=json.dumps([str(s) for s in sources])
-                )
-                new_aggregates.append(aggregate)
-                aggregated_count += 1
-        
-        # Bulk add new aggregates using upsert to handle duplicates
-        if new_aggregates:
-            try:
-                db.add_all(new_aggregates)
-                db.commit()
-            except Exception as e:
-                db.rollback()
-                # If bulk insert fails due to duplicates, insert one by one with upsert
-                for aggregate in new_aggregates:
-                    existing = db.query(VitalsHourlyAggregate).filter(
-                        and_(
-                            VitalsHourlyAggregate.user_id == aggregate.user_id,
-                            VitalsHourlyAggregate.metric_type == aggregate.metric_type,
-                            VitalsHourlyAggregate.hour_start == aggregate.hour_start,
-                            VitalsHourlyAggregate.primary_source == aggregate.primary_source
-                        )
-                    ).first()
-                    
-                    if not existing:
-                        db.add(aggregate)
-                        aggregated_count += 1
-                db.commit()
-        else:
-            db.commit()
-        
+        """Aggregate categorized data into hourly aggregates for a specific date (set-based rollup)"""
+        from app.crud.vitals_rollup import VitalsRollupCRUD
+
+        aggregated_count = VitalsRollupCRUD.rollup_hourly(db, user_id, [target_date])
+        db.commit()
         return aggregated_count
     
     @staticmethod
     def aggregate_daily_data(db: Session, user_id: int, target_date: date) -> int:
-        """Aggregate hourly data into daily aggregates"""
-        aggregated_count = 0
-        
-        # Get all metric types for the user on this date
-        metric_types = db.query(VitalsHourlyAggregate.metric_type).filter(
-            and_(
-                VitalsHourlyAggregate.user_id == user_id,
-                func.date(VitalsHourlyAggregate.hour_start) == target_date
-            )
-        ).distinct().all()
-        
-        for (metric_type,) in metric_types:
-            # Get hourly data for this date
-            hourly_data = db.query(VitalsHourlyAggregate).filter(
-                and_(
-                    VitalsHourlyAggregate.user_id == user_id,
-                    VitalsHourlyAggregate.metric_type == metric_type,
-                    func.date(VitalsHourlyAggregate.hour_start) == target_date
-                )
-            ).all()
-            
-            if not hourly_data:
-                continue
-            
-            # Calculate daily aggregates with special handling for sleep
-            if metric_type == VitalMetricType.SLEEP:
-                # For sleep, sum the total hours and calculate proper daily metrics
-                total_values = [h.total_value for h in hourly_data if h.total_value is not None]
-                avg_values = [h.average_value for h in hourly_data if h.average_value is not None]
-                min_values = [h.min_value for h in hourly_data if h.min_value is not None]
-                max_values = [h.max_value for h in hourly_data if h.max_value is not None]
-                
-                # For sleep: total is sum of all sleep periods, average is total/1 (since it's daily total)
-                daily_total = sum(total_values) if total_values else 0
-                daily_average = daily_total  # Daily total sleep
-                daily_min = min(min_values) if min_values else 0
-                daily_max = max(max_values) if max_values else 0
-                # Convert hours to minutes for duration_minutes field (expected by health scoring)
-                duration_mins = daily_total * 60.0 if daily_total > 0 else None
-            else:
-                # Standard aggregation for other metrics
-                total_values = [h.total_value for h in hourly_data if h.total_value is not None]
-                avg_values = [h.average_value for h in hourly_data if h.average_value is not None]
-                min_values = [h.min_value for h in hourly_data if h.min_value is not None]
-                max_values = [h.max_value for h in hourly_data if h.max_value is not None]
-                    
-                daily_total = sum(total_values) if total_values else None
-                daily_average = sum(avg_values) / len(avg_values) if avg_values else None
-                daily_min = min(min_values) if min_values else None
-                daily_max = max(max_values) if max_values else None
-                duration_mins = None  # Only used for sleep
-            
-            sources = set()
-            for h in hourly_data:
-                if h.sources_included:
-                    try:
-                        sources.update(json.loads(h.sources_included))
-                    except (json.JSONDecodeError, TypeError):
-                        pass
-            
-            latest_entry = max(hourly_data, key=lambda x: to_local_naive(x.hour_start))
-            
-            # Check if daily aggregate already exists
-            existing = db.query(VitalsDailyAggregate).filter(
-                and_(
-                    VitalsDailyAggregate.user_id == user_id,
-                    VitalsDailyAggregate.metric_type == metric_type,
-                    VitalsDailyAggregate.date == target_date
-                )
-            ).first()
-            
-            # Get LOINC code from the latest hourly entry (all entries should have same LOINC code)
-            loinc_code = latest_entry.loinc_code
-            
-            if existing:
-                # Update existing aggregate
-                existing.total_value = daily_total
-                existing.average_value = daily_average
-                existing.min_value = daily_min
-                existing.max_value = daily_max
-                existing.count = sum([h.count for h in hourly_data])
-                existing.duration_minutes = duration_mins  # Set duration_minutes for sleep
-                existing.unit = "hours" if metric_type == VitalMetricType.SLEEP else latest_entry.unit
-                existing.loinc_code = loinc_code  # Copy LOINC code
-                existing.primary_source = latest_entry.primary_source
-                existing.sources_included = json.dumps(list(sources))
-                existing.updated_at = datetime.utcnow()
-            else:
-                # Create new daily aggregate
-                aggregate = VitalsDailyAggregate(
-                    user_id=user_id,
-                    metric_type=metric_type,
-                    loinc_code=loinc_code,  # Copy LOINC code
-                    date=target_date,
-                    total_value=daily_total,
-                    average_value=daily_average,
-                    min_value=daily_min,
-                    max_value=daily_max,
-                    count=sum([h.count for h in hourly_data]),
-                    duration_minutes=duration_mins,  # Set duration_minutes for sleep
-                    unit="hours" if metric_type == VitalMetricType.SLEEP else latest_entry.unit,
-                    primary_source=latest_entry.primary_source,
-                    sources_included=json.dumps(list(sources))
-                )
-                db.add(aggregate)
-                aggregated_count += 1
-        
+        """Aggregate hourly data into daily aggregates (set-based rollup)"""
+        from app.crud.vitals_rollup import VitalsRollupCRUD
+        from app.health_scoring.invalidation import mark_scores_stale
+
+        aggregated_count = VitalsRollupCRUD.rollup_daily(db, user_id, [target_date])
+        mark_scores_stale(db, user_id, target_date)
         db.commit()
         return aggregated_count
     
@@ -695,162 +474,98 @@ class VitalsCRUD:
 
     @staticmethod
     def copy_raw_to_categorized_with_loinc(db: Session, user_id: int, target_date: date) -> int:
-        """Copy raw vitals data to categorized table with LOINC code mapping"""
+        """
+        Copy raw vitals data to categorized table with LOINC code mapping.
+
+        LOINC codes are resolved once per distinct (metric_type, unit) through the cached
+        vitals_mappings index, and rows are copied with a single anti-join INSERT ... SELECT
+        that skips records already present in vitals_raw_categorized.
+        """
+        from app.utils.vitals_loinc_resolver import vitals_loinc_resolver
+
         try:
-            # Get raw vitals data for the specific date that hasn't been categorized yet
-            raw_data_query = db.query(VitalsRawData).filter(
-                and_(
-                    VitalsRawData.user_id == user_id,
-                    func.date(VitalsRawData.start_date) == target_date,
-                    VitalsRawData.aggregation_status.in_(["pending", "processing"])
-                )
-            ).all()
+            day_start = datetime.combine(target_date, datetime.min.time())
+            day_end = day_start + timedelta(days=1)
+            params = {
+                "user_id": user_id,
+                "day_start": day_start,
+                "day_end": day_end,
+                "statuses": ["pending", "processing"],
+            }
 
-            if not raw_data_query:
+            # Distinct metrics of the pending raw data for this date
+            distinct_metrics = db.execute(text("""
+                SELECT DISTINCT metric_type, unit
+                FROM vitals_raw_data
+                WHERE user_id = :user_id
+                  AND start_date >= :day_start
+                  AND start_date < :day_end
+                  AND aggregation_status = ANY(:statuses)
+            """), params).fetchall()
+
+            if not distinct_metrics:
                 logger.info(f"ℹ️ [VitalsCategorization] No pending raw data found for user {user_id}, date {target_date}")
                 return 0
 
-            logger.info(f"📊 [VitalsCategorization] Processing {len(raw_data_query)} raw vitals records for categorization")
-
-            # Initialize LOINC mapper for vitals
-            loinc_mapper = None
-            try:
-                from app.crud.lab_categorization import LabTestLOINCMapper
-                if LabTestLOINCMapper is not None:
-                    loinc_mapper = LabTestLOINCMapper()
-                    logger.info("🔧 [VitalsCategorization] LOINC mapper initialized for vitals processing")
-            except Exception as e:
-                logger.warning(f"⚠️ [VitalsCategorization] Failed to initialize LOINC mapper: {e}")
-
-            categorized_count = 0
-            failed_record_ids = []
-            
-            for raw_record in raw_data_query:
-                try:
-                    # Check if already exists in categorized table
-                    existing_categorized = db.query(VitalsRawCategorized).filter(
-                        and_(
-                            VitalsRawCategorized.user_id == raw_record.user_id,
-                            VitalsRawCategorized.metric_type == raw_record.metric_type,
-                            VitalsRawCategorized.unit == raw_record.unit,
-                            VitalsRawCategorized.start_date == raw_record.start_date,
-                            VitalsRawCategorized.data_source == raw_record.data_source,
-                            VitalsRawCategorized.notes == raw_record.notes
-                        )
-                    ).first()
-
-                    if existing_categorized:
-                        logger.debug(f"⏭️ [VitalsCategorization] Skipping duplicate record for {raw_record.metric_type}")
-                        # Mark as categorized since it already exists
-                        raw_record.aggregation_status = "categorized"
-                        raw_record.updated_at = datetime.utcnow()
-                        continue
-
-                    # Step 1: Try to find LOINC code in vitals_mappings table
-                    loinc_code = None
-                    loinc_source = None
-
-                    # Query vitals_mappings table for matching vital sign
-                    vitals_mapping = db.execute(text("""
-                        SELECT loinc_code, vital_sign, loinc_source 
-                        FROM vitals_mappings 
-                        WHERE vital_sign ILIKE :metric_type
-                        OR vital_sign ILIKE :metric_type_with_percent
-                        OR vital_sign ILIKE :metric_type_with_parens
-                    """), {
-                        "metric_type": f"%{raw_record.metric_type}%",
-                        "metric_type_with_percent": f"%{raw_record.metric_type}%",
-                        "metric_type_with_parens": f"%{raw_record.metric_type}%"
-                    }).fetchone()
-
-                    if vitals_mapping and vitals_mapping.loinc_code:
-                        loinc_code = vitals_mapping.loinc_code
-                        loinc_source = vitals_mapping.loinc_source
-                        logger.debug(f"✅ [VitalsCategorization] Found LOINC code '{loinc_code}' in vitals_mappings for '{raw_record.metric_type}'")
-                    else:
-                        # Step 2: If not found in vitals_mappings, try to get LOINC code using the lab categorization method
-                        if loinc_mapper:
-                            logger.info(f"🔍 [VitalsCategorization] Looking up LOINC code for vital sign: {raw_record.metric_type}")
-                            
-                            # Use the lab categorization method to get LOINC code
-                            from app.crud.lab_categorization import LabCategorizationCRUD
-                            loinc_code, loinc_source = LabCategorizationCRUD.get_loinc_code_for_test(
-                                test_name=raw_record.metric_type,
-                                test_category="Vital Signs",
-                                test_unit=raw_record.unit,
-                                reference_range=None,
-                                loinc_mapper=loinc_mapper
-                            )
-
-                            if loinc_code:
-                                logger.info(f"✅ [VitalsCategorization] Found LOINC code '{loinc_code}' for vital sign '{raw_record.metric_type}'")
-                                
-                                # Add the new mapping to vitals_mappings table
-                                try:
-                                    db.execute(text("""
-                                        INSERT INTO vitals_mappings (vital_sign, loinc_code, property, units, system, description, loinc_source)
-                                        VALUES (:vital_sign, :loinc_code, :property, :units, :system, :description, :loinc_source)
-                                        ON CONFLICT (vital_sign) DO UPDATE SET
-                                            loinc_code = EXCLUDED.loinc_code,
-                                            property = EXCLUDED.property,
-                                            units = EXCLUDED.units,
-                                            system = EXCLUDED.system,
-                                            description = EXCLUDED.description,
-                                            loinc_source = EXCLUDED.loinc_source
-                                    """), {
-                                        "vital_sign": raw_record.metric_type,
-                                        "loinc_code": loinc_code,
-                                        "property": "Vital Sign",
-                                        "units": raw_record.unit,
-                                        "system": "Body",
-                                        "description": f"Auto-generated from vital sign: {raw_record.metric_type}",
-                                        "loinc_source": loinc_source
-                                    })
-                                    logger.info(f"✅ [VitalsCategorization] Added new mapping to vitals_mappings: '{raw_record.metric_type}' -> '{loinc_code}'")
-                                except Exception as e:
-                                    logger.warning(f"⚠️ [VitalsCategorization] Failed to add mapping to vitals_mappings: {e}")
-                            else:
-                                logger.warning(f"⚠️ [VitalsCategorization] No LOINC code found for vital sign: {raw_record.metric_type}")
-                        else:
-                            logger.warning(f"⚠️ [VitalsCategorization] LOINC mapper not available for vital sign: {raw_record.metric_type}")
-
-                    # Create categorized record
-                    categorized_record = VitalsRawCategorized(
-                        user_id=raw_record.user_id,
-                        metric_type=raw_record.metric_type,
-                        value=raw_record.value,
-                        unit=raw_record.unit,
-                        start_date=raw_record.start_date,
-                        end_date=raw_record.end_date,
-                        data_source=raw_record.data_source,
-                        source_device=raw_record.source_device,
-                        loinc_code=loinc_code,
-                        notes=raw_record.notes,
-                        confidence_score=raw_record.confidence_score,
-                        aggregation_status="pending",
-                        created_at=raw_record.created_at,
-                        updated_at=datetime.utcnow()
-                    )
-
-                    db.add(categorized_record)
-                    categorized_count += 1
-
-                    # Mark original record as categorized
-                    raw_record.aggregation_status = "categorized"
-                    raw_record.updated_at = datetime.utcnow()
-
-                except Exception as e:
-                    logger.error(f"❌ [VitalsCategorization] Error processing record {raw_record.id}: {e}")
-                    failed_record_ids.append(raw_record.id)
-                    continue
+            resolved = vitals_loinc_resolver.resolve_many(
+                db, [(row.metric_type, row.unit) for row in distinct_metrics]
+            )
+            resolved_keys = list(resolved.keys())
+            logger.info(f"📊 [VitalsCategorization] Resolved LOINC codes for {len(resolved_keys)} distinct metrics")
+
+            now = datetime.utcnow()
+            insert_result = db.execute(text("""
+                INSERT INTO vitals_raw_categorized (
+                    user_id, metric_type, value, unit, start_date, end_date,
+                    data_source, source_device, loinc_code, notes, confidence_score,
+                    aggregation_status, created_at, updated_at
+                )
+                SELECT
+                    r.user_id, r.metric_type, r.value, r.unit, r.start_date, r.end_date,
+                    r.data_source, r.source_device, m.loinc_code, r.notes, r.confidence_score,
+                    'pending', r.created_at, :now
+                FROM vitals_raw_data r
+                LEFT JOIN unnest(
+                    CAST(:metric_types AS text[]),
+                    CAST(:units AS text[]),
+                    CAST(:loinc_codes AS text[])
+                ) AS m(metric_type, unit, loinc_code)
+                  ON m.metric_type = r.metric_type AND m.unit = r.unit
+                WHERE r.user_id = :user_id
+                  AND r.start_date >= :day_start
+                  AND r.start_date < :day_end
+                  AND r.aggregation_status = ANY(:statuses)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM vitals_raw_categorized c
+                      WHERE c.user_id = r.user_id
+                        AND c.metric_type = r.metric_type
+                        AND c.unit = r.unit
+                        AND c.start_date = r.start_date
+                        AND c.data_source = r.data_source
+                        AND c.notes IS NOT DISTINCT FROM r.notes
+                  )
+                ON CONFLICT DO NOTHING
+            """), {
+                **params,
+                "metric_types": [key[0] for key in resolved_keys],
+                "units": [key[1] for key in resolved_keys],
+                "loinc_codes": [resolved[key][0] for key in resolved_keys],
+                "now": now,
+            })
+            categorized_count = insert_result.rowcount or 0
+
+            # Mark original records as categorized (including ones that already existed)
+            db.execute(text("""
+                UPDATE vitals_raw_data
+                SET aggregation_status = 'categorized', updated_at = :now
+                WHERE user_id = :user_id
+                  AND start_date >= :day_start
+                  AND start_date < :day_end
+                  AND aggregation_status = ANY(:statuses)
+            """), {**params, "now": now})
 
             db.commit()
-            
-            # Mark failed records as failed (instead of leaving them in "processing" status)
-            if failed_record_ids:
-                VitalsCRUD.mark_aggregation_failed(db, failed_record_ids, "Categorization failed")
-                logger.warning(f"⚠️ [VitalsCategorization] Marked {len(failed_record_ids)} records as failed due to categorization errors")
-            
+
             logger.info(f"✅ [VitalsCategorization] Successfully categorized {categorized_count} vitals records with LOINC codes")
             return categorized_count
 
@@ -889,6 +604,88 @@ class VitalsCRUD:
             VitalsRawData.aggregation_status.in_(["pending", "queued", "failed"])
         ).order_by(VitalsRawData.created_at).limit(limit).all()
 
+    DRAIN_STATUSES = ["pending", "queued", "failed"]
+    DRAIN_LOCK_NAMESPACE = 7301  # pg advisory lock namespace for per-user vitals drains
+
+    @staticmethod
+    def claim_pending_entries(db: Session, user_id: int, after_id: int, limit: int) -> List[Any]:
+        """
+        Claim the next keyset page of a user's pending entries and mark them processing.
+
+        Rows locked by another transaction are skipped (FOR UPDATE SKIP LOCKED), so
+        several workers can drain the table in parallel. Commits the claim and returns
+        rows with id and start_date, ordered by id.
+        """
+        rows = db.execute(text("""
+            UPDATE vitals_raw_data r
+            SET aggregation_status = 'processing', updated_at = :now
+            FROM (
+                SELECT id FROM vitals_raw_data
+                WHERE user_id = :user_id
+                  AND id > :after_id
+                  AND aggregation_status = ANY(:statuses)
+                ORDER BY id
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            ) claimed
+            WHERE r.id = claimed.id
+            RETURNING r.id, r.start_date
+        """), {
+            "user_id": user_id,
+            "after_id": after_id,
+            "statuses": VitalsCRUD.DRAIN_STATUSES,
+            "limit": limit,
+            "now": datetime.utcnow(),
+        }).fetchall()
+        db.commit()
+        return sorted(rows, key=lambda row: row.id)
+
+    @staticmethod
+    def get_users_with_pending_entries(db: Session, after_user_id: int, limit: int) -> List[int]:
+        """Keyset page of user ids that have pending entries, in user id order"""
+        rows = db.execute(text("""
+            SELECT DISTINCT user_id FROM vitals_raw_data
+            WHERE user_id > :after_user_id
+              AND aggregation_status = ANY(:statuses)
+            ORDER BY user_id
+            LIMIT :limit
+        """), {
+            "after_user_id": after_user_id,
+            "statuses": VitalsCRUD.DRAIN_STATUSES,
+            "limit": limit,
+        }).fetchall()
+        return [row.user_id for row in rows]
+
+    @staticmethod
+    @contextmanager
+    def user_drain_lock(user_id: int):
+        """
+        Try to take the cross-process drain lock for a user; yields True if acquired.
+
+        Uses a session-level advisory lock on a dedicated connection so it survives the
+        commits made while draining, and is released even if the drain fails.
+        """
+        from app.db.session import engine
+
+        conn = engine.connect()
+        acquired = False
+        try:
+            acquired = bool(conn.execute(
+                text("SELECT pg_try_advisory_lock(:namespace, :user_id)"),
+                {"namespace": VitalsCRUD.DRAIN_LOCK_NAMESPACE, "user_id": user_id}
+            ).scalar())
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    conn.execute(
+                        text("SELECT pg_advisory_unlock(:namespace, :user_id)"),
+                        {"namespace": VitalsCRUD.DRAIN_LOCK_NAMESPACE, "user_id": user_id}
+                    )
+                except Exception as e:
+                    logger.warning(f"⚠️ [VitalsDrain] Failed to release drain lock for user {user_id}: {e}")
+            conn.close()
+
     @staticmethod
     def mark_categorized_aggregation_completed(db: Session, user_id: int, target_date: date):
         """Mark categorized vitals records as aggregated after aggregation completes"""
@@ -929,191 +726,18 @@ class VitalsCRUD:
 
     @staticmethod
     def aggregate_weekly_data(db: Session, user_id: int, target_week_start: date) -> int:
-        """Aggregate daily data into weekly aggregates"""
-        aggregated_count = 0
-        
-        # Calculate week end date (Sunday)
-        target_week_end = target_week_start + timedelta(days=6)
-        
-        # Get all metric types for the user in this week
-        metric_types = db.query(VitalsDailyAggregate.metric_type).filter(
-            and_(
-                VitalsDailyAggregate.user_id == user_id,
-                VitalsDailyAggregate.date >= target_week_start,
-                VitalsDailyAggregate.date <= target_week_end
-            )
-        ).distinct().all()
-        
-        for (metric_type,) in metric_types:
-            # Get daily data for this week
-            daily_data = db.query(VitalsDailyAggregate).filter(
-                and_(
-                    VitalsDailyAggregate.user_id == user_id,
-                    VitalsDailyAggregate.metric_type == metric_type,
-                    VitalsDailyAggregate.date >= target_week_start,
-                    VitalsDailyAggregate.date <= target_week_end
-                )
-            ).all()
-            
-            if not daily_data:
-                continue
-            
-            # Calculate weekly aggregates
-            total_values = [d.total_value for d in daily_data if d.total_value is not None]
-            avg_values = [d.average_value for d in daily_data if d.average_value is not None]
-            min_values = [d.min_value for d in daily_data if d.min_value is not None]
-            max_values = [d.max_value for d in daily_data if d.max_value is not None]
-            
-            sources = set()
-            for d in daily_data:
-                if d.sources_included:
-                    try:
-                        sources.update(json.loads(d.sources_included))
-                    except:
-                        pass
-            
-            latest_entry = max(daily_data, key=lambda x: x.date)
-            
-            # Check if weekly aggregate already exists
-            existing = db.query(VitalsWeeklyAggregate).filter(
-                and_(
-                    VitalsWeeklyAggregate.user_id == user_id,
-                    VitalsWeeklyAggregate.metric_type == metric_type,
-                    VitalsWeeklyAggregate.week_start_date == target_week_start
-                )
-            ).first()
-            
-            # Get LOINC code from the latest daily entry (all entries should have same LOINC code)
-            loinc_code = latest_entry.loinc_code
-            
-            if existing:
-                # Update existing aggregate
-                existing.total_value = sum(total_values) if total_values else None
-                existing.average_value = sum(avg_values) / len(avg_values) if avg_values else None
-                existing.min_value = min(min_values) if min_values else None
-                existing.max_value = max(max_values) if max_values else None
-                existing.days_with_data = len(daily_data)
-                existing.loinc_code = loinc_code  # Copy LOINC code
-                existing.primary_source = latest_entry.primary_source
-                existing.sources_included = json.dumps(list(sources))
-                existing.updated_at = datetime.utcnow()
-            else:
-                # Create new weekly aggregate
-                aggregate = VitalsWeeklyAggregate(
-                    user_id=user_id,
-                    metric_type=metric_type,
-                    loinc_code=loinc_code,  # Copy LOINC code
-                    week_start_date=target_week_start,
-                    week_end_date=target_week_end,
-                    total_value=sum(total_values) if total_values else None,
-                    average_value=sum(avg_values) / len(avg_values) if avg_values else None,
-                    min_value=min(min_values) if min_values else None,
-                    max_value=max(max_values) if max_values else None,
-                    days_with_data=len(daily_data),
-                    unit=latest_entry.unit,
-                    primary_source=latest_entry.primary_source,
-                    sources_included=json.dumps(list(sources))
-                )
-                db.add(aggregate)
-                aggregated_count += 1
-        
+        """Aggregate daily data into weekly aggregates (set-based rollup)"""
+        from app.crud.vitals_rollup import VitalsRollupCRUD
+
+        aggregated_count = VitalsRollupCRUD.rollup_weekly(db, user_id, [target_week_start])
         db.commit()
         return aggregated_count
     
     @staticmethod
     def aggregate_monthly_data(db: Session, user_id: int, target_year: int, target_month: int) -> int:
-        """Aggregate daily data into monthly aggregates"""
-        aggregated_count = 0
-        
-        # Calculate month start and end dates
-        month_start = date(target_year, target_month, 1)
-        if target_month == 12:
-            month_end = date(target_year + 1, 1, 1) - timedelta(days=1)
-        else:
-            month_end = date(target_year, target_month + 1, 1) - timedelta(days=1)
-        
-        # Get all metric types for the user in this month
-        metric_types = db.query(VitalsDailyAggregate.metric_type).filter(
-            and_(
-                VitalsDailyAggregate.user_id == user_id,
-                VitalsDailyAggregate.date >= month_start,
-                VitalsDailyAggregate.date <= month_end
-            )
-        ).distinct().all()
-        
-        for (metric_type,) in metric_types:
-            # Get daily data for this month
-            daily_data = db.query(VitalsDailyAggregate).filter(
-                and_(
-                    VitalsDailyAggregate.user_id == user_id,
-                    VitalsDailyAggregate.metric_type == metric_type,
-                    VitalsDailyAggregate.date >= month_start,
-                    VitalsDailyAggregate.date <= month_end
-                )
-            ).all()
-            
-            if not daily_data:
-                continue
-            
-            # Calculate monthly aggregates
-            total_values = [d.total_value for d in daily_data if d.total_value is not None]
-            avg_values = [d.average_value for d in daily_data if d.average_value is not None]
-            min_values = [d.min_value for d in daily_data if d.min_value is not None]
-            max_values = [d.max_value for d in daily_data if d.max_value is not None]
-            
-            sources = set()
-            for d in daily_data:
-                if d.sources_included:
-                    try:
-                        sources.update(json.loads(d.sources_included))
-                    except:
-                        pass
-            
-            latest_entry = max(daily_data, key=lambda x: x.date)
-            
-            # Check if monthly aggregate already exists
-            existing = db.query(VitalsMonthlyAggregate).filter(
-                and_(
-                    VitalsMonthlyAggregate.user_id == user_id,
-                    VitalsMonthlyAggregate.metric_type == metric_type,
-                    VitalsMonthlyAggregate.year == target_year,
-                    VitalsMonthlyAggregate.month == target_month
-                )
-            ).first()
-            
-            # Get LOINC code from the latest daily entry (all entries should have same LOINC code)
-            loinc_code = latest_entry.loinc_code
-            
-            if existing:
-                # Update existing aggregate
-                existing.total_value = sum(total_values) if total_values else None
-                existing.average_value = sum(avg_values) / len(avg_values) if avg_values else None
-                existing.min_value = min(min_values) if min_values else None
-                existing.max_value = max(max_values) if max_values else None
-                existing.days_with_data = len(daily_data)
-                existing.loinc_code = loinc_code  # Copy LOINC code
-                existing.primary_source = latest_entry.primary_source
-                existing.sources_included = json.dumps(list(sources))
-                existing.updated_at = datetime.utcnow()
-            else:
-                # Create new monthly aggregate
-                aggregate = VitalsMonthlyAggregate(
-                    user_id=user_id,
-                    metric_type=metric_type,
-                    loinc_code=loinc_code,  # Copy LOINC code
-                    year=target_year,
-                    month=target_month,
-                    total_value=sum(total_values) if total_values else None,
-                    average_value=sum(avg_values) / len(avg_values) if avg_values else None,
-                    min_value=min(min_values) if min_values else None,
-                    max_value=max(max_values) if max_values else None,
-                    days_with_data=len(daily_data),
-                    unit=latest_entry.unit,
-                    primary_source=latest_entry.primary_source,
-                    sources_included=json.dumps(list(sources))
-                )
-                db.add(aggregate)
-                aggregated_count += 1
-        
+        """Aggregate daily data into monthly aggregates (set-based rollup)"""
+        from app.crud.vitals_rollup import VitalsRollupCRUD
+
+        aggregated_count = VitalsRollupCRUD.rollup_monthly(db, user_id, [(target_year, target_month)])
         db.commit()
-        return aggregated_count 
\ No newline at end of file
+        return aggregated_count
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Vitals Rollup Engine
+
+Set-based hourly -> daily -> weekly -> monthly rollups for vitals data.
+
+Each level is a single ``INSERT ... SELECT ... GROUP BY ... ON CONFLICT DO UPDATE``
+statement covering every affected bucket of a user, so a backfill of many days
+costs one round trip per level instead of one ORM object per (metric, bucket).
+The upserts target the unique rollup keys added in migration 069.
+
+Sleep is the one exception at the hourly level: its overlap de-duplication is
+order dependent, so sleep samples for the requested days are fetched in one
+query, reduced with ``VitalsCRUD._aggregate_sleep_data`` and written back with
+a single multi-row upsert.
+"""
+
+import json
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import and_, func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.crud.vitals import VitalsCRUD
+from app.health_scoring.invalidation import mark_scores_stale
+from app.models.vitals_data import (
+    VitalMetricType,
+    VitalsHourlyAggregate,
+    VitalsRawCategorized,
+)
+from app.utils.timezone import to_local_naive
+
+logger = logging.getLogger(__name__)
+
+# Metrics whose hourly total_value is the sum of samples (others only get avg/min/max)
+SUMMED_METRICS = [
+    VitalMetricType.STEP_COUNT.value,
+    VitalMetricType.ACTIVE_ENERGY.value,
+    VitalMetricType.WORKOUT_DURATION.value,
+    VitalMetricType.WORKOUT_CALORIES.value,
+    VitalMetricType.WORKOUT_DISTANCE.value,
+]
+
+SLEEP_METRIC = VitalMetricType.SLEEP.value
+
+
+HOURLY_ROLLUP_SQL = text("""
+    INSERT INTO vitals_hourly_aggregates (
+        user_id, metric_type, loinc_code, hour_start,
+        total_value, average_value, min_value, max_value, count,
+        unit, primary_source, sources_included, updated_at
+    )
+    SELECT
+        c.user_id,
+        c.metric_type,
+        (array_agg(c.loinc_code ORDER BY c.start_date DESC))[1],
+        date_trunc('hour', c.start_date),
+        CASE WHEN c.metric_type = ANY(:summed_metrics) THEN SUM(c.value) END,
+        AVG(c.value),
+        MIN(c.value),
+        MAX(c.value),
+        COUNT(*),
+        (array_agg(c.unit ORDER BY c.start_date DESC))[1],
+        (array_agg(c.data_source ORDER BY c.start_date DESC))[1],
+        to_json(array_agg(DISTINCT c.data_source))::text,
+        :now
+    FROM vitals_raw_categorized c
+    WHERE c.user_id = :user_id
+      AND c.start_date >= :range_start
+      AND c.start_date < :range_end
+      AND CAST(c.start_date AS date) = ANY(:days)
+      AND c.metric_type <> :sleep_metric
+    GROUP BY c.user_id, c.metric_type, date_trunc('hour', c.start_date)
+    ON CONFLICT (user_id, metric_type, hour_start)
+    DO UPDATE SET
+        loinc_code = EXCLUDED.loinc_code,
+        total_value = EXCLUDED.total_value,
+        average_value = EXCLUDED.average_value,
+        min_value = EXCLUDED.min_value,
+        max_value = EXCLUDED.max_value,
+        count = EXCLUDED.count,
+        unit = EXCLUDED.unit,
+        primary_source = EXCLUDED.primary_source,
+        sources_included = EXCLUDED.sources_included,
+        updated_at = EXCLUDED.updated_at
+""")
+
+DAILY_ROLLUP_SQL = text("""
+    WITH hourly AS (
+        SELECT h.*, CAST(h.hour_start AS date) AS bucket_date
+        FROM vitals_hourly_aggregates h
+        WHERE h.user_id = :user_id
+          AND h.hour_start >= :range_start
+          AND h.hour_start < :range_end
+          AND CAST(h.hour_start AS date) = ANY(:days)
+    ),
+    sources AS (
+        SELECT hourly.metric_type, hourly.bucket_date,
+               to_json(array_agg(DISTINCT s.source))::text AS sources_included
+        FROM hourly
+        CROSS JOIN LATERAL jsonb_array_elements_text(
+            CASE WHEN hourly.sources_included LIKE '[%' THEN hourly.sources_included::jsonb ELSE '[]'::jsonb END
+        ) AS s(source)
+        GROUP BY hourly.metric_type, hourly.bucket_date
+    ),
+    rolled AS (
+        SELECT
+            metric_type,
+            bucket_date,
+            (array_agg(loinc_code ORDER BY hour_start DESC))[1] AS loinc_code,
+            SUM(total_value) AS total_value,
+            AVG(average_value) AS average_value,
+            MIN(min_value) AS min_value,
+            MAX(max_value) AS max_value,
+            SUM(count) AS count,
+            (array_agg(unit ORDER BY hour_start DESC))[1] AS unit,
+            (array_agg(primary_source ORDER BY hour_start DESC))[1] AS primary_source
+        FROM hourly
+        GROUP BY metric_type, bucket_date
+    )
+    INSERT INTO vitals_daily_aggregates (
+        user_id, metric_type, loinc_code, date,
+        total_value, average_value, min_value, max_value, count,
+        duration_minutes, unit, primary_source, sources_included, updated_at
+    )
+    SELECT
+        :user_id,
+        r.metric_type,
+        r.loinc_code,
+        r.bucket_date,
+        -- Sleep: total is the nightly sum of sleep periods and doubles as the daily "average"
+        CASE WHEN r.metric_type = :sleep_metric THEN COALESCE(r.total_value, 0) ELSE r.total_value END,
+        CASE WHEN r.metric_type = :sleep_metric THEN COALESCE(r.total_value, 0) ELSE r.average_value END,
+        CASE WHEN r.metric_type = :sleep_metric THEN COALESCE(r.min_value, 0) ELSE r.min_value END,
+        CASE WHEN r.metric_type = :sleep_metric THEN COALESCE(r.max_value, 0) ELSE r.max_value END,
+        r.count,
+        -- duration_minutes is only populated for sleep (expected by health scoring)
+        CASE WHEN r.metric_type = :sleep_metric AND r.total_value > 0 THEN r.total_value * 60.0 END,
+        CASE WHEN r.metric_type = :sleep_metric THEN 'hours' ELSE r.unit END,
+        r.primary_source,
+        COALESCE(s.sources_included, '[]'),
+        :now
+    FROM rolled r
+    LEFT JOIN sources s
+      ON s.metric_type = r.metric_type AND s.bucket_date = r.bucket_date
+    ON CONFLICT (user_id, metric_type, date)
+    DO UPDATE SET
+        loinc_code = EXCLUDED.loinc_code,
+        total_value = EXCLUDED.total_value,
+        average_value = EXCLUDED.average_value,
+        min_value = EXCLUDED.min_value,
+        max_value = EXCLUDED.max_value,
+        count = EXCLUDED.count,
+        duration_minutes = EXCLUDED.duration_minutes,
+        unit = EXCLUDED.unit,
+        primary_source = EXCLUDED.primary_source,
+        sources_included = EXCLUDED.sources_included,
+        updated_at = EXCLUDED.updated_at
+""")
+
+# Weekly and monthly rollups read from vitals_daily_aggregates and only differ in
+# how the bucket is derived from the daily date and how it is keyed on insert.
+_DAILY_SOURCE_CTES = """
+    WITH daily AS (
+        SELECT d.*, {bucket_expr} AS bucket
+        FROM vitals_daily_aggregates d
+        WHERE d.user_id = :user_id
+          AND d.date >= :range_start
+          AND d.date <= :range_end
+          AND {bucket_expr} = ANY(:buckets)
+    ),
+    sources AS (
+        SELECT daily.metric_type, daily.bucket,
+               to_json(array_agg(DISTINCT s.source))::text AS sources_included
+        FROM daily
+        CROSS JOIN LATERAL jsonb_array_elements_text(
+            CASE WHEN daily.sources_included LIKE '[%' THEN daily.sources_included::jsonb ELSE '[]'::jsonb END
+        ) AS s(source)
+        GROUP BY daily.metric_type, daily.bucket
+    ),
+    rolled AS (
+        SELECT
+            metric_type,
+            bucket,
+            (array_agg(loinc_code ORDER BY date DESC))[1] AS loinc_code,
+            SUM(total_value) AS total_value,
+            AVG(average_value) AS average_value,
+            MIN(min_value) AS min_value,
+            MAX(max_value) AS max_value,
+            COUNT(*) AS days_with_data,
+            (array_agg(unit ORDER BY date DESC))[1] AS unit,
+            (array_agg(primary_source ORDER BY date DESC))[1] AS primary_source
+        FROM daily
+        GROUP BY metric_type, bucket
+    )
+"""
+
+_PERIOD_UPDATE_SET = """
+    DO UPDATE SET
+        loinc_code = EXCLUDED.loinc_code,
+        total_value = EXCLUDED.total_value,
+        average_value = EXCLUDED.average_value,
+        min_value = EXCLUDED.min_value,
+        max_value = EXCLUDED.max_value,
+        days_with_data = EXCLUDED.days_with_data,
+        unit = EXCLUDED.unit,
+        primary_source = EXCLUDED.primary_source,
+        sources_included = EXCLUDED.sources_included,
+        updated_at = EXCLUDED.updated_at
+"""
+
+WEEKLY_ROLLUP_SQL = text(
+    _DAILY_SOURCE_CTES.format(bucket_expr="CAST(date_trunc('week', d.date) AS date)") + """
+    INSERT INTO vitals_weekly_aggregates (
+        user_id, metric_type, loinc_code, week_start_date, week_end_date,
+        total_value, average_value, min_value, max_value, days_with_data,
+        unit, primary_source, sources_included, updated_at
+    )
+    SELECT
+        :user_id, r.metric_type, r.loinc_code, r.bucket, r.bucket + 6,
+        r.total_value, r.average_value, r.min_value, r.max_value, r.days_with_data,
+        r.unit, r.primary_source, COALESCE(s.sources_included, '[]'), :now
+    FROM rolled r
+    LEFT JOIN sources s
+      ON s.metric_type = r.metric_type AND s.bucket = r.bucket
+    ON CONFLICT (user_id, metric_type, week_start_date)
+""" + _PERIOD_UPDATE_SET
+)
+
+MONTHLY_ROLLUP_SQL = text(
+    _DAILY_SOURCE_CTES.format(
+        bucket_expr="CAST(EXTRACT(YEAR FROM d.date) * 100 + EXTRACT(MONTH FROM d.date) AS integer)"
+    ) + """
+    INSERT INTO vitals_monthly_aggregates (
+        user_id, metric_type, loinc_code, year, month,
+        total_value, average_value, min_value, max_value, days_with_data,
+        unit, primary_source, sources_included, updated_at
+    )
+    SELECT
+        :user_id, r.metric_type, r.loinc_code, r.bucket / 100, r.bucket % 100,
+        r.total_value, r.average_value, r.min_value, r.max_value, r.days_with_data,
+        r.unit, r.primary_source, COALESCE(s.sources_included, '[]'), :now
+    FROM rolled r
+    LEFT JOIN sources s
+      ON s.metric_type = r.metric_type AND s.bucket = r.bucket
+    ON CONFLICT (user_id, metric_type, year, month)
+""" + _PERIOD_UPDATE_SET
+)
+
+
+def _week_start(day: date) -> date:
+    """Monday of the week containing ``day``"""
+    return day - timedelta(days=day.weekday())
+
+
+def _month_bounds(year: int, month: int) -> Tuple[date, date]:
+    """First and last day of a calendar month"""
+    month_start = date(year, month, 1)
+    if month == 12:
+        month_end = date(year + 1, 1, 1) - timedelta(days=1)
+    else:
+        month_end = date(year, month + 1, 1) - timedelta(days=1)
+    return month_start, month_end
+
+
+class VitalsRollupCRUD:
+    """Set-based vitals rollups for a user over a set of days"""
+
+    @staticmethod
+    def rollup_hourly(db: Session, user_id: int, days: Sequence[date]) -> int:
+        """Rebuild hourly aggregates from vitals_raw_categorized for the given days"""
+        days = sorted(set(days))
+        if not days:
+            return 0
+
+        range_start = datetime.combine(days[0], datetime.min.time())
+        range_end = datetime.combine(days[-1] + timedelta(days=1), datetime.min.time())
+        now = datetime.utcnow()
+
+        result = db.execute(HOURLY_ROLLUP_SQL, {
+            "user_id": user_id,
+            "days": days,
+            "range_start": range_start,
+            "range_end": range_end,
+            "summed_metrics": SUMMED_METRICS,
+            "sleep_metric": SLEEP_METRIC,
+            "now": now,
+        })
+        written = result.rowcount or 0
+
+        written += VitalsRollupCRUD._rollup_sleep_hourly(db, user_id, days, range_start, range_end, now)
+        return written
+
+    @staticmethod
+    def _rollup_sleep_hourly(
+        db: Session,
+        user_id: int,
+        days: List[date],
+        range_start: datetime,
+        range_end: datetime,
+        now: datetime,
+    ) -> int:
+        """Hourly sleep rollup using the Python overlap de-duplication"""
+        sleep_entries = db.query(VitalsRawCategorized).filter(
+            and_(
+                VitalsRawCategorized.user_id == user_id,
+                VitalsRawCategorized.metric_type == SLEEP_METRIC,
+                VitalsRawCategorized.start_date >= range_start,
+                VitalsRawCategorized.start_date < range_end,
+                func.date(VitalsRawCategorized.start_date).in_(days),
+            )
+        ).all()
+
+        if not sleep_entries:
+            return 0
+
+        hourly_groups: Dict[datetime, List[VitalsRawCategorized]] = defaultdict(list)
+        for entry in sleep_entries:
+            hour_start = to_local_naive(entry.start_date).replace(minute=0, second=0, microsecond=0)
+            hourly_groups[hour_start].append(entry)
+
+        rows = []
+        for hour_start, entries in hourly_groups.items():
+            sleep_stats = VitalsCRUD._aggregate_sleep_data(entries)
+            latest_entry = max(entries, key=lambda x: to_local_naive(x.start_date))
+            sources = sorted(set(str(e.data_source) for e in entries))
+            rows.append({
+                "user_id": user_id,
+                "metric_type": SLEEP_METRIC,
+                "loinc_code": latest_entry.loinc_code,
+                "hour_start": hour_start,
+                "total_value": sleep_stats["total_hours"],
+                "average_value": sleep_stats["average_hours"],
+                "min_value": sleep_stats["min_hours"],
+                "max_value": sleep_stats["max_hours"],
+                "count": sleep_stats["count"],
+                "unit": "hours",  # Standardize sleep unit to hours
+                "primary_source": latest_entry.data_source,
+                "sources_included": json.dumps(sources),
+                "updated_at": now,
+            })
+
+        stmt = insert(VitalsHourlyAggregate).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "metric_type", "hour_start"],
+            set_={
+                column: stmt.excluded[column]
+                for column in (
+                    "loinc_code", "total_value", "average_value", "min_value", "max_value",
+                    "count", "unit", "primary_source", "sources_included", "updated_at",
+                )
+            },
+        )
+        result = db.execute(stmt)
+        return result.rowcount or 0
+
+    @staticmethod
+    def rollup_daily(db: Session, user_id: int, days: Sequence[date]) -> int:
+        """Rebuild daily aggregates from hourly aggregates for the given days"""
+        days = sorted(set(days))
+        if not days:
+            return 0
+
+        result = db.execute(DAILY_ROLLUP_SQL, {
+            "user_id": user_id,
+            "days": days,
+            "range_start": datetime.combine(days[0], datetime.min.time()),
+            "range_end": datetime.combine(days[-1] + timedelta(days=1), datetime.min.time()),
+            "sleep_metric": SLEEP_METRIC,
+            "now": datetime.utcnow(),
+        })
+        return result.rowcount or 0
+
+    @staticmethod
+    def rollup_weekly(db: Session, user_id: int, week_starts: Sequence[date]) -> int:
+        """Rebuild weekly aggregates (Monday-Sunday) from daily aggregates"""
+        week_starts = sorted(set(_week_start(w) for w in week_starts))
+        if not week_starts:
+            return 0
+
+        result = db.execute(WEEKLY_ROLLUP_SQL, {
+            "user_id": user_id,
+            "buckets": week_starts,
+            "range_start": week_starts[0],
+            "range_end": week_starts[-1] + timedelta(days=6),
+            "now": datetime.utcnow(),
+        })
+        return result.rowcount or 0
+
+    @staticmethod
+    def rollup_monthly(db: Session, user_id: int, months: Sequence[Tuple[int, int]]) -> int:
+        """Rebuild monthly aggregates from daily aggregates for (year, month) pairs"""
+        months = sorted(set(months))
+        if not months:
+            return 0
+
+        result = db.execute(MONTHLY_ROLLUP_SQL, {
+            "user_id": user_id,
+            "buckets": [year * 100 + month for year, month in months],
+            "range_start": _month_bounds(*months[0])[0],
+            "range_end": _month_bounds(*months[-1])[1],
+            "now": datetime.utcnow(),
+        })
+        return result.rowcount or 0
+
+    @staticmethod
+    def rollup_days(db: Session, user_id: int, days: Iterable[date], commit: bool = True) -> Dict[str, int]:
+        """
+        Run the full hourly -> daily -> weekly -> monthly rollup for a user.
+
+        Every week and month touched by ``days`` is recomputed in full from the
+        daily level, so callers only need to pass the days whose raw data changed.
+
+        Args:
+            db: Database session
+            user_id: User whose aggregates are rebuilt
+            days: Days with new or changed categorized data
+            commit: Commit once after all levels have been written
+
+        Returns:
+            Number of aggregate rows written per level
+        """
+        days = sorted(set(days))
+        if not days:
+            return {"hourly": 0, "daily": 0, "weekly": 0, "monthly": 0}
+
+        counts = {
+            "hourly": VitalsRollupCRUD.rollup_hourly(db, user_id, days),
+            "daily": VitalsRollupCRUD.rollup_daily(db, user_id, days),
+            "weekly": VitalsRollupCRUD.rollup_weekly(db, user_id, [_week_start(d) for d in days]),
+            "monthly": VitalsRollupCRUD.rollup_monthly(db, user_id, [(d.year, d.month) for d in days]),
+        }
+        mark_scores_stale(db, user_id, days[0])
+
+        if commit:
+            db.commit()
+
+        logger.debug(
+            f"📊 [VitalsRollup] User {user_id}: {len(days)} day(s) -> "
+            f"{counts['hourly']} hourly, {counts['daily']} daily, "
+            f"{counts['weekly']} weekly, {counts['monthly']} monthly aggregates"
+        )
+        return counts
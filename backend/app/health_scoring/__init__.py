@@ -5,6 +5,7 @@ This module contains:
 - Pydantic schemas for importing/exporting configuration
 - A small, explicit engine for scoring based on anchors/specs
 - Services to fetch data from existing domain tables and persist results
+- A batch scorer that backfills many users × days with set-based queries
 
 All endpoints in this package are internal-only and gated by admin auth.
 """
@@ -13,6 +14,7 @@ from .models import (
     HealthScoreSpec,
     MetricAnchorRegistry,
     HealthScoreResultDaily,
+    HealthScoreDirty,
     HealthScoreCalcLog,
 )
 
@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from app.api import deps
 from app.db.session import SessionLocal
 from .services import HealthScoringService
+from .config_cache import get_scoring_config_cache
 from .schemas import SpecCreate
 from .models import HealthScoreSpec
 
@@ -105,6 +106,7 @@ def upsert_spec(
         db.query(HealthScoreSpec).filter(HealthScoreSpec.id != spec.id).update({HealthScoreSpec.is_default: False})
     db.commit()
     db.refresh(spec)
+    get_scoring_config_cache().invalidate()
     return {"id": spec.id, "version": spec.version, "is_default": spec.is_default}
 
 
@@ -0,0 +1,491 @@
+"""Batched daily health scores for many users × days.
+
+``HealthScoringService.compute_daily`` runs about fifteen queries per user-day,
+which makes backfills (after a spec or anchor change) take hours. The batch
+scorer loads each modality's inputs for a chunk of users over the whole date
+range with one set-based query, scores them as NumPy arrays and bulk-upserts
+the results.
+
+Results are identical to compute_daily: each modality follows the matching
+``_score_*`` method (same windows, same None/zero handling, shared helpers for
+sleep hours, lab plausibility and calorie targets), windowed means are summed
+in date order exactly like ``sum()``, interpolation goes through
+``interpolate_piecewise_array``, and the final blend and explainability use the
+shared ``HealthScoringService.assemble_daily``.
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import and_, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, selectinload
+
+from app.models import UserProfile
+from app.models.nutrition_goals import NutritionGoal, NutritionGoalTarget
+from app.utils.timezone import local_now_db_func
+from .engine import interpolate_piecewise_array
+from .models import HealthScoreCalcLog, HealthScoreResultDaily
+from .services import (
+    ACUTE_MODALITIES,
+    BIOMARKER_KEYS,
+    CHRONIC_MODALITIES,
+    MEDICATION_ASSUMED_DAYS_SUPPLY,
+    MEDICATION_WINDOW_DAYS,
+    VITALS_TODAY_METRICS,
+    HealthScoringService,
+    ModalityScore,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rows and user-days are keyed as user_index * _KEY_STRIDE + date ordinal, so one
+# sorted int64 array orders by (user, day) and a day window never crosses users
+_KEY_STRIDE = 10_000_000
+_UPSERT_BATCH_ROWS = 1000
+
+_VITALS_TODAY_SQL = text("""
+    SELECT DISTINCT ON (user_id, metric_type, CAST(start_date AS DATE))
+        user_id, metric_type, CAST(start_date AS DATE) AS day, value, unit
+    FROM vitals_raw_data
+    WHERE user_id = ANY(:user_ids)
+      AND metric_type = ANY(:metric_types)
+      AND start_date >= :start_ts AND start_date <= :end_ts
+    ORDER BY user_id, metric_type, CAST(start_date AS DATE), start_date DESC
+""")
+
+_DAILY_VITALS_SQL = text("""
+    SELECT user_id, metric_type, date, total_value, average_value, duration_minutes, unit
+    FROM vitals_daily_aggregates
+    WHERE user_id = ANY(:user_ids)
+      AND metric_type = ANY(:metric_types)
+      AND date >= :start AND date <= :end
+    ORDER BY user_id, metric_type, date
+""")
+
+_LATEST_LAB_SQL = text("""
+    SELECT DISTINCT ON (user_id) user_id, test_value, test_unit
+    FROM lab_report_categorized
+    WHERE user_id = ANY(:user_ids)
+      AND (CAST(:loinc_code AS VARCHAR) IS NULL OR loinc_code = :loinc_code)
+    ORDER BY user_id, test_date DESC
+""")
+
+_NUTRITION_SQL = text("""
+    SELECT user_id, date, total_calories
+    FROM nutrition_daily_aggregates
+    WHERE user_id = ANY(:user_ids)
+      AND date >= :start AND date <= :end
+      AND total_calories IS NOT NULL
+    ORDER BY user_id, date
+""")
+
+_BILLS_SQL = text("""
+    SELECT user_id, bill_date
+    FROM pharmacy_bills
+    WHERE user_id = ANY(:user_ids)
+      AND bill_date >= :start AND bill_date <= :end
+    ORDER BY user_id, bill_date
+""")
+
+
+def _sorted_series(keys: List[int], values: List[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Key/value arrays sorted by key, keeping query order among equal keys"""
+    k = np.asarray(keys, dtype=np.int64)
+    v = np.asarray(values, dtype=np.float64)
+    order = np.argsort(k, kind="stable")
+    return k[order], v[order]
+
+
+def _window_means(row_keys: np.ndarray, row_values: np.ndarray, query_keys: np.ndarray, span_days: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mean of the rows within [day - span_days, day] for every query key, and the row counts.
+    Rows are added one column at a time in key order so each sum matches ``sum(vals)``.
+    """
+    lo = np.searchsorted(row_keys, query_keys - span_days, side="left")
+    hi = np.searchsorted(row_keys, query_keys, side="right")
+    counts = hi - lo
+    sums = np.zeros(len(query_keys))
+    if len(row_keys):
+        last = len(row_keys) - 1
+        for j in range(int(counts.max(initial=0))):
+            idx = lo + j
+            sums = sums + np.where(idx < hi, row_values[np.minimum(idx, last)], 0.0)
+    means = sums / np.maximum(counts, 1)
+    return means, counts
+
+
+@dataclass
+class _BatchInputs:
+    """Users, day range and key arrays shared by the modality loaders"""
+    user_ids: List[int]
+    index: Dict[int, int]
+    start: date
+    end: date
+    pairs: List[Tuple[int, date]]
+    keys: np.ndarray
+
+    def key(self, user_id: int, day: date) -> int:
+        return self.index[user_id] * _KEY_STRIDE + day.toordinal()
+
+
+class BatchHealthScorer:
+    """Computes and stores daily scores for a chunk of users over a date range"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.svc = HealthScoringService(db)
+
+    def compute_range(self, user_ids: Sequence[int], start: date, end: date, force: bool = False) -> Tuple[int, int, int]:
+        """
+        Score every user × day in [start, end]; existing scores are kept unless ``force``.
+        Returns (written, skipped, errors) like the per-user recalculation script.
+        """
+        spec = self.svc._scoring_config().spec
+        if not spec:
+            raise RuntimeError("No default health score spec configured")
+
+        user_ids = sorted(set(user_ids))
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        existing = set() if force else self._existing_pairs(user_ids, start, end)
+        pairs = [(u, d) for u in user_ids for d in days if (u, d) not in existing]
+        skipped = len(user_ids) * len(days) - len(pairs)
+        if not pairs:
+            return 0, skipped, 0
+
+        scored, errors = self.score_pairs(spec.spec_json, pairs)
+        written = self._write(spec.version, scored)
+        return written, skipped, errors
+
+    def score_pairs(
+        self, spec_json: Dict, pairs: List[Tuple[int, date]]
+    ) -> Tuple[List[Tuple[int, date, float, float, float, float, Dict]], int]:
+        """(user_id, day, chronic, acute, overall, confidence, detail) per pair, and the error count"""
+        user_ids = sorted({u for u, _ in pairs})
+        index = {u: i for i, u in enumerate(user_ids)}
+        start = min(d for _, d in pairs)
+        end = max(d for _, d in pairs)
+        keys = np.array([index[u] * _KEY_STRIDE + d.toordinal() for u, d in pairs], dtype=np.int64)
+        ctx = _BatchInputs(user_ids=user_ids, index=index, start=start, end=end, pairs=pairs, keys=keys)
+
+        profiles = {
+            p.user_id: p
+            for p in self.db.query(UserProfile).filter(UserProfile.user_id.in_(user_ids)).all()
+        }
+
+        daily = self._load_daily_vitals(ctx)
+        modalities: Dict[str, List[Optional[ModalityScore]]] = {
+            "vitals_today": self._vitals_today(ctx),
+            "sleep_last_night": self._daily_today(ctx, daily["Sleep"], "sleep", "duration_h", "duration_h", positive=True),
+            "activity_today": self._daily_today(ctx, daily["Steps"], "activity", "steps_per_day", "steps", positive=False),
+            "biomarkers": self._biomarkers(ctx),
+            "vitals_30d": self._daily_window(ctx, daily["Heart Rate"], 30, "vitals", "resting_hr", "hr_30d_avg"),
+            "activity": self._daily_window(ctx, daily["Steps"], 6, "activity", "steps_per_day", "steps_7d_avg"),
+            "sleep": self._daily_window(ctx, daily["Sleep"], 6, "sleep", "duration_h", "sleep_7d_avg_h"),
+            "nutrition": self._nutrition(ctx, profiles),
+            "medications": self._medications(ctx),
+        }
+
+        scored = []
+        errors = 0
+        for i, (user_id, day) in enumerate(pairs):
+            scores = {name: modalities[name][i] for name in ACUTE_MODALITIES + CHRONIC_MODALITIES}
+            if any(s is None for s in scores.values()):
+                errors += 1
+                continue
+            try:
+                chronic, acute, overall, conf, detail = self.svc.assemble_daily(spec_json, profiles.get(user_id), scores)
+            except Exception as e:
+                logger.error(f"❌ [HealthScoreBatch] Failed to score user {user_id} on {day}: {e}")
+                errors += 1
+                continue
+            scored.append((user_id, day, chronic, acute, overall, conf, detail))
+        return scored, errors
+
+    # --- Loading ---
+    def _existing_pairs(self, user_ids: List[int], start: date, end: date) -> Set[Tuple[int, date]]:
+        rows = (
+            self.db.query(HealthScoreResultDaily.user_id, HealthScoreResultDaily.date)
+            .filter(
+                and_(
+                    HealthScoreResultDaily.user_id.in_(user_ids),
+                    HealthScoreResultDaily.date >= start,
+                    HealthScoreResultDaily.date <= end,
+                )
+            )
+            .all()
+        )
+        return {(r[0], r[1]) for r in rows}
+
+    def _load_daily_vitals(self, ctx: _BatchInputs) -> Dict[str, Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+        """Per metric: sorted (keys, values) of the value each scorer reads, None values dropped"""
+        rows = self.db.execute(_DAILY_VITALS_SQL, {
+            "user_ids": ctx.user_ids,
+            "metric_types": ["Sleep", "Steps", "Heart Rate"],
+            "start": ctx.start - timedelta(days=30),
+            "end": ctx.end,
+        }).fetchall()
+        collected: Dict[str, Tuple[List[int], List[float]]] = {m: ([], []) for m in ("Sleep", "Steps", "Heart Rate")}
+        for r in rows:
+            if r.metric_type == "Sleep":
+                value = self.svc._sleep_hours(r.duration_minutes, r.total_value, r.unit)
+            elif r.metric_type == "Steps":
+                value = r.total_value
+            else:
+                value = r.average_value
+            if value is None:
+                continue
+            k, v = collected[r.metric_type]
+            k.append(ctx.key(r.user_id, r.date))
+            v.append(value)
+        return {m: _sorted_series(k, v) for m, (k, v) in collected.items()}
+
+    # --- Modalities ---
+    def _vitals_today(self, ctx: _BatchInputs) -> List[ModalityScore]:
+        rows = self.db.execute(_VITALS_TODAY_SQL, {
+            "user_ids": ctx.user_ids,
+            "metric_types": [m for m, _, _ in VITALS_TODAY_METRICS],
+            "start_ts": datetime.combine(ctx.start, datetime.min.time()),
+            "end_ts": datetime.combine(ctx.end, datetime.max.time()),
+        }).fetchall()
+        latest = {(r.user_id, r.metric_type, r.day): r for r in rows}
+
+        n = len(ctx.pairs)
+        sums = np.zeros(n)
+        counts = np.zeros(n, dtype=np.int64)
+        details: List[Dict] = [{} for _ in range(n)]
+        # Metrics are added in the scalar path's order so the sums match
+        for metric_type, key, domain in VITALS_TODAY_METRICS:
+            reg = self.svc._anchor(domain, key)
+            if not reg:
+                continue
+            hits = [(i, latest[(u, metric_type, d)]) for i, (u, d) in enumerate(ctx.pairs) if (u, metric_type, d) in latest]
+            if not hits:
+                continue
+            idx = np.array([i for i, _ in hits])
+            scores = interpolate_piecewise_array([r.value for _, r in hits], reg.anchors)
+            column = np.zeros(n)
+            column[idx] = scores
+            sums = sums + column
+            counts[idx] += 1
+            for (i, r), sc in zip(hits, scores):
+                details[i][key] = {"value": r.value, "unit": r.unit, "score": float(sc)}
+
+        means = sums / np.maximum(counts, 1)
+        return [
+            ModalityScore(score=float(means[i]), confidence=1.0, detail=details[i]) if counts[i]
+            else ModalityScore(score=0.0, confidence=0.0, detail={})
+            for i in range(n)
+        ]
+
+    def _daily_today(
+        self, ctx: _BatchInputs, series: Tuple[np.ndarray, np.ndarray], domain: str, key: str, detail_key: str, positive: bool
+    ) -> List[ModalityScore]:
+        """Single-day aggregate scorers (sleep last night, steps today)"""
+        values, counts = _window_means(series[0], series[1], ctx.keys, 0)
+        # Sleep needs hours > 0; steps only skip a falsy total
+        present = (counts > 0) & ((values > 0) if positive else (values != 0))
+        reg = self.svc._anchor(domain, key)
+        if not reg or not present.any():
+            return [ModalityScore(0.0, 0.0, {}) for _ in ctx.pairs]
+        scores = interpolate_piecewise_array(values, reg.anchors)
+        return [
+            ModalityScore(score=float(scores[i]), confidence=1.0, detail={detail_key: float(values[i]), "score": float(scores[i])})
+            if present[i] else ModalityScore(0.0, 0.0, {})
+            for i in range(len(ctx.pairs))
+        ]
+
+    def _daily_window(
+        self, ctx: _BatchInputs, series: Tuple[np.ndarray, np.ndarray], span_days: int, domain: str, key: str, detail_key: str
+    ) -> List[ModalityScore]:
+        """Windowed average scorers (30d heart rate, 7d steps, 7d sleep)"""
+        means, counts = _window_means(series[0], series[1], ctx.keys, span_days)
+        reg = self.svc._anchor(domain, key)
+        if not reg or not counts.any():
+            return [ModalityScore(0.0, 0.0, {}) for _ in ctx.pairs]
+        scores = interpolate_piecewise_array(means, reg.anchors)
+        return [
+            ModalityScore(float(scores[i]), 1.0, {detail_key: float(means[i]), "score": float(scores[i])})
+            if counts[i] else ModalityScore(0.0, 0.0, {})
+            for i in range(len(ctx.pairs))
+        ]
+
+    def _biomarkers(self, ctx: _BatchInputs) -> List[ModalityScore]:
+        """Latest plausible lab per biomarker; independent of the day like the scalar path"""
+        n_users = len(ctx.user_ids)
+        sums = np.zeros(n_users)
+        counts = np.zeros(n_users, dtype=np.int64)
+        details: List[Dict] = [{} for _ in range(n_users)]
+        for key, group, loinc in BIOMARKER_KEYS:
+            reg = self.svc._anchor("biomarker", key)
+            if not reg:
+                continue
+            rows = self.db.execute(_LATEST_LAB_SQL, {"user_ids": ctx.user_ids, "loinc_code": loinc}).fetchall()
+            readings = []
+            for r in rows:
+                reading = self.svc._biomarker_reading(key, r)
+                if reading is not None:
+                    readings.append((ctx.index[r.user_id], reading))
+            if not readings:
+                continue
+            idx = np.array([u for u, _ in readings])
+            scores = interpolate_piecewise_array([value for _, (value, _) in readings], reg.anchors)
+            column = np.zeros(n_users)
+            column[idx] = scores
+            sums = sums + column
+            counts[idx] += 1
+            for (u, (value, unit_clean)), sc in zip(readings, scores):
+                details[u][key] = {"value": value, "unit": unit_clean, "score": float(sc)}
+
+        means = sums / np.maximum(counts, 1)
+        per_user = [
+            ModalityScore(score=float(means[u]), confidence=1.0, detail=details[u]) if counts[u]
+            else ModalityScore(score=0.0, confidence=0.0, detail={})
+            for u in range(n_users)
+        ]
+        return [per_user[ctx.index[u]] for u, _ in ctx.pairs]
+
+    def _nutrition(self, ctx: _BatchInputs, profiles: Dict[int, UserProfile]) -> List[Optional[ModalityScore]]:
+        rows = self.db.execute(_NUTRITION_SQL, {
+            "user_ids": ctx.user_ids,
+            "start": ctx.start - timedelta(days=6),
+            "end": ctx.end,
+        }).fetchall()
+        row_keys, row_values = _sorted_series([ctx.key(r.user_id, r.date) for r in rows], [r.total_calories for r in rows])
+        means, counts = _window_means(row_keys, row_values, ctx.keys, 6)
+        reg = self.svc._anchor("nutrition", "energy_balance_pct_abs")
+        if not reg or not counts.any():
+            return [ModalityScore(0.0, 0.0, {}) for _ in ctx.pairs]
+
+        # Latest active goal per user, with targets and nutrients for _calorie_target_from
+        goals: Dict[int, NutritionGoal] = {}
+        for goal in (
+            self.db.query(NutritionGoal)
+            .options(selectinload(NutritionGoal.targets).selectinload(NutritionGoalTarget.nutrient))
+            .filter(and_(NutritionGoal.user_id.in_(ctx.user_ids), NutritionGoal.status == "active"))
+            .order_by(NutritionGoal.user_id, NutritionGoal.effective_at.desc())
+            .all()
+        ):
+            goals.setdefault(goal.user_id, goal)
+        user_targets = [self.svc._calorie_target_from(goals.get(u), profiles.get(u)) for u in ctx.user_ids]
+        targets = np.array([user_targets[ctx.index[u]] for u, _ in ctx.pairs], dtype=np.float64)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            deviation = np.abs((means - targets) / targets * 100.0)
+        scores = interpolate_piecewise_array(deviation, reg.anchors)
+        out: List[Optional[ModalityScore]] = []
+        for i in range(len(ctx.pairs)):
+            if not counts[i]:
+                out.append(ModalityScore(0.0, 0.0, {}))
+            elif targets[i] == 0:
+                # The scalar path raises ZeroDivisionError for this user-day
+                out.append(None)
+            else:
+                out.append(ModalityScore(float(scores[i]), 1.0, {
+                    "avg_calories": float(means[i]),
+                    "target": float(targets[i]),
+                    "deviation_pct": float(deviation[i]),
+                    "score": float(scores[i]),
+                }))
+        return out
+
+    def _medications(self, ctx: _BatchInputs) -> List[ModalityScore]:
+        """Union of assumed bill coverage over the window, via per-user coverage prefix sums"""
+        lookback = MEDICATION_WINDOW_DAYS + MEDICATION_ASSUMED_DAYS_SUPPLY
+        rows = self.db.execute(_BILLS_SQL, {
+            "user_ids": ctx.user_ids,
+            "start": ctx.start - timedelta(days=lookback),
+            "end": ctx.end,
+        }).fetchall()
+        bill_keys = np.sort(np.array([ctx.key(r.user_id, r.bill_date) for r in rows], dtype=np.int64))
+
+        # Any bill in [day - lookback, day] makes the modality present
+        has_bills = (np.searchsorted(bill_keys, ctx.keys, side="right") - np.searchsorted(bill_keys, ctx.keys - lookback, side="left")) > 0
+        if not has_bills.any():
+            return [ModalityScore(0.0, 0.0, {}) for _ in ctx.pairs]
+
+        # Day t is covered when some bill falls in [t - supply + 1, t]
+        grid_start = ctx.start - timedelta(days=MEDICATION_WINDOW_DAYS)
+        grid_len = (ctx.end - grid_start).days + 1
+        grid_keys = (
+            np.arange(len(ctx.user_ids), dtype=np.int64)[:, None] * _KEY_STRIDE
+            + (grid_start.toordinal() + np.arange(grid_len, dtype=np.int64))[None, :]
+        )
+        covered = (
+            np.searchsorted(bill_keys, grid_keys, side="right")
+            - np.searchsorted(bill_keys, grid_keys - (MEDICATION_ASSUMED_DAYS_SUPPLY - 1), side="left")
+        ) > 0
+        prefix = np.zeros((len(ctx.user_ids), grid_len + 1), dtype=np.int64)
+        prefix[:, 1:] = np.cumsum(covered, axis=1)
+
+        # Window [day - MEDICATION_WINDOW_DAYS, day] is grid columns [offset, offset + MEDICATION_WINDOW_DAYS]
+        rows_idx = np.array([ctx.index[u] for u, _ in ctx.pairs])
+        offsets = np.array([(d - ctx.start).days for _, d in ctx.pairs])
+        covered_days = prefix[rows_idx, offsets + MEDICATION_WINDOW_DAYS + 1] - prefix[rows_idx, offsets]
+        pdc = np.minimum(1.0, covered_days / float(MEDICATION_WINDOW_DAYS))
+
+        reg = self.svc._anchor("medication", "pdc")
+        # Without anchors fall back to a simple linear mapping
+        scores = interpolate_piecewise_array(pdc, reg.anchors) if reg else 100.0 * pdc
+        return [
+            ModalityScore(score=float(scores[i]), confidence=0.6, detail={
+                "pdc": float(pdc[i]),
+                "covered_days": int(covered_days[i]),
+                "window_days": MEDICATION_WINDOW_DAYS,
+                "source": "pharmacy_bills",
+            })
+            if has_bills[i] else ModalityScore(0.0, 0.0, {})
+            for i in range(len(ctx.pairs))
+        ]
+
+    # --- Persistence ---
+    def _write(self, spec_version: str, scored: List[Tuple[int, date, float, float, float, float, Dict]]) -> int:
+        if not scored:
+            return 0
+        for i in range(0, len(scored), _UPSERT_BATCH_ROWS):
+            stmt = insert(HealthScoreResultDaily).values([
+                {
+                    "user_id": user_id,
+                    "date": day,
+                    "chronic_score": float(chronic),
+                    "acute_score": float(acute),
+                    "overall_score": float(overall),
+                    "confidence": float(conf),
+                    "detail": detail,
+                    "spec_version": spec_version,
+                }
+                for user_id, day, chronic, acute, overall, conf, detail in scored[i:i + _UPSERT_BATCH_ROWS]
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["user_id", "date"],
+                set_={
+                    **{
+                        column: stmt.excluded[column]
+                        for column in ("chronic_score", "acute_score", "overall_score", "confidence", "detail", "spec_version")
+                    },
+                    # Bump so freshness checks against health_score_dirty see the recompute
+                    "updated_at": local_now_db_func(),
+                },
+            )
+            self.db.execute(stmt)
+
+        calculated_at = datetime.utcnow()
+        self.db.bulk_insert_mappings(HealthScoreCalcLog, [
+            {
+                "user_id": user_id,
+                "calculated_at": calculated_at,
+                "window_start": datetime.combine(day - timedelta(days=30), datetime.min.time()),
+                "window_end": datetime.combine(day, datetime.max.time()),
+                "spec_version": spec_version,
+                "inputs_summary": {},
+                "result_overall": float(overall),
+                "confidence": float(conf),
+            }
+            for user_id, day, chronic, acute, overall, conf, detail in scored
+        ])
+        self.db.commit()
+        return len(scored)
+
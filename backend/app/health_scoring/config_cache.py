@@ -0,0 +1,149 @@
+"""In-process cache of the scoring configuration (anchor registry + default spec).
+
+Both tables change rarely (admin spec uploads, LOINC anchor syncs) but are read
+for every metric of every score. They are loaded once into plain snapshots and
+shared by all sessions in the process. A cheap version query (registry row count
+and max updated_at, default spec id and updated_at) runs at most every
+HEALTH_SCORE_CONFIG_REFRESH_SECONDS; the full reload only happens when it changes.
+Writers in this process call ``invalidate()`` so their changes apply immediately.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import desc, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from .models import HealthScoreSpec, MetricAnchorRegistry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SpecSnapshot:
+    id: int
+    version: str
+    name: str
+    spec_json: Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class AnchorSnapshot:
+    domain: str
+    key: str
+    loinc_code: Optional[str]
+    unit: Optional[str]
+    pattern: str
+    anchors: Any
+    half_life_days: Optional[int]
+    danger: Any
+    group_key: Optional[str]
+
+
+@dataclass(frozen=True)
+class ScoringConfig:
+    spec: Optional[SpecSnapshot]
+    anchors: Dict[Tuple[str, str], AnchorSnapshot]  # (domain, key) -> active anchor row
+    changed_at: Optional[datetime] = None  # Latest anchor/spec updated_at; scores stored before it are outdated
+
+    def anchor(self, domain: str, key: str) -> Optional[AnchorSnapshot]:
+        return self.anchors.get((domain, key))
+
+
+_VERSION_SQL = text("""
+    SELECT
+        (SELECT COUNT(*) FROM metric_anchor_registry) AS anchor_count,
+        (SELECT MAX(updated_at) FROM metric_anchor_registry) AS anchors_updated_at,
+        (SELECT id FROM health_score_specs WHERE is_default = TRUE ORDER BY updated_at DESC LIMIT 1) AS spec_id,
+        (SELECT MAX(updated_at) FROM health_score_specs) AS specs_updated_at
+""")
+
+
+class ScoringConfigCache:
+    """Versioned snapshot of MetricAnchorRegistry and the default HealthScoreSpec"""
+
+    def __init__(self, refresh_seconds: Optional[int] = None):
+        self.refresh_seconds = settings.HEALTH_SCORE_CONFIG_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self._config: Optional[ScoringConfig] = None
+        self._version: Optional[tuple] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> ScoringConfig:
+        config = self._config
+        if config is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return config
+
+        with self._lock:
+            if self._config is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+                return self._config
+            version = tuple(db.execute(_VERSION_SQL).fetchone())
+            if self._config is None or version != self._version:
+                changed = [ts for ts in (version[1], version[3]) if ts is not None]
+                self._config = replace(self._load(db), changed_at=max(changed) if changed else None)
+                self._version = version
+                logger.info(
+                    f"🔄 [HealthScoreConfig] Loaded {len(self._config.anchors)} anchors, "
+                    f"spec {self._config.spec.version if self._config.spec else None}"
+                )
+            self._checked_at = time.monotonic()
+            return self._config
+
+    def invalidate(self) -> None:
+        """Force a reload on next use (call after writing anchors or specs)"""
+        with self._lock:
+            self._config = None
+            self._version = None
+
+    @staticmethod
+    def _load(db: Session) -> ScoringConfig:
+        spec_row = (
+            db.query(HealthScoreSpec)
+            .filter(HealthScoreSpec.is_default == True)
+            .order_by(desc(HealthScoreSpec.updated_at))
+            .first()
+        )
+        spec = None
+        if spec_row:
+            spec = SpecSnapshot(id=spec_row.id, version=spec_row.version, name=spec_row.name, spec_json=spec_row.spec_json)
+
+        anchors: Dict[Tuple[str, str], AnchorSnapshot] = {}
+        rows = (
+            db.query(MetricAnchorRegistry)
+            .filter(MetricAnchorRegistry.active == True)
+            .order_by(MetricAnchorRegistry.id)
+            .all()
+        )
+        for r in rows:
+            # (domain, key) is unique; keep the first row like the per-metric .first() lookups did
+            anchors.setdefault((r.domain, r.key), AnchorSnapshot(
+                domain=r.domain,
+                key=r.key,
+                loinc_code=r.loinc_code,
+                unit=r.unit,
+                pattern=r.pattern,
+                anchors=r.anchors,
+                half_life_days=r.half_life_days,
+                danger=r.danger,
+                group_key=r.group_key,
+            ))
+        return ScoringConfig(spec=spec, anchors=anchors)
+
+
+_cache: Optional[ScoringConfigCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_scoring_config_cache() -> ScoringConfigCache:
+    """Process-wide ScoringConfigCache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ScoringConfigCache()
+    return _cache
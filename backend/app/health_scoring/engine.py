@@ -1,5 +1,7 @@
 from typing import List, Tuple, Optional
 
+import numpy as np
+
 
 def interpolate_piecewise(value: float, anchors: List[Tuple[float, float]], clamp_low: float = 0.0, clamp_high: float = 100.0) -> float:
     """Piecewise linear interpolation. Anchors are sorted by value.
@@ -43,3 +45,30 @@ def exponential_decay_weight(days_since: float, half_life_days: Optional[float])
         return 0.0
 
 
+def interpolate_piecewise_array(values, anchors: List[Tuple[float, float]], clamp_low: float = 0.0, clamp_high: float = 100.0) -> np.ndarray:
+    """Vectorized interpolate_piecewise over an array of values.
+
+    Follows the scalar function step for step (stable anchor sort, clamp at the
+    ends, first segment containing the value, same arithmetic) so every element
+    equals interpolate_piecewise(value, anchors) exactly.
+    """
+    v = np.asarray(values, dtype=np.float64)
+    if not anchors:
+        return np.zeros(v.shape)
+    pts = sorted(anchors, key=lambda x: x[0])
+    xs = np.array([p[0] for p in pts], dtype=np.float64)
+    ys = np.array([p[1] for p in pts], dtype=np.float64)
+
+    # First i with value <= xs[i]; for values strictly inside the anchors that is
+    # the first segment with x0 <= value <= x1
+    i = np.clip(np.searchsorted(xs, v, side="left"), 1, len(xs) - 1)
+    x0, x1 = xs[i - 1], xs[i]
+    y0, y1 = ys[i - 1], ys[i]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (v - x0) / (x1 - x0)
+        y = np.where(x1 == x0, y1, y0 + t * (y1 - y0))
+    # Clamp; values that compare false with everything (NaN) take the fallback
+    y = np.where(v >= xs[-1], ys[-1], y)
+    y = np.where(v <= xs[0], ys[0], y)
+    y = np.where(np.isnan(v), ys[-1], y)
+    return np.maximum(clamp_low, np.minimum(clamp_high, y))
@@ -0,0 +1,148 @@
+"""Invalidation and background recompute of materialized daily health scores.
+
+Aggregation pipelines call ``mark_scores_stale`` in the same transaction that
+writes new vitals, nutrition, lab or medication data. A score for day D reads up
+to 60 days of inputs before D (and the latest lab regardless of date), so a
+change on day X can affect every stored score from X onward; the mark keeps the
+earliest such day per user in health_score_dirty.
+
+The ML worker drains marks with ``recompute_stale_scores``: it claims one user's
+mark at a time with FOR UPDATE SKIP LOCKED on a separate session, recomputes today
+plus any stored scores from since_date (bounded by HEALTH_SCORE_RECOMPUTE_MAX_DAYS),
+and deletes the mark only after the recompute has committed, and only if its
+marked_at is not newer than the claimed one. A crash or error before that point
+leaves the mark in place, so the scores stay stale and are retried next pass.
+A writer marking that same user meanwhile waits on the row lock and re-inserts
+the mark once the claim is settled.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from .models import HealthScoreDirty, HealthScoreResultDaily
+
+logger = logging.getLogger(__name__)
+
+
+_MARK_SQL = text("""
+    INSERT INTO health_score_dirty (user_id, since_date, marked_at)
+    VALUES (:user_id, :since_date, timezone(:tz, clock_timestamp()))
+    ON CONFLICT (user_id) DO UPDATE SET
+        since_date = LEAST(health_score_dirty.since_date, EXCLUDED.since_date),
+        marked_at = EXCLUDED.marked_at
+""")
+
+_CLAIM_SQL = text("""
+    SELECT user_id, since_date, marked_at FROM health_score_dirty
+    WHERE (CAST(:user_id AS INTEGER) IS NULL OR user_id = :user_id)
+      AND user_id <> ALL(CAST(:failed AS INTEGER[]))
+    ORDER BY marked_at
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+""")
+
+_SETTLE_SQL = text("""
+    DELETE FROM health_score_dirty
+    WHERE user_id = :user_id AND marked_at <= :marked_at
+""")
+
+
+def mark_scores_stale(db: Session, user_id: int, since: Optional[date] = None) -> None:
+    """
+    Record that a user's scores from ``since`` onward need recomputing.
+
+    Runs in a savepoint inside the caller's transaction so the mark commits with
+    the data that caused it; failures are logged and never abort the caller.
+    """
+    if user_id is None:
+        return
+    if isinstance(since, datetime):
+        since = since.date()
+    try:
+        with db.begin_nested():
+            db.execute(_MARK_SQL, {
+                "user_id": user_id,
+                "since_date": since or datetime.now().date(),
+                "tz": getattr(settings, "DEFAULT_TIMEZONE", "UTC"),
+            })
+    except Exception as e:
+        logger.warning(f"⚠️ [HealthScore] Failed to mark scores stale for user {user_id}: {e}")
+
+
+def is_stale(db: Session, result: HealthScoreResultDaily) -> Optional[HealthScoreDirty]:
+    """The pending mark that makes ``result`` stale, or None if it is current"""
+    mark = db.query(HealthScoreDirty).filter(HealthScoreDirty.user_id == result.user_id).first()
+    if mark is None or mark.since_date > result.date:
+        return None
+    if result.updated_at is not None and mark.marked_at <= result.updated_at:
+        return None
+    return mark
+
+
+def _days_to_recompute(db: Session, user_id: int, since: date, today: date) -> List[date]:
+    oldest = max(since, today - timedelta(days=settings.HEALTH_SCORE_RECOMPUTE_MAX_DAYS))
+    stored = (
+        db.query(HealthScoreResultDaily.date)
+        .filter(
+            HealthScoreResultDaily.user_id == user_id,
+            HealthScoreResultDaily.date >= oldest,
+            HealthScoreResultDaily.date < today,
+        )
+        .order_by(HealthScoreResultDaily.date)
+        .all()
+    )
+    days = [row[0] for row in stored]
+    if since <= today:
+        days.append(today)
+    return days
+
+
+def recompute_stale_scores(db: Session, user_id: Optional[int] = None, limit: Optional[int] = None) -> int:
+    """
+    Claim stale users (or just ``user_id``) and recompute their scores.
+    Returns the number of daily scores written.
+    """
+    from .services import HealthScoringService
+
+    limit = limit or settings.HEALTH_SCORE_RECOMPUTE_BATCH_USERS
+    svc = HealthScoringService(db)
+    today = datetime.now().date()
+    written = 0
+    users = 0
+    failed: List[int] = []  # not claimed again in this pass
+    # The claim session holds the mark's row lock while db recomputes and commits
+    claim_db = SessionLocal()
+    try:
+        for _ in range(limit):
+            claimed = claim_db.execute(_CLAIM_SQL, {"user_id": user_id, "failed": failed}).first()
+            if claimed is None:
+                break
+            uid, since, marked_at = claimed
+            users += 1
+            try:
+                for day in _days_to_recompute(db, uid, since, today):
+                    svc.compute_daily(user_id=uid, day=day)
+                    written += 1
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                claim_db.rollback()
+                # The mark stays, so the next pass retries
+                logger.error(f"❌ [HealthScore] Recompute failed for user {uid} since {since}: {e}")
+                failed.append(uid)
+                continue
+            claim_db.execute(_SETTLE_SQL, {"user_id": uid, "marked_at": marked_at})
+            claim_db.commit()
+    finally:
+        claim_db.rollback()
+        claim_db.close()
+
+    if users:
+        logger.info(f"✅ [HealthScore] Recomputed {written} daily score(s) for {users} user(s)")
+    return written
@@ -82,6 +82,19 @@ class HealthScoreResultDaily(Base):
     )
 
 
+class HealthScoreDirty(Base):
+    """Users whose stored daily scores are stale from since_date onward"""
+    __tablename__ = "health_score_dirty"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    since_date = Column(Date, nullable=False)
+    marked_at = Column(DateTime, server_default=local_now_db_expr(), nullable=False)
+
+    __table_args__ = (
+        Index("idx_health_score_dirty_marked_at", "marked_at"),
+    )
+
+
 class HealthScoreCalcLog(Base):
     __tablename__ = "health_score_calculations_log"
 
@@ -5,7 +5,7 @@ from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc
+from sqlalchemy import and_, desc, select
 
 from app.models import (
     VitalsDailyAggregate,
@@ -19,8 +19,43 @@ from app.models import (
 )
 from app.models.nutrition_goals import NutritionGoal, NutritionGoalTarget, NutritionNutrientCatalog
 from app.models.health_data import PharmacyBill
+from app.core.config import settings
+from app.utils.timezone import local_now_db_func
 from .models import HealthScoreSpec, MetricAnchorRegistry, HealthScoreResultDaily, HealthScoreCalcLog
 from .engine import interpolate_piecewise, exponential_decay_weight
+from .config_cache import AnchorSnapshot, ScoringConfig, get_scoring_config_cache
+from .invalidation import is_stale
+
+
+# Modality names in detail["acute"] / detail["chronic"]
+ACUTE_MODALITIES = ("vitals_today", "sleep_last_night", "activity_today")
+CHRONIC_MODALITIES = ("biomarkers", "vitals_30d", "activity", "sleep", "nutrition", "medications")
+
+# Last reading of the day per vital: (metric_type, anchor key, anchor domain)
+VITALS_TODAY_METRICS = [
+    ("Heart Rate", "resting_hr", "vitals"),
+    ("Blood Pressure Systolic", "bp_systolic", "vitals"),
+    ("Blood Pressure Diastolic", "bp_diastolic", "vitals"),
+    ("Oxygen Saturation", "spo2_pct", "vitals"),
+    ("Temperature", "temperature_c", "vitals"),
+]
+
+# Example: A1c and LDL if available: (anchor key, group, LOINC to filter on)
+BIOMARKER_KEYS = [
+    ("a1c_pct", "glycemic", None),
+    ("ldl_mgdl", "lipids", "13457-7"),  # example LOINC for LDL-C
+]
+BIOMARKER_EXPECTED_UNITS = {
+    "a1c_pct": ["%", "percent", "%pct"],
+    "ldl_mgdl": ["mg/dL", "mgdl"],
+}
+BIOMARKER_PLAUSIBLE_RANGES = {
+    "a1c_pct": (3.0, 20.0),
+    "ldl_mgdl": (10.0, 500.0),
+}
+
+MEDICATION_WINDOW_DAYS = 30
+MEDICATION_ASSUMED_DAYS_SUPPLY = 30
 
 
 @dataclass
@@ -33,6 +68,22 @@ class ModalityScore:
 class HealthScoringService:
     def __init__(self, db: Session):
         self.db = db
+        self._config: Optional[ScoringConfig] = None
+        self._profiles: Dict[int, Optional[UserProfile]] = {}
+
+    # Cached configuration and per-service lookups
+    def _scoring_config(self) -> ScoringConfig:
+        if self._config is None:
+            self._config = get_scoring_config_cache().get(self.db)
+        return self._config
+
+    def _anchor(self, domain: str, key: str) -> Optional[AnchorSnapshot]:
+        return self._scoring_config().anchor(domain, key)
+
+    def _get_profile(self, user_id: int) -> Optional[UserProfile]:
+        if user_id not in self._profiles:
+            self._profiles[user_id] = self.db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
+        return self._profiles[user_id]
 
     # Spec management
     def get_default_spec(self) -> HealthScoreSpec:
@@ -45,106 +96,56 @@ class HealthScoringService:
         return spec
 
     # High-level compute API
+    def get_or_compute_daily(self, user_id: int, day: date) -> HealthScoreResultDaily:
+        """Serve the stored score for a day, computing it only when missing or stale.
+
+        A score invalidated by new data is still served for HEALTH_SCORE_STALE_GRACE_SECONDS
+        while the ML worker recomputes it; after that it is recomputed inline. A score
+        from another spec version, or stored before the spec/anchors last changed, is
+        always recomputed.
+        """
+        existing = (
+            self.db.query(HealthScoreResultDaily)
+            .filter(and_(HealthScoreResultDaily.user_id == user_id, HealthScoreResultDaily.date == day))
+            .first()
+        )
+        if existing is not None and not self._config_outdated(existing):
+            mark = is_stale(self.db, existing)
+            if mark is None:
+                return existing
+            now = self.db.execute(select(local_now_db_func())).scalar()
+            if (now - mark.marked_at).total_seconds() < settings.HEALTH_SCORE_STALE_GRACE_SECONDS:
+                return existing
+        return self.compute_daily(user_id=user_id, day=day)
+
+    def _config_outdated(self, result: HealthScoreResultDaily) -> bool:
+        config = self._scoring_config()
+        if config.spec is not None and result.spec_version != config.spec.version:
+            return True
+        return bool(config.changed_at and result.updated_at and result.updated_at < config.changed_at)
+
     def compute_daily(self, user_id: int, day: date) -> HealthScoreResultDaily:
-        spec = self.get_default_spec()
+        spec = self._scoring_config().spec
         if not spec:
             raise RuntimeError("No default health score spec configured")
 
         # Compute chronic and acute by modality using existing aggregates
-        chronic_detail: Dict[str, Any] = {}
-        acute_detail: Dict[str, Any] = {}
-
-        # Helper to attach modality-level score/confidence into detail
-        def with_meta(detail_dict: Dict[str, Any], score_val: float, conf_val: float) -> Dict[str, Any]:
-            enriched = dict(detail_dict or {})
-            enriched["score"] = float(score_val)
-            enriched["confidence"] = float(conf_val)
-            return enriched
-
-        # Vitals (acute)
-        vitals_today_score = self._score_vitals_today(user_id, day, spec)
-        acute_detail["vitals_today"] = with_meta(vitals_today_score.detail, vitals_today_score.score, vitals_today_score.confidence)
-
-        # Sleep (last night)
-        sleep_today_score = self._score_sleep(user_id, day, spec)
-        acute_detail["sleep_last_night"] = with_meta(sleep_today_score.detail, sleep_today_score.score, sleep_today_score.confidence)
-
-        # Activity (today progress)
-        activity_today_score = self._score_activity_today(user_id, day, spec)
-        acute_detail["activity_today"] = with_meta(activity_today_score.detail, activity_today_score.score, activity_today_score.confidence)
-
-        # Chronic stack
-        biomarkers_score = self._score_biomarkers(user_id, day, spec)
-        chronic_detail["biomarkers"] = with_meta(biomarkers_score.detail, biomarkers_score.score, biomarkers_score.confidence)
-
-        vitals_30d_score = self._score_vitals_chronic(user_id, day, spec)
-        chronic_detail["vitals_30d"] = with_meta(vitals_30d_score.detail, vitals_30d_score.score, vitals_30d_score.confidence)
-
-        activity_7d_score = self._score_activity_chronic(user_id, day, spec)
-        chronic_detail["activity"] = with_meta(activity_7d_score.detail, activity_7d_score.score, activity_7d_score.confidence)
-
-        sleep_7d_score = self._score_sleep_chronic(user_id, day, spec)
-        chronic_detail["sleep"] = with_meta(sleep_7d_score.detail, sleep_7d_score.score, sleep_7d_score.confidence)
-
-        nutrition_7d_score = self._score_nutrition(user_id, day, spec)
-        chronic_detail["nutrition"] = with_meta(nutrition_7d_score.detail, nutrition_7d_score.score, nutrition_7d_score.confidence)
-
-        meds_30d_score = self._score_medications(user_id, day, spec)
-        chronic_detail["medications"] = with_meta(meds_30d_score.detail, meds_30d_score.score, meds_30d_score.confidence)
-
-        # Blend
-        acute_weights = spec.spec_json["scoring"]["overall"]["acuteWeights"]
-        acute = (
-            vitals_today_score.score * acute_weights.get("vitals_today", 0)
-            + sleep_today_score.score * acute_weights.get("sleep_last_night", 0)
-            + activity_today_score.score * acute_weights.get("activity_today", 0)
-        )
-
-        # Age-based chronic weights
-        user_profile: Optional[UserProfile] = self.db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
-        age_band = self._infer_age_band(user_profile)
-        chronic_weights = spec.spec_json["scoring"]["overall"]["chronicWeightsByAge"][age_band]
-        chronic = (
-            biomarkers_score.score * chronic_weights.get("biomarkers", 0)
-            + vitals_30d_score.score * chronic_weights.get("vitals_30d", 0)
-            + activity_7d_score.score * chronic_weights.get("activity", 0)
-            + sleep_7d_score.score * chronic_weights.get("sleep", 0)
-            + nutrition_7d_score.score * chronic_weights.get("nutrition", 0)
-            + meds_30d_score.score * chronic_weights.get("medications", 0)
-        )
-
-        blend = spec.spec_json["scoring"]["overall"]["blend"]
-        overall = chronic * blend["chronic"] + acute * blend["acute"]
-
-        # Confidence: naive average of modality confidences weighted by chronic+acute weights
-        overall_conf = (
-            (biomarkers_score.confidence * chronic_weights.get("biomarkers", 0))
-            + (vitals_30d_score.confidence * chronic_weights.get("vitals_30d", 0))
-            + (activity_7d_score.confidence * chronic_weights.get("activity", 0))
-            + (sleep_7d_score.confidence * chronic_weights.get("sleep", 0))
-            + (nutrition_7d_score.confidence * chronic_weights.get("nutrition", 0))
-            + (meds_30d_score.confidence * chronic_weights.get("medications", 0))
-            + (vitals_today_score.confidence * blend["acute"] * acute_weights.get("vitals_today", 0))
-            + (sleep_today_score.confidence * blend["acute"] * acute_weights.get("sleep_last_night", 0))
-            + (activity_today_score.confidence * blend["acute"] * acute_weights.get("activity_today", 0))
-        )
-
-        # Derive reasons and actions for explainability
-        reasons, actions = self._derive_reasons_and_actions(
-            acute_detail=acute_detail,
-            chronic_detail=chronic_detail,
-            acute_score=acute,
-            chronic_score=chronic,
-        )
-
-        detail = {
-            "acute": acute_detail,
-            "chronic": chronic_detail,
-            "insights": {
-                "reasons": reasons,
-                "actions": actions,
-            },
+        modalities = {
+            # Acute: vitals today, sleep last night, activity today progress
+            "vitals_today": self._score_vitals_today(user_id, day, spec),
+            "sleep_last_night": self._score_sleep(user_id, day, spec),
+            "activity_today": self._score_activity_today(user_id, day, spec),
+            # Chronic stack
+            "biomarkers": self._score_biomarkers(user_id, day, spec),
+            "vitals_30d": self._score_vitals_chronic(user_id, day, spec),
+            "activity": self._score_activity_chronic(user_id, day, spec),
+            "sleep": self._score_sleep_chronic(user_id, day, spec),
+            "nutrition": self._score_nutrition(user_id, day, spec),
+            "medications": self._score_medications(user_id, day, spec),
         }
+        chronic, acute, overall, overall_conf, detail = self.assemble_daily(
+            spec.spec_json, self._get_profile(user_id), modalities
+        )
 
         # Upsert daily result
         existing = (
@@ -159,6 +160,8 @@ class HealthScoringService:
             existing.confidence = float(overall_conf)
             existing.detail = detail
             existing.spec_version = spec.version
+            # Always bump so freshness checks against health_score_dirty see the recompute
+            existing.updated_at = local_now_db_func()
         else:
             existing = HealthScoreResultDaily(
                 user_id=user_id,
@@ -188,20 +191,93 @@ class HealthScoringService:
         self.db.refresh(existing)
         return existing
 
+    def assemble_daily(
+        self,
+        spec_json: Dict[str, Any],
+        profile: Optional[UserProfile],
+        modalities: Dict[str, ModalityScore],
+    ) -> Tuple[float, float, float, float, Dict[str, Any]]:
+        """Blend modality scores into (chronic, acute, overall, confidence, detail).
+
+        Shared by compute_daily and the batch engine so both produce identical results.
+        """
+        # Helper to attach modality-level score/confidence into detail
+        def with_meta(detail_dict: Dict[str, Any], score_val: float, conf_val: float) -> Dict[str, Any]:
+            enriched = dict(detail_dict or {})
+            enriched["score"] = float(score_val)
+            enriched["confidence"] = float(conf_val)
+            return enriched
+
+        acute_detail: Dict[str, Any] = {
+            name: with_meta(modalities[name].detail, modalities[name].score, modalities[name].confidence)
+            for name in ACUTE_MODALITIES
+        }
+        chronic_detail: Dict[str, Any] = {
+            name: with_meta(modalities[name].detail, modalities[name].score, modalities[name].confidence)
+            for name in CHRONIC_MODALITIES
+        }
+
+        # Blend
+        acute_weights = spec_json["scoring"]["overall"]["acuteWeights"]
+        acute = (
+            modalities["vitals_today"].score * acute_weights.get("vitals_today", 0)
+            + modalities["sleep_last_night"].score * acute_weights.get("sleep_last_night", 0)
+            + modalities["activity_today"].score * acute_weights.get("activity_today", 0)
+        )
+
+        # Age-based chronic weights
+        age_band = self._infer_age_band(profile)
+        chronic_weights = spec_json["scoring"]["overall"]["chronicWeightsByAge"][age_band]
+        chronic = (
+            modalities["biomarkers"].score * chronic_weights.get("biomarkers", 0)
+            + modalities["vitals_30d"].score * chronic_weights.get("vitals_30d", 0)
+            + modalities["activity"].score * chronic_weights.get("activity", 0)
+            + modalities["sleep"].score * chronic_weights.get("sleep", 0)
+            + modalities["nutrition"].score * chronic_weights.get("nutrition", 0)
+            + modalities["medications"].score * chronic_weights.get("medications", 0)
+        )
+
+        blend = spec_json["scoring"]["overall"]["blend"]
+        overall = chronic * blend["chronic"] + acute * blend["acute"]
+
+        # Confidence: naive average of modality confidences weighted by chronic+acute weights
+        overall_conf = (
+            (modalities["biomarkers"].confidence * chronic_weights.get("biomarkers", 0))
+            + (modalities["vitals_30d"].confidence * chronic_weights.get("vitals_30d", 0))
+            + (modalities["activity"].confidence * chronic_weights.get("activity", 0))
+            + (modalities["sleep"].confidence * chronic_weights.get("sleep", 0))
+            + (modalities["nutrition"].confidence * chronic_weights.get("nutrition", 0))
+            + (modalities["medications"].confidence * chronic_weights.get("medications", 0))
+            + (modalities["vitals_today"].confidence * blend["acute"] * acute_weights.get("vitals_today", 0))
+            + (modalities["sleep_last_night"].confidence * blend["acute"] * acute_weights.get("sleep_last_night", 0))
+            + (modalities["activity_today"].confidence * blend["acute"] * acute_weights.get("activity_today", 0))
+        )
+
+        # Derive reasons and actions for explainability
+        reasons, actions = self._derive_reasons_and_actions(
+            acute_detail=acute_detail,
+            chronic_detail=chronic_detail,
+            acute_score=acute,
+            chronic_score=chronic,
+        )
+
+        detail = {
+            "acute": acute_detail,
+            "chronic": chronic_detail,
+            "insights": {
+                "reasons": reasons,
+                "actions": actions,
+            },
+        }
+        return chronic, acute, overall, overall_conf, detail
+
     # --- Modality scorers (initial minimal implementations; extend later) ---
     def _score_vitals_today(self, user_id: int, day: date, spec: HealthScoreSpec) -> ModalityScore:
         # Use last available values on the day for HR, BP, SpO2, Temp
-        metrics = [
-            ("Heart Rate", "resting_hr", "vitals"),
-            ("Blood Pressure Systolic", "bp_systolic", "vitals"),
-            ("Blood Pressure Diastolic", "bp_diastolic", "vitals"),
-            ("Oxygen Saturation", "spo2_pct", "vitals"),
-            ("Temperature", "temperature_c", "vitals"),
-        ]
         sub_details = {}
         subscores: List[float] = []
         confidences: List[float] = []
-        for metric_type, key, domain in metrics:
+        for metric_type, key, domain in VITALS_TODAY_METRICS:
             row = (
                 self.db.query(VitalsRawData)
                 .filter(
@@ -217,11 +293,7 @@ class HealthScoringService:
             )
             if not row:
                 continue
-            reg = (
-                self.db.query(MetricAnchorRegistry)
-                .filter(MetricAnchorRegistry.domain == domain, MetricAnchorRegistry.key == key, MetricAnchorRegistry.active == True)
-                .first()
-            )
+            reg = self._anchor(domain, key)
             if not reg:
                 continue
             score = interpolate_piecewise(row.value, reg.anchors)
@@ -232,6 +304,22 @@ class HealthScoringService:
         conf = sum(confidences) / len(confidences) if confidences else 0.0
         return ModalityScore(score=score, confidence=conf, detail=sub_details)
 
+    @staticmethod
+    def _sleep_hours(duration_minutes: Optional[float], total_value: Optional[float], unit: Optional[str]) -> Optional[float]:
+        """Sleep duration in hours from a daily aggregate, or None if it has none"""
+        # Try to get sleep duration from duration_minutes (preferred) or fall back to total_value
+        if duration_minutes is not None and duration_minutes > 0:
+            # Duration is in minutes, convert to hours
+            return float(duration_minutes) / 60.0
+        if total_value is not None and total_value > 0:
+            # Fall back to total_value - check unit to determine if conversion needed
+            unit = (unit or "").lower()
+            if unit == "minutes" or unit == "mins":
+                return float(total_value) / 60.0
+            # Assume hours if unit is hours/hrs/h, not specified or unknown
+            return float(total_value)
+        return None
+
     def _score_sleep(self, user_id: int, day: date, spec: HealthScoreSpec) -> ModalityScore:
         # Use daily aggregates of Sleep duration (minutes)
         agg = (
@@ -242,30 +330,11 @@ class HealthScoringService:
         if not agg:
             return ModalityScore(0.0, 0.0, {})
         
-        # Try to get sleep duration from duration_minutes (preferred) or fall back to total_value
-        hours = None
-        if agg.duration_minutes is not None and agg.duration_minutes > 0:
-            # Duration is in minutes, convert to hours
-            hours = float(agg.duration_minutes) / 60.0
-        elif agg.total_value is not None and agg.total_value > 0:
-            # Fall back to total_value - check unit to determine if conversion needed
-            unit = (agg.unit or "").lower()
-            if unit == "minutes" or unit == "mins":
-                hours = float(agg.total_value) / 60.0
-            elif unit == "hours" or unit == "hrs" or unit == "h":
-                hours = float(agg.total_value)
-            else:
-                # Assume hours if unit not specified or unknown
-                hours = float(agg.total_value)
-        
+        hours = self._sleep_hours(agg.duration_minutes, agg.total_value, agg.unit)
         if hours is None or hours <= 0:
             return ModalityScore(0.0, 0.0, {})
         
-        reg = (
-            self.db.query(MetricAnchorRegistry)
-            .filter(MetricAnchorRegistry.domain == "sleep", MetricAnchorRegistry.key == "duration_h", MetricAnchorRegistry.active == True)
-            .first()
-        )
+        reg = self._anchor("sleep", "duration_h")
         if not reg:
             return ModalityScore(0.0, 0.0, {})
         score = interpolate_piecewise(hours, reg.anchors)
@@ -279,33 +348,36 @@ class HealthScoringService:
         )
         if not steps or not steps.total_value:
             return ModalityScore(0.0, 0.0, {})
-        reg = (
-            self.db.query(MetricAnchorRegistry)
-            .filter(MetricAnchorRegistry.domain == "activity", MetricAnchorRegistry.key == "steps_per_day", MetricAnchorRegistry.active == True)
-            .first()
-        )
+        reg = self._anchor("activity", "steps_per_day")
         if not reg:
             return ModalityScore(0.0, 0.0, {})
         score = interpolate_piecewise(steps.total_value, reg.anchors)
         return ModalityScore(score=score, confidence=1.0, detail={"steps": steps.total_value, "score": score})
 
+    @staticmethod
+    def _biomarker_reading(key: str, row: LabReportCategorized) -> Optional[Tuple[float, str]]:
+        """(value, unit) of a lab row if it is numeric, in an expected unit and plausible for ``key``"""
+        try:
+            value = float(row.test_value)
+        except Exception:
+            return None
+        # Unit & plausibility checks to avoid OCR/unit mismatches
+        unit_clean = (row.test_unit or "").strip()
+        if key in BIOMARKER_EXPECTED_UNITS and BIOMARKER_EXPECTED_UNITS[key]:
+            allowed = BIOMARKER_EXPECTED_UNITS[key]
+            if unit_clean and all(unit_clean.lower() != u.lower() for u in allowed):
+                # Skip if unit is clearly incompatible
+                return None
+        if key in BIOMARKER_PLAUSIBLE_RANGES:
+            lo, hi = BIOMARKER_PLAUSIBLE_RANGES[key]
+            if not (lo <= value <= hi):
+                return None
+        return value, unit_clean
+
     def _score_biomarkers(self, user_id: int, day: date, spec: HealthScoreSpec) -> ModalityScore:
-        # Example: A1c and LDL if available
         detail: Dict[str, Any] = {}
         subs: List[float] = []
-        keys = [
-            ("a1c_pct", "glycemic", None),
-            ("ldl_mgdl", "lipids", "13457-7"),  # example LOINC for LDL-C
-        ]
-        expected_units = {
-            "a1c_pct": ["%", "percent", "%pct"],
-            "ldl_mgdl": ["mg/dL", "mgdl"],
-        }
-        plausible_ranges = {
-            "a1c_pct": (3.0, 20.0),
-            "ldl_mgdl": (10.0, 500.0),
-        }
-        for key, group, loinc in keys:
+        for key, group, loinc in BIOMARKER_KEYS:
             # Prefer LOINC if provided
             q = self.db.query(LabReportCategorized).filter(LabReportCategorized.user_id == user_id)
             if loinc:
@@ -316,28 +388,13 @@ class HealthScoringService:
             row = q.order_by(desc(LabReportCategorized.test_date)).first()
             if not row:
                 continue
-            reg = (
-                self.db.query(MetricAnchorRegistry)
-                .filter(MetricAnchorRegistry.domain == "biomarker", MetricAnchorRegistry.key == key, MetricAnchorRegistry.active == True)
-                .first()
-            )
+            reg = self._anchor("biomarker", key)
             if not reg:
                 continue
-            try:
-                value = float(row.test_value)
-            except Exception:
+            reading = self._biomarker_reading(key, row)
+            if reading is None:
                 continue
-            # Unit & plausibility checks to avoid OCR/unit mismatches
-            unit_clean = (row.test_unit or "").strip()
-            if key in expected_units and expected_units[key]:
-                allowed = expected_units[key]
-                if unit_clean and all(unit_clean.lower() != u.lower() for u in allowed):
-                    # Skip if unit is clearly incompatible
-                    continue
-            if key in plausible_ranges:
-                lo, hi = plausible_ranges[key]
-                if not (lo <= value <= hi):
-                    continue
+            value, unit_clean = reading
             sc = interpolate_piecewise(value, reg.anchors)
             subs.append(sc)
             detail[key] = {"value": value, "unit": unit_clean, "score": sc}
@@ -358,15 +415,12 @@ class HealthScoringService:
                     VitalsDailyAggregate.date <= day,
                 )
             )
+            .order_by(VitalsDailyAggregate.date)
             .all()
         )
         if not rows:
             return ModalityScore(0.0, 0.0, {})
-        reg = (
-            self.db.query(MetricAnchorRegistry)
-            .filter(MetricAnchorRegistry.domain == "vitals", MetricAnchorRegistry.key == "resting_hr", MetricAnchorRegistry.active == True)
-            .first()
-        )
+        reg = self._anchor("vitals", "resting_hr")
         if not reg:
             return ModalityScore(0.0, 0.0, {})
         vals = [r.average_value for r in rows if r.average_value is not None]
@@ -389,15 +443,12 @@ class HealthScoringService:
                     VitalsDailyAggregate.date <= day,
                 )
             )
+            .order_by(VitalsDailyAggregate.date)
             .all()
         )
         if not rows:
             return ModalityScore(0.0, 0.0, {})
-        reg = (
-            self.db.query(MetricAnchorRegistry)
-            .filter(MetricAnchorRegistry.domain == "activity", MetricAnchorRegistry.key == "steps_per_day", MetricAnchorRegistry.active == True)
-            .first()
-        )
+        reg = self._anchor("activity", "steps_per_day")
         if not reg:
             return ModalityScore(0.0, 0.0, {})
         vals = [r.total_value for r in rows if r.total_value is not None]
@@ -412,33 +463,21 @@ class HealthScoringService:
         rows = (
             self.db.query(VitalsDailyAggregate)
             .filter(and_(VitalsDailyAggregate.user_id == user_id, VitalsDailyAggregate.metric_type == "Sleep", VitalsDailyAggregate.date >= start, VitalsDailyAggregate.date <= day))
+            .order_by(VitalsDailyAggregate.date)
             .all()
         )
         if not rows:
             return ModalityScore(0.0, 0.0, {})
-        reg = (
-            self.db.query(MetricAnchorRegistry)
-            .filter(MetricAnchorRegistry.domain == "sleep", MetricAnchorRegistry.key == "duration_h", MetricAnchorRegistry.active == True)
-            .first()
-        )
+        reg = self._anchor("sleep", "duration_h")
         if not reg:
             return ModalityScore(0.0, 0.0, {})
         
         # Extract sleep hours from each row, handling both duration_minutes and total_value
         vals_h = []
         for r in rows:
-            if r.duration_minutes is not None and r.duration_minutes > 0:
-                vals_h.append(r.duration_minutes / 60.0)
-            elif r.total_value is not None and r.total_value > 0:
-                # Check unit for conversion
-                unit = (r.unit or "").lower()
-                if unit == "minutes" or unit == "mins":
-                    vals_h.append(r.total_value / 60.0)
-                elif unit == "hours" or unit == "hrs" or unit == "h":
-                    vals_h.append(r.total_value)
-                else:
-                    # Assume hours
-                    vals_h.append(r.total_value)
+            hours = self._sleep_hours(r.duration_minutes, r.total_value, r.unit)
+            if hours is not None:
+                vals_h.append(hours)
         
         if not vals_h:
             return ModalityScore(0.0, 0.0, {})
@@ -451,6 +490,7 @@ class HealthScoringService:
         rows = (
             self.db.query(NutritionDailyAggregate)
             .filter(and_(NutritionDailyAggregate.user_id == user_id, NutritionDailyAggregate.date >= start, NutritionDailyAggregate.date <= day))
+            .order_by(NutritionDailyAggregate.date)
             .all()
         )
         if not rows:
@@ -461,11 +501,7 @@ class HealthScoringService:
             return ModalityScore(0.0, 0.0, {})
         avg_cals = sum(total_cals) / len(total_cals)
         # Look up energy balance anchors; expect anchors expressed as % deviation
-        reg = (
-            self.db.query(MetricAnchorRegistry)
-            .filter(MetricAnchorRegistry.domain == "nutrition", MetricAnchorRegistry.key == "energy_balance_pct_abs", MetricAnchorRegistry.active == True)
-            .first()
-        )
+        reg = self._anchor("nutrition", "energy_balance_pct_abs")
         if not reg:
             return ModalityScore(0.0, 0.0, {})
         target = self._get_daily_calorie_target(user_id)
@@ -479,14 +515,14 @@ class HealthScoringService:
         Assumption: each bill provides up to 30 days of coverage starting from bill_date.
         Coverage across multiple bills is unioned. If no bills in the last 30 days, return 0/conf=0.
         """
-        window_days = 30
+        window_days = MEDICATION_WINDOW_DAYS
         window_start = day - timedelta(days=window_days)
         bills = (
             self.db.query(PharmacyBill)
             .filter(
                 and_(
                     PharmacyBill.user_id == user_id,
-                    PharmacyBill.bill_date >= window_start - timedelta(days=30),  # allow earlier bill to cover into window
+                    PharmacyBill.bill_date >= window_start - timedelta(days=MEDICATION_ASSUMED_DAYS_SUPPLY),  # allow earlier bill to cover into window
                     PharmacyBill.bill_date <= day,
                 )
             )
@@ -500,27 +536,24 @@ class HealthScoringService:
             start_d = b.bill_date
             if not start_d:
                 continue
-            assumed_days_supply = 30
-            for i in range(assumed_days_supply):
+            for i in range(MEDICATION_ASSUMED_DAYS_SUPPLY):
                 d = start_d + timedelta(days=i)
                 if window_start <= d <= day:
                     covered.add(d)
         covered_days = len(covered)
         pdc = min(1.0, covered_days / float(window_days)) if window_days > 0 else 0.0
+        return self._medication_score(pdc, covered_days)
 
+    def _medication_score(self, pdc: float, covered_days: int) -> ModalityScore:
         # Map PDC to score using anchors
-        reg = (
-            self.db.query(MetricAnchorRegistry)
-            .filter(MetricAnchorRegistry.domain == "medication", MetricAnchorRegistry.key == "pdc", MetricAnchorRegistry.active == True)
-            .first()
-        )
+        reg = self._anchor("medication", "pdc")
         if not reg:
             # Fallback simple mapping
             score = 100.0 * pdc
         else:
             # Anchors are defined on 0..1; interpolate on that scale
             score = interpolate_piecewise(pdc, reg.anchors)
-        return ModalityScore(score=float(score), confidence=0.6, detail={"pdc": pdc, "covered_days": covered_days, "window_days": window_days, "source": "pharmacy_bills"})
+        return ModalityScore(score=float(score), confidence=0.6, detail={"pdc": pdc, "covered_days": covered_days, "window_days": MEDICATION_WINDOW_DAYS, "source": "pharmacy_bills"})
 
     # --- Explainability helpers ---
     def _derive_reasons_and_actions(
@@ -663,6 +696,10 @@ class HealthScoringService:
             .order_by(NutritionGoal.effective_at.desc())
             .first()
         )
+        return self._calorie_target_from(goal, self._get_profile(user_id))
+
+    def _calorie_target_from(self, goal: Optional[NutritionGoal], profile: Optional[UserProfile]) -> float:
+        """Calorie target from an already-loaded active goal and profile (see _get_daily_calorie_target)"""
         if goal:
             target_row = None
             for t in goal.targets:
@@ -686,7 +723,6 @@ class HealthScoringService:
                     return float(target_row.target_max)
 
         # 2) Derive from user profile with Mifflin-St Jeor + activity factor
-        profile = self.db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
         if profile and profile.weight_kg and profile.height_cm and profile.date_of_birth and profile.gender:
             age = self._age_years(profile.date_of_birth)
             s = 5 if str(profile.gender).lower().startswith("m") else -161
@@ -822,6 +858,7 @@ class HealthScoringService:
                 processed_keys.add(key)
         if upserts:
             self.db.commit()
+            get_scoring_config_cache().invalidate()
         return upserts
 
     @staticmethod
@@ -5,6 +5,7 @@ from fastapi.responses import RedirectResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
 import logging
 import sys
 import os
@@ -106,6 +107,15 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"❌ [Startup] S3 verification error: {e}")
 
+    # Warm up agent workflows (compiled once per process) without delaying startup
+    if settings.AGENT_WARMUP_ON_STARTUP:
+        try:
+            from app.agentsv2.workflow_registry import warm_up
+            asyncio.get_running_loop().run_in_executor(None, warm_up)
+            logger.info("🧩 [Startup] Agent workflow warm-up scheduled")
+        except Exception as e:
+            logger.error(f"❌ [Startup] Failed to schedule agent workflow warm-up: {e}")
+
     # Event-driven aggregation setup
     try:
         from app.core.background_worker import EventDrivenVitalsAggregationWorker
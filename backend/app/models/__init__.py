@@ -51,8 +51,8 @@ from .health_data import (
     AgentMemory,
     MedicalImage
 )
-from .lab_test_mapping import LabTestMapping
-from .lab_aggregation import LabReportDaily, LabReportMonthly, LabReportQuarterly, LabReportYearly
+from .lab_test_mapping import LabTestMapping, LOINCMappingCache
+from .lab_aggregation import LabReportDaily, LabReportMonthly, LabReportQuarterly, LabReportYearly, LabCategorySummary
 from .user_profile import (
     UserProfile,
     Condition,
@@ -83,5 +83,6 @@ from app.health_scoring.models import (
     HealthScoreSpec,
     MetricAnchorRegistry,
     HealthScoreResultDaily,
+    HealthScoreDirty,
     HealthScoreCalcLog,
 )
@@ -19,6 +19,9 @@ class ChatSession(Base):
     has_prescriptions = Column(Boolean, default=False)
     is_active = Column(Boolean, default=True)
     enhanced_mode_enabled = Column(Boolean, default=True)  # Backend control for enhanced features
+    # Rolling summary of turns older than the verbatim history window (app/services/chat_history.py)
+    history_summary = Column(Text, nullable=True)
+    history_summary_message_id = Column(Integer, nullable=True)  # Last message folded into the summary
 
     # Relationships
     user = relationship("User", back_populates="chat_sessions")
@@ -174,3 +174,34 @@ class LabReportYearly(Base):
         Index('idx_yearly_user_loinc_code_year', 'user_id', 'loinc_code', 'year'),
         UniqueConstraint('user_id', 'year', 'test_category', 'loinc_code', name='lab_reports_yearly_loinc_code_unique'),
     )
+
+class LabCategorySummary(Base):
+    """Per-user, per-category lab status summary, refreshed by LabAggregationCRUD"""
+    __tablename__ = "lab_category_summary"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    category = Column(String(100), nullable=False)
+
+    # Distinct tests (by loinc_code) in the category
+    total_tests = Column(Integer, default=0, nullable=False)
+
+    # Distinct tests with any result of the status ('Normal' / 'High','Low','Elevated' / 'Critical','Abnormal')
+    normal_count = Column(Integer, default=0, nullable=False)
+    abnormal_count = Column(Integer, default=0, nullable=False)
+    critical_count = Column(Integer, default=0, nullable=False)
+
+    # Status of each test's most recent result; unknown statuses count as green
+    latest_green_count = Column(Integer, default=0, nullable=False)
+    latest_amber_count = Column(Integer, default=0, nullable=False)
+    latest_red_count = Column(Integer, default=0, nullable=False)
+
+    last_test_date = Column(Date, nullable=True)
+
+    # Audit fields
+    created_at = Column(DateTime, server_default=local_now_db_expr(), nullable=False)
+    updated_at = Column(DateTime, server_default=local_now_db_expr(), onupdate=local_now_db_func(), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'category', name='lab_category_summary_user_category_unique'),
+    )
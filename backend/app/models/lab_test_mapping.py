@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Index
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Index, Float
 from sqlalchemy.sql import func
 from datetime import datetime
 from app.db.base import Base
@@ -39,4 +39,38 @@ class LabTestMapping(Base):
     )
 
     def __repr__(self):
-        return f"<LabTestMapping(test_name='{self.test_name}', standardized='{self.test_name_standardized}', test_code='{self.test_code}', category='{self.test_category}')>" 
\ No newline at end of file
+        return f"<LabTestMapping(test_name='{self.test_name}', standardized='{self.test_name_standardized}', test_code='{self.test_code}', category='{self.test_category}')>" 
+
+class LOINCMappingCache(Base):
+    """Content-addressed cache of LOINC code selections (positive and negative)"""
+    __tablename__ = "loinc_mapping_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), nullable=False, unique=True)  # sha256 of the normalized key + mapper version
+
+    # Normalized lookup key
+    test_name_normalized = Column(String(255), nullable=False)
+    test_category_normalized = Column(String(100), nullable=False, default="")
+    unit_normalized = Column(String(100), nullable=False, default="")
+
+    # Cached result (loinc_code is NULL for negative results)
+    loinc_code = Column(String(20), nullable=True)
+    loinc_source = Column(String(20), nullable=True)  # LOINC or CHATGPT
+    confidence = Column(Float, nullable=True)
+    is_negative = Column(Boolean, default=False, nullable=False)
+    mapper_version = Column(String(64), nullable=False)
+
+    # Usage and expiry
+    hit_count = Column(Integer, default=0, nullable=False)
+    expires_at = Column(DateTime, nullable=True)  # Only set for negative results
+
+    created_at = Column(DateTime, server_default=local_now_db_expr(), nullable=False)
+    updated_at = Column(DateTime, server_default=local_now_db_expr(), onupdate=local_now_db_func(), nullable=False)
+
+    __table_args__ = (
+        Index('idx_loinc_cache_name_category', 'test_name_normalized', 'test_category_normalized'),
+        Index('idx_loinc_cache_loinc_code', 'loinc_code'),
+    )
+
+    def __repr__(self):
+        return f"<LOINCMappingCache(test_name='{self.test_name_normalized}', loinc_code='{self.loinc_code}', negative={self.is_negative})>"
@@ -81,6 +81,9 @@ class VitalsRawData(Base):
         Index('idx_metric_date_range', 'metric_type', 'start_date', 'end_date'),
         Index('idx_user_source_date', 'user_id', 'data_source', 'start_date'),
         Index('idx_aggregation_status', 'aggregation_status', 'user_id', 'start_date'),
+        # Partial index for draining pending work per user in id order
+        Index('idx_vitals_raw_data_pending_user_id', 'user_id', 'id',
+              postgresql_where=text("aggregation_status IN ('pending', 'queued', 'failed')")),
         # Functional unique index that treats NULL notes as empty string to prevent duplicates
         Index('ux_vitals_raw_data_nodups', 'user_id', 'metric_type', 'unit', 'start_date', 'data_source', 
               text("COALESCE(notes, '')"), unique=True),
@@ -169,6 +172,7 @@ class VitalsHourlyAggregate(Base):
     __table_args__ = (
         Index('idx_user_loinc_hourly', 'user_id', 'loinc_code', 'hour_start'),
         Index('idx_hour_loinc', 'hour_start', 'loinc_code'),
+        Index('ux_vitals_hourly_rollup_key', 'user_id', 'metric_type', 'hour_start', unique=True),
     )
 
 class VitalsDailyAggregate(Base):
@@ -208,6 +212,7 @@ class VitalsDailyAggregate(Base):
     __table_args__ = (
         Index('idx_user_loinc_daily', 'user_id', 'loinc_code', 'date'),
         Index('idx_date_loinc', 'date', 'loinc_code'),
+        Index('ux_vitals_daily_rollup_key', 'user_id', 'metric_type', 'date', unique=True),
     )
 
 class VitalsWeeklyAggregate(Base):
@@ -247,6 +252,7 @@ class VitalsWeeklyAggregate(Base):
     # Indexes
     __table_args__ = (
         Index('idx_user_loinc_weekly', 'user_id', 'loinc_code', 'week_start_date'),
+        Index('ux_vitals_weekly_rollup_key', 'user_id', 'metric_type', 'week_start_date', unique=True),
     )
 
 class VitalsMonthlyAggregate(Base):
@@ -286,6 +292,7 @@ class VitalsMonthlyAggregate(Base):
     # Indexes
     __table_args__ = (
         Index('idx_user_loinc_monthly', 'user_id', 'loinc_code', 'year', 'month'),
+        Index('ux_vitals_monthly_rollup_key', 'user_id', 'metric_type', 'year', 'month', unique=True),
     )
 
 class VitalsSyncStatus(Base):
@@ -23,10 +23,19 @@ class ReminderSettings(BaseSettings):
     # Scheduling
     SCHEDULER_SCAN_INTERVAL_SECONDS: int
     SCHEDULER_BATCH_SIZE: int
+    SCHEDULER_MAX_BATCHES_PER_SCAN: int = 20  # Claim/publish rounds per scan before yielding to the next beat
+    SCHEDULER_CLAIM_TIMEOUT_SECONDS: int = 300  # Claimed rows not published within this are claimed again
+    SCHEDULER_CONFIRM_TIMEOUT_SECONDS: float = 10.0  # Wait for RabbitMQ publisher confirms per batch
 
     # FCM
     FCM_PROJECT_ID: Optional[str] = None
     FCM_CREDENTIALS_JSON: Optional[str] = None  # path or inline JSON via env
+    FCM_SENDER: str = "firebase"  # "firebase" or "fake" (records messages locally, for tests)
+
+    # Dispatch
+    DISPATCH_BATCH_SIZE: int = 100  # Reminders per dispatch task / FCM send_each call (FCM max 500)
+    DISPATCH_USER_CACHE_TTL_SECONDS: float = 30.0  # Opt-in, timezone and token lookups reused across batches
+    DISPATCH_USER_CACHE_MAX_ENTRIES: int = 50000
 
     # Metrics
     METRICS_ENABLED: bool
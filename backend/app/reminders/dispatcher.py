@@ -1,15 +1,32 @@
-from typing import Dict, Any, Optional
+"""
+Push dispatch for reminders.
+
+Events arrive in micro-batches (``reminders.dispatch_batch``). Each batch:
+
+1. loads notification opt-in, profile timezone and latest iOS token for all
+   its users in one query, through a short-TTL per-process cache
+2. sends every message with one FCM ``send_each`` call
+3. prunes tokens FCM reports as unregistered, and updates reminder statuses
+   set-wise (Processed / Failed / Skipped)
+
+REMINDER_FCM_SENDER="fake" swaps Firebase for FakeFcmSender, which records
+messages locally instead of calling FCM.
+"""
+from typing import Dict, Any, List, Optional, Tuple
 import json
 import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
 from datetime import datetime, timezone as dt_timezone
 from zoneinfo import ZoneInfo
 
 from firebase_admin import messaging, credentials, initialize_app, _apps  # type: ignore
 
 from .config import settings
-from .repository import get_latest_token_for_user
 from .metrics import reminders_dispatch_success_total, reminders_dispatch_failed_total
-from .repository import mark_processed, mark_failed
+from .repository import set_reminders_status
 from app.db.session import SessionLocal
 from sqlalchemy import text
 
@@ -73,114 +90,183 @@ def _ensure_firebase_initialized() -> None:
                 return
 
 
-def send_push_via_fcm(event: Dict[str, Any]) -> None:
-    """Send push notification via FCM using APNs for iOS through FCM.
-    Expected event contains:
-      - user_id
-      - reminder_id
-      - reminder_type
-      - payload (must include either 'fcm_token' or we expect backend to resolve and include it)
-      - timestamp
-    """
-    print(f"🔍 [FCM] Dispatch event: {event}")
-    
-    # Check if user has notifications enabled before proceeding
-    user_id = event.get("user_id")
-    if user_id:
-        db = SessionLocal()
-        try:
-            from app.models.user import User
-            user = db.query(User).filter(User.id == int(user_id)).first()
-            if user and not user.notifications_enabled:
-                print(f"⏭️  [FCM] User {user_id} has notifications disabled - skipping push notification")
-                # Mark reminder as skipped since user opted out
-                reminder_id = str(event.get("reminder_id"))
-                if reminder_id:
-                    from .repository import mark_skipped
-                    mark_skipped(db, reminder_id)
-                return
-            elif not user:
-                print(f"⚠️  [FCM] User {user_id} not found - skipping push notification")
-                return
-        except Exception as e:
-            print(f"⚠️  [FCM] Failed to check user notification settings: {e!r}")
-            # Continue with sending in case of error to avoid blocking legitimate notifications
-        finally:
-            db.close()
-    
-    # Ensure Firebase is initialized (attempt initialization if not already done)
-    _ensure_firebase_initialized()
-
-    # If still not initialized after attempt, skip sending
-    if not _apps:
-        print(
-            "⚠️  [FCM] Firebase not initialized - skipping push notification | "
-            f"project_id={getattr(settings, 'FCM_PROJECT_ID', None)}, "
-            f"REMINDER_FCM_CREDENTIALS_JSON set={bool(getattr(settings, 'FCM_CREDENTIALS_JSON', None))}, "
-            f"GOOGLE_APPLICATION_CREDENTIALS={bool(os.getenv('GOOGLE_APPLICATION_CREDENTIALS'))}"
-        )
-        return
-    
-    token = event.get("payload", {}).get("fcm_token")
-    if not token:
-        # Try lookup by user_id (ios by default)
-        from app.db.session import SessionLocal
-        db = SessionLocal()
-        try:
-            user_id = str(event.get("user_id", ""))
-            print(f"🔍 [FCM] Looking up token for user_id: {user_id}")
-            token = get_latest_token_for_user(db, user_id=user_id, platform="ios") if user_id else None
-            print(f"🔍 [FCM] Found token: {token[:20] if token else 'None'}...")
-        finally:
-            db.close()
-        if not token:
-            print("❌ [FCM] No FCM token found for user")
-            reminders_dispatch_failed_total.inc()
-            return
+@dataclass
+class UserDispatchInfo:
+    notifications_enabled: bool
+    timezone: Optional[str]
+    fcm_token: Optional[str]
 
-    # Default if missing or None
-    notification_title = event.get("payload", {}).get("title") or "Reminder"
-    notification_body = event.get("payload", {}).get("message") or "It's time!"
 
-    # Build timestamps for payload: both utc and user-local
-    utc_ts = None
+class UserDispatchInfoCache:
+    """user_id -> UserDispatchInfo for a few seconds; one query loads every missing user"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = settings.DISPATCH_USER_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._entries: Dict[str, Tuple[float, Optional[UserDispatchInfo]]] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, db, user_ids: List[str]) -> Dict[str, Optional[UserDispatchInfo]]:
+        now = time.monotonic()
+        found: Dict[str, Optional[UserDispatchInfo]] = {}
+        with self._lock:
+            for uid in user_ids:
+                entry = self._entries.get(uid)
+                if entry and entry[0] > now:
+                    found[uid] = entry[1]
+        missing = [uid for uid in set(user_ids) if uid not in found]
+        if missing:
+            loaded = self._load(db, missing)
+            with self._lock:
+                if len(self._entries) > settings.DISPATCH_USER_CACHE_MAX_ENTRIES:
+                    self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                for uid in missing:
+                    # Unknown users are cached as None too, so retries do not re-query
+                    found[uid] = loaded.get(uid)
+                    self._entries[uid] = (now + self.ttl_seconds, found[uid])
+        return found
+
+    def invalidate(self, user_ids) -> None:
+        with self._lock:
+            for uid in user_ids:
+                self._entries.pop(uid, None)
+
+    @staticmethod
+    def _load(db, user_ids: List[str]) -> Dict[str, UserDispatchInfo]:
+        int_ids = []
+        for uid in user_ids:
+            try:
+                int_ids.append(int(uid))
+            except (TypeError, ValueError):
+                continue
+        if not int_ids:
+            return {}
+        rows = db.execute(text("""
+            SELECT u.id, u.notifications_enabled, p.timezone, t.fcm_token
+            FROM users u
+            LEFT JOIN user_profiles p ON p.user_id = u.id
+            LEFT JOIN LATERAL (
+                SELECT d.fcm_token FROM device_tokens d
+                WHERE d.user_id = CAST(u.id AS text) AND d.platform = 'ios'
+                ORDER BY d.created_at DESC
+                LIMIT 1
+            ) t ON true
+            WHERE u.id = ANY(:uids)
+        """), {"uids": int_ids})
+        return {
+            str(row[0]): UserDispatchInfo(
+                notifications_enabled=bool(row[1]),
+                timezone=str(row[2]) if row[2] else None,
+                fcm_token=row[3],
+            )
+            for row in rows
+        }
+
+
+user_info_cache = UserDispatchInfoCache()
+
+
+@dataclass
+class SendResult:
+    success: bool
+    message_id: Optional[str] = None
+    error: Optional[str] = None
+    token_invalid: bool = False  # token is unregistered / belongs to another sender; prune it
+
+
+class FirebaseFcmSender:
+    """Sends through the Firebase Admin batch API (send_each, up to 500 messages per call)"""
+
+    def send(self, messages: List[messaging.Message]) -> List[SendResult]:
+        results: List[SendResult] = []
+        for start in range(0, len(messages), 500):
+            response = messaging.send_each(messages[start:start + 500], dry_run=False)
+            for item in response.responses:
+                if item.success:
+                    results.append(SendResult(True, message_id=item.message_id))
+                else:
+                    exc = item.exception
+                    results.append(SendResult(
+                        False,
+                        error=repr(exc),
+                        token_invalid=isinstance(exc, (messaging.UnregisteredError, messaging.SenderIdMismatchError)),
+                    ))
+        return results
+
+
+class FakeFcmSender:
+    """Local stand-in for FCM: records messages; tokens in ``invalid_tokens`` fail as unregistered"""
+
+    def __init__(self, invalid_tokens=None):
+        self.sent: List[messaging.Message] = []
+        self.invalid_tokens = set(invalid_tokens or ())
+
+    def send(self, messages: List[messaging.Message]) -> List[SendResult]:
+        results = []
+        for message in messages:
+            if message.token in self.invalid_tokens:
+                results.append(SendResult(False, error="UnregisteredError('fake')", token_invalid=True))
+            else:
+                self.sent.append(message)
+                results.append(SendResult(True, message_id=f"fake/{len(self.sent)}"))
+        return results
+
+
+_sender = None
+
+
+def get_fcm_sender():
+    """Process-wide sender; None when Firebase has no credentials"""
+    global _sender
+    if _sender is None:
+        if settings.FCM_SENDER == "fake":
+            _sender = FakeFcmSender()
+        else:
+            # Ensure Firebase is initialized (attempt initialization if not already done)
+            _ensure_firebase_initialized()
+            if not _apps:
+                print(
+                    "⚠️  [FCM] Firebase not initialized - skipping push notification | "
+                    f"project_id={getattr(settings, 'FCM_PROJECT_ID', None)}, "
+                    f"REMINDER_FCM_CREDENTIALS_JSON set={bool(getattr(settings, 'FCM_CREDENTIALS_JSON', None))}, "
+                    f"GOOGLE_APPLICATION_CREDENTIALS={bool(os.getenv('GOOGLE_APPLICATION_CREDENTIALS'))}"
+                )
+                return None
+            _sender = FirebaseFcmSender()
+    return _sender
+
+
+def _utc_timestamp(ts) -> Optional[str]:
     try:
-        ts = event.get("timestamp")
         if isinstance(ts, datetime):
-            utc_ts = (ts if ts.tzinfo else ts.replace(tzinfo=dt_timezone.utc)).astimezone(dt_timezone.utc).isoformat()
-        elif isinstance(ts, str) and ts:
+            return (ts if ts.tzinfo else ts.replace(tzinfo=dt_timezone.utc)).astimezone(dt_timezone.utc).isoformat()
+        if isinstance(ts, str) and ts:
             # Accept both Z and +00:00
             dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-            utc_ts = (dt if dt.tzinfo else dt.replace(tzinfo=dt_timezone.utc)).astimezone(dt_timezone.utc).isoformat()
+            return (dt if dt.tzinfo else dt.replace(tzinfo=dt_timezone.utc)).astimezone(dt_timezone.utc).isoformat()
     except Exception:
-        utc_ts = None
+        pass
+    return None
 
-    local_ts = utc_ts or ""
-    # Look up user timezone from user_profiles, fallback to DEFAULT_TIMEZONE via core settings
-    user_tz_name = None
-    try:
-        uid = event.get("user_id")
-        if uid:
-            db = SessionLocal()
-            row = db.execute(text("SELECT timezone FROM user_profiles WHERE user_id = :uid"), {"uid": int(uid)}).first()
-            if row and row[0]:
-                user_tz_name = str(row[0])
-            db.close()
-    except Exception:
-        user_tz_name = None
 
+def build_message(event: Dict[str, Any], token: str, user_tz_name: Optional[str]) -> messaging.Message:
+    """FCM message (APNs alert) for one reminder event"""
+    payload = event.get("payload") or {}
+    # Default if missing or None
+    notification_title = payload.get("title") or "Reminder"
+    notification_body = payload.get("message") or "It's time!"
+
+    # Build timestamps for payload: both utc and user-local
+    utc_ts = _utc_timestamp(event.get("timestamp"))
+    local_ts = utc_ts or ""
     try:
         if utc_ts and user_tz_name:
-            dt = datetime.fromisoformat(utc_ts.replace("Z", "+00:00"))
-            local_ts = dt.astimezone(ZoneInfo(user_tz_name)).isoformat()
+            local_ts = datetime.fromisoformat(utc_ts).astimezone(ZoneInfo(user_tz_name)).isoformat()
     except Exception:
         pass
 
     # Generate unique notification ID to prevent iOS suppression
-    import uuid
     notification_id = str(uuid.uuid4())
-    
-    message = messaging.Message(
+    return messaging.Message(
         token=token,
         notification=messaging.Notification(title=notification_title, body=notification_body),
         data={
@@ -199,49 +285,89 @@ def send_push_via_fcm(event: Dict[str, Any]) -> None:
         ),
     )
 
+
+def send_push_batch(events: List[Dict[str, Any]], sender=None) -> Dict[str, int]:
+    """Send push notifications for a micro-batch of reminder events.
+
+    Each event contains user_id, reminder_id, reminder_type, payload (title,
+    message, optional fcm_token) and timestamp. Returns counts per outcome.
+    """
+    outcome = {"processed": 0, "failed": 0, "skipped": 0}
+    if not events:
+        return outcome
+    sender = sender or get_fcm_sender()
+    if sender is None:
+        return outcome
+
+    processed, failed, skipped = [], [], []
+    no_token = 0
+    stale_tokens: Dict[str, str] = {}  # token -> user_id
+    db = SessionLocal()
     try:
-        print(f"🚀 [FCM] Sending notification to token: {token[:20]}...")
-        print(f"🚀 [FCM] Title: {notification_title}")
-        print(f"🚀 [FCM] Body: {notification_body}")
-        result = messaging.send(message, dry_run=False)
-        print(f"✅ [FCM] Notification sent successfully: {result}")
-        reminders_dispatch_success_total.inc()
-        
-        # Update rate limiting timestamp
-        current_time = datetime.now(dt_timezone.utc)
-        send_push_via_fcm._last_notification_time = current_time
-    except Exception as e:
-        import traceback
-        print(f"❌ [FCM] Failed to send notification: {e!r}")
-        tb = ''.join(traceback.format_exc().splitlines()[-3:])
-        print(f"❌ [FCM] Traceback tail: {tb}")
-        reminders_dispatch_failed_total.inc()
-        # We intentionally do not raise to avoid Celery retry storms for now
-        # Mark reminder as Failed for observability
+        user_ids = [str(e.get("user_id")) for e in events if e.get("user_id") is not None]
         try:
-            from app.db.session import SessionLocal
-            db = SessionLocal()
-            try:
-                rid = str(event.get("reminder_id"))
-                if rid:
-                    mark_failed(db, rid, reason=str(e))
-            finally:
-                db.close()
-        except Exception:
-            pass
-        return
-    else:
-        # Mark reminder as Processed on success
-        try:
-            from app.db.session import SessionLocal
-            db = SessionLocal()
+            infos = user_info_cache.get_many(db, user_ids)
+        except Exception as e:
+            # Continue with sending in case of error to avoid blocking legitimate notifications
+            print(f"⚠️  [FCM] Failed to load user notification settings: {e!r}")
+            db.rollback()
+            infos = {}
+
+        to_send: List[Tuple[Dict[str, Any], str, messaging.Message]] = []
+        for event in events:
+            reminder_id = str(event.get("reminder_id") or "")
+            user_id = str(event.get("user_id", ""))
+            info = infos.get(user_id)
+            if info is not None and not info.notifications_enabled:
+                # Reminder is skipped since the user opted out
+                print(f"⏭️  [FCM] User {user_id} has notifications disabled - skipping push notification")
+                skipped.append(reminder_id)
+                continue
+            if user_id in infos and info is None:
+                print(f"⚠️  [FCM] User {user_id} not found - skipping push notification")
+                continue
+            token = (event.get("payload") or {}).get("fcm_token") or (info.fcm_token if info else None)
+            if not token:
+                print(f"❌ [FCM] No FCM token found for user {user_id}")
+                no_token += 1
+                continue
+            to_send.append((event, token, build_message(event, token, info.timezone if info else None)))
+
+        if to_send:
             try:
-                rid = str(event.get("reminder_id"))
-                if rid:
-                    mark_processed(db, rid)
-            finally:
-                db.close()
-        except Exception:
-            pass
+                results = sender.send([message for _, _, message in to_send])
+            except Exception as e:
+                print(f"❌ [FCM] Batch send failed: {e!r}")
+                results = [SendResult(False, error=repr(e))] * len(to_send)
+            for (event, token, _), result in zip(to_send, results):
+                reminder_id = str(event.get("reminder_id") or "")
+                if result.success:
+                    processed.append(reminder_id)
+                else:
+                    print(f"❌ [FCM] Failed to send reminder {reminder_id}: {result.error}")
+                    failed.append(reminder_id)
+                    if result.token_invalid:
+                        stale_tokens[token] = str(event.get("user_id", ""))
+            print(f"✅ [FCM] Batch sent: {len(processed)} ok, {len(to_send) - len(processed)} failed")
 
+        if stale_tokens:
+            db.execute(text("DELETE FROM device_tokens WHERE fcm_token = ANY(:tokens)"), {"tokens": list(stale_tokens)})
+            db.commit()
+            user_info_cache.invalidate(stale_tokens.values())
+            print(f"🧹 [FCM] Pruned {len(stale_tokens)} unregistered device tokens")
 
+        set_reminders_status(db, [rid for rid in processed if rid], "Processed")
+        set_reminders_status(db, [rid for rid in failed if rid], "Failed")
+        set_reminders_status(db, [rid for rid in skipped if rid], "Skipped")
+    finally:
+        db.close()
+
+    reminders_dispatch_success_total.inc(len(processed))
+    reminders_dispatch_failed_total.inc(len(failed) + no_token)
+    outcome.update(processed=len(processed), failed=len(failed) + no_token, skipped=len(skipped))
+    return outcome
+
+
+def send_push_via_fcm(event: Dict[str, Any]) -> None:
+    """Send push notification via FCM using APNs for iOS through FCM (single-event batch)."""
+    send_push_batch([event])
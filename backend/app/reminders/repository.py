@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import select, update
+from sqlalchemy import select, update, text
 
 from .unified_models import Reminder, DeviceToken
 from app.utils.timezone import to_utc_aware
@@ -133,6 +133,54 @@ def get_due_reminders(db: Session, now: datetime, limit: int = 1000) -> List[Rem
     return list(db.execute(stmt).scalars())
 
 
+def claim_due_reminders(db: Session, limit: int, claim_timeout_seconds: int) -> list:
+    """Claim up to ``limit`` due reminders for this scheduler in one statement.
+
+    Rows move to "Dispatching"; FOR UPDATE SKIP LOCKED lets several schedulers
+    claim concurrently without ever sharing a row. A claim older than
+    ``claim_timeout_seconds`` (scheduler died mid-batch) is claimed again.
+    """
+    rows = db.execute(
+        text("""
+            UPDATE reminders
+            SET status = 'Dispatching', updated_at = now()
+            WHERE id IN (
+                SELECT id FROM reminders
+                WHERE status IN ('Pending', 'Dispatching')
+                  AND (status = 'Pending' OR updated_at < now() - make_interval(secs => :claim_timeout))
+                  AND is_recurring = false
+                  AND reminder_time <= now()
+                ORDER BY reminder_time
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, user_id, reminder_type, title, message, payload, reminder_time, timezone
+        """),
+        {"limit": limit, "claim_timeout": claim_timeout_seconds},
+    ).fetchall()
+    db.commit()
+    return rows
+
+
+def set_reminders_status(
+    db: Session, reminder_ids: List[str], status: str, from_status: Optional[str] = None
+) -> int:
+    """Set-wise status update; with ``from_status`` only rows still in that status change"""
+    if not reminder_ids:
+        return 0
+    result = db.execute(
+        text("""
+            UPDATE reminders
+            SET status = :status, updated_at = now()
+            WHERE id = ANY(CAST(:ids AS uuid[]))
+              AND (CAST(:from_status AS text) IS NULL OR status = :from_status)
+        """),
+        {"status": status, "ids": [str(rid) for rid in reminder_ids], "from_status": from_status},
+    )
+    db.commit()
+    return result.rowcount
+
+
 def upsert_device_token(db: Session, data: DeviceTokenCreate) -> DeviceToken:
     existing = (
         db.query(DeviceToken)
@@ -1,13 +1,16 @@
-from datetime import datetime, timezone as dt_timezone
+import socket
+import time
+from datetime import timezone as dt_timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
 from celery import shared_task
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import tuple_
 from app.db.session import SessionLocal
-from .repository import create_reminder, get_due_reminders, mark_processed, mark_failed, mark_queued, mark_skipped
+from .repository import claim_due_reminders, set_reminders_status
 from .unified_schemas import ReminderCreate
 from .celery_app import celery_app
 from .config import settings
-from .dispatcher import send_push_via_fcm
+from .dispatcher import send_push_batch
 from .metrics import scheduler_scans_total, scheduler_dispatched_total
 from app.models.nutrition_data import NutritionRawData
 from app.utils.timezone import get_zoneinfo
@@ -35,141 +38,231 @@ def ingest_reminder_task(event: dict) -> None:
 
 @shared_task(name="reminders.scan_and_dispatch")
 def scan_and_dispatch_task() -> int:
-    """Scan for due reminders and publish to output queue. Returns number dispatched."""
+    """Claim due reminders and publish them to the output queue. Returns number dispatched.
+
+    Safe to run on several schedulers at once: rows are claimed with
+    FOR UPDATE SKIP LOCKED, so each reminder is published by exactly one scan.
+    Batches repeat until nothing is due (or SCHEDULER_MAX_BATCHES_PER_SCAN).
+    """
     db: Session = SessionLocal()
     dispatched = 0
     try:
-        # Use timezone-aware UTC to compare with timestamptz column
-        now = datetime.now(dt_timezone.utc)
-        due = get_due_reminders(db, now, limit=settings.SCHEDULER_BATCH_SIZE)
         scheduler_scans_total.inc()
-        for r in due:
-            try:
-                # Conditional skip: if nutrition log already recorded for the same day and meal
-                if _should_skip_nutrition_log(db, r):
-                    # Mark as skipped for observability (not processed)
-                    print(f"🔍 [Reminders] Skipping nutrition log for user {r.user_id} and meal {r.payload.get('meal')}")
-                    mark_skipped(db, r.id)
-                    continue
-                # Only include title/message if they are not None to avoid overriding
-                # pre-populated payload values with nulls
-                payload_payload = {**r.payload}
-                if r.title is not None:
-                    payload_payload["title"] = r.title
-                if r.message is not None:
-                    payload_payload["message"] = r.message
-
-                payload = {
-                    "user_id": r.user_id,
-                    "reminder_id": str(r.id),
-                    "reminder_type": r.reminder_type,
-                    "payload": payload_payload,
-                    "timestamp": r.reminder_time.isoformat(),
-                }
-                celery_app.send_task(
-                    "reminders.dispatch",
-                    args=[payload],
-                    queue=settings.RABBITMQ_OUTPUT_QUEUE,
-                    routing_key=settings.RABBITMQ_OUTPUT_ROUTING_KEY,
-                )
-                # Mark as queued; dispatch task will mark Processed/Failed
-                mark_queued(db, r.id)
-                dispatched += 1
-                scheduler_dispatched_total.inc()
-            except Exception:
-                mark_failed(db, r.id, reason="publish_failed")
+        for _ in range(settings.SCHEDULER_MAX_BATCHES_PER_SCAN):
+            claimed = claim_due_reminders(
+                db, limit=settings.SCHEDULER_BATCH_SIZE, claim_timeout_seconds=settings.SCHEDULER_CLAIM_TIMEOUT_SECONDS
+            )
+            if not claimed:
+                break
+            dispatched += _dispatch_claimed(db, claimed)
+            if len(claimed) < settings.SCHEDULER_BATCH_SIZE:
+                break
     finally:
         db.close()
     return dispatched
 
 
-@shared_task(name="reminders.dispatch")
-def dispatch_task(output_event: dict) -> None:
-    """Consume output queue and send push via FCM."""
-    send_push_via_fcm(output_event)
-    return None
-def _should_skip_nutrition_log(db: Session, reminder) -> bool:
-    """
-    For reminders of type "nutrition_log", check if the user has already logged
-    the corresponding meal on the same local day as the reminder time.
-    If yes, return True to skip dispatching this reminder.
-    """
+def _dispatch_claimed(db: Session, claimed) -> int:
+    """Skip, publish and settle one claimed batch; returns number queued"""
+    # Conditional skip: nutrition log already recorded for the same day and meal
+    skipped = _nutrition_logs_to_skip(db, claimed)
+    if skipped:
+        print(f"🔍 [Reminders] Skipping {len(skipped)} nutrition log reminders already logged")
+        set_reminders_status(db, list(skipped), "Skipped", from_status="Dispatching")
+
+    to_send = [r for r in claimed if str(r.id) not in skipped]
+    if not to_send:
+        return 0
+    events = [_output_event(r) for r in to_send]
     try:
-        if getattr(reminder, "reminder_type", "") != "nutrition_log":
-            return False
+        confirmed, unconfirmed = _publish_batch(events)
+    except Exception as e:
+        print(f"❌ [Reminders] Publishing batch of {len(events)} failed: {e!r}")
+        confirmed, unconfirmed = [], list(range(len(events)))
+
+    # Dispatch task will mark Processed/Failed; only move rows nobody has settled yet
+    set_reminders_status(db, [to_send[i].id for i in confirmed], "Queued", from_status="Dispatching")
+    if unconfirmed:
+        # Not confirmed by the broker: release for the next scan
+        print(f"⚠️ [Reminders] {len(unconfirmed)} reminders unconfirmed by broker; released for retry")
+        set_reminders_status(db, [to_send[i].id for i in unconfirmed], "Pending", from_status="Dispatching")
+    scheduler_dispatched_total.inc(len(confirmed))
+    return len(confirmed)
+
+
+def _output_event(r) -> dict:
+    # Only include title/message if they are not None to avoid overriding
+    # pre-populated payload values with nulls
+    payload_payload = {**(r.payload or {})}
+    if r.title is not None:
+        payload_payload["title"] = r.title
+    if r.message is not None:
+        payload_payload["message"] = r.message
 
-        payload = getattr(reminder, "payload", {}) or {}
-        # Preferred order: explicit meal, then context.key
-        meal_key = (payload.get("meal") or payload.get("context", {}).get("key") or "").strip().lower()
-        if not meal_key:
-            return False
+    return {
+        "user_id": r.user_id,
+        "reminder_id": str(r.id),
+        "reminder_type": r.reminder_type,
+        "payload": payload_payload,
+        "timestamp": r.reminder_time.isoformat(),
+    }
 
-        # Convert user_id to int for NutritionRawData lookup
+
+class _PublishConfirms:
+    """Tracks RabbitMQ publisher confirms on a channel in confirm mode (delivery tags start at 1)"""
+
+    def __init__(self, channel):
+        self.acked: Set[int] = set()
+        self.nacked: Set[int] = set()
+        self.published = 0
+        channel.events["basic_ack"].add(self._on_ack)
+        channel.events["basic_nack"].add(self._on_nack)
+
+    def _settle(self, target: Set[int], delivery_tag: int, multiple: bool) -> None:
+        tags = range(1, delivery_tag + 1) if multiple else (delivery_tag,)
+        target.update(t for t in tags if t not in self.acked and t not in self.nacked)
+
+    def _on_ack(self, delivery_tag, multiple=False):
+        self._settle(self.acked, delivery_tag, multiple)
+
+    def _on_nack(self, delivery_tag, multiple=False):
+        self._settle(self.nacked, delivery_tag, multiple)
+
+    @property
+    def pending(self) -> bool:
+        return len(self.acked) + len(self.nacked) < self.published
+
+
+def _publish_batch(events: List[dict]) -> Tuple[List[int], List[int]]:
+    """Publish dispatch_batch tasks on one channel, then wait once for the broker's confirms.
+
+    Events go out in chunks of DISPATCH_BATCH_SIZE, one task per chunk.
+    Returns (confirmed, unconfirmed) indexes into ``events``.
+    """
+    size = max(1, min(settings.DISPATCH_BATCH_SIZE, 500))
+    chunks = [list(range(start, min(start + size, len(events)))) for start in range(0, len(events), size)]
+    with celery_app.connection_for_write() as connection:
+        channel = connection.channel()
         try:
-            user_id_int = int(str(reminder.user_id))
-        except Exception:
-            return False
-
-        # Determine local date for comparison using reminder timezone if present,
-        # otherwise fallback to user's profile timezone, then DEFAULT_TIMEZONE
-        tz = None
-        tz_name = getattr(reminder, "timezone", None)
-        if tz_name and ZoneInfo is not None:
+            confirms = None
+            if hasattr(channel, "confirm_select"):
+                channel.confirm_select()
+                confirms = _PublishConfirms(channel)
+            producer = celery_app.amqp.Producer(channel, auto_declare=False)
+
+            sent: List[List[int]] = []
+            for chunk in chunks:
+                try:
+                    celery_app.send_task(
+                        "reminders.dispatch_batch",
+                        args=[[events[i] for i in chunk]],
+                        queue=settings.RABBITMQ_OUTPUT_QUEUE,
+                        routing_key=settings.RABBITMQ_OUTPUT_ROUTING_KEY,
+                        producer=producer,
+                    )
+                    sent.append(chunk)
+                    if confirms is not None:
+                        confirms.published += 1
+                except Exception as e:
+                    print(f"❌ [Reminders] Publish failed for batch of {len(chunk)} reminders: {e!r}")
+
+            if confirms is None:
+                confirmed_chunks = sent
+            else:
+                deadline = time.monotonic() + settings.SCHEDULER_CONFIRM_TIMEOUT_SECONDS
+                while confirms.pending and time.monotonic() < deadline:
+                    try:
+                        connection.drain_events(timeout=max(deadline - time.monotonic(), 0.01))
+                    except socket.timeout:
+                        break
+                # Delivery tag n is the n-th successful publish on this channel
+                confirmed_chunks = [chunk for tag, chunk in enumerate(sent, start=1) if tag in confirms.acked]
+        finally:
             try:
-                tz = ZoneInfo(tz_name)
+                channel.close()
             except Exception:
-                tz = None
-        if tz is None:
-            # Try user profile timezone from DB
+                pass
+
+    confirmed = [i for chunk in confirmed_chunks for i in chunk]
+    confirmed_set = set(confirmed)
+    return confirmed, [i for i in range(len(events)) if i not in confirmed_set]
+
+
+@shared_task(name="reminders.dispatch_batch")
+def dispatch_batch_task(output_events: List[dict]) -> None:
+    """Consume output queue and send one micro-batch of pushes via FCM."""
+    send_push_batch(output_events)
+    return None
+
+
+@shared_task(name="reminders.dispatch")
+def dispatch_task(output_event: dict) -> None:
+    """Single-event dispatch, kept for messages already queued before batching."""
+    send_push_batch([output_event])
+    return None
+
+
+def _zone(name: Optional[str]):
+    if not name or ZoneInfo is None:
+        return None
+    try:
+        return ZoneInfo(str(name))
+    except Exception:
+        return None
+
+
+def _nutrition_logs_to_skip(db: Session, reminders) -> Set[str]:
+    """
+    Ids of "nutrition_log" reminders whose meal the user has already logged on
+    the reminder's local day. Timezone: the reminder's own, else the user's
+    profile timezone, else DEFAULT_TIMEZONE. Two queries per batch.
+    """
+    try:
+        candidates = []
+        for reminder in reminders:
+            if reminder.reminder_type != "nutrition_log":
+                continue
+            payload = reminder.payload or {}
+            # Preferred order: explicit meal, then context.key
+            meal_key = (payload.get("meal") or payload.get("context", {}).get("key") or "").strip().lower()
+            if not meal_key:
+                continue
+            # Convert user_id to int for NutritionRawData lookup
             try:
-                row = db.execute(
-                    _sa_text("SELECT timezone FROM user_profiles WHERE user_id = :uid"),
-                    {"uid": int(str(reminder.user_id))},
-                ).first()
-                if row and row[0] and ZoneInfo is not None:
-                    try:
-                        tz = ZoneInfo(str(row[0]))
-                    except Exception:
-                        tz = None
+                user_id_int = int(str(reminder.user_id))
             except Exception:
-                tz = None
-            if tz is None:
-                tz = get_zoneinfo()
+                continue
+            candidates.append((reminder, user_id_int, meal_key))
+        if not candidates:
+            return set()
 
-        rt = reminder.reminder_time
-        try:
-            if tz is not None:
-                local_date = (rt if rt.tzinfo else rt.replace(tzinfo=dt_timezone.utc)).astimezone(tz).date()
-            else:
-                # Fallback: use UTC date
-                local_date = (rt if rt.tzinfo else rt.replace(tzinfo=dt_timezone.utc)).astimezone(dt_timezone.utc).date()
-        except Exception:
-            # On any conversion issue, do not skip
-            return False
-
-        count_ = (
-            db.query(func.count(NutritionRawData.id))
-            .filter(
-                NutritionRawData.user_id == user_id_int,
-                NutritionRawData.meal_date == local_date,
-                NutritionRawData.meal_type == meal_key,
+        profile_tz: Dict[int, str] = {}
+        without_tz = list({uid for r, uid, _ in candidates if _zone(r.timezone) is None})
+        if without_tz:
+            rows = db.execute(
+                _sa_text("SELECT user_id, timezone FROM user_profiles WHERE user_id = ANY(:uids)"),
+                {"uids": without_tz},
             )
-            .scalar()
-        )
-        should_skip = bool(count_ and count_ >= 1)
-        # Debug trace to help diagnose timezone-related skipping
-        try:
-            print(
-                f"🔎 [Reminders] Skip check | user={reminder.user_id} meal={meal_key} tz={(tz.key if hasattr(tz,'key') else str(tz))} "
-                f"rt_utc={(rt if rt.tzinfo else rt.replace(tzinfo=dt_timezone.utc)).astimezone(dt_timezone.utc).isoformat()} "
-                f"local_date={local_date} count={count_} skip={should_skip}"
-            )
-        except Exception:
-            pass
-        return should_skip
-    except Exception:
-        # Fail-safe: never block sending due to unexpected errors
-        return False
-
+            profile_tz = {row[0]: row[1] for row in rows}
 
+        keys: Dict[str, Tuple[int, Any, str]] = {}
+        for reminder, user_id_int, meal_key in candidates:
+            tz = _zone(reminder.timezone) or _zone(profile_tz.get(user_id_int)) or get_zoneinfo()
+            rt = reminder.reminder_time
+            rt = rt if rt.tzinfo else rt.replace(tzinfo=dt_timezone.utc)
+            local_date = rt.astimezone(tz or dt_timezone.utc).date()
+            keys[str(reminder.id)] = (user_id_int, local_date, meal_key)
 
+        logged = {
+            tuple(row)
+            for row in db.query(NutritionRawData.user_id, NutritionRawData.meal_date, NutritionRawData.meal_type)
+            .filter(tuple_(NutritionRawData.user_id, NutritionRawData.meal_date, NutritionRawData.meal_type)
+                    .in_(list(set(keys.values()))))
+            .distinct()
+        }
+        return {reminder_id for reminder_id, key in keys.items() if key in logged}
+    except Exception as e:
+        # Fail-safe: never block sending due to unexpected errors
+        print(f"⚠️ [Reminders] Nutrition skip check failed: {e!r}")
+        db.rollback()
+        return set()
@@ -4,6 +4,11 @@ Dashboard API Endpoints for React Admin
 Provides comprehensive data for charts, workflow visualization,
 and real-time monitoring in the React Admin dashboard.
 Powered by Redis-based telemetry system.
+
+Chart and overview endpoints read the per-minute/per-hour rollups kept by the
+span writer (see app.core.telemetry_rollups), so their cost depends on the
+window length, not the span count. Workflow endpoints fetch span documents
+with a single MGET. All Redis access goes through the async client.
 """
 
 from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
@@ -11,8 +16,9 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta, timezone as dt_timezone
 import json
 import asyncio
-from app.core.redis import redis_client
+from app.core.redis import async_redis_client
 from app.core.system_metrics import system_metrics
+from app.core.telemetry_rollups import RECENT_ERRORS_KEY, hourly_distinct, read_window
 from app.utils.timezone import now_local, isoformat_now, to_utc_aware
 
 router = APIRouter(tags=["dashboard"])
@@ -39,6 +45,29 @@ class ConnectionManager:
 manager = ConnectionManager()
 
 
+async def _get_spans(span_ids: List[str]) -> List[Dict[str, Any]]:
+    """Load span documents in one MGET, skipping expired ones"""
+    if not span_ids:
+        return []
+    values = await async_redis_client.mget([f'telemetry:span:{span_id}' for span_id in span_ids])
+    return [json.loads(value) for value in values if value]
+
+
+async def _get_spans_since(cutoff_time: datetime) -> List[Dict[str, Any]]:
+    """Recent spans that started at or after cutoff_time, oldest first"""
+    span_ids = await async_redis_client.zrangebyscore('telemetry:recent_spans', cutoff_time.timestamp(), '+inf')
+    return await _get_spans(span_ids)
+
+
+async def _get_session_spans(user_id: int, session_id: int) -> List[Dict[str, Any]]:
+    """All stored spans of one chat session, via the writer's session index"""
+    span_ids = await async_redis_client.zrange(f'telemetry:session:{user_id}:{session_id}', 0, -1)
+    return [
+        span for span in await _get_spans(span_ids)
+        if span.get('user_id') == user_id and span.get('session_id') == session_id
+    ]
+
+
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket for real-time dashboard updates"""
@@ -48,8 +77,8 @@ async def websocket_endpoint(websocket: WebSocket):
             await asyncio.sleep(10)
             data = {
                 "timestamp": isoformat_now(),
-                "metrics": get_real_time_metrics(),
-                "recent_requests": get_recent_activity(limit=5)
+                "metrics": await get_real_time_metrics(),
+                "recent_requests": await get_recent_activity(limit=5)
             }
             await websocket.send_text(json.dumps(data))
     except WebSocketDisconnect:
@@ -58,128 +87,54 @@ async def websocket_endpoint(websocket: WebSocket):
 
 @router.get("/metrics/overview")
 async def get_overview_metrics(hours: int = Query(24, ge=1, le=168)) -> Dict[str, Any]:
-    """Get overview metrics for dashboard cards using Redis telemetry"""
+    """Get overview metrics for dashboard cards using Redis telemetry rollups"""
     
-    # Get all recent spans from Redis
-    recent_spans = redis_client.zrange('telemetry:recent_spans', 0, -1)
+    now = to_utc_aware(now_local())
+    window = await read_window(async_redis_client, (now - timedelta(hours=hours)).timestamp(), now.timestamp())
+    total_interactions = int(window.get("spans"))
     
-    if not recent_spans:
+    if not total_interactions:
         return {
             "total_requests": 0,
             "total_interactions": 0,
             "error_rate": 0,
             "avg_response_time": 0,
+            "p95_response_time": None,
             "active_agents": 0,
             "tools_used": 0,
             "period_hours": hours
         }
     
-    # Analyze spans for metrics
-    cutoff_time = to_utc_aware(now_local()) - timedelta(hours=hours)
-    valid_spans = []
-    sessions = set()
-    agents = set()
-    tools = set()
-    errors = 0
-    durations = []
-    
-    for span_id in recent_spans:
-        span_data = redis_client.get(f'telemetry:span:{span_id}')
-        if not span_data:
-            continue
-            
-        span = json.loads(span_data)
-        span_time = datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc)
-        
-        if span_time >= cutoff_time:
-            valid_spans.append(span)
-            
-            # Track sessions (requests)
-            user_id = span.get('user_id')
-            session_id = span.get('session_id')
-            if user_id and session_id:
-                sessions.add(f"{user_id}:{session_id}")
-            
-            # Track agents
-            agent_name = span.get('agent_name')
-            if agent_name:
-                agents.add(agent_name)
-            
-            # Track tools from metadata
-            metadata = span.get('metadata', {})
-            if 'tool_used' in metadata:
-                tools.add(metadata['tool_used'])
-            
-            # Track errors
-            if span.get('status') == 'ERROR':
-                errors += 1
-            
-            # Track durations
-            duration = span.get('duration_ms')
-            if duration:
-                durations.append(duration)
-    
-    total_requests = len(sessions)
-    total_interactions = len(valid_spans)
-    error_rate = errors / max(total_interactions, 1)
-    avg_response_time = sum(durations) / len(durations) if durations else 0
+    duration_count = window.get("duration_count")
+    avg_response_time = window.get("duration_ms_sum") / duration_count if duration_count else 0
     
     return {
-        "total_requests": total_requests,
+        "total_requests": window.distinct["sessions"],
         "total_interactions": total_interactions,
-        "error_rate": error_rate,
+        "error_rate": window.get("errors") / max(total_interactions, 1),
         "avg_response_time": avg_response_time,
-        "active_agents": len(agents),
-        "tools_used": len(tools),
+        "p95_response_time": window.duration_percentile(0.95),  # Histogram bucket upper bound
+        "active_agents": window.distinct["agents"],
+        "tools_used": window.distinct["tools"],
         "period_hours": hours
     }
 
 
 @router.get("/charts/request-timeline")
 async def get_request_timeline_chart(hours: int = Query(24, ge=1, le=168)) -> Dict[str, Any]:
-    """Get data for request timeline chart using Redis telemetry"""
+    """Get data for request timeline chart using Redis telemetry rollups"""
     
-    recent_spans = redis_client.zrange('telemetry:recent_spans', 0, -1)
-    cutoff_time = to_utc_aware(now_local()) - timedelta(hours=hours)
+    current_time = to_utc_aware(now_local()).replace(minute=0, second=0, microsecond=0)
+    hour_starts = [current_time - timedelta(hours=i) for i in range(hours)]
     
-    # Group by hour
-    timeline_data = {}
-    sessions_by_hour = {}
+    # Unique sessions per hour from the hourly HyperLogLogs
+    session_counts = await hourly_distinct(async_redis_client, [h.timestamp() for h in hour_starts], "sessions")
     
-    for span_id in recent_spans:
-        span_data = redis_client.get(f'telemetry:span:{span_id}')
-        if not span_data:
-            continue
-            
-        span = json.loads(span_data)
-        span_time = datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc)
-        
-        if span_time >= cutoff_time:
-            hour = span_time.replace(minute=0, second=0, microsecond=0)
-            hour_key = hour.isoformat()
-            
-            # Track unique sessions per hour
-            user_id = span.get('user_id')
-            session_id = span.get('session_id')
-            if user_id and session_id:
-                session_key = f"{user_id}:{session_id}"
-                if hour_key not in sessions_by_hour:
-                    sessions_by_hour[hour_key] = set()
-                sessions_by_hour[hour_key].add(session_key)
-    
-    # Convert to timeline data
-    for hour_key, sessions in sessions_by_hour.items():
-        timeline_data[hour_key] = len(sessions)
-    
-    current_time = to_utc_aware(now_local()).replace(minute=0, second=0, microsecond=0)
     data_points = []
-    
-    for i in range(hours):
-        hour = current_time - timedelta(hours=i)
-        hour_key = hour.isoformat()
+    for hour, requests in zip(hour_starts, session_counts):
         data_points.append({
-            "timestamp": hour_key,
-            "requests": timeline_data.get(hour_key, 0),
+            "timestamp": hour.isoformat(),
+            "requests": requests,
             "hour_label": hour.strftime("%H:00")
         })
     
@@ -191,66 +146,28 @@ async def get_request_timeline_chart(hours: int = Query(24, ge=1, le=168)) -> Di
 
 @router.get("/charts/agent-performance")
 async def get_agent_performance_chart(hours: int = Query(24, ge=1, le=168)) -> Dict[str, Any]:
-    """Get data for agent performance chart using Redis telemetry"""
+    """Get data for agent performance chart using Redis telemetry rollups"""
     
-    recent_spans = redis_client.zrange('telemetry:recent_spans', 0, -1)
+    now = to_utc_aware(now_local())
+    window = await read_window(async_redis_client, (now - timedelta(hours=hours)).timestamp(), now.timestamp())
     
-    if not recent_spans:
-        return {"data": [], "total_agents": 0}
-    
-    cutoff_time = to_utc_aware(now_local()) - timedelta(hours=hours)
-    agent_stats = {}
-    
-    for span_id in recent_spans:
-        span_data = redis_client.get(f'telemetry:span:{span_id}')
-        if not span_data:
-            continue
-            
-        span = json.loads(span_data)
-        span_time = datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc)
-        
-        if span_time < cutoff_time:
-            continue
-            
-        agent = span.get('agent_name')
-        if not agent:
-            continue
-            
-        if agent not in agent_stats:
-            agent_stats[agent] = {
-                "agent_name": agent,
-                "total_interactions": 0,
-                "errors": 0,
-                "total_execution_time": 0,
-                "execution_count": 0,
-                "tools_used": set()
-            }
-        
-        stats = agent_stats[agent]
-        stats["total_interactions"] += 1
-        
-        if span.get('status') == 'ERROR':
-            stats["errors"] += 1
-        
-        duration = span.get('duration_ms')
-        if duration:
-            stats["total_execution_time"] += duration
-            stats["execution_count"] += 1
-        
-        # Track tools from metadata
-        metadata = span.get('metadata', {})
-        if 'tool_used' in metadata:
-            stats["tools_used"].add(metadata['tool_used'])
+    tools_by_agent: Dict[str, set] = {}
+    for agent, tool in window.pairs("agent_tool:"):
+        tools_by_agent.setdefault(agent, set()).add(tool)
     
     chart_data = []
-    for agent, stats in agent_stats.items():
+    for agent, stats in window.grouped("agent:").items():
+        interactions = stats.get("spans", 0)
+        if not interactions:
+            continue
+        errors = stats.get("errors", 0)
         chart_data.append({
             "agent_name": agent,
-            "total_interactions": stats["total_interactions"],
-            "error_rate": stats["errors"] / max(stats["total_interactions"], 1),
-            "avg_execution_time": stats["total_execution_time"] / max(stats["execution_count"], 1),
-            "tools_count": len(stats["tools_used"]),
-            "success_rate": 1 - (stats["errors"] / max(stats["total_interactions"], 1))
+            "total_interactions": int(interactions),
+            "error_rate": errors / max(interactions, 1),
+            "avg_execution_time": stats.get("duration_ms_sum", 0) / max(stats.get("duration_count", 0), 1),
+            "tools_count": len(tools_by_agent.get(agent, ())),
+            "success_rate": 1 - (errors / max(interactions, 1))
         })
     
     return {
@@ -261,62 +178,26 @@ async def get_agent_performance_chart(hours: int = Query(24, ge=1, le=168)) -> D
 
 @router.get("/charts/tool-usage")
 async def get_tool_usage_chart(hours: int = Query(24, ge=1, le=168)) -> Dict[str, Any]:
-    """Get data for tool usage pie chart using Redis telemetry"""
-    
-    recent_spans = redis_client.zrange('telemetry:recent_spans', 0, -1)
-    cutoff_time = to_utc_aware(now_local()) - timedelta(hours=hours)
+    """Get data for tool usage pie chart using Redis telemetry rollups"""
     
-    tool_stats = {}
+    now = to_utc_aware(now_local())
+    window = await read_window(async_redis_client, (now - timedelta(hours=hours)).timestamp(), now.timestamp())
     
-    for span_id in recent_spans:
-        span_data = redis_client.get(f'telemetry:span:{span_id}')
-        if not span_data:
-            continue
-            
-        span = json.loads(span_data)
-        span_time = datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc)
-        
-        if span_time < cutoff_time:
-            continue
-        
-        metadata = span.get('metadata', {})
-        tool = metadata.get('tool_used')
-        
-        if not tool:
-            continue
-            
-        if tool not in tool_stats:
-            tool_stats[tool] = {
-                "tool_name": tool,
-                "usage_count": 0,
-                "total_execution_time": 0,
-                "success_count": 0,
-                "failure_count": 0,
-                "agents_using": set()
-            }
-        
-        stats = tool_stats[tool]
-        stats["usage_count"] += 1
-        stats["agents_using"].add(span.get('agent_name'))
-        
-        duration = span.get('duration_ms')
-        if duration:
-            stats["total_execution_time"] += duration
-        
-        # Check success/failure based on status
-        if span.get('status') == 'ERROR':
-            stats["failure_count"] += 1
-        else:
-            stats["success_count"] += 1
+    agents_by_tool: Dict[str, set] = {}
+    for agent, tool in window.pairs("agent_tool:"):
+        agents_by_tool.setdefault(tool, set()).add(agent)
     
     chart_data = []
-    for tool, stats in tool_stats.items():
+    for tool, stats in window.grouped("tool:").items():
+        usage_count = stats.get("uses", 0)
+        if not usage_count:
+            continue
         chart_data.append({
             "tool_name": tool,
-            "usage_count": stats["usage_count"],
-            "avg_execution_time": stats["total_execution_time"] / max(stats["usage_count"], 1),
-            "success_rate": stats["success_count"] / max(stats["usage_count"], 1),
-            "agents_count": len(stats["agents_using"]),
+            "usage_count": int(usage_count),
+            "avg_execution_time": stats.get("duration_ms_sum", 0) / max(usage_count, 1),
+            "success_rate": (usage_count - stats.get("errors", 0)) / max(usage_count, 1),
+            "agents_count": len(agents_by_tool.get(tool, ())),
             "percentage": 0  # Will be calculated on frontend
         })
     
@@ -334,56 +215,38 @@ async def get_tool_usage_chart(hours: int = Query(24, ge=1, le=168)) -> Dict[str
 
 @router.get("/charts/error-analysis")
 async def get_error_analysis_chart(hours: int = Query(24, ge=1, le=168)) -> Dict[str, Any]:
-    """Get data for error analysis chart using Redis telemetry"""
+    """Get data for error analysis chart using Redis telemetry rollups"""
     
-    recent_spans = redis_client.zrange('telemetry:recent_spans', 0, -1)
-    cutoff_time = to_utc_aware(now_local()) - timedelta(hours=hours)
+    now = to_utc_aware(now_local())
+    cutoff_time = now - timedelta(hours=hours)
+    window = await read_window(async_redis_client, cutoff_time.timestamp(), now.timestamp())
     
-    error_stats = {}
-    
-    for span_id in recent_spans:
-        span_data = redis_client.get(f'telemetry:span:{span_id}')
-        if not span_data:
-            continue
-            
-        span = json.loads(span_data)
-        span_time = datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc)
-        
-        if span_time < cutoff_time or span.get('status') != 'ERROR':
-            continue
-        
-        agent = span.get('agent_name', 'Unknown')
-        error_type = span.get('metadata', {}).get('error_type', 'General Error')
-        
-        if agent not in error_stats:
-            error_stats[agent] = {}
-        
-        if error_type not in error_stats[agent]:
-            error_stats[agent][error_type] = {
-                "count": 0,
-                "recent_errors": []
-            }
-        
-        error_stats[agent][error_type]["count"] += 1
-        error_stats[agent][error_type]["recent_errors"].append({
-            "timestamp": span_time.isoformat(),
-            "message": span.get('metadata', {}).get('error_message', 'Unknown error')
+    # Sample messages come from the capped index of recent error spans
+    error_span_ids = await async_redis_client.zrangebyscore(RECENT_ERRORS_KEY, cutoff_time.timestamp(), '+inf')
+    recent_errors: Dict[tuple, List[Dict[str, Any]]] = {}
+    for span in await _get_spans(error_span_ids):
+        metadata = span.get('metadata', {})
+        key = (span.get('agent_name') or 'Unknown', metadata.get('error_type', 'General Error'))
+        recent_errors.setdefault(key, []).append({
+            "timestamp": datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc).isoformat(),
+            "message": metadata.get('error_message', 'Unknown error')
         })
     
     chart_data = []
-    for agent, errors in error_stats.items():
-        for error_type, data in errors.items():
-            chart_data.append({
-                "agent_name": agent,
-                "error_type": error_type,
-                "count": data["count"],
-                "recent_errors": data["recent_errors"][-5:]  # Last 5 errors
-            })
+    affected_agents = set()
+    for (agent, error_type), count in window.pairs("error:").items():
+        affected_agents.add(agent)
+        chart_data.append({
+            "agent_name": agent,
+            "error_type": error_type,
+            "count": int(count),
+            "recent_errors": recent_errors.get((agent, error_type), [])[-5:]  # Last 5 errors
+        })
     
     return {
         "data": sorted(chart_data, key=lambda x: x["count"], reverse=True),
         "total_errors": sum(item["count"] for item in chart_data),
-        "affected_agents": len(error_stats)
+        "affected_agents": len(affected_agents)
     }
 
 
@@ -395,22 +258,17 @@ async def get_workflow_requests(
 ) -> Dict[str, Any]:
     """Get requests for workflow visualization using Redis telemetry data"""
     
-    # Get all recent spans from Redis
-    recent_spans = redis_client.zrange('telemetry:recent_spans', 0, -1)
+    # Get recent spans in the window from Redis
+    cutoff_time = to_utc_aware(now_local()) - timedelta(hours=hours)
+    recent_spans = await _get_spans_since(cutoff_time)
     
     if not recent_spans:
         return {"requests": [], "total": 0}
     
     # Group spans by session to create workflows
     workflows = {}
-    cutoff_time = to_utc_aware(now_local()) - timedelta(hours=hours)
     
-    for span_id in recent_spans:
-        span_data = redis_client.get(f'telemetry:span:{span_id}')
-        if not span_data:
-            continue
-            
-        span = json.loads(span_data)
+    for span in recent_spans:
         span_time = datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc)
         
         if span_time < cutoff_time:
@@ -502,19 +360,7 @@ async def get_request_workflow_detail(request_id: str) -> Dict[str, Any]:
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid request_id format")
     
-    recent_spans = redis_client.zrange('telemetry:recent_spans', 0, -1)
-    workflow_spans = []
-    
-    for span_id in recent_spans:
-        span_data = redis_client.get(f'telemetry:span:{span_id}')
-        if not span_data:
-            continue
-            
-        span = json.loads(span_data)
-        
-        if (span.get('user_id') == user_id and 
-            span.get('session_id') == session_id):
-            workflow_spans.append(span)
+    workflow_spans = await _get_session_spans(user_id, session_id)
     
     if not workflow_spans:
         raise HTTPException(status_code=404, detail="Request not found")
@@ -693,51 +539,41 @@ async def get_request_inter_agent_messages(request_id: str) -> Dict[str, Any]:
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid request_id format")
     
-    recent_spans = redis_client.zrange('telemetry:recent_spans', 0, -1)
     messages = []
     
-    for span_id in recent_spans:
-        span_data = redis_client.get(f'telemetry:span:{span_id}')
-        if not span_data:
-            continue
-            
-        span = json.loads(span_data)
+    for span in await _get_session_spans(user_id, session_id):
+        metadata = span.get('metadata', {})
         
-        if (span.get('user_id') == user_id and 
-            span.get('session_id') == session_id):
-            
-            metadata = span.get('metadata', {})
-            
-            # Extract messages from metadata
-            if 'input_message' in metadata:
-                messages.append({
-                    "timestamp": datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc).isoformat(),
-                    "from_agent": "User",
-                    "to_agent": span.get('agent_name'),
-                    "message_type": "input",
-                    "content": metadata['input_message'],
-                    "span_id": span.get('span_id')
-                })
-            
-            if 'output_message' in metadata:
-                messages.append({
-                    "timestamp": datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc).isoformat(),
-                    "from_agent": span.get('agent_name'),
-                    "to_agent": "User",
-                    "message_type": "output",
-                    "content": metadata['output_message'],
-                    "span_id": span.get('span_id')
-                })
-            
-            if 'inter_agent_message' in metadata:
-                messages.append({
-                    "timestamp": datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc).isoformat(),
-                    "from_agent": span.get('agent_name'),
-                    "to_agent": metadata.get('target_agent', 'Unknown'),
-                    "message_type": "inter_agent",
-                    "content": metadata['inter_agent_message'],
-                    "span_id": span.get('span_id')
-                })
+        # Extract messages from metadata
+        if 'input_message' in metadata:
+            messages.append({
+                "timestamp": datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc).isoformat(),
+                "from_agent": "User",
+                "to_agent": span.get('agent_name'),
+                "message_type": "input",
+                "content": metadata['input_message'],
+                "span_id": span.get('span_id')
+            })
+        
+        if 'output_message' in metadata:
+            messages.append({
+                "timestamp": datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc).isoformat(),
+                "from_agent": span.get('agent_name'),
+                "to_agent": "User",
+                "message_type": "output",
+                "content": metadata['output_message'],
+                "span_id": span.get('span_id')
+            })
+        
+        if 'inter_agent_message' in metadata:
+            messages.append({
+                "timestamp": datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc).isoformat(),
+                "from_agent": span.get('agent_name'),
+                "to_agent": metadata.get('target_agent', 'Unknown'),
+                "message_type": "inter_agent",
+                "content": metadata['inter_agent_message'],
+                "span_id": span.get('span_id')
+            })
     
     # Sort messages by timestamp
     messages.sort(key=lambda x: x['timestamp'])
@@ -758,55 +594,25 @@ async def get_system_health() -> Dict[str, Any]:
     return await system_metrics.get_system_health()
 
 
-def get_real_time_metrics() -> Dict[str, Any]:
+async def get_real_time_metrics() -> Dict[str, Any]:
     """Get real-time metrics for WebSocket updates"""
-    last_10_minutes = to_utc_aware(now_local()) - timedelta(minutes=10)
-    recent_spans = redis_client.zrange('telemetry:recent_spans', -50, -1)  # Last 50 spans
-    
-    active_sessions = set()
-    active_agents = set()
-    recent_errors = 0
-    
-    for span_id in recent_spans:
-        span_data = redis_client.get(f'telemetry:span:{span_id}')
-        if not span_data:
-            continue
-            
-        span = json.loads(span_data)
-        span_time = datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc)
-        
-        if span_time >= last_10_minutes:
-            user_id = span.get('user_id')
-            session_id = span.get('session_id')
-            if user_id and session_id:
-                active_sessions.add(f"{user_id}:{session_id}")
-            
-            agent_name = span.get('agent_name')
-            if agent_name:
-                active_agents.add(agent_name)
-            
-            if span.get('status') == 'ERROR':
-                recent_errors += 1
+    now = to_utc_aware(now_local())
+    window = await read_window(async_redis_client, (now - timedelta(minutes=10)).timestamp(), now.timestamp())
     
     return {
-        "active_sessions": len(active_sessions),
-        "active_agents": len(active_agents),
-        "recent_errors": recent_errors,
+        "active_sessions": window.distinct["sessions"],
+        "active_agents": window.distinct["agents"],
+        "recent_errors": int(window.get("errors")),
         "timestamp": isoformat_now()
     }
 
 
-def get_recent_activity(limit: int = 10) -> List[Dict[str, Any]]:
+async def get_recent_activity(limit: int = 10) -> List[Dict[str, Any]]:
     """Get recent activity for WebSocket updates"""
-    recent_spans = redis_client.zrange('telemetry:recent_spans', -limit, -1)
+    span_ids = await async_redis_client.zrange('telemetry:recent_spans', -limit, -1)
     
     activities = []
-    for span_id in recent_spans:
-        span_data = redis_client.get(f'telemetry:span:{span_id}')
-        if not span_data:
-            continue
-            
-        span = json.loads(span_data)
+    for span in await _get_spans(span_ids):
         activities.append({
             "timestamp": datetime.fromtimestamp(span['start_time'], tz=dt_timezone.utc).isoformat(),
             "agent_name": span.get('agent_name'),
@@ -815,4 +621,4 @@ def get_recent_activity(limit: int = 10) -> List[Dict[str, Any]]:
             "user_id": span.get('user_id')
         })
     
-    return sorted(activities, key=lambda x: x['timestamp'], reverse=True) 
\ No newline at end of file
+    return sorted(activities, key=lambda x: x['timestamp'], reverse=True)
@@ -491,6 +491,16 @@ async def get_performance_alerts(
         raise HTTPException(status_code=500, detail=f"Error retrieving performance alerts: {str(e)}")
 
 
+@router.get("/agents/registry")
+async def get_agent_registry_metrics() -> Dict[str, Any]:
+    """Get build times and reuse counts for compiled agent workflows and LLM clients"""
+    try:
+        from app.agentsv2.workflow_registry import get_metrics
+        return get_metrics()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving agent registry metrics: {str(e)}")
+
+
 @router.post("/metrics/clear")
 async def clear_metrics() -> Dict[str, str]:
     """Clear all stored metrics (useful for testing)"""
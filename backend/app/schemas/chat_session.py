@@ -104,7 +104,7 @@ class EnhancedChatMessage(ChatMessage):
 # Streaming Response Schemas
 class StreamingChunk(BaseModel):
     """Individual chunk for streaming responses"""
-    type: str  # "content", "status", "complete", "error"
+    type: str  # "token", "content", "status", "progress", "complete", "error"
     content: Optional[str] = None
     status: Optional[str] = None
     progress: Optional[float] = None
@@ -0,0 +1,176 @@
+"""
+Token-budgeted conversation history for the chat agents.
+
+The history passed to the customer workflow is
+
+    [{"role": "system", "content": "<rolling summary>"}]   (when one exists)
+    + the most recent turns, verbatim, within CHAT_HISTORY_TOKEN_BUDGET
+
+Turns older than the verbatim window are folded into ``chat_sessions.history_summary``;
+``history_summary_message_id`` marks the last folded message, so each fold only
+summarizes the new turns together with the previous summary. Folding starts
+when the unsummarized turns exceed the budget and shrinks them to half of it,
+so most requests make no summary call at all. A session far behind catches
+up CHAT_HISTORY_SUMMARY_BATCH_MESSAGES messages per request.
+
+Per-message token counts are cached per session in-process; message content
+never changes, so entries stay valid until the session is evicted from the LRU.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from app import crud
+from app.core.config import settings
+from app.core.database_utils import get_db_session
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(content: str) -> int:
+    """Prompt tokens for a message body (tiktoken, ~4 chars/token if unavailable)"""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    logger.warning(f"⚠️ [ChatHistory] tiktoken unavailable, estimating tokens: {e}")
+                    _encoding = False
+    if _encoding is False:
+        return len(content) // 4 + 1
+    return len(_encoding.encode(content, disallowed_special=()))
+
+
+class TokenCountCache:
+    """session_id -> {message_id: tokens}, LRU over sessions"""
+
+    def __init__(self, max_sessions: Optional[int] = None):
+        self.max_sessions = settings.CHAT_HISTORY_CACHE_SESSIONS if max_sessions is None else max_sessions
+        self._sessions: "OrderedDict[int, Dict[int, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def tokens(self, session_id: int, message_id: int, content: str) -> int:
+        with self._lock:
+            counts = self._sessions.get(session_id)
+            if counts is not None:
+                self._sessions.move_to_end(session_id)
+                cached = counts.get(message_id)
+                if cached is not None:
+                    return cached
+        tokens = count_tokens(content or "") + 4  # role and message framing
+        if self.max_sessions <= 0:
+            return tokens
+        with self._lock:
+            counts = self._sessions.setdefault(session_id, {})
+            counts[message_id] = tokens
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return tokens
+
+    def forget_before(self, session_id: int, message_id: int) -> None:
+        """Drop counts for messages now folded into the summary"""
+        with self._lock:
+            counts = self._sessions.get(session_id)
+            if counts:
+                for mid in [mid for mid in counts if mid <= message_id]:
+                    del counts[mid]
+
+
+token_counts = TokenCountCache()
+
+
+def _summary_prompt(previous_summary: Optional[str], messages) -> str:
+    transcript = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in messages)
+    return f"""You maintain a running summary of a conversation between a user and a healthcare app assistant.
+Update the summary with the new messages below. Keep facts the assistant may need later: health data the user
+mentioned, documents they uploaded, questions asked and answers given, preferences and open follow-ups.
+Write plain prose, at most {settings.CHAT_HISTORY_SUMMARY_MAX_TOKENS} tokens. Return only the updated summary.
+
+CURRENT SUMMARY:
+{previous_summary or "(none)"}
+
+NEW MESSAGES:
+{transcript}"""
+
+
+async def _summarize(previous_summary: Optional[str], messages) -> str:
+    from langchain_core.messages import HumanMessage
+    from app.agentsv2.workflow_registry import get_chat_model
+    model = get_chat_model(
+        settings.CHAT_HISTORY_SUMMARY_MODEL or settings.CUSTOMER_AGENT_MODEL,
+        openai_api_key=settings.OPENAI_API_KEY,
+        temperature=0,
+    )
+    response = await model.ainvoke([HumanMessage(content=_summary_prompt(previous_summary, messages))])
+    return (response.content or "").strip()
+
+
+async def build_conversation_history(session_id: int) -> List[Dict[str, str]]:
+    """Summary plus the newest turns within the token budget, oldest first"""
+    budget = settings.CHAT_HISTORY_TOKEN_BUDGET
+    with get_db_session() as db:
+        session = crud.chat_session.get(db=db, id=session_id)
+        if session is None:
+            return []
+        summary = session.history_summary
+        cursor = session.history_summary_message_id
+        recent = crud.chat_message.get_messages_after(
+            db=db, session_id=session_id, after_id=cursor,
+            limit=settings.CHAT_HISTORY_MAX_MESSAGES, newest_first=True,
+        )
+        token_sizes = [token_counts.tokens(session_id, m.id, m.content) for m in recent]
+
+        # Over budget: keep the newest turns within half of it and fold everything older
+        keep_budget = budget if sum(token_sizes) <= budget else budget // 2
+        verbatim, used = [], 0
+        for message, tokens in zip(recent, token_sizes):
+            if verbatim and used + tokens > keep_budget:
+                break
+            verbatim.append(message)
+            used += tokens
+        verbatim.reverse()
+
+        to_fold = []
+        if verbatim and (len(verbatim) < len(recent) or len(recent) == settings.CHAT_HISTORY_MAX_MESSAGES):
+            to_fold = [
+                {"id": m.id, "role": m.role, "content": m.content}
+                for m in crud.chat_message.get_messages_after(
+                    db=db, session_id=session_id, after_id=cursor, before_id=verbatim[0].id,
+                    limit=settings.CHAT_HISTORY_SUMMARY_BATCH_MESSAGES,
+                )
+            ]
+        history = [{"role": m.role, "content": m.content} for m in verbatim]
+
+    if to_fold:
+        try:
+            new_summary = await _summarize(summary, to_fold)
+            new_cursor = to_fold[-1]["id"]
+            with get_db_session() as db:
+                # Conditional on the cursor we read, so concurrent requests never fold twice
+                updated = db.execute(text("""
+                    UPDATE chat_sessions
+                    SET history_summary = :summary, history_summary_message_id = :new_cursor
+                    WHERE id = :session_id AND history_summary_message_id IS NOT DISTINCT FROM :cursor
+                """), {"summary": new_summary, "new_cursor": new_cursor, "session_id": session_id, "cursor": cursor})
+            if updated.rowcount:
+                summary = new_summary
+                token_counts.forget_before(session_id, new_cursor)
+                logger.info(f"🧾 [ChatHistory] Folded {len(to_fold)} messages into summary for session {session_id}")
+        except Exception as e:
+            logger.warning(f"⚠️ [ChatHistory] Summary update failed for session {session_id}: {e}")
+
+    if summary:
+        history.insert(0, {"role": "system", "content": SUMMARY_PREFIX + summary})
+    return history
@@ -1,9 +1,14 @@
+import asyncio
+import hashlib
 import os
+import shutil
 import uuid
-from typing import Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 from app.core.config import settings
 
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
 
 def _ensure_dir(path: str) -> None:
     try:
@@ -28,66 +33,132 @@ def _content_type_for_ext(ext: str) -> str:
     }.get(ext.lower(), "application/octet-stream")
 
 
-def store_file(content_bytes: bytes, original_filename: str, user_id: int, session_id: int) -> Dict[str, str]:
-    """
-    Store an uploaded file using a common temp folder for processing and a durable storage location.
-
-    Behavior:
-    - Always write a temp copy under data/tmp for processing (caller should delete when done)
-    - If settings.USE_S3_UPLOADS is True: upload to S3 and return s3:// URL as stored_url
-    - Else: write to local persistent folder under data/uploads/chat and return local path as stored_url
-
-    Returns dict with keys: original_name, file_type, temp_path, stored_url, stored_is_s3 ("true"/"false")
-    """
-    ext = _detect_ext(original_filename)
-
-    # 1) Write temp copy for processing
-    is_s3 = bool(getattr(settings, "USE_S3_UPLOADS", False))
+def _new_temp_path(user_id: int, session_id: int, ext: str) -> str:
     # Use configured temp directory (derived in settings)
     temp_root = os.path.abspath(getattr(settings, "UPLOADS_TMP_DIR"))
     _ensure_dir(temp_root)
     temp_name = f"tmp_{uuid.uuid4().hex}_{user_id}_{session_id}.{ext}"
-    temp_path = os.path.abspath(os.path.join(temp_root, temp_name))
-    with open(temp_path, "wb") as f_out:
-        f_out.write(content_bytes)
-
-    # 2) Durable storage target
-    if is_s3:
-        # Upload to S3
-        from app.services.s3_service import upload_bytes_and_get_uri
+    return os.path.abspath(os.path.join(temp_root, temp_name))
+
+
+def _write_chunk(f_out, digest, chunk: bytes) -> None:
+    digest.update(chunk)
+    f_out.write(chunk)
+
+
+def _persist(temp_path: str, sha256: str, ext: str, user_id: int) -> Tuple[str, str, bool]:
+    """
+    Copy the processed temp file to durable storage under a per-user, content-addressed name.
+    Returns (stored_url, stored_is_s3, deduplicated); identical content from the same user
+    resolves to the existing object instead of being stored again.
+    """
+    if bool(getattr(settings, "USE_S3_UPLOADS", False)):
+        from app.services.s3_service import object_exists, upload_file_and_get_uri
         s3_prefix = "uploads/chat"
         if not s3_prefix or str(s3_prefix).strip() == "":
             raise RuntimeError("UPLOADS_S3_PREFIX must be set when USE_S3_UPLOADS is true")
-        filename = f"{uuid.uuid4().hex}_{user_id}_{session_id}.{ext}"
-        s3_key = f"{s3_prefix.rstrip('/')}/{filename}"
-        s3_uri = upload_bytes_and_get_uri(
-            bucket=settings.AWS_S3_BUCKET,
+        bucket = settings.AWS_S3_BUCKET
+        s3_key = f"{s3_prefix.rstrip('/')}/{user_id}/{sha256}.{ext}"
+        if object_exists(bucket, s3_key):
+            return f"s3://{bucket}/{s3_key}", "true", True
+        s3_uri = upload_file_and_get_uri(
+            bucket=bucket,
             key=s3_key,
-            data=content_bytes,
+            path=temp_path,
             content_type=_content_type_for_ext(ext),
+            metadata={"sha256": sha256},
         )
-        stored_url = s3_uri
-        stored_is_s3 = "true"
-    else:
-        # Local persistent path
-        local_root = os.path.abspath(getattr(settings, "UPLOADS_LOCAL_DIR"))
-        _ensure_dir(local_root)
-        filename = f"{uuid.uuid4().hex}_{user_id}_{session_id}.{ext}"
-        stored_path = os.path.abspath(os.path.join(local_root, filename))
-        with open(stored_path, "wb") as f_out:
-            f_out.write(content_bytes)
-        stored_url = stored_path
-        stored_is_s3 = "false"
+        return s3_uri, "true", False
+
+    # Local persistent path
+    local_root = os.path.abspath(getattr(settings, "UPLOADS_LOCAL_DIR"))
+    user_dir = os.path.join(local_root, str(user_id))
+    _ensure_dir(user_dir)
+    stored_path = os.path.abspath(os.path.join(user_dir, f"{sha256}.{ext}"))
+    if os.path.exists(stored_path):
+        return stored_path, "false", True
+    partial_path = f"{stored_path}.{uuid.uuid4().hex}.part"
+    try:
+        # Hard link when temp and durable storage share a filesystem, else copy
+        os.link(temp_path, partial_path)
+    except OSError:
+        shutil.copyfile(temp_path, partial_path)
+    os.replace(partial_path, stored_path)
+    return stored_path, "false", False
 
+
+def _stored_meta(original_filename: Optional[str], ext: str, temp_path: str, durable: Tuple[str, str, bool], sha256: str, size: int) -> Dict[str, Any]:
+    stored_url, stored_is_s3, deduplicated = durable
     return {
         "original_name": original_filename or "uploaded_file",
         "file_type": ext,
         "temp_path": temp_path,
         "stored_url": stored_url,
         "stored_is_s3": stored_is_s3,
+        "sha256": sha256,
+        "size": size,
+        "deduplicated": deduplicated,
     }
 
 
+def store_file(content_bytes: bytes, original_filename: str, user_id: int, session_id: int) -> Dict[str, Any]:
+    """
+    Store an uploaded file using a common temp folder for processing and a durable storage location.
+
+    Behavior:
+    - Always write a temp copy under data/tmp for processing (caller should delete when done)
+    - If settings.USE_S3_UPLOADS is True: upload to S3 and return s3:// URL as stored_url
+    - Else: write to local persistent folder under data/uploads/chat and return local path as stored_url
+    - Durable copies are named <user_id>/<sha256>.<ext>, so re-uploads of the same content are not stored twice
+
+    Prefer store_upload for request bodies; it never holds the whole file in memory.
+
+    Returns dict with keys: original_name, file_type, temp_path, stored_url, stored_is_s3 ("true"/"false"),
+    sha256, size, deduplicated
+    """
+    ext = _detect_ext(original_filename)
+    temp_path = _new_temp_path(user_id, session_id, ext)
+    digest = hashlib.sha256()
+    try:
+        with open(temp_path, "wb") as f_out:
+            _write_chunk(f_out, digest, content_bytes)
+        sha256 = digest.hexdigest()
+        durable = _persist(temp_path, sha256, ext, user_id)
+    except BaseException:
+        cleanup_temp_file(temp_path)
+        raise
+    return _stored_meta(original_filename, ext, temp_path, durable, sha256, len(content_bytes))
+
+
+async def store_upload(upload, original_filename: str, user_id: int, session_id: int) -> Dict[str, Any]:
+    """
+    Streaming variant of store_file for a FastAPI UploadFile.
+
+    The body is spooled to the temp copy in UPLOAD_CHUNK_BYTES chunks while its
+    SHA-256 is computed, then the durable copy is made from that file (multipart
+    for large S3 uploads). File I/O runs in worker threads, off the event loop.
+    Returns the same dict as store_file.
+    """
+    ext = _detect_ext(original_filename)
+    temp_path = _new_temp_path(user_id, session_id, ext)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as f_out:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                await asyncio.to_thread(_write_chunk, f_out, digest, chunk)
+        sha256 = digest.hexdigest()
+        durable = await asyncio.to_thread(_persist, temp_path, sha256, ext, user_id)
+    except BaseException:
+        cleanup_temp_file(temp_path)
+        raise
+    return _stored_meta(original_filename, ext, temp_path, durable, sha256, size)
+
+
 def ensure_local_processing_path(file_path: str) -> str:
     """
     Given a stored URL which may be s3:// or local path, return a local path suitable for
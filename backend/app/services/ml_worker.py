@@ -11,6 +11,16 @@ Mode is selected via ML_WORKER_MODE environment variable:
 - "sqs" (default): Process jobs from SQS queue
 - "aggregation": Run background aggregation worker
 - "both": Run both SQS and aggregation workers
+
+In SQS mode jobs run on a pool of ML_WORKER_CONCURRENCY threads. Jobs sharing a
+serialization key (same user, or same global drain) run one at a time, duplicate
+triggers are coalesced, completed messages are acknowledged with
+DeleteMessageBatch and visibility is extended while long jobs run. Setting
+ML_WORKER_SQS_QUEUE_URL to local://<name> uses an in-process queue instead of SQS.
+
+After lab/vitals/nutrition jobs the worker recomputes daily health scores that
+the new aggregates invalidated (health_score_dirty); the recompute_health_scores
+job does the same on demand.
 """
 
 import os
@@ -20,16 +30,19 @@ import time
 import signal
 import asyncio
 import logging
-from typing import Dict, Any, Optional
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
-import boto3
 from botocore.exceptions import ClientError
 
 # Import database and models
 from sqlalchemy.orm import Session
 from app.db.session import SessionLocal
 from app.crud.lab_categorization import LabCategorizationCRUD
+from app.utils.local_sqs import create_sqs_client
 
 # Import background worker
 from app.core.background_worker import run_worker_process
@@ -47,9 +60,34 @@ logger = logging.getLogger(__name__)
 # Configuration from environment
 AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
 SQS_QUEUE_URL = os.getenv('ML_WORKER_SQS_QUEUE_URL')
-MAX_MESSAGES = int(os.getenv('ML_WORKER_BATCH_SIZE', '1'))
+MAX_MESSAGES = min(10, int(os.getenv('ML_WORKER_BATCH_SIZE', '10')))  # SQS allows at most 10 per receive
 WAIT_TIME_SECONDS = int(os.getenv('ML_WORKER_WAIT_TIME', '20'))
 VISIBILITY_TIMEOUT = int(os.getenv('ML_WORKER_VISIBILITY_TIMEOUT', '300'))
+CONCURRENCY = int(os.getenv('ML_WORKER_CONCURRENCY', '4'))  # Concurrent job handlers
+MAX_IN_FLIGHT_MESSAGES = int(os.getenv('ML_WORKER_MAX_IN_FLIGHT', '100'))  # Received but not yet acknowledged
+MAX_VISIBILITY_SECONDS = int(os.getenv('ML_WORKER_MAX_VISIBILITY', '3600'))  # Stop extending after this; message is retried
+SQS_BATCH_LIMIT = 10
+
+# Job types whose handlers drain pending rows for all users. They share one
+# serialization key per domain so two drains never pick up the same rows.
+# Vitals drains are user-scoped and guarded by per-user advisory locks instead.
+DRAIN_SERIALIZATION_KEYS = {
+    'lab_categorization': 'drain:labs',
+    'process_pending_labs': 'drain:labs',
+    'process_pending_nutrition': 'drain:nutrition',
+}
+
+# Pending vitals draining (user-scoped claim + fair sweep)
+DRAIN_BATCH_SIZE = int(os.getenv('ML_WORKER_DRAIN_BATCH_SIZE', '1000'))  # Rows claimed per keyset page
+DRAIN_TIME_BUDGET_SECONDS = int(os.getenv('ML_WORKER_DRAIN_TIME_BUDGET', '240'))  # Per job, including the sweep
+SWEEP_USERS_PAGE_SIZE = int(os.getenv('ML_WORKER_SWEEP_USERS_PAGE_SIZE', '100'))
+
+# Trigger-style jobs: duplicates for the same (job_type, user_id) are merged into
+# one job that runs up to one pass per merged message, stopping once drained.
+COALESCED_JOB_TYPES = {'process_pending_labs', 'process_pending_vitals', 'process_pending_nutrition', 'recompute_health_scores'}
+
+# Jobs whose aggregates feed the daily health score; stale scores are recomputed after them
+HEALTH_SCORE_INPUT_JOB_TYPES = {'lab_categorization', 'process_pending_labs', 'process_pending_vitals', 'process_pending_nutrition'}
 ML_WORKER_MODE = os.getenv('ML_WORKER_MODE', 'sqs').lower()  # 'sqs', 'aggregation', or 'both'
 
 # Graceful shutdown flag
@@ -66,15 +104,42 @@ signal.signal(signal.SIGTERM, signal_handler)
 signal.signal(signal.SIGINT, signal_handler)
 
 
+class _Job:
+    """A job to run: one message body plus any duplicate messages coalesced into it"""
+    
+    def __init__(self, body: Dict[str, Any], message: Dict[str, Any], coalesce_key: Optional[Tuple], serialization_key: Optional[str]):
+        self.body = body
+        self.messages = [message]
+        self.coalesce_key = coalesce_key
+        self.serialization_key = serialization_key
+    
+    @property
+    def message_id(self) -> str:
+        return self.messages[0]['MessageId']
+
+
 class MLWorker:
     """ML Worker that processes lab categorization jobs from SQS"""
     
-    def __init__(self):
+    def __init__(self, concurrency: int = CONCURRENCY):
         self.sqs_client = None
         self.crud = LabCategorizationCRUD()
         self.processed_count = 0
         self.error_count = 0
+        self.coalesced_count = 0
         self.start_time = datetime.utcnow()
+        self.concurrency = max(1, concurrency)
+        
+        # Scheduler state, guarded by _lock
+        self._lock = threading.RLock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._running = 0  # Jobs submitted to the executor
+        self._waiting: Dict[str, Deque[_Job]] = {}  # serialization key -> jobs queued behind the active one
+        self._active_keys = set()
+        self._unstarted: Dict[Tuple, _Job] = {}  # coalesce key -> queued job still accepting duplicates
+        self._in_flight: Dict[str, Dict[str, float]] = {}  # receipt handle -> received_at / visible_until
+        self._acks: List[str] = []  # receipt handles ready for DeleteMessageBatch
+        self._progress = threading.Event()
         
         # Validate configuration
         if not SQS_QUEUE_URL:
@@ -85,23 +150,24 @@ class MLWorker:
         logger.info(f"   Region: {AWS_REGION}")
         logger.info(f"   Batch Size: {MAX_MESSAGES}")
         logger.info(f"   Wait Time: {WAIT_TIME_SECONDS}s")
+        logger.info(f"   Concurrency: {self.concurrency}")
     
     def initialize_aws(self):
-        """Initialize AWS SQS client"""
+        """Initialize AWS SQS client (or the local stand-in for local:// queue URLs)"""
         try:
-            self.sqs_client = boto3.client('sqs', region_name=AWS_REGION)
+            self.sqs_client = create_sqs_client(SQS_QUEUE_URL, AWS_REGION)
             logger.info("✅ AWS SQS client initialized")
         except Exception as e:
             logger.error(f"❌ Failed to initialize AWS client: {e}")
             raise
     
-    def receive_messages(self) -> list:
+    def receive_messages(self, max_messages: int = MAX_MESSAGES, wait_time: int = WAIT_TIME_SECONDS) -> list:
         """Receive messages from SQS queue"""
         try:
             response = self.sqs_client.receive_message(
                 QueueUrl=SQS_QUEUE_URL,
-                MaxNumberOfMessages=MAX_MESSAGES,
-                WaitTimeSeconds=WAIT_TIME_SECONDS,
+                MaxNumberOfMessages=max_messages,
+                WaitTimeSeconds=wait_time,
                 VisibilityTimeout=VISIBILITY_TIMEOUT,
                 AttributeNames=['All'],
                 MessageAttributeNames=['All']
@@ -119,12 +185,21 @@ class MLWorker:
     
     def process_message(self, message: Dict[str, Any]) -> bool:
         """Process a single lab categorization job"""
-        receipt_handle = message['ReceiptHandle']
         message_id = message['MessageId']
         
         try:
             # Parse message body
             body = json.loads(message['Body'])
+        except json.JSONDecodeError as e:
+            logger.error(f"❌ Invalid JSON in message {message_id}: {e}")
+            self._record_result(False)
+            return False
+        
+        return self.process_job(body, message_id)
+    
+    def process_job(self, body: Dict[str, Any], message_id: str) -> bool:
+        """Dispatch a parsed job body to its handler"""
+        try:
             logger.info(f"🔄 Processing message {message_id}")
             logger.info(f"   Job Type: {body.get('job_type', 'unknown')}")
             
@@ -140,29 +215,34 @@ class MLWorker:
                 result = self._process_pending_vitals(body)
             elif job_type == 'process_pending_nutrition':
                 result = self._process_pending_nutrition(body)
+            elif job_type == 'recompute_health_scores':
+                result = self._process_stale_health_scores(body)
             else:
                 logger.error(f"❌ Unknown job type: {job_type}")
                 return False
             
+            if result and job_type in HEALTH_SCORE_INPUT_JOB_TYPES:
+                self._process_stale_health_scores({})
+            
             if result:
                 logger.info(f"✅ Successfully processed message {message_id}")
-                self.processed_count += 1
-                return True
             else:
                 logger.error(f"❌ Failed to process message {message_id}")
-                self.error_count += 1
-                return False
-        
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ Invalid JSON in message {message_id}: {e}")
-            self.error_count += 1
-            return False
+            self._record_result(result)
+            return result
         
         except Exception as e:
             logger.error(f"❌ Error processing message {message_id}: {e}", exc_info=True)
-            self.error_count += 1
+            self._record_result(False)
             return False
     
+    def _record_result(self, success: bool):
+        with self._lock:
+            if success:
+                self.processed_count += 1
+            else:
+                self.error_count += 1
+    
     def _process_lab_categorization(self, job_data: Dict[str, Any]) -> bool:
         """
         Process lab categorization job (DEPRECATED - use process_pending_labs instead)
@@ -297,106 +377,41 @@ class MLWorker:
     
     def _process_pending_vitals(self, job_data: Dict[str, Any]) -> bool:
         """
-        Process all pending vitals data for a user
-        
-        This is triggered when vitals are synced - it processes all pending
-        vitals in the vitals_raw_data table (categorization + aggregation)
-        
-        Processing order (EXACT replica of background_worker.py logic):
-        1. Get pending entries
-        2. Group by user_id and date
-        3. Mark as processing
-        4. For each user/date:
-           - Copy raw to categorized with LOINC
-           - Aggregate hourly data
-           - Aggregate daily data
-           - Aggregate weekly data (week starts Monday)
-           - Aggregate monthly data
+        Drain pending vitals data, starting with the triggering user
+        
+        This is triggered when vitals are synced - it processes pending vitals
+        in the vitals_raw_data table (categorization + aggregation) until the
+        backlog is empty or ML_WORKER_DRAIN_TIME_BUDGET is spent.
+        
+        Processing order:
+        1. Take the user's drain lock (skip if another worker holds it)
+        2. Claim keyset pages of the user's pending rows with FOR UPDATE SKIP LOCKED
+        3. For each page:
+           - Copy raw to categorized with LOINC for every affected date
+           - Roll up hourly -> daily -> weekly (week starts Monday) -> monthly
+             for all affected dates in one set-based pass (VitalsRollupCRUD)
            - Mark categorized as aggregated
-        5. On error: mark as failed
+           - On error: mark the page's entries as failed
+        4. With budget left, sweep other users with pending rows, one page per
+           user per round so no single backlog starves the rest
         """
         user_id = job_data.get('user_id')
+        deadline = time.monotonic() + DRAIN_TIME_BUDGET_SECONDS
         
         logger.info(f"💓 Processing pending vitals for user {user_id}")
         
         db = SessionLocal()
         try:
-            # Import required modules (same as background_worker.py)
-            from app.crud.vitals import VitalsCRUD
-            from datetime import timedelta, date as date_type
-            
-            # Get pending vitals entries from vitals_raw_data
-            pending_entries = VitalsCRUD.get_pending_aggregation_entries(db, limit=100)
-            
-            if not pending_entries:
-                logger.info(f"✅ No pending vitals found for user {user_id}")
-                return True
-            
-            logger.info(f"   Found {len(pending_entries)} pending vitals entries")
-            
-            # Group entries by user and date for efficient aggregation
-            user_date_groups = {}
-            for entry in pending_entries:
-                uid = entry.user_id
-                entry_date = entry.start_date.date()
-                key = (uid, entry_date)
-                
-                if key not in user_date_groups:
-                    user_date_groups[key] = []
-                user_date_groups[key].append(entry)
-            
-            # Mark entries as processing
-            entry_ids = [entry.id for entry in pending_entries]
-            VitalsCRUD.mark_aggregation_processing(db, entry_ids)
-            db.commit()  # Commit status updates immediately
-            
             processed_count = 0
             
-            # Process each user-date group
-            for (uid, target_date), group_entries in user_date_groups.items():
-                try:
-                    # Step 1: Copy raw data to categorized table with LOINC code mapping
-                    categorized_count = VitalsCRUD.copy_raw_to_categorized_with_loinc(db, uid, target_date)
-                    logger.debug(f"   📋 Categorized {categorized_count} vitals records with LOINC codes")
-                    
-                    # Step 2: Aggregate hourly data first
-                    hourly_count = VitalsCRUD.aggregate_hourly_data(db, uid, target_date)
-                    
-                    # Then aggregate daily data
-                    daily_count = VitalsCRUD.aggregate_daily_data(db, uid, target_date)
-                    
-                    # Calculate week start (Monday) for weekly aggregation
-                    days_since_monday = target_date.weekday()
-                    week_start = target_date - timedelta(days=days_since_monday)
-                    
-                    # Aggregate weekly data
-                    weekly_count = VitalsCRUD.aggregate_weekly_data(db, uid, week_start)
-                    
-                    # Aggregate monthly data
-                    monthly_count = VitalsCRUD.aggregate_monthly_data(db, uid, target_date.year, target_date.month)
-                    
-                    # Step 3: Mark categorized records as aggregated after successful aggregation
-                    aggregated_count = VitalsCRUD.mark_categorized_aggregation_completed(db, uid, target_date)
-                    
-                    logger.info(
-                        f"   User {uid}: {hourly_count} hourly, {daily_count} daily, "
-                        f"{weekly_count} weekly, {monthly_count} monthly vitals aggregates; "
-                        f"marked {aggregated_count} categorized records as aggregated"
-                    )
-                    
-                    # Commit after each user-date aggregation to release locks
-                    db.commit()
-                    
-                    processed_count += len(group_entries)
-                    
-                except Exception as e:
-                    db.rollback()  # Rollback failed transaction
-                    logger.error(f"❌ Vitals aggregation failed for user {uid} on {target_date}: {e}")
-                    
-                    # Mark entries as failed
-                    group_entry_ids = [entry.id for entry in group_entries]
-                    VitalsCRUD.mark_aggregation_failed(db, group_entry_ids, str(e))
-                    db.commit()  # Commit failure status
+            if user_id is not None:
+                user_id = int(user_id)
+                processed_count += self._drain_user_vitals(db, user_id, deadline)[0]
+            
+            if time.monotonic() < deadline:
+                processed_count += self._sweep_pending_vitals(db, deadline, skip_user_id=user_id)
+            else:
+                logger.info("⏱️  Vitals drain time budget spent; remaining work is left for the next trigger")
             
             logger.info(f"✅ Pending vitals processing completed: {processed_count} entries processed")
             return True
@@ -409,6 +424,114 @@ class MLWorker:
         finally:
             db.close()
     
+    def _drain_user_vitals(
+        self,
+        db: Session,
+        user_id: int,
+        deadline: float,
+        after_id: int = 0,
+        max_batches: Optional[int] = None
+    ) -> Tuple[int, int, int]:
+        """
+        Drain one user's pending vitals in id order, starting after ``after_id``.
+        
+        The keyset cursor means rows that fail are not retried within the same drain.
+        Returns (entries processed, entries claimed, cursor to resume from).
+        """
+        from app.crud.vitals import VitalsCRUD
+        
+        processed_count = claimed_count = 0
+        with VitalsCRUD.user_drain_lock(user_id) as acquired:
+            if not acquired:
+                logger.info(f"   User {user_id} vitals are being drained by another worker, skipping")
+                return 0, 0, after_id
+            
+            batches = 0
+            while time.monotonic() < deadline and (max_batches is None or batches < max_batches):
+                claimed = VitalsCRUD.claim_pending_entries(db, user_id, after_id, DRAIN_BATCH_SIZE)
+                if not claimed:
+                    break
+                after_id = claimed[-1].id
+                batches += 1
+                claimed_count += len(claimed)
+                processed_count += self._aggregate_claimed_vitals(db, user_id, claimed)
+        
+        return processed_count, claimed_count, after_id
+    
+    def _aggregate_claimed_vitals(self, db: Session, user_id: int, claimed: list) -> int:
+        """Categorize and roll up one claimed page of a user's vitals"""
+        from app.crud.vitals import VitalsCRUD
+        from app.crud.vitals_rollup import VitalsRollupCRUD
+        
+        target_dates = sorted({row.start_date.date() for row in claimed})
+        try:
+            # Step 1: Copy raw data to categorized table with LOINC code mapping
+            categorized_count = 0
+            for target_date in target_dates:
+                categorized_count += VitalsCRUD.copy_raw_to_categorized_with_loinc(db, user_id, target_date)
+            logger.debug(f"   📋 Categorized {categorized_count} vitals records with LOINC codes")
+            
+            # Step 2: Set-based hourly -> daily -> weekly (Monday start) -> monthly rollup
+            rollup_counts = VitalsRollupCRUD.rollup_days(db, user_id, target_dates, commit=False)
+            
+            # Step 3: Mark categorized records as aggregated after successful aggregation
+            aggregated_count = 0
+            for target_date in target_dates:
+                aggregated_count += VitalsCRUD.mark_categorized_aggregation_completed(db, user_id, target_date)
+            
+            logger.info(
+                f"   User {user_id} ({len(claimed)} entries, {len(target_dates)} day(s)): {rollup_counts['hourly']} hourly, "
+                f"{rollup_counts['daily']} daily, {rollup_counts['weekly']} weekly, "
+                f"{rollup_counts['monthly']} monthly vitals aggregates; "
+                f"marked {aggregated_count} categorized records as aggregated"
+            )
+            
+            # Commit after each page to release locks
+            db.commit()
+            return len(claimed)
+        
+        except Exception as e:
+            db.rollback()  # Rollback failed transaction
+            logger.error(f"❌ Vitals aggregation failed for user {user_id} on {target_dates[0]}..{target_dates[-1]}: {e}")
+            
+            # Mark entries as failed
+            VitalsCRUD.mark_aggregation_failed(db, [row.id for row in claimed], str(e))
+            db.commit()  # Commit failure status
+            return 0
+    
+    def _sweep_pending_vitals(self, db: Session, deadline: float, skip_user_id: Optional[int] = None) -> int:
+        """
+        Fair global sweep for stragglers: round-robin over users with pending rows
+        in user id order, one page per user per round, until empty or out of time.
+        """
+        from app.crud.vitals import VitalsCRUD
+        
+        processed_count = 0
+        cursors: Dict[int, int] = {}  # user id -> keyset cursor, so failed rows are not retried this sweep
+        while time.monotonic() < deadline:
+            round_claimed = 0
+            after_user_id = 0
+            while time.monotonic() < deadline:
+                user_ids = VitalsCRUD.get_users_with_pending_entries(db, after_user_id, SWEEP_USERS_PAGE_SIZE)
+                if not user_ids:
+                    break
+                after_user_id = user_ids[-1]
+                for uid in user_ids:
+                    if uid == skip_user_id or time.monotonic() >= deadline:
+                        continue
+                    processed, claimed, cursors[uid] = self._drain_user_vitals(
+                        db, uid, deadline, after_id=cursors.get(uid, 0), max_batches=1
+                    )
+                    processed_count += processed
+                    round_claimed += claimed
+            if round_claimed == 0:
+                # Nothing claimable left: empty, locked by other workers, or only rows that failed this sweep
+                break
+        
+        if processed_count:
+            logger.info(f"🧹 Vitals sweep processed {processed_count} straggler entries")
+        return processed_count
+    
     def _process_pending_nutrition(self, job_data: Dict[str, Any]) -> bool:
         """
         Process all pending nutrition data for a user
@@ -509,6 +632,28 @@ class MLWorker:
         finally:
             db.close()
     
+    def _process_stale_health_scores(self, job_data: Dict[str, Any]) -> bool:
+        """
+        Recompute daily health scores invalidated by new aggregates
+        
+        Aggregation marks users in health_score_dirty; this claims a batch of them
+        (or only job_data['user_id']) and rewrites today's and affected stored scores.
+        """
+        from app.health_scoring.invalidation import recompute_stale_scores
+        
+        db = SessionLocal()
+        try:
+            written = recompute_stale_scores(db, user_id=job_data.get('user_id'))
+            if written:
+                logger.info(f"💯 Recomputed {written} stale daily health score(s)")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Health score recompute failed: {e}", exc_info=True)
+            db.rollback()
+            return False
+        finally:
+            db.close()
+    
     def delete_message(self, receipt_handle: str) -> bool:
         """Delete message from SQS queue"""
         try:
@@ -518,11 +663,191 @@ class MLWorker:
             )
             logger.info("🗑️  Message deleted from queue")
             return True
-        
+
         except ClientError as e:
             logger.error(f"❌ Error deleting message from SQS: {e}")
             return False
-    
+
+    def delete_messages(self, receipt_handles: List[str]) -> int:
+        """Delete messages with DeleteMessageBatch (10 per call); returns the number deleted"""
+        deleted = 0
+        for i in range(0, len(receipt_handles), SQS_BATCH_LIMIT):
+            chunk = receipt_handles[i:i + SQS_BATCH_LIMIT]
+            try:
+                response = self.sqs_client.delete_message_batch(
+                    QueueUrl=SQS_QUEUE_URL,
+                    Entries=[{'Id': str(n), 'ReceiptHandle': handle} for n, handle in enumerate(chunk)]
+                )
+                deleted += len(response.get('Successful', []))
+                for failure in response.get('Failed', []):
+                    logger.warning(f"⚠️  Failed to delete message: {failure.get('Code')} {failure.get('Message', '')}")
+            except ClientError as e:
+                logger.error(f"❌ Error batch deleting messages from SQS: {e}")
+        if deleted:
+            logger.info(f"🗑️  Deleted {deleted} message(s) from queue")
+        return deleted
+
+    def _flush_acks(self):
+        with self._lock:
+            acks, self._acks = self._acks, []
+        if acks:
+            self.delete_messages(acks)
+
+    def _extend_visibility(self):
+        """Push back the visibility timeout of messages whose jobs are still queued or running"""
+        now = time.time()
+        renew_before = now + VISIBILITY_TIMEOUT / 3
+        with self._lock:
+            due = [
+                handle for handle, state in self._in_flight.items()
+                if state['visible_until'] <= renew_before and now - state['received_at'] < MAX_VISIBILITY_SECONDS
+            ]
+        for i in range(0, len(due), SQS_BATCH_LIMIT):
+            chunk = due[i:i + SQS_BATCH_LIMIT]
+            try:
+                response = self.sqs_client.change_message_visibility_batch(
+                    QueueUrl=SQS_QUEUE_URL,
+                    Entries=[
+                        {'Id': str(n), 'ReceiptHandle': handle, 'VisibilityTimeout': VISIBILITY_TIMEOUT}
+                        for n, handle in enumerate(chunk)
+                    ]
+                )
+                with self._lock:
+                    for entry in response.get('Successful', []):
+                        state = self._in_flight.get(chunk[int(entry['Id'])])
+                        if state is not None:
+                            state['visible_until'] = now + VISIBILITY_TIMEOUT
+                for failure in response.get('Failed', []):
+                    logger.warning(f"⚠️  Failed to extend visibility: {failure.get('Code')} {failure.get('Message', '')}")
+            except ClientError as e:
+                logger.error(f"❌ Error extending message visibility: {e}")
+
+    @staticmethod
+    def _serialization_key(body: Dict[str, Any]) -> Optional[str]:
+        job_type = body.get('job_type')
+        if job_type in DRAIN_SERIALIZATION_KEYS:
+            return DRAIN_SERIALIZATION_KEYS[job_type]
+        user_id = body.get('user_id')
+        return f"user:{user_id}" if user_id is not None else None
+
+    def _has_pending(self, job_type: str) -> bool:
+        """Cheap check used between passes of a coalesced drain job"""
+        db = SessionLocal()
+        try:
+            if job_type == 'process_pending_vitals':
+                from app.crud.vitals import VitalsCRUD
+                return bool(VitalsCRUD.get_pending_aggregation_entries(db, limit=1))
+            if job_type == 'process_pending_nutrition':
+                from app.crud.nutrition import nutrition_data as NutritionCRUD
+                return bool(NutritionCRUD.get_pending_aggregation_entries(db, limit=1))
+            if job_type == 'process_pending_labs':
+                return bool(self.crud.get_pending_categorization_entries(db, limit=1))
+            if job_type == 'recompute_health_scores':
+                from app.health_scoring.models import HealthScoreDirty
+                return db.query(HealthScoreDirty.user_id).first() is not None
+            return False
+        except Exception as e:
+            logger.warning(f"⚠️  Pending check failed for {job_type}: {e}")
+            return False
+        finally:
+            db.close()
+
+    def _run_job(self, job: _Job) -> bool:
+        """Run a job; a coalesced drain runs once per merged message until nothing is pending"""
+        passes = len(job.messages) if job.coalesce_key else 1
+        success = self.process_job(job.body, job.message_id)
+        for _ in range(passes - 1):
+            if not success or shutdown_flag or not self._has_pending(job.body.get('job_type')):
+                break
+            success = self.process_job(job.body, job.message_id)
+        return success
+
+    def _enqueue(self, message: Dict[str, Any]):
+        """Track a received message and schedule it, merging duplicate triggers"""
+        now = time.time()
+        with self._lock:
+            self._in_flight[message['ReceiptHandle']] = {'received_at': now, 'visible_until': now + VISIBILITY_TIMEOUT}
+
+        try:
+            body = json.loads(message['Body'])
+        except json.JSONDecodeError as e:
+            # Left on the queue so it reaches the dead-letter queue after maxReceiveCount
+            logger.error(f"❌ Invalid JSON in message {message['MessageId']}: {e}")
+            self._record_result(False)
+            with self._lock:
+                self._in_flight.pop(message['ReceiptHandle'], None)
+            return
+
+        job_type = body.get('job_type')
+        coalesce_key = (job_type, body.get('user_id')) if job_type in COALESCED_JOB_TYPES else None
+
+        with self._lock:
+            existing = self._unstarted.get(coalesce_key) if coalesce_key else None
+            if existing is not None:
+                existing.messages.append(message)
+                self.coalesced_count += 1
+                return
+
+            job = _Job(body, message, coalesce_key, self._serialization_key(body))
+            if coalesce_key:
+                self._unstarted[coalesce_key] = job
+
+            key = job.serialization_key
+            if key is not None and key in self._active_keys:
+                self._waiting.setdefault(key, deque()).append(job)
+            else:
+                if key is not None:
+                    self._active_keys.add(key)
+                self._submit(job)
+
+    def _submit(self, job: _Job):
+        # Caller holds self._lock
+        self._running += 1
+        self._executor.submit(self._execute, job)
+
+    def _execute(self, job: _Job):
+        with self._lock:
+            # Once started, later duplicates must trigger a fresh run
+            if job.coalesce_key and self._unstarted.get(job.coalesce_key) is job:
+                del self._unstarted[job.coalesce_key]
+
+        try:
+            success = self._run_job(job)
+        except Exception as e:
+            logger.error(f"❌ Unexpected error running job {job.message_id}: {e}", exc_info=True)
+            success = False
+
+        with self._lock:
+            handles = [message['ReceiptHandle'] for message in job.messages]
+            for handle in handles:
+                self._in_flight.pop(handle, None)
+            if success:
+                self._acks.extend(handles)
+            else:
+                logger.warning(f"⚠️  Job {job.message_id} failed, {len(handles)} message(s) will retry after visibility timeout")
+
+            self._running -= 1
+            key = job.serialization_key
+            if key is not None:
+                queue = self._waiting.get(key)
+                if queue and not shutdown_flag:
+                    self._submit(queue.popleft())
+                else:
+                    self._active_keys.discard(key)
+                if queue is not None and not queue:
+                    self._waiting.pop(key, None)
+        self._progress.set()
+
+    def _drop_unstarted(self):
+        """On shutdown, forget queued jobs; their messages become visible again"""
+        with self._lock:
+            for queue in self._waiting.values():
+                for job in queue:
+                    for message in job.messages:
+                        self._in_flight.pop(message['ReceiptHandle'], None)
+            self._waiting.clear()
+            self._unstarted.clear()
+
     def log_stats(self):
         """Log worker statistics"""
         uptime = (datetime.utcnow() - self.start_time).total_seconds()
@@ -530,57 +855,74 @@ class MLWorker:
         logger.info(f"   Uptime: {uptime:.0f}s")
         logger.info(f"   Processed: {self.processed_count}")
         logger.info(f"   Errors: {self.error_count}")
+        logger.info(f"   Coalesced: {self.coalesced_count}")
+        logger.info(f"   In flight: {len(self._in_flight)} message(s), {self._running} job(s) running")
         if self.processed_count > 0:
             logger.info(f"   Success Rate: {(self.processed_count/(self.processed_count+self.error_count))*100:.1f}%")
-    
+
     def run(self):
         """Main worker loop"""
         logger.info("🎯 ML Worker started, polling for messages...")
-        
+
         # Initialize AWS
         self.initialize_aws()
-        
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ml-job")
+
         # Stats logging interval
         last_stats_time = time.time()
         stats_interval = 300  # Log stats every 5 minutes
-        
-        while not shutdown_flag:
-            try:
-                # Receive messages
-                messages = self.receive_messages()
-                
-                if not messages:
-                    # No messages, continue polling
-                    continue
-                
-                # Process each message
-                for message in messages:
-                    if shutdown_flag:
-                        logger.info("⚠️  Shutdown flag set, stopping message processing")
+
+        try:
+            while not shutdown_flag:
+                try:
+                    self._flush_acks()
+                    self._extend_visibility()
+
+                    with self._lock:
+                        busy = bool(self._in_flight)
+                        capacity = MAX_IN_FLIGHT_MESSAGES - len(self._in_flight)
+
+                    if capacity <= 0:
+                        # Saturated: wait for a job to finish instead of receiving more
+                        self._progress.wait(timeout=1)
+                        self._progress.clear()
+                        continue
+
+                    # Poll briefly while work is outstanding so acks and heartbeats stay timely
+                    messages = self.receive_messages(
+                        max_messages=min(MAX_MESSAGES, capacity),
+                        wait_time=min(WAIT_TIME_SECONDS, 1) if busy else WAIT_TIME_SECONDS
+                    )
+                    for message in messages:
+                        self._enqueue(message)
+
+                    # Log stats periodically
+                    if time.time() - last_stats_time > stats_interval:
+                        self.log_stats()
+                        last_stats_time = time.time()
+
+                except KeyboardInterrupt:
+                    logger.info("⚠️  Received keyboard interrupt, shutting down...")
+                    break
+
+                except Exception as e:
+                    logger.error(f"❌ Unexpected error in worker loop: {e}", exc_info=True)
+                    time.sleep(5)  # Wait before retrying
+        finally:
+            # Let running jobs finish (keeping their messages invisible), then acknowledge them
+            logger.info("⚠️  Shutdown flag set, waiting for running jobs...")
+            self._drop_unstarted()
+            while True:
+                with self._lock:
+                    if self._running == 0:
                         break
-                    
-                    # Process the message
-                    success = self.process_message(message)
-                    
-                    # Delete message if successful
-                    if success:
-                        self.delete_message(message['ReceiptHandle'])
-                    else:
-                        logger.warning("⚠️  Message processing failed, will retry after visibility timeout")
-                
-                # Log stats periodically
-                if time.time() - last_stats_time > stats_interval:
-                    self.log_stats()
-                    last_stats_time = time.time()
-            
-            except KeyboardInterrupt:
-                logger.info("⚠️  Received keyboard interrupt, shutting down...")
-                break
-            
-            except Exception as e:
-                logger.error(f"❌ Unexpected error in worker loop: {e}", exc_info=True)
-                time.sleep(5)  # Wait before retrying
-        
+                self._extend_visibility()
+                self._flush_acks()
+                self._progress.wait(timeout=1)
+                self._progress.clear()
+            self._executor.shutdown(wait=True)
+            self._flush_acks()
+
         # Final stats
         logger.info("🛑 ML Worker shutting down...")
         self.log_stats()
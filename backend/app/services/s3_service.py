@@ -1,5 +1,6 @@
 import os
-from typing import Optional, Tuple
+import threading
+from typing import Dict, Optional, Tuple
 
 from app.core.config import settings
 
@@ -12,18 +13,29 @@ except Exception:
     _BOTO_AVAILABLE = False
 
 
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+
 def _get_s3_client():
+    """Shared S3 client; boto3 clients are thread-safe and pool their connections"""
+    global _s3_client
     if not _BOTO_AVAILABLE:
         raise RuntimeError("boto3 is not available; install boto3 to use S3 uploads")
-    client_kwargs = {}
-    if settings.AWS_REGION:
-        client_kwargs["region_name"] = settings.AWS_REGION
-    elif settings.AWS_DEFAULT_REGION:
-        client_kwargs["region_name"] = settings.AWS_DEFAULT_REGION
-    if settings.AWS_ACCESS_KEY_ID and settings.AWS_SECRET_ACCESS_KEY:
-        client_kwargs["aws_access_key_id"] = settings.AWS_ACCESS_KEY_ID
-        client_kwargs["aws_secret_access_key"] = settings.AWS_SECRET_ACCESS_KEY
-    return boto3.client("s3", **client_kwargs)
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                client_kwargs = {}
+                if settings.AWS_REGION:
+                    client_kwargs["region_name"] = settings.AWS_REGION
+                elif settings.AWS_DEFAULT_REGION:
+                    client_kwargs["region_name"] = settings.AWS_DEFAULT_REGION
+                if settings.AWS_ACCESS_KEY_ID and settings.AWS_SECRET_ACCESS_KEY:
+                    client_kwargs["aws_access_key_id"] = settings.AWS_ACCESS_KEY_ID
+                    client_kwargs["aws_secret_access_key"] = settings.AWS_SECRET_ACCESS_KEY
+                client_kwargs["config"] = Config(max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS)
+                _s3_client = boto3.client("s3", **client_kwargs)
+    return _s3_client
 
 
 def upload_bytes_and_get_uri(bucket: str, key: str, data: bytes, content_type: Optional[str] = None) -> str:
@@ -43,6 +55,48 @@ def upload_bytes_and_get_uri(bucket: str, key: str, data: bytes, content_type: O
     return f"s3://{bucket}/{key}"
 
 
+def upload_file_and_get_uri(
+    bucket: str,
+    key: str,
+    path: str,
+    content_type: Optional[str] = None,
+    metadata: Optional[Dict[str, str]] = None,
+) -> str:
+    """
+    Upload a local file to S3 and return an s3:// URI.
+    Files above UPLOADS_MULTIPART_THRESHOLD_BYTES go up as a multipart upload,
+    so the file is never held in memory whole.
+    """
+    if not bucket or str(bucket).strip() == "":
+        raise RuntimeError("S3 bucket is empty. Set AWS_S3_BUCKET or disable USE_S3_UPLOADS.")
+    from boto3.s3.transfer import TransferConfig
+    s3 = _get_s3_client()
+    extra_args = {}
+    if content_type:
+        extra_args["ContentType"] = content_type
+    if metadata:
+        extra_args["Metadata"] = metadata
+    transfer_config = TransferConfig(
+        multipart_threshold=settings.UPLOADS_MULTIPART_THRESHOLD_BYTES,
+        multipart_chunksize=settings.UPLOADS_MULTIPART_CHUNK_BYTES,
+    )
+    try:
+        s3.upload_file(path, bucket, key, ExtraArgs=extra_args or None, Config=transfer_config)
+    except (BotoCoreError, ClientError) as e:
+        raise RuntimeError(f"Failed to upload to S3 s3://{bucket}/{key}: {e}")
+    return f"s3://{bucket}/{key}"
+
+
+def object_exists(bucket: str, key: str) -> bool:
+    """True if s3://bucket/key exists; lookup errors are treated as absent"""
+    s3 = _get_s3_client()
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+        return True
+    except (BotoCoreError, ClientError):
+        return False
+
+
 def is_s3_uri(path: str) -> bool:
     return path.startswith("s3://")
 
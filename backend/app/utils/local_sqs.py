@@ -0,0 +1,169 @@
+"""
+In-process stand-in for the SQS API used by the ML worker and its client.
+
+Queue URLs of the form ``local://<name>`` resolve to a LocalSQSQueue shared by
+everything in the process, so the API (MLWorkerClient) and an MLWorker running
+in the same process can exchange jobs without AWS. Only the calls this codebase
+makes are implemented, with SQS semantics where they matter: long polling,
+visibility timeouts, per-receive receipt handles and batch results.
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import boto3
+
+LOCAL_QUEUE_PREFIX = "local://"
+
+
+class LocalSQSQueue:
+    """Thread-safe in-memory queue exposing a subset of the boto3 SQS client API"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._messages: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # message_id -> message state
+        self._receipts: Dict[str, str] = {}  # receipt_handle -> message_id
+        self._cond = threading.Condition()
+
+    # ----- helpers -----
+
+    def _visible(self, now: float) -> List[Dict[str, Any]]:
+        return [m for m in self._messages.values() if m["visible_at"] <= now]
+
+    def _resolve(self, receipt_handle: str) -> Optional[Dict[str, Any]]:
+        message_id = self._receipts.get(receipt_handle)
+        message = self._messages.get(message_id) if message_id else None
+        # Like SQS, only the handle from the latest receive is valid
+        if message is None or message["receipt_handle"] != receipt_handle:
+            return None
+        return message
+
+    def _forget(self, message: Dict[str, Any]):
+        self._messages.pop(message["MessageId"], None)
+        self._receipts.pop(message["receipt_handle"], None)
+
+    # ----- SQS API subset -----
+
+    def send_message(self, QueueUrl: str, MessageBody: str, MessageAttributes: Optional[Dict] = None, DelaySeconds: int = 0, **kwargs) -> Dict[str, Any]:
+        message_id = str(uuid.uuid4())
+        with self._cond:
+            self._messages[message_id] = {
+                "MessageId": message_id,
+                "Body": MessageBody,
+                "MessageAttributes": MessageAttributes or {},
+                "visible_at": time.monotonic() + DelaySeconds,
+                "receive_count": 0,
+                "receipt_handle": None,
+            }
+            self._cond.notify_all()
+        return {"MessageId": message_id}
+
+    def receive_message(self, QueueUrl: str, MaxNumberOfMessages: int = 1, WaitTimeSeconds: int = 0, VisibilityTimeout: int = 30, **kwargs) -> Dict[str, Any]:
+        deadline = time.monotonic() + WaitTimeSeconds
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                visible = self._visible(now)
+                if visible or now >= deadline:
+                    break
+                next_visible = min((m["visible_at"] for m in self._messages.values()), default=deadline)
+                self._cond.wait(timeout=max(0.01, min(deadline, next_visible) - now))
+
+            received = []
+            for message in visible[:max(1, min(10, MaxNumberOfMessages))]:
+                if message["receipt_handle"]:
+                    self._receipts.pop(message["receipt_handle"], None)
+                message["receipt_handle"] = uuid.uuid4().hex
+                message["receive_count"] += 1
+                message["visible_at"] = now + VisibilityTimeout
+                self._receipts[message["receipt_handle"]] = message["MessageId"]
+                received.append({
+                    "MessageId": message["MessageId"],
+                    "ReceiptHandle": message["receipt_handle"],
+                    "Body": message["Body"],
+                    "Attributes": {"ApproximateReceiveCount": str(message["receive_count"])},
+                    "MessageAttributes": message["MessageAttributes"],
+                })
+        return {"Messages": received} if received else {}
+
+    def delete_message(self, QueueUrl: str, ReceiptHandle: str, **kwargs) -> Dict[str, Any]:
+        with self._cond:
+            message = self._resolve(ReceiptHandle)
+            if message is not None:
+                self._forget(message)
+        return {}
+
+    def delete_message_batch(self, QueueUrl: str, Entries: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        successful, failed = [], []
+        with self._cond:
+            for entry in Entries:
+                message = self._resolve(entry["ReceiptHandle"])
+                if message is None:
+                    failed.append({"Id": entry["Id"], "Code": "ReceiptHandleIsInvalid", "SenderFault": True})
+                    continue
+                self._forget(message)
+                successful.append({"Id": entry["Id"]})
+        return {"Successful": successful, "Failed": failed}
+
+    def change_message_visibility_batch(self, QueueUrl: str, Entries: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        successful, failed = [], []
+        with self._cond:
+            now = time.monotonic()
+            for entry in Entries:
+                message = self._resolve(entry["ReceiptHandle"])
+                if message is None:
+                    failed.append({"Id": entry["Id"], "Code": "ReceiptHandleIsInvalid", "SenderFault": True})
+                    continue
+                message["visible_at"] = now + int(entry["VisibilityTimeout"])
+                successful.append({"Id": entry["Id"]})
+            self._cond.notify_all()
+        return {"Successful": successful, "Failed": failed}
+
+    def get_queue_attributes(self, QueueUrl: str, AttributeNames: Optional[List[str]] = None, **kwargs) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            visible = len(self._visible(now))
+            in_flight = len(self._messages) - visible
+        return {"Attributes": {
+            "ApproximateNumberOfMessages": str(visible),
+            "ApproximateNumberOfMessagesNotVisible": str(in_flight),
+        }}
+
+    # ----- test helpers -----
+
+    def send_json(self, body: Dict[str, Any]) -> str:
+        return self.send_message(QueueUrl=f"{LOCAL_QUEUE_PREFIX}{self.name}", MessageBody=json.dumps(body))["MessageId"]
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._messages)
+
+
+_local_queues: Dict[str, LocalSQSQueue] = {}
+_local_queues_lock = threading.Lock()
+
+
+def is_local_queue_url(queue_url: Optional[str]) -> bool:
+    return bool(queue_url) and queue_url.startswith(LOCAL_QUEUE_PREFIX)
+
+
+def get_local_queue(queue_url: str) -> LocalSQSQueue:
+    """Return the process-wide LocalSQSQueue for a local:// URL"""
+    name = queue_url[len(LOCAL_QUEUE_PREFIX):] if is_local_queue_url(queue_url) else queue_url
+    with _local_queues_lock:
+        queue = _local_queues.get(name)
+        if queue is None:
+            queue = LocalSQSQueue(name)
+            _local_queues[name] = queue
+        return queue
+
+
+def create_sqs_client(queue_url: Optional[str], region_name: str):
+    """boto3 SQS client, or the in-process stand-in for local:// queue URLs"""
+    if is_local_queue_url(queue_url):
+        return get_local_queue(queue_url)
+    return boto3.client('sqs', region_name=region_name)
@@ -0,0 +1,204 @@
+"""
+Persistent, cross-worker cache for LOINC code selections.
+
+Lab reports repeat the same test names, and every uncached lookup costs an
+embedding call, a pgvector scan and an LLM round trip. Selections are keyed by
+the normalized (test_name, category, unit) plus the mapper version, stored in
+the loinc_mapping_cache table and fronted by Redis so every API/ML worker
+shares them. Unresolvable tests are cached as negative results with a shorter
+expiry so they are retried eventually.
+"""
+import hashlib
+import json
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database_utils import get_db_session
+from app.models.lab_test_mapping import LOINCMappingCache
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "loinc_cache"
+
+
+def normalize_component(value: Optional[str]) -> str:
+    """Lowercase, trim and collapse whitespace so trivially different spellings share a key"""
+    return re.sub(r"\s+", " ", (value or "").strip().lower())
+
+
+@dataclass
+class CachedLOINC:
+    """A cached LOINC selection (loinc_code is None for negative results)"""
+    loinc_code: Optional[str]
+    loinc_source: Optional[str]
+    confidence: Optional[float]
+    is_negative: bool
+
+    def as_tuple(self) -> Tuple[Optional[str], Optional[str]]:
+        return self.loinc_code, self.loinc_source
+
+
+class LOINCMappingCacheService:
+    """Redis-fronted Postgres cache of LOINC code selections"""
+
+    def __init__(self, version: Optional[str] = None):
+        self.version = version or f"{settings.LOINC_MAPPER_VERSION}:{settings.LAB_AGGREGATION_AGENT_MODEL or 'default'}"
+        self._redis = None
+        self._redis_unavailable = False
+
+    def _get_redis(self):
+        if self._redis is None and not self._redis_unavailable:
+            try:
+                from app.core.redis import redis_client
+                self._redis = redis_client
+            except Exception as e:
+                logger.warning(f"⚠️ [LOINCCache] Redis unavailable, using Postgres only: {e}")
+                self._redis_unavailable = True
+        return self._redis
+
+    def make_key(self, test_name: str, test_category: Optional[str], unit: Optional[str]) -> Tuple[str, str, str, str]:
+        """Return (cache_key, name, category, unit) for the normalized lookup"""
+        name = normalize_component(test_name)
+        category = normalize_component(test_category)
+        unit_norm = normalize_component(unit)
+        digest = hashlib.sha256(
+            json.dumps([self.version, name, category, unit_norm]).encode("utf-8")
+        ).hexdigest()
+        return digest, name, category, unit_norm
+
+    def _redis_get(self, cache_key: str) -> Optional[CachedLOINC]:
+        client = self._get_redis()
+        if not client:
+            return None
+        try:
+            raw = client.get(f"{REDIS_KEY_PREFIX}:{cache_key}")
+            if raw:
+                return CachedLOINC(**json.loads(raw))
+        except Exception as e:
+            logger.debug(f"[LOINCCache] Redis get failed: {e}")
+        return None
+
+    def _redis_set(self, cache_key: str, entry: CachedLOINC):
+        client = self._get_redis()
+        if not client:
+            return
+        ttl = settings.LOINC_CACHE_NEGATIVE_TTL_SECONDS if entry.is_negative else settings.LOINC_CACHE_REDIS_TTL_SECONDS
+        try:
+            client.setex(f"{REDIS_KEY_PREFIX}:{cache_key}", ttl, json.dumps(entry.__dict__))
+        except Exception as e:
+            logger.debug(f"[LOINCCache] Redis set failed: {e}")
+
+    def get(self, db: Session, test_name: str, test_category: Optional[str], unit: Optional[str]) -> Optional[CachedLOINC]:
+        """Look up a cached selection (Redis first, then Postgres); None means not cached"""
+        cache_key, _, _, _ = self.make_key(test_name, test_category, unit)
+
+        entry = self._redis_get(cache_key)
+        if entry is not None:
+            return entry
+
+        row = db.query(LOINCMappingCache).filter(LOINCMappingCache.cache_key == cache_key).first()
+        if row is None:
+            return None
+        if row.is_negative and row.expires_at and row.expires_at < datetime.utcnow():
+            return None
+
+        row.hit_count = (row.hit_count or 0) + 1
+        entry = CachedLOINC(
+            loinc_code=row.loinc_code,
+            loinc_source=row.loinc_source,
+            confidence=row.confidence,
+            is_negative=row.is_negative,
+        )
+        self._redis_set(cache_key, entry)
+        return entry
+
+    def put(
+        self,
+        db: Session,
+        test_name: str,
+        test_category: Optional[str],
+        unit: Optional[str],
+        loinc_code: Optional[str],
+        loinc_source: Optional[str] = None,
+        confidence: Optional[float] = None,
+    ) -> CachedLOINC:
+        """Store a selection; a missing loinc_code is stored as a negative result"""
+        cache_key, name, category, unit_norm = self.make_key(test_name, test_category, unit)
+        is_negative = not loinc_code
+        expires_at = (
+            datetime.utcnow() + timedelta(seconds=settings.LOINC_CACHE_NEGATIVE_TTL_SECONDS)
+            if is_negative else None
+        )
+
+        values = {
+            "cache_key": cache_key,
+            "test_name_normalized": name[:255],
+            "test_category_normalized": category[:100],
+            "unit_normalized": unit_norm[:100],
+            "loinc_code": loinc_code,
+            "loinc_source": loinc_source,
+            "confidence": confidence,
+            "is_negative": is_negative,
+            "mapper_version": self.version,
+            "expires_at": expires_at,
+            "updated_at": datetime.utcnow(),
+        }
+        stmt = insert(LOINCMappingCache).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["cache_key"],
+            set_={k: stmt.excluded[k] for k in values if k != "cache_key"},
+        )
+        db.execute(stmt)
+
+        entry = CachedLOINC(
+            loinc_code=loinc_code,
+            loinc_source=loinc_source,
+            confidence=confidence,
+            is_negative=is_negative,
+        )
+        self._redis_set(cache_key, entry)
+        return entry
+
+    def get_or_resolve(
+        self,
+        test_name: str,
+        test_category: Optional[str],
+        unit: Optional[str],
+        resolver: Callable[[], Tuple[Optional[str], Optional[str], Optional[float]]],
+        refresh: bool = False,
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Return the cached selection or call ``resolver`` and cache its result.
+
+        ``resolver`` returns (loinc_code, loinc_source, confidence). Cache reads and
+        writes use their own short-lived session so they never touch the caller's
+        transaction, and cache failures never prevent resolution.
+        """
+        if not refresh:
+            try:
+                with get_db_session() as db:
+                    cached = self.get(db, test_name, test_category, unit)
+                if cached is not None:
+                    logger.debug(f"📦 [LOINCCache] Hit for '{test_name}' -> {cached.loinc_code or 'NO_MATCH'}")
+                    return cached.as_tuple()
+            except Exception as e:
+                logger.warning(f"⚠️ [LOINCCache] Lookup failed for '{test_name}': {e}")
+
+        loinc_code, loinc_source, confidence = resolver()
+
+        try:
+            with get_db_session() as db:
+                self.put(db, test_name, test_category, unit, loinc_code, loinc_source, confidence)
+        except Exception as e:
+            logger.warning(f"⚠️ [LOINCCache] Failed to store selection for '{test_name}': {e}")
+        return loinc_code, loinc_source
+
+
+loinc_mapping_cache = LOINCMappingCacheService()
@@ -9,9 +9,10 @@ import logging
 from typing import Dict, Any, Optional
 from datetime import datetime
 
-import boto3
 from botocore.exceptions import ClientError
 
+from app.utils.local_sqs import create_sqs_client
+
 logger = logging.getLogger(__name__)
 
 # Configuration
@@ -30,7 +31,7 @@ class MLWorkerClient:
         
         if self.enabled and self.queue_url:
             try:
-                self.sqs_client = boto3.client('sqs', region_name=AWS_REGION)
+                self.sqs_client = create_sqs_client(self.queue_url, AWS_REGION)
                 logger.info(f"✅ ML Worker SQS client initialized (queue: {self.queue_url})")
             except Exception as e:
                 logger.error(f"❌ Failed to initialize SQS client: {e}")
@@ -356,6 +357,71 @@ class MLWorkerClient:
             logger.error(f"❌ Unexpected error sending trigger to SQS: {e}")
             return None
     
+    def send_health_score_recompute_trigger(
+        self,
+        user_id: int,
+        priority: str = "normal"
+    ) -> Optional[str]:
+        """
+        Send a trigger to recompute a user's stale daily health scores
+        
+        Aggregation jobs already recompute stale scores when they finish; this is
+        for writers outside the ML worker (e.g. pharmacy bills) that mark scores
+        stale in health_score_dirty.
+        
+        Args:
+            user_id: User ID whose stale scores should be recomputed
+            priority: Job priority ("high", "normal", "low")
+        
+        Returns:
+            Message ID if successful, None otherwise
+        """
+        if not self.is_enabled():
+            logger.warning("ML Worker is not enabled, cannot send job")
+            return None
+        
+        try:
+            message_body = {
+                "job_type": "recompute_health_scores",
+                "user_id": user_id,
+                "priority": priority,
+                "submitted_at": datetime.utcnow().isoformat()
+            }
+            
+            # Send message to SQS
+            response = self.sqs_client.send_message(
+                QueueUrl=self.queue_url,
+                MessageBody=json.dumps(message_body),
+                MessageAttributes={
+                    'JobType': {
+                        'DataType': 'String',
+                        'StringValue': 'recompute_health_scores'
+                    },
+                    'Priority': {
+                        'DataType': 'String',
+                        'StringValue': priority
+                    },
+                    'UserId': {
+                        'DataType': 'Number',
+                        'StringValue': str(user_id)
+                    }
+                }
+            )
+            
+            message_id = response['MessageId']
+            logger.info(
+                f"✅ Health score recompute trigger sent to SQS "
+                f"(user: {user_id}, msg_id: {message_id})"
+            )
+            return message_id
+        
+        except ClientError as e:
+            logger.error(f"❌ Failed to send health score recompute trigger to SQS: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"❌ Unexpected error sending trigger to SQS: {e}")
+            return None
+    
     def get_queue_depth(self) -> Optional[int]:
         """
         Get approximate number of messages in queue
@@ -12,6 +12,17 @@ class TelemetryQuery:
     
     def __init__(self):
         self.redis = redis_client
+
+    def _get_spans(self, span_ids: List[str]) -> List[Dict[str, Any]]:
+        """Load span documents in one MGET, skipping expired ones"""
+        if not span_ids:
+            return []
+        values = self.redis.mget([f"telemetry:span:{span_id}" for span_id in span_ids])
+        return [json.loads(value) for value in values if value]
+
+    def _scan_keys(self, pattern: str) -> List[str]:
+        """Keys matching pattern via incremental SCAN (KEYS blocks Redis on large keyspaces)"""
+        return list(self.redis.scan_iter(match=pattern, count=1000))
     
     def get_recent_spans(self, limit: int = 100) -> List[Dict[str, Any]]:
         """Get most recent spans"""
@@ -19,13 +30,7 @@ class TelemetryQuery:
             # Get recent span IDs (sorted by timestamp)
             span_ids = self.redis.zrevrange("telemetry:recent_spans", 0, limit-1)
             
-            spans = []
-            for span_id in span_ids:
-                span_data = self.redis.get(f"telemetry:span:{span_id}")
-                if span_data:
-                    spans.append(json.loads(span_data))
-            
-            return spans
+            return self._get_spans(span_ids)
         except Exception as e:
             print(f"Error getting recent spans: {e}")
             return []
@@ -36,13 +41,7 @@ class TelemetryQuery:
             # Get span IDs for this agent
             span_ids = self.redis.zrevrange(f"telemetry:agent:{agent_name}", 0, limit-1)
             
-            spans = []
-            for span_id in span_ids:
-                span_data = self.redis.get(f"telemetry:span:{span_id}")
-                if span_data:
-                    spans.append(json.loads(span_data))
-            
-            return spans
+            return self._get_spans(span_ids)
         except Exception as e:
             print(f"Error getting agent spans: {e}")
             return []
@@ -53,11 +52,7 @@ class TelemetryQuery:
             # Get span IDs for this trace
             span_ids = self.redis.zrange(f"telemetry:trace:{trace_id}", 0, -1)
             
-            spans = []
-            for span_id in span_ids:
-                span_data = self.redis.get(f"telemetry:span:{span_id}")
-                if span_data:
-                    spans.append(json.loads(span_data))
+            spans = self._get_spans(span_ids)
             
             # Sort by start time
             spans.sort(key=lambda x: x.get('start_time', ''))
@@ -72,13 +67,7 @@ class TelemetryQuery:
             # Get span IDs for this session
             span_ids = self.redis.zrevrange(f"telemetry:session:{user_id}:{session_id}", 0, limit-1)
             
-            spans = []
-            for span_id in span_ids:
-                span_data = self.redis.get(f"telemetry:span:{span_id}")
-                if span_data:
-                    spans.append(json.loads(span_data))
-            
-            return spans
+            return self._get_spans(span_ids)
         except Exception as e:
             print(f"Error getting session spans: {e}")
             return []
@@ -92,18 +81,20 @@ class TelemetryQuery:
             stats['recent_spans_count'] = self.redis.zcard("telemetry:recent_spans")
             
             # Active agents
-            agent_keys = self.redis.keys("telemetry:agent:*")
+            agent_keys = self._scan_keys("telemetry:agent:*")
             stats['active_agents'] = len(agent_keys)
             
-            agent_stats = {}
+            pipe = self.redis.pipeline(transaction=False)
             for key in agent_keys:
+                pipe.zcard(key)
+            agent_stats = {}
+            for key, span_count in zip(agent_keys, pipe.execute()):
                 agent_name = key.split(":")[-1]
-                span_count = self.redis.zcard(key)
                 agent_stats[agent_name] = span_count
             stats['agent_spans'] = agent_stats
             
             # Active traces
-            trace_keys = self.redis.keys("telemetry:trace:*")
+            trace_keys = self._scan_keys("telemetry:trace:*")
             stats['active_traces'] = len(trace_keys)
             
             # Daily metrics
@@ -112,11 +103,10 @@ class TelemetryQuery:
             stats['todays_spans'] = int(daily_spans) if daily_spans else 0
             
             # Hourly metrics for last 24 hours
+            hour_keys = [(datetime.utcnow() - timedelta(hours=i)).strftime("%Y-%m-%d:%H") for i in range(24)]
+            hourly_counts = self.redis.mget([f"telemetry:metrics:spans:hourly:{hour_key}" for hour_key in hour_keys])
             hourly_stats = {}
-            for i in range(24):
-                hour_time = datetime.utcnow() - timedelta(hours=i)
-                hour_key = hour_time.strftime("%Y-%m-%d:%H")
-                hourly_count = self.redis.get(f"telemetry:metrics:spans:hourly:{hour_key}")
+            for hour_key, hourly_count in zip(hour_keys, hourly_counts):
                 hourly_stats[hour_key] = int(hourly_count) if hourly_count else 0
             stats['hourly_spans'] = hourly_stats
             
@@ -194,14 +184,14 @@ class TelemetryQuery:
             print(f"Cleaned up {removed} old spans from recent list")
             
             # Clean up agent indices
-            agent_keys = self.redis.keys("telemetry:agent:*")
+            agent_keys = self._scan_keys("telemetry:agent:*")
             for key in agent_keys:
                 removed = self.redis.zremrangebyscore(key, 0, cutoff_time)
                 if removed > 0:
                     print(f"Cleaned up {removed} old spans from {key}")
             
             # Clean up trace indices
-            trace_keys = self.redis.keys("telemetry:trace:*")
+            trace_keys = self._scan_keys("telemetry:trace:*")
             for key in trace_keys:
                 removed = self.redis.zremrangebyscore(key, 0, cutoff_time)
                 if removed > 0:
@@ -0,0 +1,192 @@
+"""
+Cached LOINC resolution for vitals metric types.
+
+The vitals_mappings table is small and changes rarely, so it is loaded once into
+an in-process index and refreshed after a TTL. Resolutions are memoized per
+normalized (metric_type, unit) key, which keeps categorization of a large sync at
+O(distinct metrics) lookups instead of one vitals_mappings scan per raw row.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ResolvedLOINC = Tuple[Optional[str], Optional[str]]  # (loinc_code, loinc_source)
+
+
+def _normalize(value: Optional[str]) -> str:
+    return (value or "").strip().lower()
+
+
+class VitalsLOINCResolver:
+    """In-process vitals_mappings index with TTL refresh and per-key memoization"""
+
+    def __init__(self, ttl_seconds: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.VITALS_LOINC_CACHE_TTL_SECONDS
+        self._lock = threading.RLock()
+        self._mappings: List[Dict[str, Any]] = []
+        self._exact: Dict[str, Dict[str, Any]] = {}
+        self._resolved: Dict[Tuple[str, str], ResolvedLOINC] = {}
+        self._loaded_at: Optional[float] = None
+        self._loinc_mapper = None
+        self._loinc_mapper_unavailable = False
+
+    def invalidate(self):
+        """Drop the index and memoized resolutions; the next lookup reloads vitals_mappings"""
+        with self._lock:
+            self._loaded_at = None
+            self._resolved.clear()
+
+    def _ensure_loaded(self, db: Session):
+        """Load vitals_mappings into memory if the index is missing or expired"""
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl_seconds:
+                return
+
+            rows = db.execute(text("""
+                SELECT vital_sign, loinc_code, loinc_source, units
+                FROM vitals_mappings
+                WHERE loinc_code IS NOT NULL
+            """)).fetchall()
+
+            self._mappings = [
+                {
+                    "vital_sign": _normalize(row.vital_sign),
+                    "loinc_code": row.loinc_code,
+                    "loinc_source": row.loinc_source,
+                    "units": _normalize(row.units),
+                }
+                for row in rows
+                if row.vital_sign
+            ]
+            self._exact = {m["vital_sign"]: m for m in self._mappings}
+            self._resolved.clear()
+            self._loaded_at = time.monotonic()
+            logger.info(f"🔄 [VitalsLOINCResolver] Loaded {len(self._mappings)} vitals mappings")
+
+    def _match_index(self, metric_type: str, unit: str) -> Optional[ResolvedLOINC]:
+        """Match against the in-memory index (same semantics as `vital_sign ILIKE '%metric%'`)"""
+        exact = self._exact.get(metric_type)
+        if exact:
+            return exact["loinc_code"], exact["loinc_source"]
+
+        candidates = [m for m in self._mappings if metric_type and metric_type in m["vital_sign"]]
+        if not candidates:
+            return None
+
+        # Prefer mappings that list the sample's unit, then the most specific (shortest) name
+        candidates.sort(key=lambda m: (not (unit and unit in m["units"]), len(m["vital_sign"])))
+        best = candidates[0]
+        return best["loinc_code"], best["loinc_source"]
+
+    def _get_loinc_mapper(self):
+        """Shared LabTestLOINCMapper for the process (constructed at most once)"""
+        if self._loinc_mapper is not None or self._loinc_mapper_unavailable:
+            return self._loinc_mapper
+        try:
+            from app.crud.lab_categorization import LabTestLOINCMapper, LOINC_MAPPER_AVAILABLE
+            if LOINC_MAPPER_AVAILABLE and LabTestLOINCMapper is not None:
+                self._loinc_mapper = LabTestLOINCMapper()
+                logger.info("🔧 [VitalsLOINCResolver] LOINC mapper initialized for vitals processing")
+            else:
+                self._loinc_mapper_unavailable = True
+        except Exception as e:
+            logger.warning(f"⚠️ [VitalsLOINCResolver] Failed to initialize LOINC mapper: {e}")
+            self._loinc_mapper_unavailable = True
+        return self._loinc_mapper
+
+    def _lookup_with_mapper(self, db: Session, metric_type: str, unit: Optional[str]) -> ResolvedLOINC:
+        """Fall back to the embedding + LLM mapper and persist any new mapping"""
+        loinc_mapper = self._get_loinc_mapper()
+        if not loinc_mapper:
+            logger.warning(f"⚠️ [VitalsLOINCResolver] LOINC mapper not available for vital sign: {metric_type}")
+            return None, None
+
+        from app.crud.lab_categorization import LabCategorizationCRUD
+
+        logger.info(f"🔍 [VitalsLOINCResolver] Looking up LOINC code for vital sign: {metric_type}")
+        loinc_code, loinc_source = LabCategorizationCRUD.get_loinc_code_for_test(
+            test_name=metric_type,
+            test_category="Vital Signs",
+            test_unit=unit,
+            reference_range=None,
+            loinc_mapper=loinc_mapper
+        )
+        if not loinc_code:
+            logger.warning(f"⚠️ [VitalsLOINCResolver] No LOINC code found for vital sign: {metric_type}")
+            return None, None
+
+        try:
+            db.execute(text("""
+                INSERT INTO vitals_mappings (vital_sign, loinc_code, property, units, system, description, loinc_source)
+                VALUES (:vital_sign, :loinc_code, :property, :units, :system, :description, :loinc_source)
+                ON CONFLICT (vital_sign) DO UPDATE SET
+                    loinc_code = EXCLUDED.loinc_code,
+                    property = EXCLUDED.property,
+                    units = EXCLUDED.units,
+                    system = EXCLUDED.system,
+                    description = EXCLUDED.description,
+                    loinc_source = EXCLUDED.loinc_source
+            """), {
+                "vital_sign": metric_type,
+                "loinc_code": loinc_code,
+                "property": "Vital Sign",
+                "units": unit,
+                "system": "Body",
+                "description": f"Auto-generated from vital sign: {metric_type}",
+                "loinc_source": loinc_source
+            })
+            logger.info(f"✅ [VitalsLOINCResolver] Added new mapping to vitals_mappings: '{metric_type}' -> '{loinc_code}'")
+        except Exception as e:
+            logger.warning(f"⚠️ [VitalsLOINCResolver] Failed to add mapping to vitals_mappings: {e}")
+
+        # Make the new mapping visible to later lookups without waiting for the TTL
+        entry = {
+            "vital_sign": _normalize(metric_type),
+            "loinc_code": loinc_code,
+            "loinc_source": loinc_source,
+            "units": _normalize(unit),
+        }
+        with self._lock:
+            self._mappings.append(entry)
+            self._exact[entry["vital_sign"]] = entry
+        return loinc_code, loinc_source
+
+    def resolve_many(
+        self, db: Session, keys: Iterable[Tuple[str, Optional[str]]]
+    ) -> Dict[Tuple[str, Optional[str]], ResolvedLOINC]:
+        """
+        Resolve LOINC codes for distinct (metric_type, unit) pairs.
+
+        Unresolvable pairs are memoized as (None, None) until the next refresh so the
+        mapper fallback is not retried for every batch.
+        """
+        self._ensure_loaded(db)
+
+        results: Dict[Tuple[str, Optional[str]], ResolvedLOINC] = {}
+        for metric_type, unit in set(keys):
+            cache_key = (_normalize(metric_type), _normalize(unit))
+            with self._lock:
+                cached = self._resolved.get(cache_key)
+            if cached is None:
+                cached = self._match_index(*cache_key)
+                if cached is None:
+                    cached = self._lookup_with_mapper(db, metric_type, unit)
+                with self._lock:
+                    self._resolved[cache_key] = cached
+            results[(metric_type, unit)] = cached
+        return results
+
+    def resolve(self, db: Session, metric_type: str, unit: Optional[str] = None) -> ResolvedLOINC:
+        """Resolve a single (metric_type, unit) pair"""
+        return self.resolve_many(db, [(metric_type, unit)])[(metric_type, unit)]
+
+
+vitals_loinc_resolver = VitalsLOINCResolver()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Measure event-loop lag while concurrent vitals bulk submissions are in flight.
+
+Runs the FastAPI app in-process (httpx ASGI transport) so the probe shares the
+event loop with the request handlers: any handler that blocks the loop on a
+database call shows up directly as probe lag. Requests are authenticated as an
+existing user via a dependency override and the API key middleware is disabled.
+
+Submitted points are real rows, so run it as a dedicated test user: a user that
+already has vitals not written by this script is refused. Every row is tagged
+with the run id and deleted when the run ends, including on failure.
+
+Usage:
+    # 50 concurrent clients, 20 bulk submissions each, 500 points per submission
+    python load_test_event_loop_lag.py --user-id 4242
+
+    # Heavier run with a stricter lag budget
+    python load_test_event_loop_lag.py --user-id 4242 --concurrency 100 --points 2000 --max-lag-ms 100
+"""
+import sys
+import os
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Run without the API key middleware; must be set before settings are loaded
+os.environ["REQUIRE_API_KEY"] = "false"
+
+import httpx
+from sqlalchemy import func
+
+from app.api import deps
+from app.db.session import SessionLocal
+from app.main import app
+from app.models.user import User
+from app.models.vitals_data import VitalsRawData
+from app.core.config import settings
+from app.utils.timezone import now_local
+
+
+async def probe_loop_lag(interval: float, samples: list, stop: asyncio.Event):
+    """Record how late each sleep(interval) wakes up, in milliseconds"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, (loop.time() - started - interval) * 1000))
+
+
+NOTES_PREFIX = "load-test"
+
+
+def build_payload(points: int, notes: str) -> dict:
+    end = now_local()
+    data = []
+    for i in range(points):
+        ts = end - timedelta(minutes=i)
+        data.append({
+            "metric_type": "Heart Rate",
+            "value": random.randint(55, 110),
+            "unit": "bpm",
+            "start_date": ts.isoformat(),
+            "end_date": ts.isoformat(),
+            "data_source": "manual_entry",
+            "notes": notes,
+        })
+    return {
+        "data": data,
+        "chunk_info": {
+            "session_id": f"loadtest_{uuid.uuid4().hex[:8]}",
+            "chunk_number": 1,
+            "total_chunks": 2,
+            "is_final_chunk": False,  # keep the ML worker out of the measurement
+        },
+    }
+
+
+async def client_worker(client: httpx.AsyncClient, requests: int, points: int, notes: str, latencies: list, errors: list):
+    url = f"{settings.API_V1_STR}/vitals/bulk-submit"
+    for _ in range(requests):
+        started = time.perf_counter()
+        try:
+            response = await client.post(url, json=build_payload(points, notes))
+            if response.status_code != 200:
+                errors.append(f"{response.status_code}: {response.text[:200]}")
+        except Exception as e:
+            errors.append(str(e))
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def delete_run_rows(user_id: int, notes: str) -> int:
+    db = SessionLocal()
+    try:
+        deleted = (
+            db.query(VitalsRawData)
+            .filter(VitalsRawData.user_id == user_id, VitalsRawData.notes == notes)
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+async def run(args) -> bool:
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == args.user_id).first()
+        if not user:
+            print(f"❌ User {args.user_id} not found")
+            return False
+        real_rows = (
+            db.query(VitalsRawData.id)
+            .filter(
+                VitalsRawData.user_id == args.user_id,
+                ~func.coalesce(VitalsRawData.notes, "").startswith(NOTES_PREFIX),
+            )
+            .first()
+        )
+        if real_rows and not args.allow_user_with_data:
+            print(f"❌ User {args.user_id} has real vitals data; use a dedicated test user "
+                  f"(or --allow-user-with-data to submit anyway)")
+            return False
+        db.expunge(user)
+    finally:
+        db.close()
+
+    app.dependency_overrides[deps.get_current_user] = lambda: user
+    notes = f"{NOTES_PREFIX}:{uuid.uuid4().hex[:12]}"
+    try:
+        return await measure(args, notes)
+    finally:
+        deleted = await asyncio.to_thread(delete_run_rows, args.user_id, notes)
+        print(f"🧹 Deleted {deleted} load-test rows ({notes})")
+
+
+async def measure(args, notes: str) -> bool:
+    lag_samples, latencies, errors = [], [], []
+    stop = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=300) as client:
+        probe = asyncio.create_task(probe_loop_lag(args.probe_interval_ms / 1000, lag_samples, stop))
+
+        # Idle baseline before load
+        await asyncio.sleep(1.0)
+        baseline = list(lag_samples)
+
+        print(f"🚀 {args.concurrency} clients x {args.requests} bulk submissions x {args.points} points")
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            client_worker(client, args.requests, args.points, notes, latencies, errors)
+            for _ in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        await probe
+
+    under_load = lag_samples[len(baseline):]
+    print(f"⏱️  Finished {len(latencies)} requests in {elapsed:.1f}s ({len(latencies) / elapsed:.1f} req/s), {len(errors)} errors")
+    print(f"   Request latency ms: p50={percentile(latencies, 0.5):.0f} p95={percentile(latencies, 0.95):.0f} p99={percentile(latencies, 0.99):.0f}")
+    print(f"   Loop lag idle ms:   mean={statistics.fmean(baseline or [0]):.2f} max={max(baseline or [0]):.2f}")
+    print(f"   Loop lag load ms:   mean={statistics.fmean(under_load or [0]):.2f} p99={percentile(under_load, 0.99):.2f} max={max(under_load or [0]):.2f}")
+    for error in errors[:5]:
+        print(f"   ⚠️  {error}")
+
+    worst = percentile(under_load, 0.99)
+    if worst > args.max_lag_ms:
+        print(f"❌ p99 loop lag {worst:.1f}ms exceeds budget of {args.max_lag_ms}ms")
+        return False
+    print(f"✅ p99 loop lag within {args.max_lag_ms}ms budget")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Event-loop lag under concurrent vitals bulk submissions",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--user-id", type=int, required=True, help="Dedicated test user to submit data as")
+    parser.add_argument("--allow-user-with-data", action="store_true",
+                        help="Run even if the user has vitals not written by this script")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent clients (default: 50)")
+    parser.add_argument("--requests", type=int, default=20, help="Bulk submissions per client (default: 20)")
+    parser.add_argument("--points", type=int, default=500, help="Data points per submission (default: 500)")
+    parser.add_argument("--probe-interval-ms", type=float, default=10, help="Loop lag probe interval (default: 10)")
+    parser.add_argument("--max-lag-ms", type=float, default=50, help="p99 loop lag budget (default: 50)")
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
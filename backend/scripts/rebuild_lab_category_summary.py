@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Rebuild lab_category_summary from lab_report_categorized.
+
+Lab aggregation keeps the summary current as results arrive; run this after
+migration 074 to populate it for existing users, or to repair it after manual
+edits to lab_report_categorized.
+
+Safe to run multiple times - each user's rows are recomputed from scratch.
+"""
+import sys
+import os
+import argparse
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.crud.lab_aggregation import LabAggregationCRUD
+from app.db.session import SessionLocal
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Rebuild per-user lab category status summaries',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Rebuild for all users
+  python rebuild_lab_category_summary.py
+
+  # Rebuild for a specific user only
+  python rebuild_lab_category_summary.py --user-id 1
+        """
+    )
+
+    parser.add_argument(
+        '--user-id',
+        type=int,
+        help='Optional: Rebuild only this user_id',
+        default=None
+    )
+
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        total = LabAggregationCRUD.rebuild_category_summaries(db, user_id=args.user_id)
+        print(f"✅ Rebuilt {total} category summaries")
+        return 0
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Rebuild failed: {e}")
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
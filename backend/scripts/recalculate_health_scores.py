@@ -14,12 +14,17 @@ Usage:
 
     # Recalculate all users with data
     python recalculate_health_scores.py --all-users --days 30
+
+    # Batch mode: set-based loading and vectorized scoring, 4 processes, resumable
+    python recalculate_health_scores.py --all-users --days 30 --batch --workers 4 --checkpoint /tmp/hs.json
 """
 import sys
 import os
+import json
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import date, timedelta, datetime
-from typing import List, Tuple
+from typing import Dict, List, Set, Tuple
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -27,8 +32,9 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 from sqlalchemy import func, distinct
 from app.models import VitalsDailyAggregate, User
 from app.health_scoring.services import HealthScoringService
+from app.health_scoring.batch import BatchHealthScorer
 from app.health_scoring.models import HealthScoreResultDaily
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, engine
 
 
 def get_users_with_data(db, limit=None) -> List[int]:
@@ -94,6 +100,95 @@ def recalculate_user_scores(
     return success, skipped, errors
 
 
+def load_checkpoint(path: str, params: Dict) -> Set[int]:
+    """User ids already completed by an earlier run with the same parameters."""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("params") != params:
+        print(f"⚠️  Checkpoint {path} was written for {data.get('params')}; starting over")
+        return set()
+    return set(data.get("done_user_ids", []))
+
+
+def save_checkpoint(path: str, params: Dict, done: Set[int]) -> None:
+    """Write the checkpoint atomically so an interrupted run never leaves it truncated."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"params": params, "done_user_ids": sorted(done)}, f)
+    os.replace(tmp_path, path)
+
+
+def score_user_chunk(
+    user_ids: List[int],
+    start_date: date,
+    end_date: date,
+    force: bool
+) -> Tuple[List[int], bool, Tuple[int, int, int]]:
+    """
+    Score one chunk of users in batch mode (runs in a worker process).
+
+    Returns:
+        Tuple of (user_ids, ok, (success_count, skipped_count, error_count))
+    """
+    db = SessionLocal()
+    try:
+        return user_ids, True, BatchHealthScorer(db).compute_range(user_ids, start_date, end_date, force=force)
+    except Exception as e:
+        db.rollback()
+        print(f"  ✗ Users {user_ids[0]}..{user_ids[-1]}: Error - {str(e)[:100]}")
+        return user_ids, False, (0, 0, len(user_ids) * ((end_date - start_date).days + 1))
+    finally:
+        db.close()
+
+
+def recalculate_batch(
+    user_ids: List[int],
+    start_date: date,
+    end_date: date,
+    force: bool,
+    workers: int,
+    chunk_size: int,
+    checkpoint: str = None
+) -> Tuple[int, int, int]:
+    """
+    Recalculate scores in user chunks with BatchHealthScorer, across processes.
+    Completed chunks are recorded in the checkpoint file so a rerun resumes.
+
+    Returns:
+        Tuple of (success_count, skipped_count, error_count)
+    """
+    params = {"start_date": start_date.isoformat(), "end_date": end_date.isoformat(), "force": force}
+    done = load_checkpoint(checkpoint, params)
+    pending = [u for u in user_ids if u not in done]
+    if done:
+        print(f"Resuming from checkpoint: {len(user_ids) - len(pending)} users already done")
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+
+    # Children must open their own connections rather than share the parent's sockets
+    engine.dispose()
+
+    total_success = 0
+    total_skipped = 0
+    total_errors = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(score_user_chunk, chunk, start_date, end_date, force) for chunk in chunks]
+        for idx, future in enumerate(as_completed(futures), 1):
+            chunk, ok, (success, skipped, errors) = future.result()
+            total_success += success
+            total_skipped += skipped
+            total_errors += errors
+            if ok:
+                done.update(chunk)
+                if checkpoint:
+                    save_checkpoint(checkpoint, params, done)
+            print(f"[{idx}/{len(chunks)}] Users {chunk[0]}..{chunk[-1]}: "
+                  f"{success} calculated, {skipped} skipped, {errors} errors")
+
+    return total_success, total_skipped, total_errors
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Batch recalculate health scores',
@@ -161,6 +256,33 @@ Examples:
         default=None
     )
     
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help='Use the batched scorer (set-based queries, vectorized scoring, bulk upsert)'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='Worker processes for --batch (default: 1)',
+        default=1
+    )
+    
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        help='Users per batch chunk (default: 200)',
+        default=200
+    )
+    
+    parser.add_argument(
+        '--checkpoint',
+        type=str,
+        help='JSON file recording finished users for --batch; reruns skip them',
+        default=None
+    )
+    
     args = parser.parse_args()
     
     # Validate arguments
@@ -184,6 +306,8 @@ Examples:
     print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Date range: {start_date} to {end_date} ({(end_date - start_date).days + 1} days)")
     print(f"Force recalculation: {args.force}")
+    if args.batch:
+        print(f"Batch mode: {args.workers} worker(s), {args.chunk_size} users per chunk")
     print("=" * 80)
     print()
     
@@ -207,22 +331,34 @@ Examples:
         total_skipped = 0
         total_errors = 0
         
-        for idx, user_id in enumerate(user_ids, 1):
-            print(f"\n[{idx}/{len(user_ids)}] User {user_id}:")
-            
-            success, skipped, errors = recalculate_user_scores(
-                db,
-                user_id,
+        if args.batch:
+            db.close()
+            total_success, total_skipped, total_errors = recalculate_batch(
+                user_ids,
                 start_date,
                 end_date,
-                force=args.force
+                force=args.force,
+                workers=args.workers,
+                chunk_size=args.chunk_size,
+                checkpoint=args.checkpoint
             )
+        else:
+            for idx, user_id in enumerate(user_ids, 1):
+                print(f"\n[{idx}/{len(user_ids)}] User {user_id}:")
             
-            total_success += success
-            total_skipped += skipped
-            total_errors += errors
+                success, skipped, errors = recalculate_user_scores(
+                    db,
+                    user_id,
+                    start_date,
+                    end_date,
+                    force=args.force
+                )
+            
+                total_success += success
+                total_skipped += skipped
+                total_errors += errors
             
-            print(f"  Summary: {success} calculated, {skipped} skipped, {errors} errors")
+                print(f"  Summary: {success} calculated, {skipped} skipped, {errors} errors")
         
         print()
         print("=" * 80)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Warm the shared LOINC mapping cache from known lab test mappings.
+
+Resolves every active lab_test_mappings entry through the same path the lab
+categorization flow uses, so the embedding search and LLM selection are paid
+once here instead of during report processing. Requires LOINC_ENABLED=1.
+
+Usage:
+    # Warm the cache for all active mappings
+    LOINC_ENABLED=1 python warm_loinc_mapping_cache.py
+
+    # Re-resolve everything (e.g. after a prompt/model change) and fill missing codes
+    LOINC_ENABLED=1 python warm_loinc_mapping_cache.py --refresh --update-mappings
+
+    # Only the first 100 mappings
+    LOINC_ENABLED=1 python warm_loinc_mapping_cache.py --limit 100
+"""
+import sys
+import os
+import argparse
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.models.lab_test_mapping import LabTestMapping
+from app.crud.lab_categorization import LabCategorizationCRUD, LabTestLOINCMapper, LOINC_MAPPER_AVAILABLE
+from app.db.session import SessionLocal
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Warm the LOINC mapping cache from lab_test_mappings",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Maximum number of mappings to resolve",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignore cached selections and resolve again",
+    )
+    parser.add_argument(
+        "--update-mappings",
+        action="store_true",
+        help="Store resolved codes on mappings that have no loinc_code yet",
+    )
+    parser.add_argument(
+        "--commit-every",
+        type=int,
+        default=50,
+        help="Commit mapping updates every N mappings (default: 50)",
+    )
+    args = parser.parse_args()
+
+    if not LOINC_MAPPER_AVAILABLE or LabTestLOINCMapper is None:
+        print("❌ LOINC mapper not available (set LOINC_ENABLED=1 and install its dependencies)")
+        sys.exit(1)
+
+    loinc_mapper = LabTestLOINCMapper()
+    db = SessionLocal()
+    resolved = missing = updated = 0
+    try:
+        query = db.query(LabTestMapping).filter(LabTestMapping.is_active == True).order_by(LabTestMapping.id)
+        if args.limit:
+            query = query.limit(args.limit)
+        mappings = query.all()
+        print(f"🔥 Warming LOINC cache for {len(mappings)} mappings (refresh={args.refresh})")
+
+        for i, mapping in enumerate(mappings, start=1):
+            loinc_code, loinc_source = LabCategorizationCRUD.get_loinc_code_for_test(
+                test_name=LabCategorizationCRUD.loinc_lookup_name(mapping),
+                test_category=mapping.test_category,
+                test_unit=None,
+                reference_range=None,
+                loinc_mapper=loinc_mapper,
+                refresh_cache=args.refresh,
+            )
+
+            if loinc_code:
+                resolved += 1
+                if args.update_mappings and not mapping.loinc_code:
+                    mapping.loinc_code = loinc_code
+                    mapping.loinc_source = loinc_source
+                    mapping.updated_at = datetime.utcnow()
+                    updated += 1
+            else:
+                missing += 1
+
+            if i % args.commit_every == 0:
+                db.commit()
+                print(f"   ... {i}/{len(mappings)} (resolved={resolved}, no_match={missing}, updated={updated})")
+
+        db.commit()
+        print(f"✅ Done: resolved={resolved}, no_match={missing}, mappings_updated={updated}")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Warm-up failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import asyncio
+import importlib
+
+import pytest
+
+from app.agentsv2.workflow_registry import RequestScopedAttributes
+
+
+class _SharedWorkflow(RequestScopedAttributes):
+    REQUEST_SCOPED_ATTRIBUTES = {
+        "current_user_id": lambda: None,
+        "intermediate_tool_outputs": dict,
+        "retrieved_data_json": lambda: None,
+    }
+
+    def __init__(self):
+        self.intermediate_tool_outputs = {}
+
+    async def run(self, user_id, rows, entered, proceed):
+        self.begin_request_scope()
+        self.current_user_id = user_id
+        self.intermediate_tool_outputs["retrieve_data"] = rows
+        self.retrieved_data_json = {"user_id": user_id, "rows": rows}
+        entered.set()
+        await proceed.wait()
+        return self.current_user_id, dict(self.intermediate_tool_outputs), self.retrieved_data_json
+
+
+def test_concurrent_requests_do_not_share_scratch_data():
+    async def scenario():
+        workflow = _SharedWorkflow()
+        first_in, second_in, release = asyncio.Event(), asyncio.Event(), asyncio.Event()
+        first = asyncio.create_task(workflow.run("1", ["glucose 90"], first_in, release))
+        await first_in.wait()
+        second = asyncio.create_task(workflow.run("2", ["glucose 180"], second_in, release))
+        await second_in.wait()
+        release.set()
+        return await first, await second, workflow
+
+    (uid_a, out_a, json_a), (uid_b, out_b, json_b), workflow = asyncio.run(scenario())
+
+    assert uid_a == "1" and out_a == {"retrieve_data": ["glucose 90"]} and json_a["user_id"] == "1"
+    assert uid_b == "2" and out_b == {"retrieve_data": ["glucose 180"]} and json_b["user_id"] == "2"
+    # Nothing a request wrote is left on the shared instance
+    assert workflow.intermediate_tool_outputs == {}
+    assert workflow.retrieved_data_json is None
+
+
+@pytest.mark.parametrize(
+    "module_name, class_name, attribute",
+    [
+        ("app.agentsv2.nutrition_analyze_workflow", "NutritionAnalyzeWorkflow", "intermediate_tool_outputs"),
+        ("app.agentsv2.lab_analyze_workflow", "LabAnalyzeWorkflow", "retrieved_data_json"),
+        ("app.agentsv2.pharmacy_analyze_workflow", "PharmacyAnalyzeWorkflow", "retrieved_data_json"),
+        ("app.agentsv2.vitals_analyze_workflow", "VitalsAnalyzeWorkflow", "retrieved_data_json"),
+    ],
+)
+def test_analyze_workflows_scope_retrieved_data(module_name, class_name, attribute):
+    pytest.importorskip("langgraph")
+    workflow_cls = getattr(importlib.import_module(module_name), class_name)
+    assert attribute in workflow_cls.REQUEST_SCOPED_ATTRIBUTES